@@ -37,6 +37,18 @@ function Get-LogFileStatus {
     return $status
 }
 
+function Get-LogEntryStats {
+    # 通过 log_parser.py 流式统计条目（不把整个日志读入内存），没有Python时返回空
+    try {
+        $parser = Join-Path $PSScriptRoot "log_parser.py"
+        $json = & python $parser $LogFile --action stats --json 2>$null
+        if ($LASTEXITCODE -eq 0 -and $json) {
+            return ($json | Out-String | ConvertFrom-Json)
+        }
+    } catch { }
+    return $null
+}
+
 function Show-LogStatus {
     $status = Get-LogFileStatus
     if (-not $status) { return }
@@ -47,6 +59,11 @@ function Show-LogStatus {
     Write-Host "行数统计: $($status.Lines) 行" -ForegroundColor White
     Write-Host "最后修改: $($status.LastModified)" -ForegroundColor White
     
+    $entryStats = Get-LogEntryStats
+    if ($entryStats) {
+        Write-Host "条目统计: $($entryStats.entries) 条 ($($entryStats.first) ~ $($entryStats.last))" -ForegroundColor White
+    }
+    
     if ($status.NeedsArchive) {
         Write-Host "⚠️  文件大小超过 $MaxSizeMB MB，建议归档" -ForegroundColor Yellow
     } else {
@@ -12,12 +12,18 @@ import shutil
 import json
 from pathlib import Path
 
+from chunk_store import ChunkStore
+from backup_replication import load_target_config, STATUS_FILE_NAME
+from backup_retention import RetentionEngine
+from log_compression import strip_compression_suffix
+
 class BackupManager:
     def __init__(self, project_dir=None):
         self.project_dir = project_dir or os.getcwd()
         self.project_name = self.detect_project_name()
         self.backup_dir = os.path.join(self.project_dir, "backups")
-        self.ai_backup_dir = r"d:\ai-projects\backups"
+        self.replication_targets = load_target_config(self.backup_dir, self.project_name) \
+            if os.path.exists(self.backup_dir) else []
         
     def detect_project_name(self):
         """自动检测项目名称"""
@@ -40,13 +46,13 @@ class BackupManager:
         backup_files = []
         total_size = 0
         
-        for file in os.listdir(self.backup_dir):
-            if file.endswith('.md'):
-                file_path = os.path.join(self.backup_dir, file)
-                size = os.path.getsize(file_path)
-                mtime = os.path.getmtime(file_path)
-                backup_files.append((file, size, mtime))
-                total_size += size
+        # scandir 每个文件只 stat 一次（备份文件上万个时 listdir + getsize + getmtime 明显变慢）
+        with os.scandir(self.backup_dir) as entries:
+            for entry in entries:
+                if strip_compression_suffix(entry.name).endswith('.md') and entry.is_file():
+                    stat = entry.stat()
+                    backup_files.append((entry.name, stat.st_size, stat.st_mtime))
+                    total_size += stat.st_size
         
         backup_files.sort(key=lambda x: x[2], reverse=True)
         
@@ -65,27 +71,45 @@ class BackupManager:
         print("\n🔍 元数据文件检查:")
         meta_files = [f for f in os.listdir(self.backup_dir) if f.startswith('backup_meta_')]
         for meta_file in meta_files:
-            backup_type = meta_file.replace('backup_meta_', '').replace('.txt', '')
+            backup_type = os.path.splitext(meta_file.replace('backup_meta_', ''))[0]
             corresponding_backup = f"{self.project_name}-log-incremental-{backup_type}.md"
             
-            if corresponding_backup in [f[0] for f in backup_files]:
+            if corresponding_backup in [strip_compression_suffix(f[0]) for f in backup_files]:
                 print(f"  ✅ {backup_type}: 元数据和备份文件都存在")
             else:
                 print(f"  ⚠️ {backup_type}: 有元数据但缺少备份文件")
         
-        # 5. 检查AI项目目录备份
-        print(f"\n🌐 AI项目目录备份检查:")
-        if os.path.exists(self.ai_backup_dir):
-            ai_backup_files = [f for f in os.listdir(self.ai_backup_dir) 
-                             if f.startswith(f"{self.project_name}-log-incremental-")]
-            if ai_backup_files:
-                print(f"  ✅ 发现 {len(ai_backup_files)} 个AI项目目录备份")
-                for file in ai_backup_files:
-                    print(f"    - {file}")
+        # 5. 检查复制目标
+        print(f"\n🌐 复制目标检查（backups/replication.json）:")
+        status = {}
+        status_path = os.path.join(self.backup_dir, STATUS_FILE_NAME)
+        if os.path.exists(status_path):
+            with open(status_path, 'r', encoding='utf-8') as f:
+                status = {target['name']: target for target in json.load(f).get('targets', [])}
+        if not self.replication_targets:
+            print("  ⚠️ 没有配置复制目标")
+        for target in self.replication_targets:
+            name = target.get('name') or target['path']
+            metrics = status.get(name)
+            if metrics is None:
+                print(f"  ❔ {name} ({target['path']}): 还没有复制记录")
+            elif metrics['backlog'] or metrics['consecutive_failures']:
+                print(f"  ⚠️ {name}: 积压 {metrics['backlog']} 个文件，延迟 {metrics['lag_seconds']:.0f}秒，"
+                      f"最近错误: {metrics['last_error']}")
             else:
-                print("  ⚠️ AI项目目录没有发现备份文件")
+                print(f"  ✅ {name}: 已同步（最近成功 {metrics['last_success']}）")
+        
+        # 6. 去重快照库
+        print(f"\n🧩 去重快照库检查:")
+        store = ChunkStore(os.path.join(self.backup_dir, "chunk-store"))
+        report = store.savings_report(f"{self.project_name}-log.md", self.backup_dir)
+        if report['snapshots']:
+            print(f"  ✅ {report['snapshots']} 个快照，{report['unique_chunks']} 个不重复块")
+            print(f"  💾 快照库占用 {report['stored_bytes'] / 1024 / 1024:.2f} MB，"
+                  f"逐个完整复制需 {report['logical_bytes'] / 1024 / 1024:.2f} MB（{report['dedup_ratio']:.1f}x）")
+            print(f"  📄 现有增量备份文件 {report['legacy_files']} 个，占用 {report['legacy_bytes'] / 1024 / 1024:.2f} MB")
         else:
-            print("  ❌ AI项目备份目录不存在")
+            print("  ⚠️ 还没有日志快照")
     
     def classify_backup_type(self, filename):
         """分类备份文件类型"""
@@ -106,60 +130,43 @@ class BackupManager:
             return "未知类型"
     
     def cleanup_duplicates(self, dry_run=True):
-        """清理重复和无用的备份文件"""
-        print(f"🧹 清理重复备份文件 {'(预演模式)' if dry_run else '(执行模式)'}")
-        print("=" * 50)
+        """清理重复和无用的备份文件（bak 文件超过7天、根目录备份保留最新2个）"""
+        return self.apply_retention(dry_run=dry_run, kinds=["legacy-bak", "root-backup"])
+    
+    def apply_retention(self, dry_run=True, kinds=None, as_json=False):
+        """按保留策略（backups/retention.json 可覆盖默认策略）清理备份"""
+        engine = RetentionEngine(self.project_dir, self.project_name)
+        plan = engine.plan(kinds=kinds)
         
-        cleanup_candidates = []
-        
-        # 1. 查找停止更新的bak文件
-        for file in os.listdir(self.backup_dir):
-            if file.endswith('.md') and 'bak' in file:
-                file_path = os.path.join(self.backup_dir, file)
-                mtime = os.path.getmtime(file_path)
-                days_old = (datetime.datetime.now().timestamp() - mtime) / (24 * 3600)
-                
-                if days_old > 7:  # 超过7天未更新
-                    cleanup_candidates.append((file_path, f"停止更新的bak文件 ({days_old:.1f}天前)"))
-        
-        # 2. 查找根目录的重复备份
-        root_backups = [f for f in os.listdir(self.project_dir) 
-                       if f.startswith(f"{self.project_name}-log-backup-") and f.endswith('.md')]
-        
-        if len(root_backups) > 2:  # 保留最新的2个
-            root_backups.sort(key=lambda x: os.path.getmtime(os.path.join(self.project_dir, x)))
-            for old_backup in root_backups[:-2]:
-                file_path = os.path.join(self.project_dir, old_backup)
-                cleanup_candidates.append((file_path, "根目录重复备份"))
-        
-        # 3. 显示清理计划
-        if cleanup_candidates:
-            print(f"发现 {len(cleanup_candidates)} 个可清理的文件:")
-            total_size = 0
-            for file_path, reason in cleanup_candidates:
-                size = os.path.getsize(file_path)
-                total_size += size
-                size_mb = size / 1024 / 1024
-                print(f"  🗑️ {os.path.basename(file_path)} ({size_mb:.2f}MB) - {reason}")
-            
-            print(f"\n💾 可释放空间: {total_size / 1024 / 1024:.2f} MB")
-            
-            if not dry_run:
-                confirm = input("\n⚠️ 确定要删除这些文件吗？(y/N): ")
-                if confirm.lower() == 'y':
-                    deleted_count = 0
-                    for file_path, reason in cleanup_candidates:
-                        try:
-                            os.remove(file_path)
-                            deleted_count += 1
-                            print(f"✅ 已删除: {os.path.basename(file_path)}")
-                        except Exception as e:
-                            print(f"❌ 删除失败: {os.path.basename(file_path)} - {e}")
-                    print(f"\n🎉 清理完成，删除了 {deleted_count} 个文件")
-                else:
-                    print("取消清理操作")
+        if as_json:
+            print(json.dumps(plan, ensure_ascii=False, indent=2))
         else:
-            print("✅ 没有发现需要清理的重复备份文件")
+            print(f"🧹 按保留策略清理备份 {'(预演模式)' if dry_run else '(执行模式)'}")
+            print("=" * 50)
+            for kind, summary in plan['kinds'].items():
+                print(f"  {kind:<16} 共 {summary['files']:>6}  保留 {summary['keep']:>6}  "
+                      f"删除 {summary['delete']:>6}  可回收 {summary['bytes_reclaimable'] / 1024 / 1024:.2f} MB")
+            for item in plan['delete'][:20]:
+                print(f"  🗑️ {os.path.basename(item['path'])} ({item['size'] / 1024 / 1024:.2f}MB) [{item['kind']}]")
+            if len(plan['delete']) > 20:
+                print(f"  ... 另有 {len(plan['delete']) - 20} 个文件")
+            if plan['orphan_objects']:
+                print(f"  🧩 {len(plan['orphan_objects'])} 个不再被引用的快照块对象")
+            print(f"\n💾 可释放空间: {plan['bytes_reclaimable'] / 1024 / 1024:.2f} MB（扫描 {plan['scan_ms']}ms）")
+        
+        if not plan['delete'] and not plan['orphan_objects']:
+            if not as_json:
+                print("✅ 没有发现需要清理的备份文件")
+            return plan
+        
+        if not dry_run:
+            confirm = input("\n⚠️ 确定要删除这些文件吗？(y/N): ")
+            if confirm.lower() == 'y':
+                deleted_count, freed = engine.apply(plan)
+                print(f"\n🎉 清理完成，删除了 {deleted_count} 个文件，释放 {freed / 1024 / 1024:.2f} MB")
+            else:
+                print("取消清理操作")
+        return plan
     
     def create_emergency_backup(self):
         """创建紧急完整备份"""
@@ -191,10 +198,12 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description="injection项目备份管理工具")
-    parser.add_argument("action", choices=["status", "cleanup", "emergency"], 
-                       help="操作类型: status(状态报告), cleanup(清理重复), emergency(紧急备份)")
+    parser.add_argument("action", choices=["status", "cleanup", "retention", "emergency"], 
+                       help="操作类型: status(状态报告), cleanup(清理重复), retention(按保留策略清理), emergency(紧急备份)")
     parser.add_argument("--execute", action="store_true", 
                        help="执行清理操作（默认为预演模式）")
+    parser.add_argument("--json", action="store_true", 
+                       help="以JSON输出保留策略预演计划")
     parser.add_argument("--project-dir", type=str, 
                        help="项目目录路径（默认为当前目录）")
     
@@ -206,6 +215,8 @@ def main():
         manager.status_report()
     elif args.action == "cleanup":
         manager.cleanup_duplicates(dry_run=not args.execute)
+    elif args.action == "retention":
+        manager.apply_retention(dry_run=not args.execute, as_json=args.json)
     elif args.action == "emergency":
         manager.create_emergency_backup()
     
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+备份多目标异步复制 - 可配置的复制目标 + 工作线程池
+
+原 backup-2 写死 d:\\ai-projects，并在注入流程中同步写入；BackupManager 又另外写死 d:\\ai-projects\\backups。
+本模块：
+1. 复制目标在 backups/replication.json 中配置（应用与 BackupManager 共用），支持：
+   - directory：本地目录或另一块磁盘，按相对路径镜像
+   - object_store：本地模拟的对象存储（内容寻址对象 + SQLite 键索引）
+2. 每个目标有独立的工作线程和队列，慢副本只拖慢自己，注入流程只负责入队
+3. 同一文件在队列中的多次提交合并为一次；失败按指数退避重试
+4. 每个目标记录积压数量、复制延迟、最近错误等指标，写入 replication-status.json
+5. 启动或目标恢复后按快照库、分段清单遍历源目录，补齐副本缺失或过期的文件
+
+命令行：python backup_replication.py <备份目录> [status|sync] [--archive 分段目录]
+
+作者: Assistant
+创建时间: 2025-06-16
+项目: injection
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import random
+import shutil
+import sqlite3
+import hashlib
+import datetime
+import threading
+
+
+CONFIG_FILE_NAME = "replication.json"
+STATUS_FILE_NAME = "replication-status.json"
+
+# 不复制的本地状态文件（verification-status.json 为 backup_verifier 的校验结果，每轮都会改写）
+EXCLUDED_NAMES = {CONFIG_FILE_NAME, STATUS_FILE_NAME, "verification-status.json"}
+EXCLUDED_PREFIXES = ("backup_meta_",)
+EXCLUDED_SUFFIXES = (".tmp",)
+
+
+def default_targets(project_name):
+    """未配置时沿用原 backup-2 位置（仅 Windows）"""
+    if os.name != 'nt':
+        return []
+    return [{'name': "ai-projects", 'type': "directory", 'path': os.path.join(r"d:\ai-projects", "backups", project_name)}]
+
+
+def load_target_config(backup_dir, project_name):
+    """读取复制目标配置；没有配置文件时写入默认配置，方便用户修改"""
+    config_path = os.path.join(backup_dir, CONFIG_FILE_NAME)
+    try:
+        if os.path.exists(config_path):
+            with open(config_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('targets', [])
+        targets = default_targets(project_name)
+        os.makedirs(backup_dir, exist_ok=True)
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump({'targets': targets}, f, ensure_ascii=False, indent=2)
+        return targets
+    except Exception as e:
+        print(f"⚠️ 读取备份复制配置失败：{e}")
+        return []
+
+
+def is_replicated(name):
+    return not (name in EXCLUDED_NAMES or name.startswith(EXCLUDED_PREFIXES) or name.endswith(EXCLUDED_SUFFIXES))
+
+
+# === 复制目标 ===
+class DirectoryTarget:
+    """目录目标：按相对路径镜像（本地目录、另一块磁盘、网络共享）"""
+
+    def __init__(self, name, path, **options):
+        self.name = name
+        self.path = path
+
+    def describe(self):
+        return f"目录 {self.path}"
+
+    def is_current(self, key, stat):
+        try:
+            target_stat = os.stat(os.path.join(self.path, key))
+            return target_stat.st_size == stat.st_size and target_stat.st_mtime_ns >= stat.st_mtime_ns
+        except OSError:
+            return False
+
+    def put(self, key, source_path):
+        destination = os.path.join(self.path, key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        temp_file = destination + ".tmp"
+        shutil.copy2(source_path, temp_file)
+        os.replace(temp_file, destination)
+        return os.path.getsize(destination)
+
+    def close(self):
+        pass
+
+
+class ObjectStoreTarget:
+    """本地模拟的对象存储：对象按 sha256 存放，键 -> 对象 的映射记录在 SQLite 中"""
+
+    def __init__(self, name, path, **options):
+        self.name = name
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def describe(self):
+        return f"对象存储 {self.path}"
+
+    def _connect(self):
+        if self.conn is None:
+            os.makedirs(self.path, exist_ok=True)
+            self.conn = sqlite3.connect(os.path.join(self.path, "index.db"), check_same_thread=False)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS objects (
+                    key TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    stored TEXT
+                )
+            """)
+        return self.conn
+
+    def is_current(self, key, stat):
+        with self.lock:
+            row = self._connect().execute("SELECT size, mtime_ns FROM objects WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] == stat.st_size and row[1] >= stat.st_mtime_ns
+
+    def put(self, key, source_path):
+        stat = os.stat(source_path)
+        with open(source_path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        object_path = os.path.join(self.path, "objects", digest[:2], digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            with open(object_path + ".tmp", 'wb') as out:
+                out.write(data)
+            os.replace(object_path + ".tmp", object_path)
+        with self.lock, self._connect():
+            self.conn.execute("INSERT OR REPLACE INTO objects (key, sha256, size, mtime_ns, stored) VALUES (?, ?, ?, ?, ?)",
+                              (key, digest, stat.st_size, stat.st_mtime_ns, datetime.datetime.now().isoformat()))
+        return len(data)
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+TARGET_TYPES = {
+    'directory': DirectoryTarget,
+    'object_store': ObjectStoreTarget,
+}
+
+
+def create_target(config):
+    target_class = TARGET_TYPES.get(config.get('type', 'directory'))
+    if target_class is None:
+        raise ValueError(f"未知的复制目标类型：{config.get('type')}")
+    options = {key: value for key, value in config.items() if key not in ('name', 'type', 'path')}
+    return target_class(config.get('name') or config['path'], config['path'], **options)
+
+
+# === 复制服务 ===
+class TargetWorker:
+    """单个复制目标的队列、工作线程和指标"""
+
+    def __init__(self, replicator, target):
+        self.replicator = replicator
+        self.target = target
+        self.condition = threading.Condition()
+        self.heap = []        # (就绪时间, 序号, 键)
+        self.pending = {}     # 键 -> {'path', 'queued', 'attempts'}
+        self.counter = 0
+        self.thread = None
+        self.metrics = {
+            'replicated_files': 0,
+            'replicated_bytes': 0,
+            'failures': 0,
+            'consecutive_failures': 0,
+            'last_success': None,
+            'last_error': None,
+            'last_error_time': None
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name=f"BackupReplica-{self.target.name}", daemon=True)
+        self.thread.start()
+
+    def submit(self, key, path, delay=0.0):
+        with self.condition:
+            job = self.pending.get(key)
+            if job is None:
+                self.pending[key] = {'path': path, 'queued': time.time(), 'attempts': 0, 'dirty': False}
+            else:
+                # 合并：保留最早的入队时间用于计算延迟；正在复制时标记为需要再复制一次
+                job['path'] = path
+                job['dirty'] = True
+            self.counter += 1
+            heapq.heappush(self.heap, (time.monotonic() + delay, self.counter, key))
+            self.condition.notify()
+
+    def _next_job(self):
+        with self.condition:
+            while not self.replicator.stop_event.is_set():
+                if self.heap:
+                    ready_at, _, key = self.heap[0]
+                    wait = ready_at - time.monotonic()
+                    if wait <= 0:
+                        heapq.heappop(self.heap)
+                        if key in self.pending:
+                            job = self.pending[key]
+                            job['dirty'] = False
+                            return key, job
+                        continue  # 已被合并处理
+                    self.condition.wait(wait)
+                else:
+                    self.condition.wait()
+            return None, None
+
+    def _run(self):
+        while True:
+            key, job = self._next_job()
+            if key is None:
+                return
+            try:
+                stat = os.stat(job['path'])
+            except FileNotFoundError:
+                # 源文件已被删除（如保留策略清理），不再复制
+                with self.condition:
+                    if not job['dirty']:
+                        self.pending.pop(key, None)
+                continue
+            try:
+                if not self.target.is_current(key, stat):
+                    written = self.target.put(key, job['path'])
+                    self.metrics['replicated_files'] += 1
+                    self.metrics['replicated_bytes'] += written
+                with self.condition:
+                    # 复制期间文件又被提交时保留任务，由堆中的新记录再复制一次
+                    if not job['dirty']:
+                        self.pending.pop(key, None)
+                self.metrics['consecutive_failures'] = 0
+                self.metrics['last_success'] = datetime.datetime.now().isoformat()
+            except Exception as e:
+                self._retry(key, job, e)
+            self.replicator.status_changed()
+
+    def _retry(self, key, job, error):
+        job['attempts'] += 1
+        self.metrics['failures'] += 1
+        self.metrics['consecutive_failures'] += 1
+        self.metrics['last_error'] = str(error)
+        self.metrics['last_error_time'] = datetime.datetime.now().isoformat()
+        delay = min(self.replicator.max_delay, self.replicator.base_delay * (2 ** (job['attempts'] - 1)))
+        delay *= random.uniform(0.8, 1.2)
+        if job['attempts'] == 1 or self.metrics['consecutive_failures'] % 20 == 0:
+            print(f"⚠️ 复制到 {self.target.name} 失败，{delay:.0f}秒后重试：{error}")
+        with self.condition:
+            self.counter += 1
+            heapq.heappush(self.heap, (time.monotonic() + delay, self.counter, key))
+
+    def snapshot_metrics(self):
+        with self.condition:
+            oldest = min((job['queued'] for job in self.pending.values()), default=None)
+            backlog = len(self.pending)
+        metrics = dict(self.metrics)
+        metrics.update({
+            'name': self.target.name,
+            'target': self.target.describe(),
+            'backlog': backlog,
+            'lag_seconds': round(time.time() - oldest, 1) if oldest else 0.0
+        })
+        return metrics
+
+
+class BackupReplicator:
+    """备份多目标异步复制服务"""
+
+    def __init__(self, source_roots, targets, base_delay=2.0, max_delay=300.0, status_path=None):
+        """source_roots: {键前缀: 源目录}，键前缀为空表示备份目录本身"""
+        self.source_roots = source_roots
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.status_path = status_path
+        self.stop_event = threading.Event()
+        self.workers = []
+        self.status_lock = threading.Lock()
+        self.last_status_write = 0.0
+        for config in targets:
+            try:
+                self.workers.append(TargetWorker(self, create_target(config)))
+            except Exception as e:
+                print(f"⚠️ 忽略无效的复制目标 {config}：{e}")
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        if self.workers:
+            print(f"🔁 备份复制已启动：{', '.join(worker.target.describe() for worker in self.workers)}")
+
+    def stop(self):
+        self.stop_event.set()
+        for worker in self.workers:
+            with worker.condition:
+                worker.condition.notify_all()
+        for worker in self.workers:
+            if worker.thread:
+                worker.thread.join(2.0)
+            worker.target.close()
+        self.write_status(force=True)
+
+    # === 提交 ===
+    def key_for(self, path):
+        """源文件对应的复制键（相对路径，使用 / 分隔）"""
+        path = os.path.abspath(path)
+        for prefix, root in self.source_roots.items():
+            root = os.path.abspath(root)
+            if path.startswith(root + os.sep):
+                relative = os.path.relpath(path, root).replace(os.sep, '/')
+                return f"{prefix}/{relative}" if prefix else relative
+        return None
+
+    def submit(self, paths):
+        """把文件加入所有目标的复制队列（立即返回）"""
+        if isinstance(paths, str):
+            paths = [paths]
+        for path in paths:
+            key = self.key_for(path) if path else None
+            if key is None or not is_replicated(os.path.basename(path)):
+                continue
+            for worker in self.workers:
+                worker.submit(key, path)
+
+    def catch_up(self):
+        """遍历源目录（快照库对象与清单、分段清单与分段、增量备份），把副本缺失或过期的文件入队"""
+        queued = 0
+        for prefix, root in self.source_roots.items():
+            for path, stat in self._walk(root):
+                key = self.key_for(path)
+                for worker in self.workers:
+                    try:
+                        current = worker.target.is_current(key, stat)
+                    except Exception:
+                        current = False
+                    if not current:
+                        worker.submit(key, path)
+                        queued += 1
+        if queued:
+            print(f"🔁 副本追赶：{queued} 个文件待复制")
+        return queued
+
+    def catch_up_async(self):
+        threading.Thread(target=self.catch_up, name="BackupReplicaCatchUp", daemon=True).start()
+
+    @staticmethod
+    def _walk(root):
+        if not os.path.isdir(root):
+            return
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file() and is_replicated(entry.name):
+                    yield entry.path, entry.stat()
+
+    # === 指标 ===
+    def metrics(self):
+        return [worker.snapshot_metrics() for worker in self.workers]
+
+    def status_changed(self):
+        self.write_status()
+
+    def write_status(self, force=False):
+        """把各目标指标写入状态文件（最多每秒一次），供 BackupManager 查看"""
+        if not self.status_path:
+            return
+        with self.status_lock:
+            now = time.monotonic()
+            if not force and now - self.last_status_write < 1.0:
+                return
+            self.last_status_write = now
+            try:
+                temp_file = self.status_path + ".tmp"
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump({'updated': datetime.datetime.now().isoformat(), 'targets': self.metrics()},
+                              f, ensure_ascii=False, indent=2)
+                os.replace(temp_file, self.status_path)
+            except Exception as e:
+                print(f"⚠️ 写入复制状态失败：{e}")
+
+
+def main():
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="备份多目标复制")
+    parser.add_argument("backup_dir", help="备份目录")
+    parser.add_argument("action", nargs="?", default="status", choices=["status", "sync"])
+    parser.add_argument("--archive", default="", help="日志分段目录（默认为备份目录同级的 log-archive）")
+    parser.add_argument("--project", default="", help="项目名称（默认为备份目录的上级目录名）")
+    args = parser.parse_args()
+
+    backup_dir = os.path.abspath(args.backup_dir)
+    project_dir = os.path.dirname(backup_dir)
+    project_name = args.project or os.path.basename(project_dir)
+
+    if args.action == "status":
+        status_path = os.path.join(backup_dir, STATUS_FILE_NAME)
+        if not os.path.exists(status_path):
+            print("⚠️ 还没有复制状态记录")
+            return 1
+        with open(status_path, 'r', encoding='utf-8') as f:
+            print(json.dumps(json.load(f), ensure_ascii=False, indent=2))
+        return 0
+
+    archive_dir = args.archive or os.path.join(project_dir, "log-archive")
+    replicator = BackupReplicator({'': backup_dir, 'log-archive': archive_dir},
+                                  load_target_config(backup_dir, project_name),
+                                  status_path=os.path.join(backup_dir, STATUS_FILE_NAME))
+    replicator.start()
+    replicator.catch_up()
+    while any(metrics['backlog'] for metrics in replicator.metrics()):
+        failing = [metrics for metrics in replicator.metrics() if metrics['consecutive_failures'] >= 3]
+        if failing:
+            print(f"❌ 复制失败：{failing[0]['name']} - {failing[0]['last_error']}")
+            break
+        time.sleep(0.2)
+    replicator.stop()
+    for metrics in replicator.metrics():
+        print(f"{metrics['name']}: 已复制 {metrics['replicated_files']} 个文件 / {metrics['replicated_bytes']} 字节，积压 {metrics['backlog']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+备份后台校验 - 空闲时按限速重新校验备份、归档段和复制副本
+
+backups/ 中的文件和第二位置的副本是否仍然可读、内容是否一致，原先要等到恢复时才知道。本模块：
+1. 快照库：逐个重新解压、哈希所有被快照清单引用的块对象，缺失或摘要不符即报告
+2. 归档段：按 log-archive 清单中的 sha256 复核每个段文件
+3. 增量备份：解压并解析头部，核对正文长度与头部记录的区间
+4. 复制副本：目录目标按相对路径比对（已校验过的文件比较 sha256，其余比较大小），
+   对象存储目标按 index.db 中的 sha256 复核对象文件
+5. 令牌桶限制读取速率；应用有活动（注入、写日志）后暂停，空闲满 idle_seconds 才继续，从断点接着校验
+6. 结果写入 backups/verification-status.json，供状态栏和诊断导出读取
+
+命令行：python backup_verifier.py <项目目录> [--project 名称] [--rate MB每秒] [--json]
+
+作者: Assistant
+创建时间: 2025-06-16
+项目: injection
+"""
+
+import os
+import sys
+import json
+import zlib
+import time
+import sqlite3
+import hashlib
+import datetime
+import threading
+
+from chunk_store import ChunkStore
+from log_parser import parse_backup_header
+from log_compression import open_compressed, strip_compression_suffix
+from backup_replication import load_target_config, is_replicated
+
+
+STATUS_FILE_NAME = "verification-status.json"
+
+DEFAULT_RATE = 4 * 1024 * 1024       # 字节/秒
+DEFAULT_IDLE_SECONDS = 30
+DEFAULT_INTERVAL_SECONDS = 6 * 3600  # 两轮完整校验之间的间隔
+READ_SIZE = 256 * 1024
+MAX_PROBLEMS = 200
+
+
+class RateLimiter:
+    """令牌桶：平均速率 rate 字节/秒，允许一个读取块的突发"""
+
+    def __init__(self, rate, burst=READ_SIZE):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def consume(self, amount, stop_event=None):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= min(amount, self.burst):
+                self.tokens -= amount
+                return True
+            wait = (min(amount, self.burst) - self.tokens) / self.rate
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class VerificationPaused(Exception):
+    """校验过程中应用变为活跃或服务停止"""
+
+
+class BackupVerifier:
+    """空闲时运行的备份校验服务"""
+
+    STATE_IDLE = "idle"
+    STATE_RUNNING = "running"
+    STATE_PAUSED = "paused"
+
+    def __init__(self, project_dir, project_name, archive_dir=None, rate=DEFAULT_RATE,
+                 idle_seconds=DEFAULT_IDLE_SECONDS, interval_seconds=DEFAULT_INTERVAL_SECONDS):
+        self.project_dir = project_dir
+        self.project_name = project_name
+        self.backup_dir = os.path.join(project_dir, "backups")
+        self.archive_dir = archive_dir or os.path.join(project_dir, "log-archive")
+        self.source_roots = {'': self.backup_dir, 'log-archive': self.archive_dir}
+        self.status_path = os.path.join(self.backup_dir, STATUS_FILE_NAME)
+        self.limiter = RateLimiter(rate)
+        self.idle_seconds = idle_seconds
+        self.interval_seconds = interval_seconds
+
+        self.last_activity = time.monotonic()
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+        self.state = self.STATE_IDLE
+        self.respect_idle = True
+        self.run_requested = False
+        self.pending = None      # 本轮尚未完成的校验任务迭代器
+        self.interrupted = None  # 因让出而中断的任务
+        self.current = None      # 本轮进行中的结果
+        self.result = self.load_status()
+        self.version = 0         # 每次结果变化加一，界面据此判断是否需要刷新
+
+    # === 状态 ===
+    def load_status(self):
+        try:
+            if os.path.exists(self.status_path):
+                with open(self.status_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"⚠️ 读取备份校验状态失败：{e}")
+        return None
+
+    def save_status(self, result):
+        os.makedirs(self.backup_dir, exist_ok=True)
+        temp_file = self.status_path + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.status_path)
+
+    def summary(self):
+        """供状态栏显示的一行摘要"""
+        with self.lock:
+            result = self.current if self.state != self.STATE_IDLE and self.current else self.result
+            state = self.state
+        if result is None:
+            return "备份校验：尚未运行"
+        problems = len(result['problems'])
+        if state != self.STATE_IDLE:
+            label = "校验中" if state == self.STATE_RUNNING else "校验已暂停"
+            return f"备份{label}：{result['checked_files']} 个文件，{problems} 个问题"
+        if problems:
+            return f"⚠️ 备份校验发现 {problems} 个问题（{result['finished'][:16].replace('T', ' ')}）"
+        return f"✅ 备份校验通过：{result['checked_files']} 个文件（{result['finished'][:16].replace('T', ' ')}）"
+
+    # === 调度 ===
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+
+    def notify_activity(self):
+        """应用有活动（注入、写日志）时调用；进行中的校验在下一个读取块前暂停"""
+        self.last_activity = time.monotonic()
+
+    def request_run(self):
+        """忽略间隔，在下次空闲时立即开始一轮校验"""
+        self.run_requested = True
+        self.wake_event.set()
+
+    def is_idle(self):
+        return time.monotonic() - self.last_activity >= self.idle_seconds
+
+    def is_due(self):
+        if self.pending is not None or self.run_requested:
+            return True
+        finished = (self.result or {}).get('finished')
+        if not finished:
+            return True
+        elapsed = (datetime.datetime.now() - datetime.datetime.fromisoformat(finished)).total_seconds()
+        return elapsed >= self.interval_seconds
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            if self.is_idle() and self.is_due():
+                try:
+                    self.run_pass()
+                except VerificationPaused:
+                    with self.lock:
+                        self.state = self.STATE_PAUSED
+                        self.version += 1
+                except Exception as e:
+                    print(f"⚠️ 备份校验出错：{e}")
+                    with self.lock:
+                        self.pending = None
+                        self.interrupted = None
+                        self.current = None
+                        self.state = self.STATE_IDLE
+                        self.version += 1
+            self.wake_event.wait(min(self.idle_seconds, 10) or 1)
+            self.wake_event.clear()
+
+    def _checkpoint(self):
+        """每个读取块之前检查是否需要让出"""
+        if self.stop_event.is_set() or not self.is_idle():
+            raise VerificationPaused()
+
+    # === 校验 ===
+    def run_pass(self, respect_idle=True):
+        """执行（或继续）一轮完整校验，返回结果；respect_idle 为 False 时不因活动暂停（命令行使用）"""
+        with self.lock:
+            if self.pending is None:
+                self.pending = self.tasks()
+                self.current = {
+                    'started': datetime.datetime.now().isoformat(),
+                    'finished': None,
+                    'checked_files': 0,
+                    'checked_bytes': 0,
+                    'categories': {},
+                    'problems': []
+                }
+            self.state = self.STATE_RUNNING
+            self.run_requested = False
+            self.version += 1
+
+        self.respect_idle = respect_idle
+        while True:
+            # 被打断的任务在恢复时重新执行
+            task = self.interrupted or next(self.pending, None)
+            self.interrupted = None
+            if task is None:
+                break
+            category, path, check = task
+            try:
+                if respect_idle:
+                    self._checkpoint()
+                problem = check()
+            except VerificationPaused:
+                self.interrupted = task
+                raise
+            except Exception as e:
+                problem = f"{type(e).__name__}: {e}"
+            self._record(category, path, problem)
+
+        with self.lock:
+            self.current['finished'] = datetime.datetime.now().isoformat()
+            self.result = self.current
+            self.pending = None
+            self.current = None
+            self.state = self.STATE_IDLE
+            self.version += 1
+        self.save_status(self.result)
+        if self.result['problems']:
+            print(f"⚠️ 备份校验发现 {len(self.result['problems'])} 个问题")
+        return self.result
+
+    def _record(self, category, path, problem):
+        with self.lock:
+            result = self.current
+            result['checked_files'] += 1
+            stats = result['categories'].setdefault(category, {'files': 0, 'problems': 0})
+            stats['files'] += 1
+            if problem:
+                stats['problems'] += 1
+                if len(result['problems']) < MAX_PROBLEMS:
+                    result['problems'].append({'category': category, 'path': path, 'error': problem})
+            self.version += 1
+
+    def _read(self, f, size=READ_SIZE):
+        """限速读取一个块"""
+        if self.respect_idle:
+            self._checkpoint()
+        data = f.read(size)
+        # 按实际读到的字节计费（块对象通常只有几KB）
+        if data and not self.limiter.consume(len(data), self.stop_event):
+            raise VerificationPaused()
+        with self.lock:
+            if self.current is not None:
+                self.current['checked_bytes'] += len(data)
+        return data
+
+    def _hash_file(self, path):
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as f:
+            while True:
+                data = self._read(f)
+                if not data:
+                    break
+                digest.update(data)
+                size += len(data)
+        return digest.hexdigest(), size
+
+    def tasks(self):
+        """生成本轮的校验任务 (类别, 路径, 检查函数)；检查函数返回问题描述或None"""
+        verified = {}  # 复制键 -> 本地 sha256，复核目录副本时使用
+        yield from self._chunk_store_tasks(verified)
+        yield from self._segment_tasks(verified)
+        yield from self._backup_file_tasks()
+        yield from self._target_tasks(verified)
+
+    def _chunk_store_tasks(self, verified):
+        store = ChunkStore(os.path.join(self.backup_dir, "chunk-store"))
+        if not os.path.isdir(store.snapshots_dir):
+            return
+        referenced = {}
+        for log_name in sorted(os.listdir(store.snapshots_dir)):
+            errors = []
+            manifests = store.list_snapshots(log_name, errors)
+            for file_name, error in errors:
+                yield "snapshot", f"{log_name}/{file_name}", lambda error=error: f"快照清单无法读取：{error}"
+            for manifest in manifests:
+                try:
+                    for chunk_digest, _ in store.resolve_chunks(log_name, manifest['id']):
+                        referenced.setdefault(chunk_digest, manifest['id'])
+                except Exception as e:
+                    yield "snapshot", f"{log_name}/{manifest['id']}", lambda error=e: f"清单链无法解析：{error}"
+
+        for chunk_digest in sorted(referenced):
+            path = store.object_path(chunk_digest)
+
+            def check(path=path, chunk_digest=chunk_digest):
+                if not os.path.exists(path):
+                    return f"块对象缺失（快照 {referenced[chunk_digest]} 引用）"
+                parts = []
+                with open(path, 'rb') as f:
+                    while True:
+                        data = self._read(f)
+                        if not data:
+                            break
+                        parts.append(data)
+                compressed = b''.join(parts)
+                if hashlib.sha256(zlib.decompress(compressed)).hexdigest() != chunk_digest:
+                    return "块对象内容与摘要不符"
+                verified[os.path.relpath(path, self.backup_dir).replace(os.sep, '/')] = hashlib.sha256(compressed).hexdigest()
+                return None
+            yield "chunk", path, check
+
+    def _segment_tasks(self, verified):
+        if not os.path.isdir(self.archive_dir):
+            return
+        for file_name in sorted(os.listdir(self.archive_dir)):
+            if not file_name.endswith(".manifest.json"):
+                continue
+            manifest_path = os.path.join(self.archive_dir, file_name)
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    segments = json.load(f).get('segments', [])
+            except Exception as e:
+                yield "segment", manifest_path, lambda error=e: f"归档清单无法读取：{type(error).__name__}: {error}"
+                continue
+            for segment in segments:
+                path = os.path.join(self.archive_dir, segment['file'])
+
+                def check(path=path, segment=segment):
+                    if not os.path.exists(path):
+                        return "归档段缺失"
+                    digest, size = self._hash_file(path)
+                    if digest != segment.get('sha256') or size != segment.get('stored_bytes', size):
+                        return "归档段 sha256 与清单不符"
+                    verified[f"log-archive/{segment['file']}"] = digest
+                    return None
+                yield "segment", path, check
+
+    def _backup_file_tasks(self):
+        if not os.path.isdir(self.backup_dir):
+            return
+        prefix = f"{self.project_name}-log-incremental-"
+        for entry in sorted(os.scandir(self.backup_dir), key=lambda entry: entry.name):
+            if not (strip_compression_suffix(entry.name).startswith(prefix) and entry.is_file()):
+                continue
+
+            def check(path=entry.path):
+                with open_compressed(path) as f:
+                    header = parse_backup_header(f)
+                    if header is None:
+                        return "缺少备份文件头"
+                    f.seek(header['body_offset'])
+                    length = 0
+                    while True:
+                        data = self._read(f)
+                        if not data:
+                            break
+                        length += len(data)
+                if header.get('unit') == '字节' and header.get('start') is not None and header.get('end') is not None:
+                    if length != header['end'] - header['start']:
+                        return f"正文 {length} 字节，与头部区间 {header['start']}-{header['end']} 不符"
+                return None
+            yield "backup", entry.path, check
+
+    def _target_tasks(self, verified):
+        for target in load_target_config(self.backup_dir, self.project_name) if os.path.isdir(self.backup_dir) else []:
+            if not target.get('enabled', True):
+                continue
+            name = target.get('name') or target['path']
+            if target.get('type', 'directory') == 'object_store':
+                yield from self._object_store_tasks(name, target['path'])
+            else:
+                yield from self._directory_target_tasks(name, target['path'], verified)
+
+    def _directory_target_tasks(self, name, target_path, verified):
+        if not os.path.isdir(target_path):
+            yield f"target:{name}", target_path, lambda: "复制目标不可访问"
+            return
+        for key, source_path in self._source_files():
+            copy_path = os.path.join(target_path, *key.split('/'))
+            if not os.path.exists(copy_path):
+                continue  # 尚未复制的文件由复制服务负责补齐
+
+            def check(key=key, source_path=source_path, copy_path=copy_path):
+                if key in verified:
+                    digest, _ = self._hash_file(copy_path)
+                    return None if digest == verified[key] else "副本内容与本地不一致"
+                if os.path.exists(source_path) and os.path.getsize(copy_path) < os.path.getsize(source_path):
+                    return "副本比本地文件短"
+                return None
+            yield f"target:{name}", copy_path, check
+
+    def _object_store_tasks(self, name, target_path):
+        index_path = os.path.join(target_path, "index.db")
+        if not os.path.exists(index_path):
+            return
+        conn = sqlite3.connect(index_path)
+        try:
+            rows = conn.execute("SELECT DISTINCT sha256 FROM objects ORDER BY sha256").fetchall()
+        finally:
+            conn.close()
+        for (digest,) in rows:
+            object_path = os.path.join(target_path, "objects", digest[:2], digest)
+
+            def check(object_path=object_path, digest=digest):
+                if not os.path.exists(object_path):
+                    return "对象缺失"
+                actual, _ = self._hash_file(object_path)
+                return None if actual == digest else "对象内容与 sha256 不符"
+            yield f"target:{name}", object_path, check
+
+    def _source_files(self):
+        for root_name, root in self.source_roots.items():
+            if not os.path.isdir(root):
+                continue
+            for dir_path, dir_names, file_names in os.walk(root):
+                dir_names.sort()
+                for file_name in sorted(file_names):
+                    if not is_replicated(file_name):
+                        continue  # 本地状态文件（含本模块的校验结果）不复制，也就不比对副本
+                    path = os.path.join(dir_path, file_name)
+                    relative = os.path.relpath(path, root).replace(os.sep, '/')
+                    yield (f"{root_name}/{relative}" if root_name else relative), path
+
+
+def main():
+    """命令行入口：立即执行一轮校验（不等待空闲）"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="备份后台校验")
+    parser.add_argument("project_dir", nargs="?", default=os.getcwd(), help="项目目录")
+    parser.add_argument("--project", default="", help="项目名称（默认为目录名）")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE / 1024 / 1024, help="读取限速（MB/秒）")
+    parser.add_argument("--json", action="store_true", help="以JSON输出")
+    args = parser.parse_args()
+
+    project_dir = os.path.abspath(args.project_dir)
+    verifier = BackupVerifier(project_dir, args.project or os.path.basename(project_dir),
+                              rate=args.rate * 1024 * 1024)
+    result = verifier.run_pass(respect_idle=False)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        for category, stats in sorted(result['categories'].items()):
+            print(f"  {category:<24} {stats['files']:>6} 个文件  {stats['problems']:>4} 个问题")
+        for problem in result['problems']:
+            print(f"  ❌ [{problem['category']}] {problem['path']}: {problem['error']}")
+        print(verifier.summary())
+    return 1 if result['problems'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+注入阶段基准 - 统计激活、点击、剪贴板、粘贴、提交各阶段耗时及其中的等待
+
+默认使用模拟驱动（虚拟时钟，不真正等待），按 --latency 给底层操作加上模拟耗时，
+按 --ready 模拟前台切换、点击获得焦点、剪贴板写入生效所需的时间；
+--mode both 先后运行固定等待与条件等待两种模式，并对比中位总耗时。
+在 Windows 上可用 --driver win32 --hwnd 句柄 --x --y 对真实窗口测量（会真的注入文本）。
+--delays 覆盖等待预算，用来比较不同预算下的总耗时，例如：
+    python benchmarks/bench_injection_stages.py --delays activate_settle=0.05,paste_hold=0.02
+
+用法: python benchmarks/bench_injection_stages.py [--rounds 200] [--driver fake|win32] [--mode both|fixed|condition]
+"""
+
+import os
+import sys
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from input_driver import (STAGES, MODES, DEFAULT_DELAYS, InjectionSequence, FakeInputDriver,
+                          create_input_driver)
+
+
+# 模拟的底层操作耗时（秒），量级取自 Windows 上的典型值
+DEFAULT_LATENCY = "activate=0.004,foreground_window=0.0001,client_to_screen=0.0001,move_cursor=0.0005," \
+                  "click=0.001,set_clipboard=0.006,get_clipboard=0.003,key_combo_down=0.0005," \
+                  "key_combo_up=0.0005,press_enter=0.0005,clipboard_sequence=0.00005," \
+                  "has_focus=0.0001,is_minimized=0.0001"
+TOOL_WINDOW = 1000
+DEFAULT_READY = "activate=0.012,focus=0.004,clipboard=0.001"
+
+
+def parse_pairs(text):
+    pairs = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        key, value = item.split('=', 1)
+        pairs[key.strip()] = float(value)
+    return pairs
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(args, mode, delays):
+    """按一种等待模式注入 rounds 次，打印阶段表，返回总耗时中位数"""
+    if args.driver == "win32":
+        driver = create_input_driver("win32")
+        hwnd = args.hwnd
+        position = (args.x, args.y)
+    else:
+        driver = FakeInputDriver(latency=parse_pairs(args.latency), ready_delays=parse_pairs(args.ready),
+                                 virtual_clock=not args.real_sleep)
+        hwnd = 1001
+        position = (120, 640)
+        driver.add_window(hwnd, "main.py - injection - Cursor", origin=(100, 50))
+        driver.add_window(TOOL_WINDOW, "提示词注入工具")
+
+    sequence = InjectionSequence(driver, delays, verbose=False, mode=mode)
+    samples = {stage: [] for stage in STAGES}
+    sleeps = {stage: [] for stage in STAGES}
+    totals = []
+    for index in range(args.rounds):
+        if args.driver != "win32":
+            # 每次注入都从注入工具窗口切换过去
+            driver.foreground = driver.focused = TOOL_WINDOW
+        result = sequence.run(hwnd, position, f"【项目：injection】\n基准第 {index} 次注入")
+        totals.append(result['total_ms'])
+        for stage in STAGES:
+            samples[stage].append(result['stages'][stage]['ms'])
+            sleeps[stage].append(result['stages'][stage]['sleep_ms'])
+
+    if args.driver != "win32":
+        assert len(driver.submitted[hwnd]) == args.rounds
+
+    print(f"驱动: {driver.name}，模式: {mode}，{args.rounds} 次注入，固定等待: "
+          f"{', '.join(f'{key}={value}' for key, value in sequence.delays.items() if value)}\n")
+    print(f"{'阶段':<10} | {'中位ms':>8} | {'p95 ms':>8} | {'其中等待ms':>10} | {'操作ms':>8}")
+    print("-" * 58)
+    for stage in STAGES:
+        median = statistics.median(samples[stage])
+        waited = statistics.median(sleeps[stage])
+        print(f"{stage:<10} | {median:>8.1f} | {percentile(samples[stage], 0.95):>8.1f} | "
+              f"{waited:>10.1f} | {median - waited:>8.1f}")
+    print("-" * 58)
+    print(f"{'合计':<10} | {statistics.median(totals):>8.1f} | {percentile(totals, 0.95):>8.1f}\n")
+    return statistics.median(totals)
+
+
+def run(args):
+    delays = parse_pairs(args.delays)
+    unknown = set(delays) - set(DEFAULT_DELAYS)
+    if unknown:
+        print(f"❌ 未知的等待项: {', '.join(sorted(unknown))}（可用: {', '.join(DEFAULT_DELAYS)}）")
+        return 1
+
+    modes = ("fixed", "condition") if args.mode == "both" else (args.mode,)
+    medians = {mode: measure(args, mode, delays) for mode in modes}
+    if len(medians) > 1:
+        print(f"中位总耗时: 固定等待 {medians['fixed']:.1f}ms -> 条件等待 {medians['condition']:.1f}ms "
+              f"（{medians['fixed'] / medians['condition']:.1f}x）")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="注入阶段耗时基准")
+    parser.add_argument("--rounds", type=int, default=200, help="注入次数")
+    parser.add_argument("--driver", choices=["fake", "win32"], default="fake", help="输入驱动")
+    parser.add_argument("--mode", choices=("both",) + MODES, default="both", help="等待模式")
+    parser.add_argument("--hwnd", type=int, default=0, help="win32 驱动的目标窗口句柄")
+    parser.add_argument("--x", type=int, default=0, help="win32 驱动的输入框客户区横坐标")
+    parser.add_argument("--y", type=int, default=0, help="win32 驱动的输入框客户区纵坐标")
+    parser.add_argument("--latency", type=str, default=DEFAULT_LATENCY, help="模拟驱动的操作耗时 名称=秒,...")
+    parser.add_argument("--ready", type=str, default=DEFAULT_READY,
+                        help="模拟驱动的状态生效时间 activate/focus/clipboard=秒,...")
+    parser.add_argument("--delays", type=str, default="", help="覆盖固定等待 名称=秒,...")
+    parser.add_argument("--real-sleep", action="store_true", help="模拟驱动真正等待（默认虚拟时钟）")
+    args = parser.parse_args()
+    if args.driver == "win32" and not args.hwnd:
+        parser.error("--driver win32 需要 --hwnd")
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量备份性能基准 - 对比旧版全文读取与字节偏移尾部读取
+
+模拟每次注入后的双重备份（backup-1 / backup-2）：
+- 旧版：每个备份目标都完整读取并解码日志，再按字符数切片
+- 新版：LogBackupEngine 按字节偏移 seek，两个目标共享一次尾部读取
+
+用法: python benchmarks/bench_log_backup.py [--sizes 1,4,16,64] [--rounds 20]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_backup_engine import LogBackupEngine
+
+
+def make_entry(index):
+    """生成一条与真实日志格式一致的交互记录"""
+    timestamp = (datetime.datetime(2025, 6, 1) + datetime.timedelta(minutes=index)).strftime("%Y-%m-%d %H:%M:%S")
+    return (f"\n# {timestamp} (Cursor - 项目：injection)\n\n## 📥 输入\n\n"
+            f"【项目：injection】\n请检查第 {index} 号任务的日志备份逻辑，并给出修改建议。\n\n"
+            f"## 📤 输出\n\n✅ 命令注入完成 - Cursor - {timestamp}\n")
+
+
+def build_log(path, size_mb):
+    """生成指定大小的日志文件"""
+    target = size_mb * 1024 * 1024
+    index = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        written = 0
+        while written < target:
+            entry = make_entry(index)
+            f.write(entry)
+            written += len(entry.encode('utf-8'))
+            index += 1
+    return index
+
+
+def legacy_backup(log_file, positions, backup_paths):
+    """旧版实现：每个备份目标各自全文读取并按字符切片"""
+    for backup_type, backup_path in backup_paths:
+        with open(log_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        last = positions.get(backup_type, 0)
+        if len(content) > last:
+            with open(backup_path, 'w', encoding='utf-8') as f:
+                f.write(content[last:])
+            positions[backup_type] = len(content)
+
+
+def run(sizes, rounds):
+    work_dir = tempfile.mkdtemp(prefix="bench_log_backup_")
+    try:
+        print(f"{'日志大小':>8} | {'旧版(ms/次)':>12} | {'新版(ms/次)':>12} | {'加速比':>8}")
+        print("-" * 52)
+        for size_mb in sizes:
+            log_file = os.path.join(work_dir, f"bench-{size_mb}-log.md")
+            backup_dir = os.path.join(work_dir, f"backups-{size_mb}")
+            os.makedirs(backup_dir, exist_ok=True)
+            next_index = build_log(log_file, size_mb)
+            destinations = [
+                ("backup-1", os.path.join(backup_dir, "bench-log-incremental-1.md")),
+                ("backup-2", os.path.join(backup_dir, "bench-log-incremental-2.md")),
+            ]
+
+            # 预热：两种实现都先完成一次全量备份
+            positions = {}
+            legacy_backup(log_file, positions, destinations)
+            engine = LogBackupEngine(log_file, backup_dir, "bench")
+            engine.backup(destinations)
+
+            legacy_total = 0.0
+            engine_total = 0.0
+            for _ in range(rounds):
+                with open(log_file, 'a', encoding='utf-8') as f:
+                    f.write(make_entry(next_index))
+                next_index += 1
+
+                start = time.perf_counter()
+                legacy_backup(log_file, positions, destinations)
+                legacy_total += time.perf_counter() - start
+
+                # 旧版已推进自己的位置，这里再追加一条保证新版也有新增内容
+                with open(log_file, 'a', encoding='utf-8') as f:
+                    f.write(make_entry(next_index))
+                next_index += 1
+
+                start = time.perf_counter()
+                engine.backup(destinations)
+                engine_total += time.perf_counter() - start
+
+            legacy_ms = legacy_total / rounds * 1000
+            engine_ms = engine_total / rounds * 1000
+            speedup = legacy_ms / engine_ms if engine_ms else float('inf')
+            print(f"{size_mb:>6}MB | {legacy_ms:>12.2f} | {engine_ms:>12.3f} | {speedup:>7.0f}x")
+            os.remove(log_file)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增量备份性能基准")
+    parser.add_argument("--sizes", type=str, default="1,4,16,64", help="日志大小列表（MB），逗号分隔")
+    parser.add_argument("--rounds", type=int, default=20, help="每个大小的追加+备份轮数")
+    args = parser.parse_args()
+    run([int(s) for s in args.sizes.split(',') if s], args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志压缩基准 - 对比不压缩、gzip、zstd 与训练字典 zstd 的压缩率和吞吐
+
+用日志前 80% 的条目训练字典，后 20% 模拟：
+- 增量备份：每次注入后写入 1~3 条新条目（带备份头部）的小文件
+- 归档段：后 20% 作为一个整体封存段
+
+用法: python benchmarks/bench_log_compression.py [--log 日志文件] [--entries 20000] [--rounds 3]
+"""
+
+import io
+import os
+import sys
+import gzip
+import time
+import random
+import argparse
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_parser import parse_entries
+from log_compression import ZSTD_AVAILABLE, zstandard, DEFAULT_DICT_SIZE, BACKUP_LEVEL, ARCHIVE_LEVEL
+
+
+TOPICS = ["日志备份", "增量渲染", "窗口注入", "剪贴板", "思维导图", "模板管理", "热重载", "全屏布局"]
+FILES = ["main.py", "log_index.py", "layout_manager.py", "template_manager.py", "window_manager.py"]
+TEMPLATES = ["", "请先阅读相关代码，再给出修改方案。\n", "完成后更新项目日志并总结改动。\n"]
+
+
+def make_entry(index, rng):
+    """生成一条与真实日志格式一致、内容有变化的交互记录"""
+    timestamp = (datetime.datetime(2025, 1, 1) + datetime.timedelta(minutes=index)).strftime("%Y-%m-%d %H:%M:%S")
+    topic = rng.choice(TOPICS)
+    file_name = rng.choice(FILES)
+    lines = rng.randint(5, 400)
+    return (f"\n# {timestamp} (Cursor - 项目：injection)\n\n## 📥 输入：\n\n"
+            f"【项目：injection】\n{rng.choice(TEMPLATES)}请处理第 {index} 号任务：{topic}在 {file_name} "
+            f"第 {lines} 行附近的逻辑需要调整，错误码 {rng.randint(1000, 9999)}。\n{rng.choice(TEMPLATES)}\n"
+            f"## 📤 输出：\n\n### ✅ {topic}修复完成\n\n- 修改文件：{file_name}（{lines} 行）\n"
+            f"- 耗时 {rng.random() * 10:.2f} 秒\n\n✅ 命令注入完成 - Cursor - {timestamp}\n")
+
+
+def backup_header(index, start, end):
+    return (f"# 增量日志备份\n## 备份信息\n- 备份时间: 2025-06-16 10:{index % 60:02d}:00\n"
+            f"- 备份类型: backup-1\n- 备份模式: INCREMENTAL_BACKUP\n- 起始位置: {start}\n"
+            f"- 结束位置: {end}\n- 位置单位: 字节\n- 项目名称: injection\n\n---\n\n").encode('utf-8')
+
+
+def load_entries(log_path, count):
+    if log_path:
+        with open(log_path, 'rb') as f:
+            data = f.read()
+        return [data[entry.start:entry.end] for entry in parse_entries(io.BytesIO(data))]
+    rng = random.Random(42)
+    return [make_entry(index, rng).encode('utf-8') for index in range(count)]
+
+
+def make_backups(entries):
+    """把条目切成每次 1~3 条的增量备份"""
+    rng = random.Random(7)
+    backups = []
+    position = 0
+    index = 0
+    while index < len(entries):
+        take = rng.randint(1, 3)
+        body = b''.join(entries[index:index + take])
+        backups.append(backup_header(index, position, position + len(body)) + body)
+        position += len(body)
+        index += take
+    return backups
+
+
+def measure(name, compress, decompress, payloads, rounds):
+    raw = sum(len(payload) for payload in payloads)
+    compress_time = decompress_time = float('inf')
+    stored = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        compressed = [compress(payload) for payload in payloads]
+        compress_time = min(compress_time, time.perf_counter() - start)
+        start = time.perf_counter()
+        for blob, payload in zip(compressed, payloads):
+            assert decompress(blob) == payload
+        decompress_time = min(decompress_time, time.perf_counter() - start)
+        stored = sum(len(blob) for blob in compressed)
+    megabytes = raw / 1024 / 1024
+    print(f"{name:<22} | {stored / raw:>7.1%} | {raw / stored:>6.2f}x | "
+          f"{megabytes / compress_time if compress_time else float('inf'):>10.1f} | "
+          f"{megabytes / decompress_time if decompress_time else float('inf'):>10.1f}")
+
+
+def run(log_path, count, rounds):
+    entries = load_entries(log_path, count)
+    split = int(len(entries) * 0.8)
+    training, testing = entries[:split], entries[split:]
+    backups = make_backups(testing)
+    archive = [b''.join(testing)]
+
+    codecs = [
+        ("不压缩", lambda data: data, lambda blob: blob),
+        ("gzip-6", lambda data: gzip.compress(data, compresslevel=6), gzip.decompress),
+    ]
+    if ZSTD_AVAILABLE:
+        start = time.perf_counter()
+        dictionary = zstandard.train_dictionary(DEFAULT_DICT_SIZE, training)
+        train_ms = (time.perf_counter() - start) * 1000
+        print(f"字典训练：{len(training)} 个样本，{len(dictionary.as_bytes())} 字节，{train_ms:.0f}ms\n")
+        for level in (BACKUP_LEVEL, ARCHIVE_LEVEL):
+            plain_c = zstandard.ZstdCompressor(level=level)
+            dict_c = zstandard.ZstdCompressor(level=level, dict_data=dictionary)
+            plain_d = zstandard.ZstdDecompressor()
+            dict_d = zstandard.ZstdDecompressor(dict_data=dictionary)
+            codecs.append((f"zstd-{level}", plain_c.compress, plain_d.decompress))
+            codecs.append((f"zstd-{level}+字典", dict_c.compress, dict_d.decompress))
+    else:
+        print("⚠️ 未安装 zstandard，只对比 gzip\n")
+
+    for title, payloads in ((f"增量备份（{len(backups)} 个，平均 "
+                             f"{sum(map(len, backups)) // len(backups)} 字节）", backups),
+                            (f"归档段（{len(archive[0]) / 1024 / 1024:.1f}MB）", archive)):
+        print(title)
+        print(f"{'方式':<22} | {'体积':>7} | {'压缩比':>7} | {'压缩MB/s':>10} | {'解压MB/s':>10}")
+        print("-" * 70)
+        for name, compress, decompress in codecs:
+            measure(name, compress, decompress, payloads, rounds)
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志压缩基准")
+    parser.add_argument("--log", type=str, default="", help="使用真实日志文件（默认生成模拟日志）")
+    parser.add_argument("--entries", type=int, default=20000, help="模拟日志条目数")
+    parser.add_argument("--rounds", type=int, default=3, help="每种方式重复次数（取最快一次）")
+    args = parser.parse_args()
+    run(args.log, args.entries, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志全文搜索性能基准 - 在大日志上测量建索引耗时和查询延迟
+
+生成指定条数的交互记录，建立条目索引和FTS全文索引后，
+对一组中英文关键词分别测量查询延迟（含高亮摘要）。
+
+用法: python benchmarks/bench_log_search.py [--entries 100000] [--rounds 5]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_index import LogIndex
+from log_search import LogSearchIndex
+
+TOPICS = ["日志备份", "增量渲染", "窗口注入", "剪贴板", "思维导图", "模板管理", "热重载", "全屏布局"]
+WORDS = ["backup", "offset", "journal", "render", "cursor", "clipboard", "mindmap", "template"]
+QUERIES = ["日志备份", "剪贴板 cursor", "增量", "journal", "思维导图 template", "不存在的关键词"]
+
+
+def make_entry(index, rng):
+    timestamp = (datetime.datetime(2025, 1, 1) + datetime.timedelta(minutes=index)).strftime("%Y-%m-%d %H:%M:%S")
+    topic = rng.choice(TOPICS)
+    word = rng.choice(WORDS)
+    return (f"\n# {timestamp} (Cursor - 项目：injection)\n\n## 📥 输入\n\n"
+            f"【项目：injection】\n请处理第 {index} 号任务：{topic}相关的 {word} 逻辑需要调整。\n\n"
+            f"## 📤 输出\n\n✅ 命令注入完成 - Cursor - {timestamp}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志全文搜索性能基准")
+    parser.add_argument("--entries", type=int, default=100000, help="日志条目数")
+    parser.add_argument("--rounds", type=int, default=5, help="每个查询的重复次数")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_log_search_")
+    try:
+        log_file = os.path.join(work_dir, "bench-log.md")
+        rng = random.Random(42)
+        with open(log_file, 'w', encoding='utf-8') as f:
+            for index in range(args.entries):
+                f.write(make_entry(index, rng))
+        print(f"日志: {args.entries} 条, {os.path.getsize(log_file) / 1024 / 1024:.1f}MB")
+
+        log_index = LogIndex(log_file)
+        search_index = LogSearchIndex(log_file, log_index)
+
+        start = time.perf_counter()
+        search_index.update()
+        print(f"首次建索引: {time.perf_counter() - start:.1f}s")
+
+        with open(log_file, 'a', encoding='utf-8') as f:
+            f.write(make_entry(args.entries, rng))
+        start = time.perf_counter()
+        search_index.update()
+        print(f"追加一条后增量更新: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        print(f"{'查询':<20} | {'结果数':>6} | {'延迟(ms)':>9}")
+        print("-" * 44)
+        for query in QUERIES:
+            best = float('inf')
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                results = search_index.search(query, limit=50)
+                best = min(best, time.perf_counter() - start)
+            print(f"{query:<20} | {len(results):>6} | {best * 1000:>9.1f}")
+
+        search_index.close()
+        log_index.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
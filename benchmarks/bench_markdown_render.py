@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Markdown渲染性能基准 - 对比旧版逐行转换器与单遍状态机渲染器
+
+- 旧版：main.py 中原 convert_markdown_to_html 的逐行实现（每行普通文本重新编译正则）
+- 新版：markdown_renderer.render_markdown（预编译、单遍）
+- 新版+缓存：MarkdownRenderer 第二次渲染同一日志（条目内容哈希命中缓存）
+
+用法: python benchmarks/bench_markdown_render.py [--size 10] [--rounds 3]
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from markdown_renderer import MarkdownRenderer, render_markdown
+
+
+def make_entry(index):
+    """生成一条带代码块、列表和引用的交互记录"""
+    timestamp = (datetime.datetime(2025, 6, 1) + datetime.timedelta(minutes=index)).strftime("%Y-%m-%d %H:%M:%S")
+    return (f"# {timestamp} (Cursor - 项目：injection)\n\n## 📥 输入\n\n"
+            f"【项目：injection】\n请检查第 {index} 号任务，**重点**关注 `log_backup_engine.py` 的*增量*逻辑。\n\n"
+            f"- 备份位置改为字节偏移\n- 多个目标共享一次读取\n\n"
+            f"> 注意：不要修改旧版元数据格式\n\n"
+            f"```python\nwith open(log_file, 'rb') as f:\n    f.seek(offset)\n    data = f.read()  # **not bold**\n```\n\n"
+            f"## 📤 输出\n\n✅ 命令注入完成 - Cursor - {timestamp}\n\n---\n\n")
+
+
+def build_log(size_mb):
+    target = size_mb * 1024 * 1024
+    parts = []
+    written = 0
+    index = 0
+    while written < target:
+        entry = make_entry(index)
+        parts.append(entry)
+        written += len(entry.encode('utf-8'))
+        index += 1
+    return ''.join(parts), index
+
+
+def legacy_convert(markdown_content):
+    """旧版 convert_markdown_to_html 的正文部分（原样保留用于对比）"""
+    html_lines = []
+    lines = markdown_content.split('\n')
+
+    for line in lines:
+        line = line.rstrip()
+
+        if line.startswith('# '):
+            html_lines.append(f'<h1 style="color: #333; border-bottom: 2px solid #e0e0e0; padding-bottom: 5px;">{line[2:]}</h1>')
+        elif line.startswith('## '):
+            html_lines.append(f'<h2 style="color: #444; margin-top: 20px;">{line[3:]}</h2>')
+        elif line.startswith('### '):
+            html_lines.append(f'<h3 style="color: #555;">{line[4:]}</h3>')
+        elif line.startswith('#### '):
+            html_lines.append(f'<h4 style="color: #666;">{line[5:]}</h4>')
+        elif line.startswith('- '):
+            html_lines.append(f'<li style="margin: 5px 0;">{line[2:]}</li>')
+        elif line.startswith('* '):
+            html_lines.append(f'<li style="margin: 5px 0;">{line[2:]}</li>')
+        elif line.startswith('```'):
+            if '```' in line[3:]:
+                code = line[3:].replace('```', '')
+                html_lines.append(f'<code style="background-color: #f5f5f5; padding: 2px 4px; border-radius: 3px;">{code}</code>')
+            else:
+                html_lines.append('<pre style="background-color: #f8f9fa; padding: 10px; border-radius: 5px; border-left: 3px solid #007acc;">')
+        elif line.startswith('> '):
+            html_lines.append(f'<blockquote style="border-left: 3px solid #ccc; margin: 10px 0; padding-left: 10px; color: #666;">{line[2:]}</blockquote>')
+        elif line.strip() == '---':
+            html_lines.append('<hr style="border: none; border-top: 1px solid #e0e0e0; margin: 20px 0;">')
+        elif not line.strip():
+            html_lines.append('<br>')
+        else:
+            processed_line = line
+            processed_line = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', processed_line)
+            processed_line = re.sub(r'\*(.*?)\*', r'<em>\1</em>', processed_line)
+            processed_line = re.sub(r'`(.*?)`', r'<code style="background-color: #f5f5f5; padding: 2px 4px; border-radius: 3px;">\1</code>', processed_line)
+            html_lines.append(f'<p style="margin: 8px 0; line-height: 1.6;">{processed_line}</p>')
+
+    return ''.join(html_lines)
+
+
+def timed(func, content, rounds):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(content)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Markdown渲染性能基准")
+    parser.add_argument("--size", type=int, default=10, help="日志大小（MB）")
+    parser.add_argument("--rounds", type=int, default=3, help="每种实现的重复次数（取最好成绩）")
+    args = parser.parse_args()
+
+    content, entry_count = build_log(args.size)
+    print(f"日志大小: {args.size}MB, 条目数: {entry_count}")
+
+    # 旧版的正则缓存会被 re 模块内部缓存吸收，这里测的是真实调用路径的开销
+    legacy_ms = timed(legacy_convert, content, args.rounds)
+    single_pass_ms = timed(render_markdown, content, args.rounds)
+
+    renderer = MarkdownRenderer(max_cached_entries=entry_count)
+    start = time.perf_counter()
+    renderer.render(content)
+    cold_ms = (time.perf_counter() - start) * 1000
+    warm_ms = timed(renderer.render, content, args.rounds)
+
+    print(f"{'实现':<16} | {'耗时(ms)':>10} | {'相对旧版':>8}")
+    print("-" * 42)
+    for name, ms in (("旧版逐行转换", legacy_ms), ("单遍状态机", single_pass_ms),
+                     ("条目缓存(冷)", cold_ms), ("条目缓存(热)", warm_ms)):
+        print(f"{name:<16} | {ms:>10.1f} | {legacy_ms / ms:>7.1f}x")
+    print(f"缓存统计: {renderer.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+窗口查找基准 - 比较每次枚举全部窗口与窗口登记表字典查询的耗时
+
+使用模拟窗口来源：--windows 个顶层窗口，其中 --cursor 个是 Cursor 窗口，
+每次枚举按 --enum-cost 给每个窗口加上模拟耗时（EnumWindows 回调、取标题的典型开销）。
+"枚举"按原 find_current_cursor_window / get_cursor_project_name 的做法每次查找都枚举一遍；
+"登记表"只在比对时枚举，查找是字典命中；另统计一次改名后增量比对查询进程名的次数。
+
+用法: python benchmarks/bench_window_lookup.py [--windows 300] [--cursor 5] [--lookups 2000]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from window_registry import WindowRegistry, FakeWindowSource, project_from_title
+
+
+class SlowFakeWindowSource(FakeWindowSource):
+    """枚举时每个窗口有固定耗时的模拟来源"""
+
+    def __init__(self, enum_cost):
+        super().__init__()
+        self.enum_cost = enum_cost
+        self.enumerations = 0
+
+    def snapshot(self):
+        self.enumerations += 1
+        deadline = time.perf_counter() + self.enum_cost * len(self.windows)
+        while time.perf_counter() < deadline:
+            pass
+        return super().snapshot()
+
+
+def enumerate_lookup(source):
+    """原做法：枚举全部窗口，取句柄最大的 Cursor 窗口及其项目名称"""
+    windows = sorted(((hwnd, title) for hwnd, title in source.snapshot().items() if "Cursor" in title), reverse=True)
+    if not windows:
+        return None, ""
+    return windows[0][0], project_from_title(windows[0][1])
+
+
+def registry_lookup(registry):
+    hwnd = registry.latest_cursor_window()
+    return hwnd, registry.get(hwnd)['project'] if hwnd else ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="窗口查找耗时基准")
+    parser.add_argument("--windows", type=int, default=300, help="顶层窗口数")
+    parser.add_argument("--cursor", type=int, default=5, help="其中 Cursor 窗口数")
+    parser.add_argument("--lookups", type=int, default=2000, help="查找次数")
+    parser.add_argument("--enum-cost", type=float, default=0.000005, help="枚举时每个窗口的模拟耗时（秒）")
+    args = parser.parse_args()
+
+    source = SlowFakeWindowSource(args.enum_cost)
+    for index in range(args.windows):
+        if index < args.cursor:
+            source.open_window(5000 + index, f"main.py - project{index} - Cursor")
+        else:
+            source.open_window(100 + index, f"窗口 {index}", process="explorer")
+
+    started = time.perf_counter()
+    for _ in range(args.lookups):
+        expected = enumerate_lookup(source)
+    enum_ms = (time.perf_counter() - started) * 1000
+
+    registry = WindowRegistry(source)
+    build_started = time.perf_counter()
+    registry.refresh()
+    build_ms = (time.perf_counter() - build_started) * 1000
+
+    started = time.perf_counter()
+    for _ in range(args.lookups):
+        result = registry_lookup(registry)
+    registry_ms = (time.perf_counter() - started) * 1000
+    assert result == expected, (result, expected)
+
+    # 增量比对：只有改名的窗口重新查询进程名
+    source.rename_window(5000, "other.py - project0 - Cursor")
+    lookups_before = source.process_lookups
+    added, changed, removed = registry.refresh()
+    process_lookups = source.process_lookups - lookups_before
+
+    print(f"{args.windows} 个窗口（{args.cursor} 个Cursor窗口），{args.lookups} 次查找")
+    print(f"每次枚举:   合计 {enum_ms:>9.1f}ms，每次 {enum_ms * 1000 / args.lookups:>8.1f}µs")
+    print(f"窗口登记表: 合计 {registry_ms:>9.1f}ms，每次 {registry_ms * 1000 / args.lookups:>8.1f}µs"
+          f"（建立索引 {build_ms:.1f}ms）")
+    print(f"加速: {enum_ms / max(registry_ms, 1e-6):.0f}x")
+    print(f"改名 1 个窗口后比对: 新增 {added}，变化 {changed}，移除 {removed}，查询进程名 {process_lookups} 次")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
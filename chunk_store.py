@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内容寻址分块备份库 - 日志历史快照去重存储
+
+原备份方案中 {project}-log-incremental-{1,2,startup,manual,before-recovery}.md 相互覆盖，
+只保留最近一次增量，历史无法回溯；每次检测到截断或改写还要重新复制整个文件。本模块：
+1. 用 gear 滚动哈希按内容切分日志（内容定义分块，插入/删除后切分点自动重新对齐）
+2. 每个不重复的块以 sha256 为地址只存一份（zlib 压缩）：backups/chunk-store/objects/
+3. 每次快照记录为清单，追加写入的日志只记录复用前缀块数和新增块；
+   进程内保留上次快照的块列表、最后一个块的起点和之前内容的哈希状态，
+   追加后只读取并重新切分最后一个块起的尾部（文件被替换、变短或尾部被改写时回到完整比对）
+4. 可以按快照或时间点恢复日志，并逐块、整体校验 sha256
+5. 统计相比现有方案节省的磁盘空间
+6. SnapshotWorker 在独立线程中执行快照，同一日志的排队请求合并为一次
+
+命令行：python chunk_store.py <日志文件> [snapshot|list|restore|report] [--at 时间] [--output 路径] [--json]
+
+作者: Assistant
+创建时间: 2025-06-16
+项目: injection
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import hashlib
+import datetime
+import threading
+
+
+# gear 表：由固定种子生成，一经使用不可修改（否则切分点变化，去重失效）
+GEAR = [int.from_bytes(hashlib.sha256(b'injection-gear-%d' % i).digest()[:8], 'big') for i in range(256)]
+HASH_MASK = (1 << 64) - 1
+
+MIN_CHUNK_SIZE = 2 * 1024
+AVG_CHUNK_SIZE = 8 * 1024
+MAX_CHUNK_SIZE = 64 * 1024
+
+# 归一化分块：达到平均大小之前用更严格的掩码，之后放宽，块大小集中在平均值附近
+MASK_SMALL = 0x0000d9f003530000   # 15 位
+MASK_LARGE = 0x0000d90003530000   # 11 位
+
+
+def find_cut(data, start, end):
+    """返回从 start 开始的第一个块的结束位置（纯 Python 逐字节计算，约 0.2 秒/MB）"""
+    if end - start <= MIN_CHUNK_SIZE:
+        return end
+    stop = min(start + MAX_CHUNK_SIZE, end)
+    normal = min(start + AVG_CHUNK_SIZE, stop)
+
+    h = 0
+    position = start + MIN_CHUNK_SIZE
+    for byte in data[position:normal]:
+        h = ((h << 1) + GEAR[byte]) & HASH_MASK
+        position += 1
+        if not h & MASK_SMALL:
+            return position
+    for byte in data[position:stop]:
+        h = ((h << 1) + GEAR[byte]) & HASH_MASK
+        position += 1
+        if not h & MASK_LARGE:
+            return position
+    return stop
+
+
+def iter_chunks(data, start=0):
+    """按内容切分 data[start:]，产出 (起始, 结束)"""
+    data = memoryview(data)
+    end = len(data)
+    while start < end:
+        cut = find_cut(data, start, end)
+        yield start, cut
+        start = cut
+
+
+class ChunkStore:
+    """内容寻址分块备份库"""
+
+    # 每隔若干个增量清单写一次完整清单，限制恢复时的清单链长度
+    FULL_MANIFEST_INTERVAL = 32
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.objects_dir = os.path.join(store_dir, "objects")
+        self.snapshots_dir = os.path.join(store_dir, "snapshots")
+        self.lock = threading.Lock()
+        self.latest = {}  # 日志文件名 -> (清单, 完整块列表)
+        self.cursors = {}  # 日志文件名 -> 增量快照游标（见 _set_cursor）
+
+    # === 块对象 ===
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def has_object(self, digest):
+        # 不做进程内缓存：保留策略可能在应用运行期间回收块对象
+        return os.path.exists(self.object_path(digest))
+
+    def put_object(self, digest, data):
+        """写入块对象，已存在时跳过；返回写入的磁盘字节数"""
+        if self.has_object(digest):
+            return 0
+        path = self.object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zlib.compress(data, 6)
+        temp_file = path + ".tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(compressed)
+        os.replace(temp_file, path)
+        return len(compressed)
+
+    def get_object(self, digest):
+        """读取块对象并校验内容地址"""
+        with open(self.object_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"块对象校验失败：{digest}")
+        return data
+
+    # === 清单 ===
+    def manifest_dir(self, log_name):
+        return os.path.join(self.snapshots_dir, log_name)
+
+    def manifest_path(self, log_name, snapshot_id):
+        return os.path.join(self.manifest_dir(log_name), f"{snapshot_id}.json")
+
+    def load_manifest(self, log_name, snapshot_id):
+        with open(self.manifest_path(log_name, snapshot_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_manifest(self, log_name, manifest):
+        os.makedirs(self.manifest_dir(log_name), exist_ok=True)
+        path = self.manifest_path(log_name, manifest['id'])
+        temp_file = path + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_file, path)
+
+    def list_snapshots(self, log_name, errors=None):
+        """按时间顺序列出快照清单（不含块列表）
+
+        无法读取的清单被跳过；传入 errors 列表时把 (文件名, 异常) 追加到其中而不是打印。
+        """
+        manifest_dir = self.manifest_dir(log_name)
+        if not os.path.isdir(manifest_dir):
+            return []
+        snapshots = []
+        for file_name in sorted(os.listdir(manifest_dir)):
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                manifest = self.load_manifest(log_name, file_name[:-5])
+                manifest.pop('chunks', None)
+                snapshots.append(manifest)
+            except Exception as e:
+                if errors is not None:
+                    errors.append((file_name, e))
+                else:
+                    print(f"⚠️ 读取快照清单失败 ({file_name})：{e}")
+        return snapshots
+
+    def resolve_chunks(self, log_name, snapshot_id):
+        """沿清单链还原快照的完整块列表 [[sha256, 长度], ...]"""
+        chain = []
+        while snapshot_id:
+            manifest = self.load_manifest(log_name, snapshot_id)
+            chain.append(manifest)
+            snapshot_id = manifest.get('parent')
+
+        chunks = []
+        for manifest in reversed(chain):
+            chunks = chunks[:manifest.get('keep', 0)] + manifest['chunks']
+        return chunks
+
+    def latest_snapshot(self, log_name):
+        """最新快照 (清单, 完整块列表)，没有快照时返回 (None, [])"""
+        if log_name not in self.latest:
+            snapshots = self.list_snapshots(log_name)
+            if snapshots:
+                manifest = snapshots[-1]
+                self.latest[log_name] = (manifest, self.resolve_chunks(log_name, manifest['id']))
+            else:
+                self.latest[log_name] = (None, [])
+        return self.latest[log_name]
+
+    def find_snapshot(self, log_name, at=None):
+        """不晚于时间点 at（datetime 或 ISO 字符串前缀）的最新快照清单"""
+        if isinstance(at, datetime.datetime):
+            at = at.isoformat()
+        found = None
+        for manifest in self.list_snapshots(log_name):
+            if at and manifest['created'][:len(at)] > at:
+                break
+            found = manifest
+        return found
+
+    # === 快照 ===
+    def snapshot(self, log_file, reason="manual"):
+        """为日志当前内容建立快照，返回清单；内容与最新快照相同时返回 None
+
+        日志只是追加时只读取最后一个块起的尾部；首次快照、文件被替换或变短、尾部被改写，
+        以及每 FULL_MANIFEST_INTERVAL 次快照写完整清单时，读取整个文件逐块比对。
+        """
+        log_name = os.path.basename(log_file)
+        with self.lock:
+            previous, previous_chunks = self.latest_snapshot(log_name)
+            with open(log_file, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                tail = self._read_tail(f, stat, log_name, previous)
+                if tail is not None:
+                    return self._tail_snapshot(log_file, stat, tail, reason, previous, previous_chunks)
+                f.seek(0)
+                data = f.read()
+            return self._full_snapshot(log_file, stat, data, reason, previous, previous_chunks)
+
+    def _read_tail(self, f, stat, log_name, previous):
+        """游标仍然有效时返回游标起点之后的内容，否则返回 None（调用方改做完整比对）"""
+        cursor = self.cursors.get(log_name)
+        if (cursor is None or previous is None or cursor['snapshot'] != previous['id']
+                or (stat.st_ino, stat.st_dev) != cursor['file'] or stat.st_size < cursor['size']
+                or previous.get('depth', 0) + 1 >= self.FULL_MANIFEST_INTERVAL):
+            return None
+        f.seek(cursor['tail_start'])
+        tail = f.read()
+        # 上次快照的最后一个块必须原样保留（尾部被原地改写时换成完整比对）
+        last_length = cursor['size'] - cursor['tail_start']
+        if last_length and hashlib.sha256(tail[:last_length]).hexdigest() != cursor['last_digest']:
+            return None
+        return tail
+
+    def _tail_snapshot(self, log_file, stat, tail, reason, previous, previous_chunks):
+        """追加写入：保留除最后一块外的全部块，从最后一块的起点重新切分"""
+        cursor = self.cursors[os.path.basename(log_file)]
+        if len(tail) == cursor['size'] - cursor['tail_start']:
+            return None
+        hasher = cursor['hasher'].copy()
+        hasher.update(tail)
+        keep = len(previous_chunks) - 1 if previous_chunks else 0
+        return self._write_snapshot(log_file, stat, tail, cursor['tail_start'], hasher.hexdigest(), reason,
+                                    previous, previous_chunks, keep, cursor['hasher'].copy())
+
+    def _full_snapshot(self, log_file, stat, data, reason, previous, previous_chunks):
+        digest = hashlib.sha256(data).hexdigest()
+        if previous and previous['size'] == len(data) and previous['sha256'] == digest:
+            self._set_cursor(os.path.basename(log_file), stat, previous, previous_chunks, data, 0, hashlib.sha256())
+            return None
+
+        # 追加写入时前缀块不变：逐块校验，保留到第一个不匹配的块为止
+        # 最后一个块是在文件末尾截断的，不是内容切分点，总是重新切分
+        keep = 0
+        offset = 0
+        view = memoryview(data)
+        for chunk_digest, length in previous_chunks[:-1]:
+            if offset + length > len(data) or hashlib.sha256(view[offset:offset + length]).hexdigest() != chunk_digest:
+                break
+            keep += 1
+            offset += length
+        return self._write_snapshot(log_file, stat, data, 0, digest, reason, previous, previous_chunks, keep,
+                                    hashlib.sha256())
+
+    def _write_snapshot(self, log_file, stat, data, base, digest, reason, previous, previous_chunks, keep, hasher):
+        """data 为日志从 base 开始的内容，保留前 keep 个块，其后重新切分；hasher 为 base 之前内容的哈希状态"""
+        log_name = os.path.basename(log_file)
+        offset = sum(length for _, length in previous_chunks[:keep]) - base
+        view = memoryview(data)
+        new_chunks = []
+        new_objects = []
+        stored_bytes = 0
+        for start, end in iter_chunks(data, offset):
+            chunk = view[start:end]
+            chunk_digest = hashlib.sha256(chunk).hexdigest()
+            written = self.put_object(chunk_digest, chunk)
+            if written:
+                new_objects.append(chunk_digest)
+                stored_bytes += written
+            new_chunks.append([chunk_digest, end - start])
+
+        created = datetime.datetime.now()
+        snapshot_id = created.strftime("%Y%m%d-%H%M%S-%f")
+        depth = previous.get('depth', 0) + 1 if previous else 0
+        if previous is None or keep == 0 or depth >= self.FULL_MANIFEST_INTERVAL:
+            parent, depth, manifest_chunks = None, 0, previous_chunks[:keep] + new_chunks
+            manifest_keep = 0
+        else:
+            parent, manifest_chunks, manifest_keep = previous['id'], new_chunks, keep
+
+        manifest = {
+            'id': snapshot_id,
+            'log_file': log_name,
+            'created': created.isoformat(),
+            'reason': reason,
+            'size': base + len(data),
+            'sha256': digest,
+            'parent': parent,
+            'depth': depth,
+            'keep': manifest_keep,
+            'chunks': manifest_chunks,
+            'new_chunks': len(new_chunks),
+            'stored_bytes': stored_bytes
+        }
+        self.save_manifest(log_name, manifest)
+
+        full_chunks = previous_chunks[:keep] + new_chunks
+        summary = {key: value for key, value in manifest.items() if key != 'chunks'}
+        self.latest[log_name] = (summary, full_chunks)
+        self._set_cursor(log_name, stat, summary, full_chunks, data, base, hasher)
+        # 本次新写入的块对象只随返回值提供（供复制服务使用），不写入清单
+        return dict(summary, new_objects=new_objects)
+
+    def _set_cursor(self, log_name, stat, summary, full_chunks, data, base, hasher):
+        """记录下次增量快照的起点：最后一个块的起点，以及此前内容的哈希状态
+
+        data 为日志从 base 开始的内容，hasher 为 base 之前内容的哈希状态（会被更新）。
+        """
+        size = base + len(data)
+        last_length = full_chunks[-1][1] if full_chunks else 0
+        tail_start = size - last_length
+        hasher.update(memoryview(data)[:tail_start - base])
+        self.cursors[log_name] = {
+            'snapshot': summary['id'],
+            'file': (stat.st_ino, stat.st_dev),
+            'size': size,
+            'tail_start': tail_start,
+            'last_digest': full_chunks[-1][0] if full_chunks else None,
+            'hasher': hasher
+        }
+
+    # === 恢复 ===
+    def restore(self, log_name, snapshot_id, target_path):
+        """把快照恢复到 target_path（先写临时文件，校验通过后替换）
+
+        target_path 是正在写入的日志时，需经 LogJournalWriter.run_exclusive 在句柄关闭期间调用。
+        """
+        with self.lock:
+            manifest = self.load_manifest(log_name, snapshot_id)
+            chunks = self.resolve_chunks(log_name, snapshot_id)
+
+        target_dir = os.path.dirname(os.path.abspath(target_path))
+        os.makedirs(target_dir, exist_ok=True)
+        temp_file = target_path + ".restore.tmp"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(temp_file, 'wb') as out:
+                for chunk_digest, length in chunks:
+                    data = self.get_object(chunk_digest)
+                    if len(data) != length:
+                        raise ValueError(f"块长度不符：{chunk_digest}")
+                    digest.update(data)
+                    out.write(data)
+                    size += length
+            if size != manifest['size'] or digest.hexdigest() != manifest['sha256']:
+                raise ValueError(f"快照 {snapshot_id} 恢复结果校验失败")
+            os.replace(temp_file, target_path)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+        print(f"♻️ 已从快照 {snapshot_id} 恢复 {os.path.basename(target_path)}（{size} 字节）")
+        return {'snapshot': snapshot_id, 'created': manifest['created'], 'size': size, 'path': target_path}
+
+    def restore_at(self, log_name, at, target_path):
+        """恢复不晚于时间点 at 的最新快照"""
+        manifest = self.find_snapshot(log_name, at)
+        if manifest is None:
+            return None
+        return self.restore(log_name, manifest['id'], target_path)
+
+    # === 统计 ===
+    def savings_report(self, log_name, legacy_dir=None):
+        """统计去重存储相对现有备份方案的磁盘占用
+
+        logical_bytes: 每个快照都完整复制一份（现有方案要保留同样历史所需的空间）
+        legacy_bytes: legacy_dir 中现有 {项目}-log-incremental-*.md 实际占用
+        """
+        snapshots = self.list_snapshots(log_name)
+        # 完整清单含全部块，增量清单复用的块已出现在祖先清单中
+        referenced = {}
+        for manifest in snapshots:
+            for chunk_digest, length in self.load_manifest(log_name, manifest['id'])['chunks']:
+                referenced[chunk_digest] = length
+
+        object_bytes = 0
+        for chunk_digest in referenced:
+            try:
+                object_bytes += os.path.getsize(self.object_path(chunk_digest))
+            except OSError:
+                pass
+        manifest_bytes = sum(os.path.getsize(self.manifest_path(log_name, manifest['id'])) for manifest in snapshots)
+
+        legacy_bytes = 0
+        legacy_files = 0
+        if legacy_dir and os.path.isdir(legacy_dir):
+            for entry in os.scandir(legacy_dir):
+                if entry.is_file() and "-log-incremental-" in entry.name and entry.name.endswith(".md"):
+                    legacy_bytes += entry.stat().st_size
+                    legacy_files += 1
+
+        logical_bytes = sum(manifest['size'] for manifest in snapshots)
+        stored_bytes = object_bytes + manifest_bytes
+        return {
+            'snapshots': len(snapshots),
+            'logical_bytes': logical_bytes,
+            'unique_chunks': len(referenced),
+            'unique_bytes': sum(referenced.values()),
+            'object_bytes': object_bytes,
+            'manifest_bytes': manifest_bytes,
+            'stored_bytes': stored_bytes,
+            'saved_bytes': logical_bytes - stored_bytes,
+            'dedup_ratio': logical_bytes / stored_bytes if stored_bytes else 0,
+            'legacy_files': legacy_files,
+            'legacy_bytes': legacy_bytes
+        }
+
+
+class SnapshotWorker:
+    """后台快照线程：快照不在写入线程和UI线程执行
+
+    同一日志排队中的请求合并为一次（原因取并集），快照读取的是执行时的最新内容。
+    首次或完整比对时纯 Python 的 gear 哈希约 0.2 秒/MB（5MB 日志约 1 秒），
+    只有追加时重新切分最后一个块起的尾部，通常只需几毫秒。
+    """
+
+    def __init__(self, store, on_snapshot=None):
+        self.store = store
+        self.on_snapshot = on_snapshot  # on_snapshot(log_file, manifest)，在快照线程执行
+        self.pending = {}  # 日志路径 -> 合并后的原因集合
+        self.busy = False
+        self.stopping = False
+        self.condition = threading.Condition()
+        self.run_lock = threading.Lock()  # 快照进行中持有，见 hold()
+        self.thread = None
+
+    def request(self, log_file, reason):
+        """排入一次快照请求，立即返回"""
+        with self.condition:
+            self.pending.setdefault(log_file, set()).update(reason.split(","))
+            if self.thread is None or not self.thread.is_alive():
+                self.stopping = False
+                self.thread = threading.Thread(target=self._run, name="ChunkSnapshotWorker", daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def hold(self):
+        """with worker.hold(): 期间不开始新的快照（替换日志文件前使用，快照线程不会打开着日志）"""
+        return self.run_lock
+
+    def flush(self, timeout=30.0):
+        """等待排队中的快照全部完成"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.pending or self.busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def stop(self, timeout=5.0):
+        """停止快照线程，排队中的请求丢弃（下次备份时的快照包含这些内容）"""
+        with self.condition:
+            self.stopping = True
+            self.pending.clear()
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopping:
+                    self.condition.wait()
+                if self.stopping:
+                    return
+            # 先等 hold() 结束再取请求，期间到达的请求也合并进这一次
+            with self.run_lock:
+                with self.condition:
+                    if self.stopping:
+                        return
+                    log_file, reasons = self.pending.popitem()
+                    self.busy = True
+                try:
+                    manifest = self.store.snapshot(log_file, ",".join(sorted(reasons)))
+                except Exception as e:
+                    print(f"⚠️ 后台日志快照失败 ({os.path.basename(log_file)})：{e}")
+                    manifest = None
+            try:
+                if manifest and self.on_snapshot:
+                    self.on_snapshot(log_file, manifest)
+            except Exception as e:
+                print(f"⚠️ 后台日志快照后处理失败：{e}")
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+
+
+def main():
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="内容寻址分块备份库")
+    parser.add_argument("log_file", help="日志文件路径")
+    parser.add_argument("action", nargs="?", default="list", choices=["snapshot", "list", "restore", "report"])
+    parser.add_argument("--store", default="", help="备份库目录（默认为日志目录下 backups/chunk-store）")
+    parser.add_argument("--at", default="", help="恢复不晚于该时间的快照（ISO 格式，可只给前缀）")
+    parser.add_argument("--snapshot", default="", help="恢复指定快照")
+    parser.add_argument("--output", default="", help="恢复目标路径（默认 <日志>.restored.md）")
+    parser.add_argument("--json", action="store_true", help="以JSON输出")
+    args = parser.parse_args()
+
+    log_dir = os.path.dirname(os.path.abspath(args.log_file))
+    backup_dir = os.path.join(log_dir, "backups")
+    store = ChunkStore(args.store or os.path.join(backup_dir, "chunk-store"))
+    log_name = os.path.basename(args.log_file)
+
+    if args.action == "snapshot":
+        result = store.snapshot(args.log_file)
+    elif args.action == "list":
+        result = store.list_snapshots(log_name)
+    elif args.action == "restore":
+        output = args.output or os.path.splitext(args.log_file)[0] + ".restored.md"
+        if args.snapshot:
+            result = store.restore(log_name, args.snapshot, output)
+        else:
+            result = store.restore_at(log_name, args.at or None, output)
+    else:
+        result = store.savings_report(log_name, backup_dir)
+
+    if args.json or args.action != "list":
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        for manifest in result:
+            print(f"{manifest['id']}  {manifest['size']:>10} 字节  +{manifest['new_chunks']} 块  [{manifest['reason']}]")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+笔记图片库 - 按内容哈希存储笔记图片，去重、后台无损重压缩、按需生成缩略图
+
+原 take_note 把剪贴板图片以 images/{时间戳}.png 全尺寸保存，同一张截图粘贴两次就存两份，
+而且保存的是"当前剪贴板里的图片"，不一定是编辑框里那张。
+本模块：
+1. 图片以 PNG 编码后的 sha256 命名：images/<sha256>.png，相同图片只存一份
+2. 后台线程对 PNG 做无损重压缩：合并 IDAT 后以 zlib 最高级别重新压缩，
+   像素数据校验一致且体积更小才替换（文件名仍是原始编码的哈希，重复粘贴照样命中）
+3. 缩略图按需生成并缓存到 images/thumbs/<sha256>-w<宽度>.png，
+   不大于目标宽度的图片直接使用原图
+4. 索引 images/index.json 记录尺寸、原始/存储体积和重压缩状态
+
+缩放依赖 PyQt5（未安装时缩略图退回原图），去重与重压缩只用标准库。
+
+作者: Assistant
+创建时间: 2025-06-16
+项目: injection
+"""
+
+import os
+import re
+import sys
+import json
+import zlib
+import queue
+import struct
+import hashlib
+import argparse
+import datetime
+import threading
+
+try:
+    from PyQt5.QtCore import Qt, QBuffer, QByteArray, QIODevice
+    from PyQt5.QtGui import QImage
+    QT_AVAILABLE = True
+except ImportError:
+    QT_AVAILABLE = False
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+INDEX_FILE_NAME = "index.json"
+THUMB_DIR_NAME = "thumbs"
+RECOMPRESS_LEVEL = 9
+
+# 编辑框与阅读器中显示图片的宽度
+EDITOR_IMAGE_WIDTH = 600
+READER_IMAGE_WIDTH = 480
+
+IMAGE_NAME_RE = re.compile(r'^([0-9a-f]{64})\.png$')
+THUMB_NAME_RE = re.compile(r'^([0-9a-f]{64})-w(\d+)\.png$')
+
+
+def png_dimensions(data):
+    """从 IHDR 读取 PNG 宽高，不是 PNG 时返回 None"""
+    if len(data) < 24 or not data.startswith(PNG_SIGNATURE) or data[12:16] != b'IHDR':
+        return None
+    return struct.unpack('>II', data[16:24])
+
+
+def iter_png_chunks(data):
+    """依次产生 (类型, 数据)，到 IEND 或数据结束为止"""
+    position = len(PNG_SIGNATURE)
+    while position + 8 <= len(data):
+        length, chunk_type = struct.unpack('>I4s', data[position:position + 8])
+        body = data[position + 8:position + 8 + length]
+        if len(body) != length:
+            raise ValueError("PNG 数据块不完整")
+        yield chunk_type, body
+        position += 12 + length
+        if chunk_type == b'IEND':
+            break
+
+
+def png_chunk(chunk_type, body):
+    return struct.pack('>I', len(body)) + chunk_type + body + struct.pack('>I', zlib.crc32(chunk_type + body))
+
+
+def recompress_png(data, level=RECOMPRESS_LEVEL):
+    """无损重压缩 PNG：合并所有 IDAT 并以更高级别重新 deflate
+
+    扫描线的过滤方式和像素数据完全不变，只换压缩参数。结果不小于原文件时返回 None。
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        return None
+
+    parts = [PNG_SIGNATURE]
+    idat = []
+    idat_index = None
+    for chunk_type, body in iter_png_chunks(data):
+        if chunk_type == b'IDAT':
+            if idat_index is None:
+                idat_index = len(parts)
+                parts.append(None)
+            idat.append(body)
+        else:
+            parts.append(png_chunk(chunk_type, body))
+    if idat_index is None:
+        return None
+
+    raw = zlib.decompress(b''.join(idat))
+    packed = zlib.compress(raw, level)
+    if zlib.decompress(packed) != raw:
+        return None
+    parts[idat_index] = png_chunk(b'IDAT', packed)
+    result = b''.join(parts)
+    return result if len(result) < len(data) else None
+
+
+class ImageStore:
+    """内容寻址的笔记图片库（一个项目日志目录下的 images/）"""
+
+    def __init__(self, image_dir, recompress=True):
+        self.image_dir = os.path.abspath(image_dir)
+        self.thumb_dir = os.path.join(self.image_dir, THUMB_DIR_NAME)
+        self.index_path = os.path.join(self.image_dir, INDEX_FILE_NAME)
+        self.recompress = recompress
+        self.lock = threading.Lock()
+        self.index = self.load_index()
+        self.pending = queue.Queue()
+        self.worker = None
+
+    # === 索引 ===
+
+    def load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"⚠️ 图片索引读取失败，将重新记录: {e}")
+            return {}
+
+    def save_index(self):
+        """调用方持有 self.lock"""
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.index_path)
+
+    # === 路径 ===
+
+    def path_for(self, digest):
+        return os.path.join(self.image_dir, f"{digest}.png")
+
+    def thumb_path_for(self, digest, width):
+        return os.path.join(self.thumb_dir, f"{digest}-w{width}.png")
+
+    @staticmethod
+    def source_of(path):
+        """哈希图片或其缩略图对应的原图路径与哈希，其它文件返回 (path, None)"""
+        name = os.path.basename(path)
+        match = IMAGE_NAME_RE.match(name)
+        if match:
+            return path, match.group(1)
+        match = THUMB_NAME_RE.match(name)
+        if match and os.path.basename(os.path.dirname(path)) == THUMB_DIR_NAME:
+            image_dir = os.path.dirname(os.path.dirname(path))
+            return os.path.join(image_dir, f"{match.group(1)}.png"), match.group(1)
+        return path, None
+
+    def markdown_link(self, digest, base_dir, alt="图片"):
+        rel_path = os.path.relpath(self.path_for(digest), base_dir).replace("\\", "/")
+        return f"![{alt}]({rel_path})"
+
+    # === 写入 ===
+
+    def put_bytes(self, data):
+        """存入一张已编码的图片，返回内容哈希（已存在时不重复写入）"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        with self.lock:
+            if digest in self.index and os.path.exists(path):
+                return digest
+
+            os.makedirs(self.image_dir, exist_ok=True)
+            if not os.path.exists(path):
+                temp_path = path + ".tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+
+            dimensions = png_dimensions(data)
+            self.index[digest] = {
+                'width': dimensions[0] if dimensions else None,
+                'height': dimensions[1] if dimensions else None,
+                'original_size': len(data),
+                'stored_size': os.path.getsize(path),
+                'recompressed': False,
+                'created': datetime.datetime.now().isoformat(timespec='seconds')
+            }
+            self.save_index()
+
+        if self.recompress and dimensions:
+            self.schedule_recompress(digest)
+        return digest
+
+    def put_qimage(self, image):
+        """把 QImage 编码为 PNG 后存入"""
+        if not QT_AVAILABLE:
+            raise RuntimeError("PyQt5 不可用，无法编码图片")
+        buffer_data = QByteArray()
+        buffer = QBuffer(buffer_data)
+        buffer.open(QIODevice.WriteOnly)
+        image.save(buffer, "PNG")
+        buffer.close()
+        return self.put_bytes(bytes(buffer_data))
+
+    def import_file(self, path):
+        """导入图片文件（本库中的哈希图片或缩略图直接返回其哈希）"""
+        source, digest = self.source_of(os.path.abspath(path))
+        if digest and os.path.dirname(source) == self.image_dir and os.path.exists(source):
+            return digest
+        with open(source, 'rb') as f:
+            return self.put_bytes(f.read())
+
+    # === 后台重压缩 ===
+
+    def schedule_recompress(self, digest):
+        self.pending.put(digest)
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._recompress_loop, daemon=True)
+                self.worker.start()
+
+    def _recompress_loop(self):
+        while True:
+            try:
+                digest = self.pending.get(timeout=5)
+            except queue.Empty:
+                with self.lock:
+                    if self.pending.empty():
+                        self.worker = None
+                        return
+                continue
+            try:
+                self.recompress_image(digest)
+            except Exception as e:
+                print(f"⚠️ 图片重压缩失败 {digest[:12]}: {e}")
+            finally:
+                self.pending.task_done()
+
+    def recompress_image(self, digest):
+        """重压缩一张图片，体积变小时原子替换，返回节省的字节数"""
+        path = self.path_for(digest)
+        with open(path, 'rb') as f:
+            data = f.read()
+        packed = recompress_png(data)
+
+        with self.lock:
+            record = self.index.get(digest)
+            if packed is not None:
+                temp_path = path + ".tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(packed)
+                os.replace(temp_path, path)
+            if record is not None:
+                record['stored_size'] = len(packed) if packed is not None else len(data)
+                record['recompressed'] = True
+                self.save_index()
+
+        return len(data) - len(packed) if packed is not None else 0
+
+    def wait_idle(self):
+        """等待已排队的重压缩完成"""
+        self.pending.join()
+
+    # === 缩略图 ===
+
+    def thumbnail(self, path, width):
+        """返回宽度不超过 width 的图片路径，缩略图首次请求时生成并缓存"""
+        source, digest = self.source_of(os.path.abspath(path))
+        if digest is None:
+            try:
+                with open(source, 'rb') as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+            except OSError:
+                return path
+
+        thumb_path = self.thumb_path_for(digest, width)
+        if os.path.exists(thumb_path):
+            return thumb_path
+
+        record = self.index.get(digest) if os.path.dirname(source) == self.image_dir else None
+        image_width = record.get('width') if record else None
+        if image_width is not None and image_width <= width:
+            return source
+        if not QT_AVAILABLE:
+            return source
+
+        try:
+            image = QImage(source)
+            if image.isNull():
+                return source
+            if image.width() <= width:
+                return source
+            os.makedirs(self.thumb_dir, exist_ok=True)
+            temp_path = thumb_path + ".tmp.png"
+            if not image.scaledToWidth(width, Qt.SmoothTransformation).save(temp_path, "PNG"):
+                return source
+            os.replace(temp_path, thumb_path)
+            return thumb_path
+        except Exception as e:
+            print(f"⚠️ 生成缩略图失败 {os.path.basename(source)}: {e}")
+            return source
+
+    # === 统计 ===
+
+    def stats(self):
+        with self.lock:
+            records = list(self.index.values())
+        thumbs = 0
+        if os.path.isdir(self.thumb_dir):
+            thumbs = sum(1 for entry in os.scandir(self.thumb_dir) if entry.name.endswith('.png'))
+        return {
+            'images': len(records),
+            'original_bytes': sum(record.get('original_size') or 0 for record in records),
+            'stored_bytes': sum(record.get('stored_size') or 0 for record in records),
+            'pending_recompress': sum(1 for record in records if not record.get('recompressed')),
+            'thumbnails': thumbs
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="笔记图片库")
+    parser.add_argument("action", choices=["stats", "add", "recompress"],
+                        help="stats=统计, add=导入图片, recompress=重压缩尚未处理的图片")
+    parser.add_argument("image_dir", help="图片目录（项目日志目录下的 images/）")
+    parser.add_argument("files", nargs="*", help="add 时要导入的图片文件")
+    args = parser.parse_args()
+
+    store = ImageStore(args.image_dir, recompress=False)
+
+    if args.action == "add":
+        for path in args.files:
+            digest = store.import_file(path)
+            print(f"✅ {path} -> {digest}.png")
+        return 0
+
+    if args.action == "recompress":
+        saved = 0
+        for digest, record in list(store.index.items()):
+            if not record.get('recompressed') and os.path.exists(store.path_for(digest)):
+                saved += store.recompress_image(digest)
+        print(f"✅ 重压缩完成，节省 {saved / 1024:.1f}KB")
+
+    info = store.stats()
+    print(f"📊 图片 {info['images']} 张，原始 {info['original_bytes'] / 1024:.1f}KB，"
+          f"存储 {info['stored_bytes'] / 1024:.1f}KB，缩略图 {info['thumbnails']} 张，"
+          f"待重压缩 {info['pending_recompress']} 张")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+注入队列 - 多条命令按顺序在后台逐条注入，带节奏控制、确认和背压
+
+原先一次点击注入一条命令，整个注入过程阻塞UI；一组提示词只能逐条粘贴、逐条注入。本模块：
+1. 有界队列接收多条命令（一次加入的整批放不下时整批拒绝，调用方提示稍后再试）
+2. 单个后台线程依次执行：准备注入文本 → InjectionSequence 注入 → 确认 → 间隔 pacing 秒 → 下一条，
+   任何时刻最多只有一条在注入，不会互相穿插
+3. 确认与 check_injection_result 的思路一致：注入后检查结果是否符合预期——
+   目标窗口仍在前台（回车发给了目标），剪贴板序列号未被其他程序改动（粘贴的确实是本条内容）
+4. 某条失败时默认暂停队列，剩余条目保持等待，由用户决定继续或取消
+5. 每个条目的状态变化、整体进度和整批完成都通过Qt信号通知UI线程（写日志也在UI线程完成）
+
+作者: Assistant
+创建时间: 2025-06-16
+项目: injection
+"""
+
+import time
+import queue
+import datetime
+import threading
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from input_driver import InjectionSequence, InjectionError, wait_until, format_timings
+
+
+DEFAULT_PACING = 3.0          # 两条命令之间的间隔（秒）
+DEFAULT_MAX_PENDING = 100     # 队列中最多等待的条目数
+CONFIRM_TIMEOUT = 1.0         # 注入后等待确认条件成立的最长时间（秒）
+
+STATUS_ICONS = {
+    'pending': "⏳",
+    'running': "▶️",
+    'done': "✅",
+    'failed': "❌",
+    'cancelled': "⏹️",
+}
+
+
+class InjectionQueue(QObject):
+    """顺序注入队列
+
+    prepare(command, options) -> (注入文本, 项目名称)，在后台线程调用
+    target() -> (窗口句柄, 输入框客户区坐标)，每条注入前读取，校准变化后立即生效
+    relocate() -> 新窗口句柄或 None，激活失败时重新查找目标窗口
+    """
+
+    # 信号定义
+    item_changed = pyqtSignal(dict)         # 条目快照（状态变化时）
+    progress_changed = pyqtSignal(int, int) # 本批已结束条目数, 本批总数
+    batch_finished = pyqtSignal(dict)       # 本批统计 {'done', 'failed', 'cancelled', 'elapsed_ms'}
+    target_changed = pyqtSignal(int)        # 激活时重新查找到的目标窗口句柄
+
+    def __init__(self, driver, prepare, target, relocate=None, pacing=DEFAULT_PACING,
+                 max_pending=DEFAULT_MAX_PENDING, stop_on_failure=True, confirm_timeout=CONFIRM_TIMEOUT,
+                 parent=None):
+        super().__init__(parent)
+        self.driver = driver
+        self.prepare = prepare
+        self.target = target
+        self.relocate = relocate
+        self.pacing = pacing
+        self.max_pending = max_pending
+        self.stop_on_failure = stop_on_failure
+        self.confirm_timeout = confirm_timeout
+
+        self.queue = queue.Queue()
+        self.items = {}              # 条目ID -> 条目
+        self.batch = []              # 本批条目ID（队列清空后开始新的一批）
+        self.batch_started = None
+        self.lock = threading.Lock()
+        self.sequence = 0
+        self.current = None
+
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    # === 服务控制 ===
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="InjectionQueue", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2.0):
+        """停止后台线程（正在注入的条目会先完成）"""
+        self.stop_event.set()
+        self.resume_event.set()
+        self.queue.put(None)
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def pause(self):
+        """当前条目完成后暂停"""
+        self.resume_event.clear()
+
+    def resume(self):
+        self.resume_event.set()
+
+    def is_paused(self):
+        return not self.resume_event.is_set()
+
+    def is_busy(self):
+        """是否还有条目在注入或等待注入"""
+        with self.lock:
+            return self.current is not None or self.pending_count() > 0
+
+    def pending_count(self):
+        """调用方持有 self.lock"""
+        return sum(1 for item_id in self.batch if self.items[item_id]['status'] == 'pending')
+
+    # === 入队与取消 ===
+
+    def enqueue(self, commands, options=None):
+        """加入一批命令，返回条目ID列表；队列放不下整批时返回 None"""
+        commands = [command for command in commands if command.strip()]
+        if not commands:
+            return []
+
+        created = []
+        with self.lock:
+            if self.pending_count() + len(commands) > self.max_pending:
+                return None
+            if not any(self.items[item_id]['status'] in ('pending', 'running') for item_id in self.batch):
+                self.batch = []
+                self.batch_started = time.monotonic()
+            for command in commands:
+                self.sequence += 1
+                item = {
+                    'id': self.sequence,
+                    'command': command,
+                    'options': dict(options or {}),
+                    'status': 'pending',
+                    'error': "",
+                    'project_name': "",
+                    'hwnd': None,
+                    'total_ms': None,
+                    'queued_at': datetime.datetime.now().isoformat(timespec='seconds'),
+                    'finished_at': None
+                }
+                self.items[item['id']] = item
+                self.batch.append(item['id'])
+                created.append(dict(item))
+
+        for item in created:
+            self.queue.put(item['id'])
+            self.item_changed.emit(item)
+        self._emit_progress()
+        self.start()
+        return [item['id'] for item in created]
+
+    def cancel_pending(self):
+        """取消所有尚未开始的条目，返回取消的数量"""
+        cancelled = []
+        with self.lock:
+            for item_id in self.batch:
+                item = self.items[item_id]
+                if item['status'] == 'pending':
+                    item['status'] = 'cancelled'
+                    item['finished_at'] = datetime.datetime.now().isoformat(timespec='seconds')
+                    cancelled.append(dict(item))
+        for item in cancelled:
+            self.item_changed.emit(item)
+        if cancelled:
+            self._emit_progress()
+            self._finish_batch_if_idle()
+        # 暂停中取消后恢复运行，让后台线程丢弃已取消的条目
+        self.resume_event.set()
+        return len(cancelled)
+
+    def batch_items(self):
+        with self.lock:
+            return [dict(self.items[item_id]) for item_id in self.batch]
+
+    # === 后台执行 ===
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            item_id = self.queue.get()
+            if item_id is None:
+                break
+            self.resume_event.wait()
+            if self.stop_event.is_set():
+                break
+
+            with self.lock:
+                item = self.items.get(item_id)
+                if item is None or item['status'] != 'pending':
+                    continue
+                item['status'] = 'running'
+                self.current = item_id
+                snapshot = dict(item)
+            self.item_changed.emit(snapshot)
+
+            succeeded = self._inject(item)
+
+            with self.lock:
+                self.current = None
+                item['finished_at'] = datetime.datetime.now().isoformat(timespec='seconds')
+                snapshot = dict(item)
+            self.item_changed.emit(snapshot)
+            self._emit_progress()
+
+            if not succeeded and self.stop_on_failure:
+                self.resume_event.clear()
+                print(f"⏸️ 注入队列第 {item['id']} 条失败，队列已暂停: {item['error']}")
+            if self._finish_batch_if_idle():
+                continue
+            # 节奏控制：给目标应用处理上一条的时间
+            self.stop_event.wait(self.pacing)
+
+    def _inject(self, item):
+        """执行一条注入并确认，结果写回条目"""
+        try:
+            text, project_name = self.prepare(item['command'], item['options'])
+            item['project_name'] = project_name
+            target_window, target_position = self.target()
+            if not target_window or not target_position:
+                raise InjectionError("activate", "未校准目标窗口")
+
+            sequence = InjectionSequence(self.driver, verbose=False)
+            result = sequence.run(target_window, target_position, text, relocate=self.relocate)
+            item['hwnd'] = result['hwnd']
+            item['total_ms'] = result['total_ms']
+            if result['hwnd'] != target_window:
+                self.target_changed.emit(result['hwnd'])
+
+            if not self.confirm(result):
+                raise InjectionError("confirm", "注入后未确认：目标窗口已不在前台或剪贴板被改动")
+
+            item['status'] = 'done'
+            print(f"✅ 队列注入 #{item['id']}: {format_timings(result)}")
+            return True
+
+        except Exception as e:
+            item['status'] = 'failed'
+            item['error'] = str(e)
+            return False
+
+    def confirm(self, result):
+        """确认注入生效：目标窗口仍在前台，剪贴板仍是本条内容"""
+        hwnd = result['hwnd']
+        sequence = result.get('clipboard_sequence')
+        return wait_until(
+            lambda: self.driver.foreground_window() == hwnd and
+            (sequence is None or self.driver.clipboard_sequence() == sequence),
+            self.confirm_timeout, self.driver)
+
+    def _emit_progress(self):
+        with self.lock:
+            total = len(self.batch)
+            finished = sum(1 for item_id in self.batch
+                           if self.items[item_id]['status'] in ('done', 'failed', 'cancelled'))
+        self.progress_changed.emit(finished, total)
+
+    def _finish_batch_if_idle(self):
+        """本批全部结束时发出统计，返回是否已结束"""
+        with self.lock:
+            if self.current is not None or not self.batch:
+                return False
+            statuses = [self.items[item_id]['status'] for item_id in self.batch]
+            if 'pending' in statuses or 'running' in statuses:
+                return False
+            summary = {
+                'done': statuses.count('done'),
+                'failed': statuses.count('failed'),
+                'cancelled': statuses.count('cancelled'),
+                'elapsed_ms': (time.monotonic() - (self.batch_started or time.monotonic())) * 1000
+            }
+            # 已结束的条目不再保留，避免长期运行时无限增长
+            for item_id in self.batch:
+                self.items.pop(item_id, None)
+            self.batch = []
+        self.batch_finished.emit(summary)
+        return True
@@ -0,0 +1,171 @@
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPlainTextEdit,
+                             QPushButton, QListWidget, QListWidgetItem, QProgressBar,
+                             QDoubleSpinBox, QMessageBox)
+from PyQt5.QtCore import Qt
+from injection_queue import STATUS_ICONS
+
+
+def split_commands(text):
+    """拆分批量命令：有单独一行 --- 时按 --- 分隔（支持多行命令），否则每个非空行是一条"""
+    lines = text.splitlines()
+    if any(line.strip() == '---' for line in lines):
+        commands = []
+        current = []
+        for line in lines + ['---']:
+            if line.strip() == '---':
+                command = '\n'.join(current).strip()
+                if command:
+                    commands.append(command)
+                current = []
+            else:
+                current.append(line)
+        return commands
+    return [line.strip() for line in lines if line.strip()]
+
+
+class InjectionQueueDialog(QDialog):
+    """批量注入：输入多条命令加入注入队列，显示进度和每条的状态"""
+
+    def __init__(self, injection_queue, options_provider=None, parent=None):
+        super().__init__(parent)
+        self.injection_queue = injection_queue
+        self.options_provider = options_provider
+        self.list_items = {}  # 条目ID -> QListWidgetItem
+        self.initUI()
+
+        injection_queue.item_changed.connect(self.on_item_changed)
+        injection_queue.progress_changed.connect(self.on_progress_changed)
+        injection_queue.batch_finished.connect(self.on_batch_finished)
+
+        for item in injection_queue.batch_items():
+            self.on_item_changed(item)
+        self.update_pause_button()
+
+    def initUI(self):
+        self.setWindowTitle('批量注入')
+        self.setMinimumWidth(600)
+        self.setMinimumHeight(560)
+        self.setWindowFlags(self.windowFlags() | Qt.WindowStaysOnTopHint)
+
+        layout = QVBoxLayout()
+
+        layout.addWidget(QLabel("每行一条命令；多行命令之间用单独一行 --- 分隔"))
+        self.commands_input = QPlainTextEdit()
+        self.commands_input.setPlaceholderText("检查登录模块的错误处理\n为日志导出补充单元测试\n...")
+        layout.addWidget(self.commands_input)
+
+        # 节奏设置与加入队列
+        add_layout = QHBoxLayout()
+        add_layout.addWidget(QLabel("每条间隔(秒):"))
+        self.pacing_spin = QDoubleSpinBox()
+        self.pacing_spin.setRange(0.0, 600.0)
+        self.pacing_spin.setSingleStep(0.5)
+        self.pacing_spin.setValue(self.injection_queue.pacing)
+        self.pacing_spin.valueChanged.connect(self.on_pacing_changed)
+        add_layout.addWidget(self.pacing_spin)
+        add_layout.addStretch()
+        self.add_button = QPushButton("加入队列")
+        self.add_button.clicked.connect(self.add_commands)
+        add_layout.addWidget(self.add_button)
+        layout.addLayout(add_layout)
+
+        # 进度
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
+        self.progress_label = QLabel("队列空闲")
+        layout.addWidget(self.progress_label)
+
+        # 每条状态
+        self.item_list = QListWidget()
+        layout.addWidget(self.item_list)
+
+        # 控制按钮
+        control_layout = QHBoxLayout()
+        self.pause_button = QPushButton("暂停")
+        self.pause_button.clicked.connect(self.toggle_pause)
+        control_layout.addWidget(self.pause_button)
+        self.cancel_button = QPushButton("取消剩余")
+        self.cancel_button.clicked.connect(self.cancel_pending)
+        control_layout.addWidget(self.cancel_button)
+        control_layout.addStretch()
+        close_button = QPushButton("关闭")
+        close_button.clicked.connect(self.close)
+        control_layout.addWidget(close_button)
+        layout.addLayout(control_layout)
+
+        self.setLayout(layout)
+
+    def add_commands(self):
+        commands = split_commands(self.commands_input.toPlainText())
+        if not commands:
+            QMessageBox.warning(self, "错误", "请输入至少一条命令")
+            return
+        options = self.options_provider() if self.options_provider else None
+        item_ids = self.injection_queue.enqueue(commands, options)
+        if item_ids is None:
+            QMessageBox.warning(self, "队列已满",
+                                f"队列最多等待 {self.injection_queue.max_pending} 条，请等当前批次完成后再加入")
+            return
+        self.commands_input.clear()
+
+    def on_pacing_changed(self, value):
+        self.injection_queue.pacing = value
+
+    def toggle_pause(self):
+        if self.injection_queue.is_paused():
+            self.injection_queue.resume()
+        else:
+            self.injection_queue.pause()
+        self.update_pause_button()
+
+    def update_pause_button(self):
+        self.pause_button.setText("继续" if self.injection_queue.is_paused() else "暂停")
+
+    def cancel_pending(self):
+        count = self.injection_queue.cancel_pending()
+        self.progress_label.setText(f"已取消 {count} 条等待中的命令")
+        self.update_pause_button()
+
+    def on_item_changed(self, item):
+        first_line = item['command'].splitlines()[0] if item['command'] else ""
+        text = f"{STATUS_ICONS.get(item['status'], '')} #{item['id']} {first_line[:60]}"
+        if item['status'] == 'done' and item['total_ms'] is not None:
+            text += f"  ({item['total_ms']:.0f}ms)"
+        if item['error']:
+            text += f"  - {item['error']}"
+
+        list_item = self.list_items.get(item['id'])
+        if list_item is None:
+            list_item = QListWidgetItem(text)
+            self.item_list.addItem(list_item)
+            self.list_items[item['id']] = list_item
+        else:
+            list_item.setText(text)
+        if item['status'] == 'running':
+            self.item_list.scrollToItem(list_item)
+        self.update_pause_button()
+
+    def on_progress_changed(self, finished, total):
+        self.progress_bar.setRange(0, max(total, 1))
+        self.progress_bar.setValue(finished)
+        state = "已暂停" if self.injection_queue.is_paused() else "注入中"
+        self.progress_label.setText(f"{state}：{finished}/{total}")
+
+    def on_batch_finished(self, summary):
+        self.progress_label.setText(
+            f"本批完成：成功 {summary['done']} 条，失败 {summary['failed']} 条，"
+            f"取消 {summary['cancelled']} 条，用时 {summary['elapsed_ms'] / 1000:.1f} 秒")
+        self.update_pause_button()
+
+    def closeEvent(self, event):
+        """关闭窗口不影响队列继续运行"""
+        for signal, slot in ((self.injection_queue.item_changed, self.on_item_changed),
+                             (self.injection_queue.progress_changed, self.on_progress_changed),
+                             (self.injection_queue.batch_finished, self.on_batch_finished)):
+            try:
+                signal.disconnect(slot)
+            except TypeError:
+                pass
+        super().closeEvent(event)
@@ -0,0 +1,561 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输入驱动 - 命令注入的激活、点击、剪贴板、粘贴、提交五个阶段的可替换后端
+
+原 inject_command 直接调用 win32gui / win32api / pyperclip，阶段之间是固定的 time.sleep
+（激活 0.2s、点击前后各 0.1s、剪贴板 0.1s、Ctrl+V 前后各 0.1s、回车后 0.2s），
+每次注入至少多等约 1 秒，而且离开 Windows 无法运行。本模块：
+1. InputDriver 定义注入用到的全部底层操作，Win32InputDriver 是 Windows 实现
+2. FakeInputDriver 在进程内模拟窗口、焦点、剪贴板和输入框，可设置每个操作的延迟、
+   激活失败次数，并可使用虚拟时钟（sleep 只推进时钟不真正等待），供 Linux 下调试和基准
+3. InjectionSequence 按阶段执行一次注入，等待时间集中在 DEFAULT_DELAYS 中，
+   返回每个阶段的耗时（其中等待多少、操作多少），便于调整或替换等待预算
+4. wait_until 以指数退避的微小间隔轮询廉价条件直到截止时间。条件等待模式（默认）下
+   激活等到前台窗口就是目标、恢复等到窗口不再最小化、点击等到目标窗口持有键盘焦点、
+   剪贴板等到序列号变化，条件一成立立即进入下一步；没有可观测条件的等待（移动、点击、粘贴、回车之后）保留原来的时长
+
+作者: Assistant
+创建时间: 2025-06-16
+项目: injection
+"""
+
+import time
+import ctypes
+
+try:
+    import win32gui
+    import win32con
+    import win32api
+    import win32process
+    import win32clipboard
+    import pyperclip
+    WIN32_AVAILABLE = True
+except ImportError:
+    WIN32_AVAILABLE = False
+
+
+STAGES = ("activate", "click", "clipboard", "paste", "submit")
+
+# 与原 inject_command 一致的等待预算（秒）
+DEFAULT_DELAYS = {
+    'activate_settle': 0.2,   # SetForegroundWindow 之后
+    'restore_settle': 0.3,    # 第三次激活前 SW_RESTORE 之后
+    'move_settle': 0.1,       # SetCursorPos 之后
+    'click_settle': 0.1,      # 点击之后
+    'clipboard_settle': 0.1,  # 写剪贴板之后、回读校验之前
+    'paste_hold': 0.1,        # 按住 Ctrl+V 的时间
+    'paste_settle': 0.1,      # 粘贴之后
+    'submit_settle': 0.2,     # 回车之后
+}
+
+# 条件等待模式的固定等待：只去掉被条件等待代替的三项（激活、恢复、剪贴板）；
+# 其余等待没有可轮询的条件（焦点只能观测到窗口级，Cursor 异步读取剪贴板和处理回车），
+# 在真实 Cursor 窗口上验证之前保留原来的时长
+CONDITION_DELAYS = dict(DEFAULT_DELAYS, activate_settle=0, restore_settle=0, clipboard_settle=0)
+
+# 条件等待的截止时间（秒），超时后按原逻辑判定失败或重试
+WAIT_TIMEOUTS = {
+    'activate': 0.3,
+    'restore': 0.3,
+    'focus': 0.1,
+    'clipboard': 0.2,
+}
+
+MODES = ("condition", "fixed")
+ACTIVATION_ATTEMPTS = 3
+INITIAL_POLL_INTERVAL = 0.0005
+MAX_POLL_INTERVAL = 0.016
+
+
+class InjectionError(Exception):
+    """注入某个阶段失败"""
+
+    def __init__(self, stage, message):
+        super().__init__(message)
+        self.stage = stage
+
+
+class _RealClock:
+    now = staticmethod(time.perf_counter)
+    sleep = staticmethod(time.sleep)
+
+
+_REAL_CLOCK = _RealClock()
+
+
+class _GUIThreadInfo(ctypes.Structure):
+    """GetGUIThreadInfo 使用的 GUITHREADINFO 结构"""
+    _fields_ = [
+        ('cbSize', ctypes.c_uint32),
+        ('flags', ctypes.c_uint32),
+        ('hwndActive', ctypes.c_void_p),
+        ('hwndFocus', ctypes.c_void_p),
+        ('hwndCapture', ctypes.c_void_p),
+        ('hwndMenuOwner', ctypes.c_void_p),
+        ('hwndMoveSize', ctypes.c_void_p),
+        ('hwndCaret', ctypes.c_void_p),
+        ('rcCaret', ctypes.c_long * 4),
+    ]
+
+
+def wait_until(condition, timeout, clock=None, initial_interval=INITIAL_POLL_INTERVAL,
+               max_interval=MAX_POLL_INTERVAL):
+    """轮询 condition() 直到成立或超过 timeout 秒，间隔从 initial_interval 起每次翻倍
+
+    clock 提供 now()/sleep()（输入驱动即可，模拟驱动的虚拟时钟因此同样适用）。
+    返回条件最终是否成立。
+    """
+    clock = clock or _REAL_CLOCK
+    deadline = clock.now() + timeout
+    interval = initial_interval
+    while True:
+        if condition():
+            return True
+        remaining = deadline - clock.now()
+        if remaining <= 0:
+            return False
+        clock.sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
+
+
+class InputDriver:
+    """注入用到的底层输入操作（句柄、坐标与 win32 含义一致）"""
+
+    name = "base"
+
+    def now(self):
+        return time.perf_counter()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def foreground_window(self):
+        raise NotImplementedError
+
+    def activate(self, hwnd):
+        raise NotImplementedError
+
+    def restore(self, hwnd):
+        raise NotImplementedError
+
+    def is_minimized(self, hwnd):
+        raise NotImplementedError
+
+    def has_focus(self, hwnd):
+        """键盘焦点是否在 hwnd 或其子窗口上"""
+        raise NotImplementedError
+
+    def clipboard_sequence(self):
+        """剪贴板序列号，每次剪贴板内容变化加一"""
+        raise NotImplementedError
+
+    def client_to_screen(self, hwnd, position):
+        raise NotImplementedError
+
+    def move_cursor(self, point):
+        raise NotImplementedError
+
+    def click(self):
+        raise NotImplementedError
+
+    def set_clipboard(self, text):
+        raise NotImplementedError
+
+    def get_clipboard(self):
+        raise NotImplementedError
+
+    def key_combo_down(self):
+        """按下 Ctrl+V"""
+        raise NotImplementedError
+
+    def key_combo_up(self):
+        """松开 Ctrl+V"""
+        raise NotImplementedError
+
+    def press_enter(self):
+        raise NotImplementedError
+
+
+class Win32InputDriver(InputDriver):
+    """Windows 后端：win32gui / win32api / pyperclip"""
+
+    name = "win32"
+
+    def __init__(self):
+        if not WIN32_AVAILABLE:
+            raise RuntimeError("pywin32 / pyperclip 不可用，无法使用 Win32 输入驱动")
+
+    def foreground_window(self):
+        return win32gui.GetForegroundWindow()
+
+    def activate(self, hwnd):
+        win32gui.SetForegroundWindow(hwnd)
+
+    def restore(self, hwnd):
+        win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
+
+    def is_minimized(self, hwnd):
+        return bool(win32gui.IsIconic(hwnd))
+
+    def has_focus(self, hwnd):
+        thread_id = win32process.GetWindowThreadProcessId(hwnd)[0]
+        info = _GUIThreadInfo()
+        info.cbSize = ctypes.sizeof(_GUIThreadInfo)
+        if not ctypes.windll.user32.GetGUIThreadInfo(thread_id, ctypes.byref(info)):
+            return False
+        focus = info.hwndFocus or 0
+        return bool(focus) and (focus == hwnd or bool(win32gui.IsChild(hwnd, focus)))
+
+    def clipboard_sequence(self):
+        return win32clipboard.GetClipboardSequenceNumber()
+
+    def client_to_screen(self, hwnd, position):
+        return win32gui.ClientToScreen(hwnd, tuple(position))
+
+    def move_cursor(self, point):
+        win32api.SetCursorPos(point)
+
+    def click(self):
+        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, 0, 0, 0, 0)
+        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, 0, 0, 0, 0)
+
+    def set_clipboard(self, text):
+        pyperclip.copy(text)
+
+    def get_clipboard(self):
+        return pyperclip.paste()
+
+    def key_combo_down(self):
+        win32api.keybd_event(win32con.VK_CONTROL, 0, 0, 0)
+        win32api.keybd_event(ord('V'), 0, 0, 0)
+
+    def key_combo_up(self):
+        win32api.keybd_event(ord('V'), 0, win32con.KEYEVENTF_KEYUP, 0)
+        win32api.keybd_event(win32con.VK_CONTROL, 0, win32con.KEYEVENTF_KEYUP, 0)
+
+    def press_enter(self):
+        win32api.keybd_event(win32con.VK_RETURN, 0, 0, 0)
+        win32api.keybd_event(win32con.VK_RETURN, 0, win32con.KEYEVENTF_KEYUP, 0)
+
+
+class FakeInputDriver(InputDriver):
+    """进程内模拟后端：窗口、焦点、剪贴板和每个窗口的输入框
+
+    latency: {操作名: 秒}，模拟每个底层操作本身的耗时
+    ready_delays: {'activate' / 'focus' / 'clipboard': 秒}，操作之后状态过多久才可见
+                  （前台切换、点击获得焦点、剪贴板写入都是异步生效的）
+    activation_failures: 前 N 次激活不生效（模拟被系统拒绝前台切换）
+    virtual_clock: True 时 sleep 和操作延迟只推进虚拟时钟，不真正等待
+    """
+
+    name = "fake"
+
+    def __init__(self, windows=None, latency=None, activation_failures=0, virtual_clock=True,
+                 ready_delays=None):
+        self.windows = dict(windows or {})     # hwnd -> {'title', 'origin': (x, y), 'minimized'}
+        self.latency = dict(latency or {})
+        self.ready_delays = dict(ready_delays or {})
+        self.pending = {}                      # 状态名 -> (新值, 生效时间)
+        self.activation_failures = activation_failures
+        self.virtual_clock = virtual_clock
+        self.clock = 0.0
+        self.started = time.perf_counter()
+
+        self.foreground = None
+        self.focused = None
+        self.cursor = (0, 0)
+        self.clipboard = ""
+        self.clipboard_sequence_number = 0
+        self.combo_down = False
+        self.buffers = {}                      # hwnd -> 输入框当前文本
+        self.submitted = {}                    # hwnd -> 已提交的文本列表
+        self.events = []
+        self.sleep_calls = 0
+
+    def add_window(self, hwnd, title, origin=(0, 0), minimized=False):
+        self.windows[hwnd] = {'title': title, 'origin': origin, 'minimized': minimized}
+
+    # === 时钟 ===
+
+    def now(self):
+        if self.virtual_clock:
+            return self.clock + (time.perf_counter() - self.started)
+        return time.perf_counter()
+
+    def sleep(self, seconds):
+        self.sleep_calls += 1
+        if self.virtual_clock:
+            self.clock += seconds
+        else:
+            time.sleep(seconds)
+
+    def _operate(self, name, *details):
+        self.events.append((name,) + details)
+        delay = self.latency.get(name, 0)
+        if delay:
+            if self.virtual_clock:
+                self.clock += delay
+            else:
+                time.sleep(delay)
+        self._settle()
+
+    def _defer(self, state, value, delay_key):
+        """state 在 ready_delays[delay_key] 秒后变为 value"""
+        delay = self.ready_delays.get(delay_key, 0)
+        self.pending[state] = (value, self.now() + delay)
+        self._settle()
+
+    def _settle(self):
+        now = self.now()
+        for state, (value, ready_at) in list(self.pending.items()):
+            if ready_at <= now:
+                del self.pending[state]
+                if state == 'clipboard':
+                    self.clipboard = value
+                    self.clipboard_sequence_number += 1
+                else:
+                    setattr(self, state, value)
+
+    # === 操作 ===
+
+    def foreground_window(self):
+        self._operate("foreground_window")
+        return self.foreground
+
+    def activate(self, hwnd):
+        self._operate("activate", hwnd)
+        if hwnd not in self.windows:
+            raise OSError(f"无效的窗口句柄: {hwnd}")
+        if self.activation_failures > 0:
+            self.activation_failures -= 1
+            return
+        self._defer('foreground', hwnd, 'activate')
+
+    def restore(self, hwnd):
+        self._operate("restore", hwnd)
+        self.windows[hwnd]['minimized'] = False
+
+    def is_minimized(self, hwnd):
+        self._operate("is_minimized", hwnd)
+        return self.windows[hwnd].get('minimized', False)
+
+    def has_focus(self, hwnd):
+        self._operate("has_focus", hwnd)
+        return self.focused == hwnd
+
+    def clipboard_sequence(self):
+        self._operate("clipboard_sequence")
+        return self.clipboard_sequence_number
+
+    def client_to_screen(self, hwnd, position):
+        self._operate("client_to_screen", hwnd)
+        origin = self.windows[hwnd]['origin']
+        return (origin[0] + position[0], origin[1] + position[1])
+
+    def move_cursor(self, point):
+        self._operate("move_cursor", point)
+        self.cursor = tuple(point)
+
+    def click(self):
+        self._operate("click", self.cursor)
+        self._defer('focused', self.foreground, 'focus')
+
+    def set_clipboard(self, text):
+        self._operate("set_clipboard", len(text))
+        self._defer('clipboard', text, 'clipboard')
+
+    def get_clipboard(self):
+        self._operate("get_clipboard")
+        return self.clipboard
+
+    def key_combo_down(self):
+        self._operate("key_combo_down")
+        self.combo_down = True
+
+    def key_combo_up(self):
+        self._operate("key_combo_up")
+        if self.combo_down and self.focused is not None and self.focused == self.foreground:
+            self.buffers[self.focused] = self.buffers.get(self.focused, "") + self.clipboard
+        self.combo_down = False
+
+    def press_enter(self):
+        self._operate("press_enter")
+        hwnd = self.focused
+        if hwnd is not None and hwnd == self.foreground:
+            self.submitted.setdefault(hwnd, []).append(self.buffers.pop(hwnd, ""))
+
+
+class InjectionSequence:
+    """按阶段执行一次注入：激活 → 点击 → 剪贴板 → 粘贴 → 提交
+
+    mode="condition"（默认）按条件等待推进，mode="fixed" 使用原来的固定等待。
+    """
+
+    def __init__(self, driver, delays=None, verbose=True, mode="condition", timeouts=None):
+        if mode not in MODES:
+            raise ValueError(f"未知的注入等待模式: {mode}")
+        self.driver = driver
+        self.verbose = verbose
+        self.mode = mode
+        self.delays = dict(CONDITION_DELAYS if mode == "condition" else DEFAULT_DELAYS)
+        if delays:
+            self.delays.update(delays)
+        self.timeouts = dict(WAIT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.timings = {}
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def wait(self, key):
+        seconds = self.delays.get(key, 0)
+        if seconds > 0:
+            start = self.driver.now()
+            self.driver.sleep(seconds)
+            self.current['sleep_ms'] += (self.driver.now() - start) * 1000
+
+    def wait_for(self, key, condition):
+        """条件等待模式下等待 condition 成立（最多 timeouts[key] 秒），固定模式直接返回 True"""
+        if self.mode != "condition":
+            return True
+        start = self.driver.now()
+        ready = wait_until(condition, self.timeouts[key], self.driver)
+        self.current['sleep_ms'] += (self.driver.now() - start) * 1000
+        return ready
+
+    def _stage(self, name, action, *args):
+        self.current = {'ms': 0.0, 'sleep_ms': 0.0}
+        start = self.driver.now()
+        try:
+            return action(*args)
+        finally:
+            self.current['ms'] = (self.driver.now() - start) * 1000
+            self.timings[name] = self.current
+
+    def run(self, target_window, target_position, text, relocate=None, copied=False, settle=True):
+        """执行一次注入，返回 {'hwnd', 'stages', 'total_ms', 'clipboard_sequence'}，失败时抛出 InjectionError
+
+        relocate: 第一次激活失败后调用，返回重新查找到的目标窗口句柄（或 None）
+        copied: 剪贴板已由 copy_ahead 写好本条文本，跳过剪贴板阶段
+        settle: False 时回车后不等待 submit_settle，由调用方把这段时间用于下一条的准备（见 settle_after）
+        """
+        self.timings = {}
+        if not copied:
+            self.copied_sequence = None
+        start = self.driver.now()
+        hwnd = self._stage("activate", self.activate, target_window, relocate)
+        self._stage("click", self.click, hwnd, target_position)
+        if copied:
+            self.timings["clipboard"] = {'ms': 0.0, 'sleep_ms': 0.0}
+        else:
+            self._stage("clipboard", self.copy, text)
+        self._stage("paste", self.paste)
+        self._stage("submit", self.submit, settle)
+        return {
+            'hwnd': hwnd,
+            'stages': self.timings,
+            'total_ms': (self.driver.now() - start) * 1000,
+            'clipboard_sequence': self.copied_sequence
+        }
+
+    # === 阶段 ===
+
+    def activate(self, target_window, relocate=None):
+        """激活目标窗口（最多三次：第二次前重新查找窗口，第三次前先恢复窗口），返回最终句柄"""
+        driver = self.driver
+        hwnd = target_window
+        for attempt in range(ACTIVATION_ATTEMPTS):
+            try:
+                if attempt == 1 and relocate is not None:
+                    self.log("⚠️ 第一次激活失败，尝试重新查找Cursor窗口...")
+                    new_window = relocate()
+                    if new_window and new_window != hwnd:
+                        self.log(f"🔄 发现新的Cursor窗口句柄: {new_window} (原句柄: {hwnd})")
+                        hwnd = new_window
+
+                if attempt == ACTIVATION_ATTEMPTS - 1:
+                    driver.restore(hwnd)
+                    self.wait('restore_settle')
+                    self.wait_for('restore', lambda: not driver.is_minimized(hwnd))
+
+                driver.activate(hwnd)
+                self.wait('activate_settle')
+                self.wait_for('activate', lambda: driver.foreground_window() == hwnd)
+
+                current_foreground = driver.foreground_window()
+                if current_foreground == hwnd:
+                    self.log(f"✅ 窗口激活成功 (尝试 #{attempt + 1}, 句柄: {hwnd})")
+                    return hwnd
+                self.log(f"❌ 窗口激活失败 (尝试 #{attempt + 1}): 目标={hwnd}, 当前前台={current_foreground}")
+
+            except Exception as e:
+                self.log(f"❌ 窗口激活异常 (尝试 #{attempt + 1}): {str(e)}")
+                if attempt == ACTIVATION_ATTEMPTS - 1:
+                    raise InjectionError("activate", f"窗口激活失败: {str(e)}")
+
+        raise InjectionError("activate", f"无法激活目标窗口 (最终句柄: {hwnd})")
+
+    def click(self, hwnd, target_position):
+        point = self.driver.client_to_screen(hwnd, target_position)
+        self.driver.move_cursor(point)
+        self.wait('move_settle')
+        self.driver.click()
+        self.wait_for('focus', lambda: self.driver.has_focus(hwnd))
+        self.wait('click_settle')
+
+    def copy(self, text):
+        driver = self.driver
+        sequence = driver.clipboard_sequence() if self.mode == "condition" else None
+        driver.set_clipboard(text)
+        self.wait('clipboard_settle')
+        self.wait_for('clipboard', lambda: driver.clipboard_sequence() != sequence)
+        if driver.get_clipboard() != text:
+            raise InjectionError("clipboard", "剪贴板复制失败")
+        self.copied_sequence = driver.clipboard_sequence()
+
+    def paste(self):
+        self.driver.key_combo_down()
+        self.wait('paste_hold')
+        self.driver.key_combo_up()
+        self.wait('paste_settle')
+
+    def submit(self, settle=True):
+        self.driver.press_enter()
+        if settle:
+            self.wait('submit_settle')
+
+    # === 多目标流水线 ===
+
+    def copy_ahead(self, text):
+        """在上一条回车后的等待期间写入下一条的剪贴板（上一条的粘贴已完成，剪贴板可以复用）"""
+        self.current = {'ms': 0.0, 'sleep_ms': 0.0}
+        self.copy(text)
+
+    def settle_after(self, started):
+        """补足 submit_settle：从 started（回车之后的时刻）算起，已经过去的时间不再等待"""
+        remaining = self.delays.get('submit_settle', 0) - (self.driver.now() - started)
+        if remaining > 0:
+            self.driver.sleep(remaining)
+
+
+def create_input_driver(name="auto"):
+    """auto / win32：Win32 驱动，pywin32 不可用时抛出 RuntimeError；fake：模拟驱动（只在明确指定时使用）
+
+    auto 不会退回模拟驱动，否则注入看似成功，实际上什么也没有发送。
+    """
+    if name in ("auto", "win32"):
+        return Win32InputDriver()
+    if name == "fake":
+        return FakeInputDriver()
+    raise ValueError(f"未知的输入驱动: {name}")
+
+
+def format_timings(result):
+    """阶段耗时摘要，例如 'activate 201ms(等待200) | click 200ms(等待200) | ... | 合计 1002ms'"""
+    parts = [f"{name} {timing['ms']:.0f}ms(等待{timing['sleep_ms']:.0f})"
+             for name, timing in result['stages'].items()]
+    parts.append(f"合计 {result['total_ms']:.0f}ms")
+    return " | ".join(parts)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量日志备份引擎 - 按字节偏移只读取日志新增尾部
+
+原实现每次备份都把整个 {project}-log.md 读入内存再按字符数切片，
+每次注入要做两次（backup-1 / backup-2）。本引擎改为：
+1. 备份位置记录为字节偏移 + 偏移前尾部校验值
+2. 通过 seek 只读取新增尾部
+3. 多个备份目标共享一次读取
+4. 尾部校验值不一致时判定为原地改写，退回全量备份
+5. 提供 LogCodec 时按字典 zstd 压缩写入（扩展名追加 .zst / .gz）
+
+作者: Assistant
+创建时间: 2025-06-14
+项目: injection
+"""
+
+import os
+import json
+import hashlib
+import datetime
+import threading
+
+
+class LogBackupEngine:
+    """增量日志备份引擎"""
+
+    # 尾部校验窗口（字节）
+    TAIL_CHECK_SIZE = 256
+
+    # 备份模式
+    MODE_FULL = "FULL_BACKUP"
+    MODE_INCREMENTAL = "INCREMENTAL_BACKUP"
+    MODE_TRUNCATION = "TRUNCATION_DETECTED"
+    MODE_REWRITE = "REWRITE_DETECTED"
+
+    def __init__(self, log_file, meta_dir, project_name=None, codec=None):
+        self.log_file = log_file
+        self.meta_dir = meta_dir
+        self.project_name = project_name if project_name else "unknown"
+        self.codec = codec
+
+        # UI线程与日志写入线程都可能触发备份，需串行化
+        self.lock = threading.Lock()
+
+    # === 位置元数据 ===
+    def meta_path(self, backup_type):
+        """备份位置元数据文件路径"""
+        return os.path.join(self.meta_dir, f"backup_meta_{backup_type}.json")
+
+    def legacy_meta_path(self, backup_type):
+        """旧版按字符数记录的元数据文件路径"""
+        return os.path.join(self.meta_dir, f"backup_meta_{backup_type}.txt")
+
+    def load_state(self, backup_type):
+        """读取备份位置状态 {offset, tail_hash}"""
+        try:
+            meta_file = self.meta_path(backup_type)
+            if os.path.exists(meta_file):
+                with open(meta_file, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                return {
+                    'offset': int(state.get('offset', 0)),
+                    'tail_hash': state.get('tail_hash', '')
+                }
+
+            # 兼容旧版字符位置，一次性换算为字节偏移
+            legacy_file = self.legacy_meta_path(backup_type)
+            if os.path.exists(legacy_file):
+                with open(legacy_file, 'r', encoding='utf-8') as f:
+                    char_position = int(f.read().strip() or 0)
+                return self._migrate_legacy_position(char_position)
+        except Exception as e:
+            print(f"⚠️ 读取备份位置失败 ({backup_type})：{e}")
+        return {'offset': 0, 'tail_hash': ''}
+
+    def save_state(self, backup_type, offset, tail_hash):
+        """保存备份位置状态"""
+        try:
+            os.makedirs(self.meta_dir, exist_ok=True)
+            meta_file = self.meta_path(backup_type)
+            temp_file = meta_file + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'offset': offset,
+                    'tail_hash': tail_hash,
+                    'updated': datetime.datetime.now().isoformat()
+                }, f)
+            os.replace(temp_file, meta_file)
+        except Exception as e:
+            print(f"❌ 更新备份位置失败：{e}")
+
+    def reset_state(self, backup_type):
+        """清除备份位置（下次备份将为全量备份）"""
+        for meta_file in (self.meta_path(backup_type), self.legacy_meta_path(backup_type)):
+            try:
+                if os.path.exists(meta_file):
+                    os.remove(meta_file)
+            except Exception as e:
+                print(f"⚠️ 清除备份位置失败：{e}")
+
+    def _migrate_legacy_position(self, char_position):
+        """把旧版字符位置换算为字节偏移（仅首次升级时读取一次前缀）"""
+        if char_position <= 0 or not os.path.exists(self.log_file):
+            return {'offset': 0, 'tail_hash': ''}
+        with open(self.log_file, 'r', encoding='utf-8', newline='') as f:
+            prefix = f.read(char_position)
+        offset = len(prefix.encode('utf-8'))
+        with open(self.log_file, 'rb') as f:
+            tail_hash = self._hash_before(f, offset)
+        return {'offset': offset, 'tail_hash': tail_hash}
+
+    # === 尾部校验 ===
+    def _hash_before(self, f, offset):
+        """计算偏移之前 TAIL_CHECK_SIZE 字节的校验值"""
+        start = max(0, offset - self.TAIL_CHECK_SIZE)
+        f.seek(start)
+        return self._tail_digest(f.read(offset - start))
+
+    @staticmethod
+    def _tail_digest(data):
+        return hashlib.sha1(data).hexdigest()
+
+    def plan(self, f, size, state):
+        """根据当前文件大小和已记录状态决定备份模式和起始偏移"""
+        offset = state['offset']
+        if offset <= 0:
+            return (self.MODE_FULL, 0) if size > 0 else (None, 0)
+        if size < offset:
+            return self.MODE_TRUNCATION, 0
+        if state['tail_hash'] and self._hash_before(f, offset) != state['tail_hash']:
+            return self.MODE_REWRITE, 0
+        if size == offset:
+            return None, offset
+        return self.MODE_INCREMENTAL, offset
+
+    # === 备份 ===
+    def create_header(self, backup_type, backup_mode, start_position=0, end_position=0):
+        """创建备份文件头部信息"""
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        header = f"""# 增量日志备份
+## 备份信息
+- 备份时间: {timestamp}
+- 备份类型: {backup_type}
+- 备份模式: {backup_mode}
+- 起始位置: {start_position}
+- 结束位置: {end_position}
+- 位置单位: 字节
+- 项目名称: {self.project_name}
+
+---
+
+"""
+        return header
+
+    def backup(self, destinations):
+        """对多个备份目标执行增量备份，只读取一次新增尾部
+
+        destinations: [(backup_type, backup_path), ...]
+        返回每个目标的结果列表，没有新内容的目标不出现在结果中
+        """
+        if not destinations or not os.path.exists(self.log_file):
+            return []
+
+        with self.lock:
+            return self._backup_locked(destinations)
+
+    def _backup_locked(self, destinations):
+        with open(self.log_file, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+
+            plans = []
+            for backup_type, backup_path in destinations:
+                state = self.load_state(backup_type)
+                mode, start = self.plan(f, size, state)
+                if mode:
+                    plans.append((backup_type, backup_path, mode, start))
+
+            if not plans:
+                return []
+
+            # 所有目标共享一次读取：从最小起始偏移读到文件末尾
+            read_start = min(start for _, _, _, start in plans)
+            f.seek(read_start)
+            data = f.read(size - read_start)
+
+            if len(data) >= self.TAIL_CHECK_SIZE or read_start == 0:
+                new_tail_hash = self._tail_digest(data[-self.TAIL_CHECK_SIZE:])
+            else:
+                new_tail_hash = self._hash_before(f, size)
+
+        results = []
+        for backup_type, backup_path, mode, start in plans:
+            increment = data[start - read_start:]
+            header = self.create_header(backup_type, mode, start, size)
+            try:
+                backup_dir = os.path.dirname(backup_path)
+                if backup_dir:
+                    os.makedirs(backup_dir, exist_ok=True)
+                if self.codec is not None:
+                    written_path = self.codec.write_backup(backup_path, [header.encode('utf-8'), increment])
+                    self._remove_stale_variants(backup_path, written_path)
+                else:
+                    written_path = backup_path
+                    with open(backup_path, 'wb') as out:
+                        out.write(header.encode('utf-8'))
+                        out.write(increment)
+                self.save_state(backup_type, size, new_tail_hash)
+                results.append({
+                    'backup_type': backup_type,
+                    'backup_path': written_path,
+                    'mode': mode,
+                    'start': start,
+                    'end': size,
+                    'bytes': len(increment)
+                })
+            except Exception as e:
+                print(f"❌ 写入增量备份失败 ({backup_type})：{e}")
+
+        return results
+
+    @staticmethod
+    def _remove_stale_variants(backup_path, written_path):
+        """覆盖写入的备份（如 incremental-1）切换压缩方式后，删除旧格式的同名文件"""
+        for path in (backup_path, backup_path + ".zst", backup_path + ".gz"):
+            if path != written_path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"⚠️ 删除旧格式备份失败 ({os.path.basename(path)})：{e}")
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志压缩编解码 - 用项目自身日志训练的 zstd 字典压缩备份和归档段
+
+日志条目大量重复 "## 📥 输入" / "## 📤 输出" 标题、"✅ 命令注入完成 - Cursor - ..." 行、
+模板前后缀和【项目：...】标签，增量备份通常只有几KB，通用 gzip 没有上下文可用，压缩率很低。本模块：
+1. 从项目日志最近的条目中采样训练 zstd 字典，按版本保存在 backups/dictionaries/ 并记录清单
+2. 写入备份和归档段时用最新字典压缩，zstd 帧头自带字典ID，旧版本字典保留用于读取旧文件
+3. 读取时按扩展名（.zst / .gz）透明解压，按帧头字典ID自动找到对应字典
+4. 未安装 zstandard 时：归档段退回 gzip，增量备份保持不压缩（小文件 gzip 收益有限）
+
+命令行：python log_compression.py <日志文件> [train|info|cat <文件>] [--dir 字典目录]
+
+作者: Assistant
+创建时间: 2025-06-16
+项目: injection
+"""
+
+import io
+import os
+import sys
+import gzip
+import json
+import shutil
+import datetime
+import threading
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+
+COMPRESSED_SUFFIXES = {'.zst': "zstd", '.gz': "gzip"}
+METHOD_SUFFIXES = {"zstd": '.zst', "gzip": '.gz'}
+
+DICTIONARY_DIR_NAME = "dictionaries"
+DICTIONARY_MANIFEST_NAME = "dictionaries.json"
+
+DEFAULT_DICT_SIZE = 64 * 1024
+# 训练样本取日志末尾最近的内容
+MAX_SAMPLE_BYTES = 8 * 1024 * 1024
+MIN_SAMPLE_COUNT = 32
+# 日志增长到上次训练时的2倍后重新训练
+RETRAIN_GROWTH = 2.0
+
+BACKUP_LEVEL = 3
+ARCHIVE_LEVEL = 10
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# 已加载的字典：字典ID -> ZstdCompressionDict（进程内共享，读取时按帧头查找）
+_dictionaries = {}
+_dictionaries_lock = threading.Lock()
+
+
+def compression_of(path):
+    """按扩展名判断压缩方式：zstd / gzip / none"""
+    return COMPRESSED_SUFFIXES.get(os.path.splitext(path)[1], "none")
+
+
+def strip_compression_suffix(name):
+    """去掉压缩扩展名（x.md.zst -> x.md）"""
+    stem, suffix = os.path.splitext(name)
+    return stem if suffix in COMPRESSED_SUFFIXES else name
+
+
+def register_dictionary(dictionary):
+    """登记已加载的字典，返回字典ID"""
+    dict_id = dictionary.dict_id()
+    with _dictionaries_lock:
+        _dictionaries[dict_id] = dictionary
+    return dict_id
+
+
+def frame_dict_id(path):
+    """读取 zstd 帧头中的字典ID（0 表示没有使用字典）"""
+    with open(path, 'rb') as f:
+        header = f.read(18)
+    return zstandard.get_frame_parameters(header).dict_id
+
+
+def find_dictionary(dict_id, path=None):
+    """按字典ID查找字典：先查进程内登记，再查文件附近的字典目录"""
+    if not dict_id:
+        return None
+    with _dictionaries_lock:
+        dictionary = _dictionaries.get(dict_id)
+    if dictionary is not None:
+        return dictionary
+
+    if path:
+        # 备份与字典目录同级；归档段在 log-archive/，字典在 ../backups/dictionaries/
+        base_dir = os.path.dirname(os.path.abspath(path))
+        for dict_dir in (os.path.join(base_dir, DICTIONARY_DIR_NAME),
+                         os.path.join(os.path.dirname(base_dir), "backups", DICTIONARY_DIR_NAME)):
+            if os.path.isdir(dict_dir):
+                DictionaryStore(dict_dir).load_all()
+        with _dictionaries_lock:
+            dictionary = _dictionaries.get(dict_id)
+    if dictionary is None:
+        raise RuntimeError(f"找不到 {os.path.basename(path or '')} 使用的压缩字典（ID {dict_id}）")
+    return dictionary
+
+
+class ZstdFileReader(io.RawIOBase):
+    """可 seek 的 zstd 解压读取器（向后 seek 时从头重新解压，日志读取基本只向前）"""
+
+    def __init__(self, path, dictionary=None):
+        super().__init__()
+        self.path = path
+        self.decompressor = zstandard.ZstdDecompressor(dict_data=dictionary) if dictionary \
+            else zstandard.ZstdDecompressor()
+        self.stream = None
+        self.position = 0
+        self._reopen()
+
+    def _reopen(self):
+        if self.stream is not None:
+            self.stream.close()
+        self.stream = self.decompressor.stream_reader(open(self.path, 'rb'), closefd=True)
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("zstd 读取器不支持相对末尾定位")
+        if offset < self.position:
+            self._reopen()
+        while self.position < offset:
+            data = self.stream.read(min(COPY_CHUNK_SIZE, offset - self.position))
+            if not data:
+                break
+            self.position += len(data)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        super().close()
+
+
+def open_compressed(path):
+    """以二进制只读方式打开文件，按扩展名透明解压；返回的对象支持 readline / 迭代 / seek"""
+    method = compression_of(path)
+    if method == "gzip":
+        return gzip.open(path, 'rb')
+    if method == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError(f"读取 {os.path.basename(path)} 需要安装 zstandard")
+        dictionary = find_dictionary(frame_dict_id(path), path)
+        return io.BufferedReader(ZstdFileReader(path, dictionary), COPY_CHUNK_SIZE)
+    return open(path, 'rb')
+
+
+def read_compressed(path):
+    """读取并解压整个文件"""
+    with open_compressed(path) as f:
+        return f.read()
+
+
+def uncompressed_size(path, stat=None):
+    """解压后的字节数；zstd 帧头记录了原始大小时不需要解压"""
+    method = compression_of(path)
+    if method == "none":
+        return (stat or os.stat(path)).st_size
+    if method == "zstd" and ZSTD_AVAILABLE:
+        with open(path, 'rb') as f:
+            content_size = zstandard.get_frame_parameters(f.read(18)).content_size
+        if content_size > 0:
+            return content_size
+    size = 0
+    with open_compressed(path) as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+            size += len(chunk)
+    return size
+
+
+class DictionaryStore:
+    """按版本保存的压缩字典：{字典目录}/{日志名}.v{版本}.dict + dictionaries.json 清单"""
+
+    def __init__(self, dict_dir):
+        self.dict_dir = dict_dir
+        self.manifest_path = os.path.join(dict_dir, DICTIONARY_MANIFEST_NAME)
+        self.manifest = self.load_manifest()
+
+    def load_manifest(self):
+        try:
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"⚠️ 读取压缩字典清单失败：{e}")
+        return {'versions': []}
+
+    def save_manifest(self):
+        os.makedirs(self.dict_dir, exist_ok=True)
+        temp_file = self.manifest_path + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.manifest_path)
+
+    def latest(self):
+        versions = self.manifest['versions']
+        return versions[-1] if versions else None
+
+    def load(self, record):
+        """加载一个版本的字典并登记"""
+        with open(os.path.join(self.dict_dir, record['file']), 'rb') as f:
+            dictionary = zstandard.ZstdCompressionDict(f.read())
+        register_dictionary(dictionary)
+        return dictionary
+
+    def load_all(self):
+        loaded = 0
+        if not ZSTD_AVAILABLE:
+            return loaded
+        for record in self.manifest['versions']:
+            try:
+                self.load(record)
+                loaded += 1
+            except Exception as e:
+                print(f"⚠️ 加载压缩字典 {record.get('file')} 失败：{e}")
+        return loaded
+
+    def needs_training(self, log_file):
+        if not os.path.exists(log_file):
+            return False
+        record = self.latest()
+        if record is None:
+            return True
+        return os.path.getsize(log_file) >= record['trained_from_size'] * RETRAIN_GROWTH
+
+    @staticmethod
+    def collect_samples(log_file, max_bytes=MAX_SAMPLE_BYTES):
+        """以日志末尾最近的条目为样本；每条再拆出输入、输出两段，对应小增量备份的常见形态"""
+        from log_parser import parse_entries
+
+        with open(log_file, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            f.seek(max(0, size - max_bytes))
+            data = f.read()
+
+        samples = []
+        for entry in parse_entries(io.BytesIO(data)):
+            raw = data[entry.start:entry.end]
+            if not raw.strip():
+                continue
+            samples.append(raw)
+            split = raw.find('## 📤'.encode('utf-8'))
+            if split > 0:
+                samples.append(raw[:split])
+                samples.append(raw[split:])
+        return samples
+
+    def train(self, log_file, dict_size=DEFAULT_DICT_SIZE):
+        """用日志训练新版本字典，样本不足或训练失败时返回None"""
+        if not ZSTD_AVAILABLE:
+            return None
+        samples = self.collect_samples(log_file)
+        if len(samples) < MIN_SAMPLE_COUNT:
+            print(f"⚠️ 日志条目太少（{len(samples)} 个样本），暂不训练压缩字典")
+            return None
+
+        try:
+            dictionary = zstandard.train_dictionary(dict_size, samples)
+        except Exception as e:
+            print(f"⚠️ 训练压缩字典失败：{e}")
+            return None
+
+        version = (self.latest() or {}).get('version', 0) + 1
+        file_name = f"{os.path.splitext(os.path.basename(log_file))[0]}.v{version}.dict"
+        os.makedirs(self.dict_dir, exist_ok=True)
+        temp_file = os.path.join(self.dict_dir, file_name + ".tmp")
+        with open(temp_file, 'wb') as f:
+            f.write(dictionary.as_bytes())
+        os.replace(temp_file, os.path.join(self.dict_dir, file_name))
+
+        record = {
+            'version': version,
+            'dict_id': dictionary.dict_id(),
+            'file': file_name,
+            'dict_bytes': len(dictionary.as_bytes()),
+            'samples': len(samples),
+            'sample_bytes': sum(len(sample) for sample in samples),
+            'trained_from_size': os.path.getsize(log_file),
+            'created': datetime.datetime.now().isoformat()
+        }
+        self.manifest['versions'].append(record)
+        self.save_manifest()
+        register_dictionary(dictionary)
+        print(f"📚 已训练压缩字典 v{version}（{record['samples']} 个样本，{record['dict_bytes']} 字节）")
+        return record
+
+
+class LogCodec:
+    """备份与归档段的压缩编码
+
+    mode: auto（有 zstandard 时用字典 zstd，否则归档 gzip、备份不压缩）/ zstd / gzip / none
+    """
+
+    MODES = ("auto", "zstd", "gzip", "none")
+
+    def __init__(self, dict_dir, mode="auto"):
+        self.dict_dir = dict_dir
+        self.mode = mode if mode in self.MODES else "auto"
+        self.dictionaries = DictionaryStore(dict_dir)
+        self.dictionary = None
+        self.compressors = {}
+        self.lock = threading.Lock()
+        self.training = None
+
+        if ZSTD_AVAILABLE:
+            self.dictionaries.load_all()
+            record = self.dictionaries.latest()
+            if record:
+                self.dictionary = find_dictionary(record['dict_id'])
+
+    # === 压缩方式 ===
+    def backup_method(self):
+        if self.mode in ("auto", "zstd") and ZSTD_AVAILABLE:
+            return "zstd"
+        if self.mode == "gzip" or self.mode == "zstd":
+            return "gzip"
+        return "none"
+
+    def archive_method(self):
+        if self.mode in ("auto", "zstd") and ZSTD_AVAILABLE:
+            return "zstd"
+        if self.mode == "none":
+            return "none"
+        return "gzip"
+
+    def path_for(self, path, method):
+        return path + METHOD_SUFFIXES.get(method, '')
+
+    # === 字典 ===
+    def ensure_dictionary(self, log_file):
+        """日志没有字典或比上次训练时增长一倍以上时重新训练"""
+        if not ZSTD_AVAILABLE or self.mode not in ("auto", "zstd"):
+            return None
+        if not self.dictionaries.needs_training(log_file):
+            return self.dictionaries.latest()
+        record = self.dictionaries.train(log_file)
+        if record:
+            with self.lock:
+                self.dictionary = find_dictionary(record['dict_id'])
+                self.compressors = {}
+        return record
+
+    def ensure_dictionary_async(self, log_file):
+        """后台训练字典，训练完成前照常不带字典压缩"""
+        if self.training is not None and self.training.is_alive():
+            return
+        if not ZSTD_AVAILABLE or not self.dictionaries.needs_training(log_file):
+            return
+        self.training = threading.Thread(target=self.ensure_dictionary, args=(log_file,), daemon=True)
+        self.training.start()
+
+    def compressor(self, level):
+        with self.lock:
+            compressor = self.compressors.get(level)
+            if compressor is None:
+                compressor = zstandard.ZstdCompressor(level=level, dict_data=self.dictionary) if self.dictionary \
+                    else zstandard.ZstdCompressor(level=level)
+                self.compressors[level] = compressor
+            return compressor
+
+    # === 写入 ===
+    def compress_bytes(self, data, method, level=BACKUP_LEVEL):
+        if method == "zstd":
+            return self.compressor(level).compress(data)
+        if method == "gzip":
+            return gzip.compress(data, compresslevel=6)
+        return data
+
+    def write_backup(self, path, parts):
+        """把若干字节块压缩写入 path（按压缩方式追加扩展名），返回实际路径"""
+        method = self.backup_method()
+        target = self.path_for(path, method)
+        data = self.compress_bytes(b''.join(parts), method)
+        temp_file = target + ".tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(data)
+        os.replace(temp_file, target)
+        return target
+
+    def compress_file(self, raw_path, level=ARCHIVE_LEVEL):
+        """流式压缩归档段，返回压缩文件路径（不压缩时返回原路径）"""
+        method = self.archive_method()
+        if method == "none":
+            return raw_path
+        target = self.path_for(raw_path, method)
+        with open(raw_path, 'rb') as src, open(target, 'wb') as dst:
+            if method == "zstd":
+                self.compressor(level).copy_stream(src, dst, size=os.fstat(src.fileno()).st_size)
+            else:
+                with gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=6) as out:
+                    shutil.copyfileobj(src, out, COPY_CHUNK_SIZE)
+        return target
+
+
+def main():
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="日志压缩字典")
+    parser.add_argument("log_file", help="日志文件路径")
+    parser.add_argument("action", nargs="?", default="info", choices=["info", "train", "cat"])
+    parser.add_argument("path", nargs="?", default="", help="cat：要解压输出的文件")
+    parser.add_argument("--dir", default="", help="字典目录（默认为日志目录下 backups/dictionaries）")
+    args = parser.parse_args()
+
+    dict_dir = args.dir or os.path.join(os.path.dirname(os.path.abspath(args.log_file)), "backups", DICTIONARY_DIR_NAME)
+    store = DictionaryStore(dict_dir)
+
+    if args.action == "train":
+        if not ZSTD_AVAILABLE:
+            print("❌ 训练字典需要安装 zstandard")
+            return 1
+        return 0 if store.train(args.log_file) else 1
+
+    if args.action == "cat":
+        store.load_all()
+        with open_compressed(args.path) as f:
+            shutil.copyfileobj(f, sys.stdout.buffer, COPY_CHUNK_SIZE)
+        return 0
+
+    print(f"zstandard: {'已安装' if ZSTD_AVAILABLE else '未安装'}")
+    for record in store.manifest['versions']:
+        print(f"  v{record['version']}  ID {record['dict_id']}  {record['dict_bytes']} 字节  "
+              f"{record['samples']} 个样本  训练于 {record['created'][:19]}")
+    if not store.manifest['versions']:
+        print("  还没有训练字典")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
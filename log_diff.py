@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志差异定位 - 用分块滚动哈希找出当前日志与备份/快照之间改动的区域
+
+auto_recover_log_file 原先直接用最新备份覆盖日志，用户不知道丢了什么、改了什么。本模块：
+1. 两侧按内容定义分块（与去重快照库相同的 gear 滚动哈希），快照一侧直接使用清单中的块列表
+2. 比较块摘要序列找出不一致的字节区域，整体耗时与文件大小成线性关系
+3. 只在不一致区域内（扩展到条目标题边界）解析条目，按标题配对得到新增、丢失、改动的条目
+4. 生成 Markdown 差异报告供日志阅读器显示
+5. 合并：一致区域原样保留，丢失的条目补回，新增的条目保留，改动的条目按 prefer 选择一侧
+
+命令行：python log_diff.py <日志文件> [备份文件|快照ID] [--merge 输出路径] [--prefer base|live] [--json]
+
+作者: Assistant
+创建时间: 2025-06-16
+项目: injection
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import difflib
+import hashlib
+
+from chunk_store import ChunkStore, iter_chunks
+from log_parser import parse_entries, parse_backup_header, HEADING_PATTERN
+from log_compression import open_compressed
+
+
+# 报告中每个条目最多显示的行数
+MAX_REPORT_LINES = 60
+
+
+class DiffSide:
+    """参与比较的一方：内容字节、块列表，以及在日志中的起始偏移（部分备份时非0）"""
+
+    def __init__(self, label, data, offset=0, chunks=None):
+        self.label = label
+        self.data = data
+        self.offset = offset
+        self.chunks = chunks
+
+    @classmethod
+    def from_file(cls, path, label=None):
+        with open(path, 'rb') as f:
+            return cls(label or os.path.basename(path), f.read())
+
+    @classmethod
+    def from_backup(cls, path, live_data=None):
+        """增量备份文件：只取正文；按字节计的备份使用头部起始位置，旧版备份按首个标题在当前日志中定位"""
+        with open_compressed(path) as f:
+            header = parse_backup_header(f)
+            f.seek(header['body_offset'] if header else 0)
+            data = f.read()
+
+        offset = 0
+        if header and header.get('unit') == '字节' and header.get('start') is not None:
+            offset = header['start']
+        elif header and header.get('start') and live_data is not None:
+            first_line = data.lstrip(b'\n').split(b'\n', 1)[0]
+            position = live_data.find(first_line) if HEADING_PATTERN.match(first_line) else -1
+            offset = max(position, 0)
+        return cls(os.path.basename(path), data, offset)
+
+    @classmethod
+    def from_snapshot(cls, store, log_name, snapshot_id):
+        """去重快照：块列表直接取自清单，不需要重新分块"""
+        chunks = [(chunk_digest, length) for chunk_digest, length in store.resolve_chunks(log_name, snapshot_id)]
+        data = b''.join(store.get_object(chunk_digest) for chunk_digest, _ in chunks)
+        return cls(f"快照 {snapshot_id}", data, 0, chunks)
+
+    def chunk_list(self):
+        if self.chunks is None:
+            data = self.data
+            self.chunks = [(hashlib.sha256(data[start:end]).hexdigest(), end - start)
+                           for start, end in iter_chunks(data)]
+        return self.chunks
+
+
+def is_heading_at(data, position):
+    if position != 0 and data[position - 1:position] != b'\n':
+        return False
+    line_end = data.find(b'\n', position)
+    line = data[position:line_end if line_end >= 0 else len(data)]
+    return HEADING_PATTERN.match(line) is not None
+
+
+def heading_before(data, position):
+    """position 处或之前最近的条目标题起点（没有时为0）"""
+    position = min(position, len(data))
+    if position < len(data) and is_heading_at(data, position):
+        return position
+    search_end = position
+    while True:
+        found = data.rfind(b'\n# ', 0, search_end)
+        if found < 0:
+            return 0
+        if is_heading_at(data, found + 1):
+            return found + 1
+        search_end = found
+
+
+def heading_after(data, position):
+    """position 处或之后最近的条目标题起点（没有时为末尾）"""
+    if position >= len(data):
+        return len(data)
+    if is_heading_at(data, position):
+        return position
+    search_start = position
+    while True:
+        found = data.find(b'\n# ', search_start)
+        if found < 0:
+            return len(data)
+        if is_heading_at(data, found + 1):
+            return found + 1
+        search_start = found + 1
+
+
+class LogDiffer:
+    """比较备份（base）与当前日志（live）"""
+
+    def __init__(self, base, live):
+        self.base = base
+        # 部分备份只与当前日志中对应起点之后的内容比较
+        if base.offset:
+            live = DiffSide(live.label, live.data[base.offset:], base.offset)
+        self.live = live
+        self.windows = []
+        self.matched_bytes = 0
+        self.compared = False
+
+    # === 块比较 ===
+    def changed_regions(self):
+        """比较两侧块摘要序列，返回 [(base起, base止, live起, live止)]（各自坐标）"""
+        base_chunks = self.base.chunk_list()
+        live_chunks = self.live.chunk_list()
+        base_bounds = self._bounds(base_chunks)
+        live_bounds = self._bounds(live_chunks)
+
+        matcher = difflib.SequenceMatcher(None, [digest for digest, _ in base_chunks],
+                                          [digest for digest, _ in live_chunks], autojunk=False)
+        regions = []
+        matched = 0
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                matched += base_bounds[i2] - base_bounds[i1]
+                continue
+            regions.append((base_bounds[i1], base_bounds[i2], live_bounds[j1], live_bounds[j2]))
+        self.matched_bytes = matched
+        return regions
+
+    @staticmethod
+    def _bounds(chunks):
+        bounds = [0]
+        for _, length in chunks:
+            bounds.append(bounds[-1] + length)
+        return bounds
+
+    def _windows(self, regions):
+        """把改动区域扩展到条目标题边界，并合并相互重叠的区域"""
+        windows = []
+        for base_start, base_end, live_start, live_end in regions:
+            window = [heading_before(self.base.data, base_start), heading_after(self.base.data, base_end),
+                      heading_before(self.live.data, live_start), heading_after(self.live.data, live_end)]
+            if windows and (window[0] <= windows[-1][1] or window[2] <= windows[-1][3]):
+                previous = windows[-1]
+                previous[1] = max(previous[1], window[1])
+                previous[3] = max(previous[3], window[3])
+            else:
+                windows.append(window)
+        return windows
+
+    # === 条目比较 ===
+    @staticmethod
+    def _entries(data, start, end):
+        entries = []
+        for entry in parse_entries(io.BytesIO(data), offset=start, end=end):
+            # 以标题行（时间、来源、项目）配对两侧的条目
+            line_end = data.find(b'\n', entry.start, entry.end)
+            entries.append({
+                'timestamp': entry.timestamp,
+                'kind': entry.kind,
+                'start': entry.start,
+                'end': entry.end,
+                'key': data[entry.start:line_end if line_end >= 0 else entry.end]
+            })
+        return entries
+
+    def compare(self):
+        """返回差异结果（可序列化为JSON）"""
+        started = time.perf_counter()
+        regions = self.changed_regions()
+        self.windows = []
+        changes = []
+        for base_start, base_end, live_start, live_end in self._windows(regions):
+            base_entries = self._entries(self.base.data, base_start, base_end)
+            live_entries = self._entries(self.live.data, live_start, live_end)
+            base_lead = (base_start, base_entries[0]['start'] if base_entries else base_end)
+            live_lead = (live_start, live_entries[0]['start'] if live_entries else live_end)
+
+            ops = difflib.SequenceMatcher(None, [entry['key'] for entry in base_entries],
+                                          [entry['key'] for entry in live_entries], autojunk=False).get_opcodes()
+            for tag, i1, i2, j1, j2 in ops:
+                if tag == 'equal':
+                    for base_entry, live_entry in zip(base_entries[i1:i2], live_entries[j1:j2]):
+                        base_body, _ = self._split_separator(self._text(self.base, base_entry))
+                        live_body, _ = self._split_separator(self._text(self.live, live_entry))
+                        if base_body != live_body:
+                            changes.append(self._change("modified", base_entry, live_entry))
+                    continue
+                for base_entry in base_entries[i1:i2]:
+                    changes.append(self._change("removed", base_entry, None))
+                for live_entry in live_entries[j1:j2]:
+                    changes.append(self._change("added", None, live_entry))
+
+            if self.base.data[slice(*base_lead)] != self.live.data[slice(*live_lead)]:
+                changes.append({'change': "preamble", 'timestamp': None,
+                                'base': list(base_lead), 'live': list(live_lead)})
+            self.windows.append({'base': (base_start, base_end), 'live': (live_start, live_end),
+                                 'base_lead': base_lead, 'live_lead': live_lead,
+                                 'base_entries': base_entries, 'live_entries': live_entries, 'ops': ops})
+
+        self.compared = True
+        counts = {}
+        for change in changes:
+            counts[change['change']] = counts.get(change['change'], 0) + 1
+        offset = self.live.offset
+        return {
+            'base': self.base.label,
+            'live': self.live.label,
+            'offset': offset,
+            'base_size': len(self.base.data),
+            'live_size': len(self.live.data),
+            'matched_bytes': self.matched_bytes,
+            'regions': [{'base': [base_start + offset, base_end + offset], 'live': [live_start + offset, live_end + offset]}
+                        for base_start, base_end, live_start, live_end in regions],
+            'counts': counts,
+            'changes': changes,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+
+    def _change(self, kind, base_entry, live_entry):
+        entry = base_entry or live_entry
+        offset = self.live.offset
+        return {
+            'change': kind,
+            'timestamp': entry['timestamp'],
+            'kind': entry['kind'],
+            'base': [base_entry['start'] + offset, base_entry['end'] + offset] if base_entry else None,
+            'live': [live_entry['start'] + offset, live_entry['end'] + offset] if live_entry else None,
+            'base_text': self._text(self.base, base_entry).decode('utf-8', errors='replace') if base_entry else '',
+            'live_text': self._text(self.live, live_entry).decode('utf-8', errors='replace') if live_entry else ''
+        }
+
+    @staticmethod
+    def _text(side, entry):
+        return side.data[entry['start']:entry['end']]
+
+    @staticmethod
+    def _split_separator(text):
+        """拆出条目末尾的换行分隔：备份的最后一个条目在当前日志中后面追加了新条目时，两侧只差这段分隔"""
+        body = text.rstrip(b'\r\n')
+        return body, text[len(body):]
+
+    # === 合并 ===
+    def merge(self, output_path, prefer="base", live_prefix=b''):
+        """写出合并结果：一致区域取当前日志，丢失条目补回，新增条目保留，改动条目取 prefer 一侧
+
+        live_prefix 为部分备份起点之前的当前日志内容（原样保留）。返回写入字节数。
+        output_path 是正在写入的日志时，需经 LogJournalWriter.run_exclusive 在句柄关闭期间调用。
+        """
+        if not self.compared:
+            self.compare()
+        live = self.live.data
+        base = self.base.data
+        temp_file = output_path + ".merge.tmp"
+        written = 0
+        with open(temp_file, 'wb') as out:
+            def emit(data):
+                nonlocal written
+                out.write(data)
+                written += len(data)
+
+            emit(live_prefix)
+            position = 0
+            for window in self.windows:
+                emit(live[position:window['live'][0]])
+                lead = live[slice(*window['live_lead'])] or base[slice(*window['base_lead'])]
+                emit(lead)
+                base_entries = window['base_entries']
+                live_entries = window['live_entries']
+                for tag, i1, i2, j1, j2 in window['ops']:
+                    if tag == 'equal':
+                        for base_entry, live_entry in zip(base_entries[i1:i2], live_entries[j1:j2]):
+                            live_text = live[live_entry['start']:live_entry['end']]
+                            if prefer != "base":
+                                emit(live_text)
+                                continue
+                            # 改动的条目取备份正文，分隔仍按当前日志（后面可能还有追加的条目）
+                            base_body, _ = self._split_separator(base[base_entry['start']:base_entry['end']])
+                            live_body, separator = self._split_separator(live_text)
+                            emit(live_text if base_body == live_body else base_body + separator)
+                        continue
+                    for entry in base_entries[i1:i2]:
+                        emit(self._terminated(base[entry['start']:entry['end']]))
+                    for entry in live_entries[j1:j2]:
+                        emit(live[entry['start']:entry['end']])
+                position = window['live'][1]
+            emit(live[position:])
+        os.replace(temp_file, output_path)
+        return written
+
+    @staticmethod
+    def _terminated(text):
+        """补回的条目后面还有其他条目时需要以换行结束"""
+        return text if text.endswith(b'\n') else text + b'\n'
+
+
+def diff_logs(base, live):
+    """比较两侧并返回 (LogDiffer, 差异结果)"""
+    differ = LogDiffer(base, live)
+    return differ, differ.compare()
+
+
+def merge_into_log(base, log_file, prefer="base", output_path=None):
+    """把备份/快照与日志合并，默认原地替换日志文件；返回差异结果（含 merged_size）"""
+    live = DiffSide.from_file(log_file, "当前日志")
+    differ, result = diff_logs(base, live)
+    live_prefix = live.data[:base.offset] if base.offset else b''
+    result['merged_size'] = differ.merge(output_path or log_file, prefer, live_prefix)
+    return result
+
+
+def render_markdown(result, max_lines=MAX_REPORT_LINES):
+    """把差异结果渲染为 Markdown 报告"""
+    counts = result['counts']
+    lines = [
+        f"# 🔍 日志差异：{result['live']} ↔ {result['base']}",
+        "",
+        f"- 当前日志 {result['live_size']} 字节，{result['base']} {result['base_size']} 字节"
+        + (f"（自日志第 {result['offset']} 字节起比较）" if result['offset'] else ""),
+        f"- 相同内容 {result['matched_bytes']} 字节，{len(result['regions'])} 个不一致区域，耗时 {result['elapsed_ms']}ms",
+        f"- 丢失 {counts.get('removed', 0)} 条，新增 {counts.get('added', 0)} 条，改动 {counts.get('modified', 0)} 条",
+        ""
+    ]
+    if not result['changes']:
+        lines.append("✅ 两侧内容一致")
+
+    titles = {
+        'removed': "➖ 丢失（备份中有，当前日志中没有）",
+        'added': "➕ 新增（只在当前日志中）",
+        'modified': "✏️ 改动",
+        'preamble': "✏️ 日志开头（首个条目之前）"
+    }
+    for change in result['changes']:
+        lines.append(f"## {titles[change['change']]} {change.get('timestamp') or ''}".rstrip())
+        lines.append("")
+        if change['change'] == 'preamble':
+            continue
+        base_lines = change['base_text'].splitlines()
+        live_lines = change['live_text'].splitlines()
+        if change['change'] == 'modified':
+            body = list(difflib.unified_diff(base_lines, live_lines, "备份", "当前日志", n=2, lineterm=""))
+        elif change['change'] == 'removed':
+            body = [f"- {line}" for line in base_lines]
+        else:
+            body = [f"+ {line}" for line in live_lines]
+        if len(body) > max_lines:
+            body = body[:max_lines] + [f"… 另有 {len(body) - max_lines} 行"]
+        lines.append("```diff")
+        lines.extend(body)
+        lines.append("```")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def main():
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="日志差异定位与合并")
+    parser.add_argument("log_file", help="日志文件路径")
+    parser.add_argument("source", nargs="?", default="", help="备份文件路径或快照ID（默认最新快照）")
+    parser.add_argument("--merge", default="", help="把合并结果写入该路径（传入日志路径则原地合并）")
+    parser.add_argument("--prefer", default="base", choices=["base", "live"], help="改动条目取哪一侧")
+    parser.add_argument("--json", action="store_true", help="以JSON输出")
+    args = parser.parse_args()
+
+    log_file = os.path.abspath(args.log_file)
+    live = DiffSide.from_file(log_file, "当前日志")
+    if args.source and os.path.exists(args.source):
+        base = DiffSide.from_backup(args.source, live.data)
+    else:
+        store = ChunkStore(os.path.join(os.path.dirname(log_file), "backups", "chunk-store"))
+        log_name = os.path.basename(log_file)
+        snapshot_id = args.source or (store.latest_snapshot(log_name)[0] or {}).get('id')
+        if not snapshot_id:
+            print("❌ 没有可比较的快照")
+            return 1
+        base = DiffSide.from_snapshot(store, log_name, snapshot_id)
+
+    if args.merge:
+        result = merge_into_log(base, log_file, args.prefer, os.path.abspath(args.merge))
+    else:
+        _, result = diff_logs(base, live)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(render_markdown(result))
+        if 'merged_size' in result:
+            print(f"🔀 已写出合并结果 {args.merge}（{result['merged_size']} 字节）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
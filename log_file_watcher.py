@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志文件监控器 - 基于文件系统事件的项目日志变化检测
+
+原实现用 QTimer 每2秒 os.path.getsize 一次，空闲时也不断唤醒，
+连续追加要等到下一次轮询才被发现，大小不变的原地改写则完全检测不到。
+本监控器：
+1. 通过 watchdog 监听日志所在目录的文件系统事件（与热重载管理器相同的依赖）
+2. 同一文件的一串事件在防抖窗口内合并为一次检查
+3. 用 (大小, 修改时间) 过滤无变化的事件，再用尾部指纹区分追加、截断和改写
+4. 只在真正发生变化时通过Qt信号通知UI线程
+5. 没有安装 watchdog 时退回低频轮询线程
+
+作者: Assistant
+创建时间: 2025-06-16
+项目: injection
+"""
+
+import os
+import hashlib
+import threading
+from PyQt5.QtCore import QObject, pyqtSignal
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+    WATCHDOG_AVAILABLE = False
+
+
+class LogFileWatcher(QObject):
+    """项目日志变化监控器"""
+
+    # 信号定义
+    log_changed = pyqtSignal(str, str, int, int)  # 日志路径, 变化类型, 原大小, 新大小
+
+    # 变化类型
+    CHANGE_APPEND = "append"
+    CHANGE_TRUNCATE = "truncate"
+    CHANGE_REWRITE = "rewrite"
+    CHANGE_CREATED = "created"
+    CHANGE_DELETED = "deleted"
+
+    TAIL_CHECK_SIZE = 256
+
+    def __init__(self, log_file, debounce=0.3, poll_interval=5.0, parent=None):
+        super().__init__(parent)
+        self.log_file = os.path.abspath(log_file)
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+
+        self.observer = None
+        self.poll_thread = None
+        self.stop_event = threading.Event()
+        self.debounce_timer = None
+        self.lock = threading.Lock()
+        self.is_watching = False
+
+        # 上次检查时的文件指纹
+        self.size = 0
+        self.mtime_ns = 0
+        self.tail_hash = ''
+        self.exists = False
+
+        # 统计信息
+        self.stats = {'events': 0, 'checks': 0, 'changes': 0}
+
+    def start(self):
+        """开始监控"""
+        if self.is_watching:
+            return
+        self.rebaseline()
+        self.stop_event.clear()
+
+        if WATCHDOG_AVAILABLE:
+            try:
+                self.observer = Observer()
+                self.observer.schedule(LogFileEventHandler(self), os.path.dirname(self.log_file), recursive=False)
+                self.observer.start()
+                self.is_watching = True
+                print(f"🔍 日志文件事件监控已启动：{os.path.basename(self.log_file)}")
+                return
+            except Exception as e:
+                print(f"⚠️ 启动文件事件监控失败，改用轮询：{e}")
+                self.observer = None
+
+        self.poll_thread = threading.Thread(target=self._poll_loop, name="LogFileWatcher", daemon=True)
+        self.poll_thread.start()
+        self.is_watching = True
+        print(f"🔍 日志文件轮询监控已启动（{self.poll_interval:.0f}秒）：{os.path.basename(self.log_file)}")
+
+    def stop(self):
+        """停止监控"""
+        if not self.is_watching:
+            return
+        self.stop_event.set()
+        with self.lock:
+            if self.debounce_timer:
+                self.debounce_timer.cancel()
+                self.debounce_timer = None
+        if self.observer:
+            try:
+                self.observer.stop()
+                self.observer.join(2.0)
+            except Exception as e:
+                print(f"⚠️ 停止文件事件监控失败：{e}")
+            self.observer = None
+        if self.poll_thread:
+            self.poll_thread.join(2.0)
+            self.poll_thread = None
+        self.is_watching = False
+        print(f"⏹️ 日志文件监控已停止：{os.path.basename(self.log_file)}")
+
+    # === 指纹 ===
+    def rebaseline(self):
+        """以文件当前状态为基准（应用自身的轮转、恢复等已知变化之后调用，避免误报）"""
+        with self.lock:
+            self._capture(*self._stat())
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.log_file)
+            return True, stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return False, 0, 0
+
+    def _hash_before(self, offset):
+        with open(self.log_file, 'rb') as f:
+            start = max(0, offset - self.TAIL_CHECK_SIZE)
+            f.seek(start)
+            return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+    def _capture(self, exists, size, mtime_ns):
+        self.exists = exists
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.tail_hash = self._hash_before(size) if exists and size else ''
+
+    # === 检查 ===
+    def notify_event(self):
+        """收到文件系统事件：重新开始防抖计时，连续事件只触发一次检查"""
+        self.stats['events'] += 1
+        with self.lock:
+            if self.stop_event.is_set():
+                return
+            if self.debounce_timer:
+                self.debounce_timer.cancel()
+            self.debounce_timer = threading.Timer(self.debounce, self.check)
+            self.debounce_timer.daemon = True
+            self.debounce_timer.start()
+
+    def check(self):
+        """比较文件指纹，发生变化时发出 log_changed 信号"""
+        with self.lock:
+            self.debounce_timer = None
+            self.stats['checks'] += 1
+            exists, size, mtime_ns = self._stat()
+
+            if exists == self.exists and size == self.size and mtime_ns == self.mtime_ns:
+                return None
+
+            old_size = self.size
+            try:
+                if not exists:
+                    change = self.CHANGE_DELETED
+                elif not self.exists:
+                    change = self.CHANGE_CREATED
+                elif size < old_size:
+                    change = self.CHANGE_TRUNCATE
+                elif old_size and self._hash_before(old_size) != self.tail_hash:
+                    change = self.CHANGE_REWRITE
+                elif size > old_size:
+                    change = self.CHANGE_APPEND
+                else:
+                    # 只有修改时间变化，尾部未变
+                    self.mtime_ns = mtime_ns
+                    return None
+                self._capture(exists, size, mtime_ns)
+            except OSError as e:
+                # 文件正被替换，留待下一次事件
+                print(f"⚠️ 读取日志指纹失败：{e}")
+                return None
+
+        self.stats['changes'] += 1
+        self.log_changed.emit(self.log_file, change, old_size, size)
+        return change
+
+    def _poll_loop(self):
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"⚠️ 日志轮询检查失败：{e}")
+
+
+class LogFileEventHandler(FileSystemEventHandler):
+    """只关心被监控日志文件本身的事件（含被替换、移动）"""
+
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+        self.target = os.path.normcase(watcher.log_file)
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        paths = [getattr(event, 'src_path', ''), getattr(event, 'dest_path', '')]
+        if any(path and os.path.normcase(os.path.abspath(path)) == self.target for path in paths):
+            self.watcher.notify_event()
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+项目日志条目索引 - SQLite 旁路索引
+
+为 {project}-log.md 维护一个条目索引（起始字节偏移、时间戳、条目类型、来源应用、项目），
+读取方可以直接 seek 到最近 N 条或某个时间段的条目，而不必扫描整个 Markdown。
+
+- 追加写入后调用 update() 只扫描新增字节
+- 文件被截断或尾部被改写（带外修改）时自动重建
+- 索引文件与日志同目录：.{日志文件名}.index.db
+- 条目标题识别由 log_parser.LogScanner 完成，代码块中的标题行不计为条目
+
+命令行：python log_index.py <日志文件> [stats|tail N|range 开始 结束|rebuild] [--json]
+
+作者: Assistant
+创建时间: 2025-06-15
+项目: injection
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+import threading
+
+from log_parser import LogScanner
+from log_segments import read_segment
+
+
+class LogIndex:
+    """项目日志条目索引"""
+
+    SCHEMA_VERSION = "3"
+    TAIL_CHECK_SIZE = 256
+
+    def __init__(self, log_file, index_path=None):
+        self.log_file = log_file
+        self.index_path = index_path or self.default_index_path(log_file)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        self.segment_cache = (None, b'')  # 最近读取的已封存段 (段名, 原始字节)
+        self._init_schema()
+
+    @staticmethod
+    def default_index_path(log_file):
+        log_dir = os.path.dirname(os.path.abspath(log_file))
+        return os.path.join(log_dir, f".{os.path.basename(log_file)}.index.db")
+
+    def _init_schema(self):
+        with self.lock, self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            upgrade = self._get_meta('version') != self.SCHEMA_VERSION
+            if upgrade:
+                self.conn.execute("DROP TABLE IF EXISTS entries")
+                self.conn.execute("DROP TABLE IF EXISTS segments")
+            # segment 为空表示条目位于热日志中，否则为已封存段的段名
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    seq INTEGER PRIMARY KEY,
+                    offset INTEGER NOT NULL,
+                    ts TEXT,
+                    kind TEXT,
+                    app TEXT,
+                    project TEXT,
+                    segment TEXT NOT NULL DEFAULT ''
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_ts ON entries(ts)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS segments (
+                    name TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    raw_bytes INTEGER NOT NULL
+                )
+            """)
+            if upgrade:
+                self._reset()
+                self._set_meta('version', self.SCHEMA_VERSION)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # === 元数据 ===
+    def _get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _reset(self):
+        """丢弃热日志部分的索引（已封存段不受影响）"""
+        self.conn.execute("DELETE FROM entries WHERE segment = ''")
+        self._set_meta('scan_offset', 0)
+        self._set_meta('tail_hash', '')
+        self._set_meta('in_fence', 0)
+        # 每次重建序号都会重新分配，依赖序号的旁路索引据此判断是否需要重建
+        self._set_meta('generation', int(self._get_meta('generation', 0)) + 1)
+
+    def _tail_hash(self, f, offset):
+        start = max(0, offset - self.TAIL_CHECK_SIZE)
+        f.seek(start)
+        return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+    # === 增量更新 ===
+    def update(self):
+        """同步索引到日志文件当前状态，返回新增条目数"""
+        with self.lock:
+            if not os.path.exists(self.log_file):
+                if int(self._get_meta('scan_offset', 0)):
+                    with self.conn:
+                        self._reset()
+                return 0
+
+            with open(self.log_file, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                scan_offset = int(self._get_meta('scan_offset', 0))
+
+                # 截断或尾部被改写：带外修改，整体重建
+                if size < scan_offset or (
+                        scan_offset and self._tail_hash(f, scan_offset) != self._get_meta('tail_hash', '')):
+                    print(f"🔁 日志发生带外修改，重建条目索引：{os.path.basename(self.log_file)}")
+                    with self.conn:
+                        self._reset()
+                    scan_offset = 0
+
+                if size == scan_offset:
+                    return 0
+
+                return self._scan(f, scan_offset)
+
+    def rebuild(self):
+        """丢弃现有索引并完整重建"""
+        with self.lock:
+            with self.conn:
+                self._reset()
+        return self.update()
+
+    def _scan(self, f, scan_offset):
+        """从 scan_offset 起扫描完整行，记录条目标题（代码块状态跨次扫描保存）"""
+        scanner = LogScanner(f, scan_offset, in_fence=scan_offset > 0 and self._get_meta('in_fence') == '1')
+        next_seq = (self.conn.execute("SELECT MAX(seq) FROM entries").fetchone()[0] or 0) + 1
+
+        rows = []
+        for heading in scanner.headings():
+            rows.append((next_seq,) + heading)
+            next_seq += 1
+
+        position = scanner.position
+        new_tail_hash = self._tail_hash(f, position) if position else ''
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO entries (seq, offset, ts, kind, app, project) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._set_meta('scan_offset', position)
+            self._set_meta('tail_hash', new_tail_hash)
+            self._set_meta('in_fence', 1 if scanner.in_fence else 0)
+        return len(rows)
+
+    def seal_hot_segment(self, name, path, raw_bytes):
+        """热日志已封存为段：把热日志条目标记到该段，索引从空热日志重新开始
+
+        调用方需持有 self.lock，并在调用前已 update() 到封存时的文件末尾。
+        序号保持不变，依赖序号的全文索引无需重建。
+        """
+        with self.lock:
+            with self.conn:
+                self.conn.execute("UPDATE entries SET segment = ? WHERE segment = ''", (name,))
+                self.conn.execute("INSERT OR REPLACE INTO segments (name, path, raw_bytes) VALUES (?, ?, ?)",
+                                  (name, path, raw_bytes))
+                self._set_meta('scan_offset', 0)
+                self._set_meta('tail_hash', '')
+                self._set_meta('in_fence', 0)
+            count, first_ts, last_ts = self.conn.execute(
+                "SELECT COUNT(*), MIN(ts), MAX(ts) FROM entries WHERE segment = ?", (name,)).fetchone()
+            return {'raw_bytes': raw_bytes, 'entries': count, 'first_ts': first_ts, 'last_ts': last_ts}
+
+    # === 查询 ===
+    ENTRY_COLUMNS = "seq, offset, ts, kind, app, project, segment"
+
+    def _rows_to_entries(self, rows):
+        """补全每个条目的结束偏移（同一段中下一个条目的起始偏移或段末尾）"""
+        entries = self._rows_to_entries_unlinked(rows)
+        for i, entry in enumerate(entries):
+            if i + 1 < len(entries) and entries[i + 1]['segment'] == entry['segment']:
+                entry['end'] = entries[i + 1]['offset']
+            else:
+                entry['end'] = self._next_offset(entry['seq'], entry['segment'])
+        return entries
+
+    @staticmethod
+    def _rows_to_entries_unlinked(rows):
+        return [{
+            'seq': seq,
+            'offset': offset,
+            'end': None,
+            'ts': ts,
+            'kind': kind,
+            'app': app,
+            'project': project,
+            'segment': segment
+        } for seq, offset, ts, kind, app, project, segment in rows]
+
+    def _next_offset(self, seq, segment=''):
+        row = self.conn.execute("SELECT offset, segment FROM entries WHERE seq = ?", (seq + 1,)).fetchone()
+        if row and row[1] == segment:
+            return row[0]
+        return self._segment_size(segment)
+
+    def _segment_size(self, segment):
+        if segment:
+            row = self.conn.execute("SELECT raw_bytes FROM segments WHERE name = ?", (segment,)).fetchone()
+            return row[0] if row else 0
+        return os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+
+    def generation(self):
+        """索引代数（每次重建加一）"""
+        with self.lock:
+            return int(self._get_meta('generation', 0))
+
+    def count(self):
+        with self.lock:
+            self.update()
+            return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def last_entries(self, n):
+        """最近 n 条条目（按时间顺序）"""
+        with self.lock:
+            self.update()
+            rows = self.conn.execute(
+                f"SELECT {self.ENTRY_COLUMNS} FROM entries ORDER BY seq DESC LIMIT ?", (n,)).fetchall()
+            return self._rows_to_entries(list(reversed(rows)))
+
+    def entries_range(self, first_seq, last_seq):
+        """序号区间 [first_seq, last_seq] 内的条目"""
+        with self.lock:
+            self.update()
+            rows = self.conn.execute(
+                f"SELECT {self.ENTRY_COLUMNS} FROM entries WHERE seq BETWEEN ? AND ? ORDER BY seq",
+                (first_seq, last_seq)).fetchall()
+            return self._rows_to_entries(rows)
+
+    def entries_between(self, start_ts, end_ts):
+        """时间段 [start_ts, end_ts] 内的条目，时间格式 YYYY-MM-DD HH:MM:SS（可只给前缀）"""
+        with self.lock:
+            self.update()
+            rows = self.conn.execute(
+                f"SELECT {self.ENTRY_COLUMNS} FROM entries WHERE ts >= ? AND ts <= ? ORDER BY seq",
+                (start_ts, end_ts + "\uffff")).fetchall()
+            return self._rows_to_entries(rows)
+
+    def entries_from_offset(self, offset):
+        """起始偏移不小于 offset 的条目（用于渲染新追加的内容）"""
+        with self.lock:
+            self.update()
+            rows = self.conn.execute(
+                f"SELECT {self.ENTRY_COLUMNS} FROM entries WHERE offset >= ? AND segment = '' ORDER BY seq",
+                (offset,)).fetchall()
+            return self._rows_to_entries(rows)
+
+    def entries_by_seq(self, seqs):
+        """按给定序号批量取条目（保持传入顺序，不存在的序号被跳过）"""
+        if not seqs:
+            return []
+        with self.lock:
+            placeholders = ",".join("?" * len(seqs))
+            rows = self.conn.execute(
+                f"SELECT {self.ENTRY_COLUMNS} FROM entries WHERE seq IN ({placeholders})", list(seqs)).fetchall()
+            next_rows = {seq - 1: (offset, segment) for seq, offset, segment in self.conn.execute(
+                f"SELECT seq, offset, segment FROM entries WHERE seq IN ({placeholders})",
+                [seq + 1 for seq in seqs]).fetchall()}
+
+            by_seq = {}
+            for entry in self._rows_to_entries_unlinked(rows):
+                following = next_rows.get(entry['seq'])
+                if following and following[1] == entry['segment']:
+                    entry['end'] = following[0]
+                else:
+                    entry['end'] = self._segment_size(entry['segment'])
+                by_seq[entry['seq']] = entry
+        return [by_seq[seq] for seq in seqs if seq in by_seq]
+
+    def entry(self, seq):
+        entries = self.entries_range(seq, seq)
+        return entries[0] if entries else None
+
+    def entry_at_time(self, timestamp):
+        """时间不晚于 timestamp 的最后一条条目"""
+        with self.lock:
+            self.update()
+            row = self.conn.execute(
+                "SELECT seq FROM entries WHERE ts <= ? ORDER BY ts DESC, seq DESC LIMIT 1",
+                (timestamp + "\uffff",)).fetchone()
+        return self.entry(row[0]) if row else None
+
+    def read_bytes(self, segment, start, end):
+        """读取热日志或已封存段中 [start, end) 的原始字节"""
+        if not segment:
+            with open(self.log_file, 'rb') as f:
+                f.seek(start)
+                return f.read(end - start)
+        return self._segment_data(segment)[start:end]
+
+    def _segment_data(self, segment):
+        """已封存段的原始字节（缓存最近一个段，分页和搜索通常集中访问同一段）"""
+        cached_name, cached_data = self.segment_cache
+        if cached_name == segment:
+            return cached_data
+        with self.lock:
+            row = self.conn.execute("SELECT path FROM segments WHERE name = ?", (segment,)).fetchone()
+        if not row:
+            return b''
+        data = read_segment(row[0])
+        self.segment_cache = (segment, data)
+        return data
+
+    @staticmethod
+    def group_by_segment(entries):
+        """把按序号排列的条目切分为同一段内的连续分组"""
+        groups = []
+        for entry in entries:
+            if groups and groups[-1][0]['segment'] == entry['segment']:
+                groups[-1].append(entry)
+            else:
+                groups.append([entry])
+        return groups
+
+    def read_entry(self, entry):
+        """按字节区间读取条目原文"""
+        return self.read_bytes(entry['segment'], entry['offset'], entry['end']).decode('utf-8', errors='replace')
+
+    def read_entries(self, entries):
+        """读取连续条目的原文（每段一次读取）"""
+        return "".join(
+            self.read_bytes(group[0]['segment'], group[0]['offset'], group[-1]['end']).decode('utf-8', errors='replace')
+            for group in self.group_by_segment(entries))
+
+    def stats(self):
+        """索引统计信息"""
+        with self.lock:
+            self.update()
+            total = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            by_kind = dict(self.conn.execute("SELECT kind, COUNT(*) FROM entries GROUP BY kind").fetchall())
+            first_ts, last_ts = self.conn.execute("SELECT MIN(ts), MAX(ts) FROM entries").fetchone()
+            segments = self.conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+            return {
+                'log_file': self.log_file,
+                'entries': total,
+                'by_kind': by_kind,
+                'first': first_ts,
+                'last': last_ts,
+                'segments': segments,
+                'indexed_bytes': int(self._get_meta('scan_offset', 0))
+            }
+
+
+def main():
+    """命令行入口（供 PowerShell 脚本等外部工具查询）"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="项目日志条目索引")
+    parser.add_argument("log_file", help="日志文件路径")
+    parser.add_argument("action", nargs="?", default="stats", choices=["stats", "tail", "range", "rebuild"])
+    parser.add_argument("args", nargs="*", help="tail: 条数; range: 开始时间 结束时间")
+    parser.add_argument("--json", action="store_true", help="以JSON输出")
+    args = parser.parse_args()
+
+    index = LogIndex(args.log_file)
+    try:
+        if args.action == "rebuild":
+            result = {'entries': index.rebuild()}
+        elif args.action == "tail":
+            result = index.last_entries(int(args.args[0]) if args.args else 10)
+        elif args.action == "range":
+            result = index.entries_between(args.args[0], args.args[1] if len(args.args) > 1 else args.args[0])
+        else:
+            result = index.stats()
+
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+        elif isinstance(result, list):
+            for entry in result:
+                print(f"#{entry['seq']:>6}  {entry['ts']}  [{entry['kind']}]  {entry['app']} - {entry['project']}")
+        else:
+            for key, value in result.items():
+                print(f"{key}: {value}")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
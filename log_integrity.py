@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+项目日志完整性哈希链 - 篡改检测只需哈希新增字节
+
+原完整性检查只比较文件大小（清零、缩小到10%以下），原地修改历史条目完全检测不到。
+本模块把日志按 64KiB 分块建立哈希链：
+1. 每个完整块的 sha256 作为叶子，链尖 tip_i = sha256(tip_{i-1} + 叶子_i)
+2. 未满一块的尾部单独记录长度和 sha256
+3. 快速校验：只读取原尾部和新增字节（外加轮流抽查一个历史块），验证通过后沿链追加
+4. 完整校验：逐块比对，精确指出被改动的块、字节区间和涉及的日志条目
+5. 链记录在备份目录中：{日志文件名}.integrity.json
+
+命令行：python log_integrity.py <日志文件> [verify|full|rebuild] [--dir 记录目录] [--json]
+
+作者: Assistant
+创建时间: 2025-06-16
+项目: injection
+"""
+
+import os
+import sys
+import json
+import hashlib
+import datetime
+import threading
+
+from log_parser import parse_entries
+
+
+class LogIntegrityChain:
+    """项目日志完整性哈希链"""
+
+    BLOCK_SIZE = 64 * 1024
+    VERSION = 1
+
+    # 校验结果
+    STATUS_OK = "ok"
+    STATUS_APPENDED = "appended"
+    STATUS_TAMPERED = "tampered"
+    STATUS_TRUNCATED = "truncated"
+    STATUS_MISSING = "missing"
+
+    def __init__(self, log_file, state_dir):
+        self.log_file = log_file
+        self.state_path = os.path.join(state_dir, f"{os.path.basename(log_file)}.integrity.json")
+        self.lock = threading.Lock()
+        self.state = self.load_state()
+
+    # === 链记录 ===
+    def empty_state(self):
+        return {
+            'version': self.VERSION,
+            'block_size': self.BLOCK_SIZE,
+            'size': 0,
+            'leaves': [],
+            'tip': '',
+            'tail_hash': hashlib.sha256(b'').hexdigest(),
+            'audit_cursor': 0,
+            'incidents': [],
+            'updated': None
+        }
+
+    def load_state(self):
+        try:
+            if os.path.exists(self.state_path):
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                if state.get('version') == self.VERSION and state.get('block_size') == self.BLOCK_SIZE:
+                    return state
+        except Exception as e:
+            print(f"⚠️ 读取日志完整性记录失败：{e}")
+        return None
+
+    def save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        self.state['updated'] = datetime.datetime.now().isoformat()
+        temp_file = self.state_path + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(temp_file, self.state_path)
+
+    @staticmethod
+    def chain(tip, leaf):
+        return hashlib.sha256(bytes.fromhex(tip) + bytes.fromhex(leaf)).hexdigest()
+
+    def sealed_size(self):
+        return len(self.state['leaves']) * self.BLOCK_SIZE
+
+    def _extend(self, data):
+        """把 data（从已封存块末尾开始的字节）计入链中"""
+        leaves = self.state['leaves']
+        tip = self.state['tip'] or hashlib.sha256(b'').hexdigest()
+        view = memoryview(data)
+        position = 0
+        while len(data) - position >= self.BLOCK_SIZE:
+            leaf = hashlib.sha256(view[position:position + self.BLOCK_SIZE]).hexdigest()
+            leaves.append(leaf)
+            tip = self.chain(tip, leaf)
+            position += self.BLOCK_SIZE
+        self.state['tip'] = tip
+        self.state['tail_hash'] = hashlib.sha256(view[position:]).hexdigest()
+        self.state['size'] = self.sealed_size() + len(data) - position
+
+    def rebuild(self):
+        """以日志当前内容重建哈希链（日志轮转、从备份恢复等已知变化之后调用）"""
+        with self.lock:
+            self._rebuild()
+            return self.state['size']
+
+    def _rebuild(self):
+        incidents = self.state['incidents'] if self.state else []
+        self.state = self.empty_state()
+        self.state['incidents'] = incidents
+        if os.path.exists(self.log_file):
+            with open(self.log_file, 'rb') as f:
+                # 逐块读入，只有最后一块可能不满，成为尾部
+                for block in iter(lambda: f.read(self.BLOCK_SIZE), b''):
+                    self._extend(block)
+        self.save_state()
+
+    # === 快速校验 ===
+    def verify(self, update=True):
+        """快速校验：只哈希原尾部、新增字节和一个抽查块
+
+        返回 {'status', 'size', 'appended', 'hashed_bytes', 'blocks'}；
+        update 为 True 时校验通过即把新增字节计入链中。
+        """
+        with self.lock:
+            if self.state is None:
+                self._rebuild()
+                return self._result(self.STATUS_OK, self.state['size'], 0, self.state['size'])
+
+            if not os.path.exists(self.log_file):
+                return self._result(self.STATUS_MISSING, 0, 0, 0)
+
+            with open(self.log_file, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                covered = self.state['size']
+                if size < covered:
+                    return self._result(self.STATUS_TRUNCATED, size, size - covered, 0)
+
+                sealed = self.sealed_size()
+                f.seek(sealed)
+                data = f.read(size - sealed)
+                hashed = len(data)
+
+                tail_length = covered - sealed
+                if hashlib.sha256(data[:tail_length]).hexdigest() != self.state['tail_hash']:
+                    block = len(self.state['leaves'])
+                    return self._result(self.STATUS_TAMPERED, size, size - covered, hashed, [block])
+
+                # 轮流抽查一个历史块，长期运行下整个文件都会被复核
+                leaves = self.state['leaves']
+                if leaves:
+                    cursor = self.state.get('audit_cursor', 0) % len(leaves)
+                    f.seek(cursor * self.BLOCK_SIZE)
+                    if hashlib.sha256(f.read(self.BLOCK_SIZE)).hexdigest() != leaves[cursor]:
+                        return self._result(self.STATUS_TAMPERED, size, size - covered, hashed + self.BLOCK_SIZE, [cursor])
+                    self.state['audit_cursor'] = cursor + 1
+                    hashed += self.BLOCK_SIZE
+
+            appended = size - covered
+            if update and appended:
+                self._extend(data)
+                self.save_state()
+            return self._result(self.STATUS_APPENDED if appended else self.STATUS_OK, size, appended, hashed)
+
+    @staticmethod
+    def _result(status, size, appended, hashed_bytes, blocks=None):
+        return {'status': status, 'size': size, 'appended': appended, 'hashed_bytes': hashed_bytes, 'blocks': blocks or []}
+
+    # === 完整校验 ===
+    def verify_full(self):
+        """逐块比对整条链，返回被改动的块及其字节区间和涉及的条目"""
+        with self.lock:
+            if self.state is None or not os.path.exists(self.log_file):
+                return {'status': self.STATUS_MISSING, 'altered': [], 'size': 0, 'covered': 0}
+            report = self._compare(self.log_file)
+
+        if report['altered']:
+            self._attach_entries(report['altered'])
+        return report
+
+    def verify_file(self, path):
+        """校验另一个文件（如从备份重建的日志）是否与哈希链记录的内容一致
+
+        文件比记录短时只比对其包含的完整块，结果为 truncated；任何块不一致为 tampered。
+        """
+        with self.lock:
+            if self.state is None:
+                return {'status': self.STATUS_MISSING, 'altered': [], 'size': 0, 'covered': 0}
+            return self._compare(path)
+
+    def _compare(self, path):
+        altered = []
+        leaves = self.state['leaves']
+        covered = self.state['size']
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            for index, leaf in enumerate(leaves):
+                start = index * self.BLOCK_SIZE
+                if start + self.BLOCK_SIZE > size:
+                    break
+                if hashlib.sha256(f.read(self.BLOCK_SIZE)).hexdigest() != leaf:
+                    altered.append({'block': index, 'start': start, 'end': start + self.BLOCK_SIZE, 'entries': []})
+            if size >= covered:
+                f.seek(self.sealed_size())
+                if hashlib.sha256(f.read(covered - self.sealed_size())).hexdigest() != self.state['tail_hash']:
+                    altered.append({'block': len(leaves), 'start': self.sealed_size(), 'end': covered, 'entries': []})
+
+        tip = hashlib.sha256(b'').hexdigest()
+        for leaf in leaves:
+            tip = self.chain(tip, leaf)
+        if leaves and tip != self.state['tip']:
+            print("⚠️ 完整性记录中的叶子与链尖不一致，记录本身可能被修改")
+
+        if altered:
+            status = self.STATUS_TAMPERED
+        elif size < covered:
+            status = self.STATUS_TRUNCATED
+        else:
+            status = self.STATUS_OK
+        return {'status': status, 'altered': altered, 'size': size, 'covered': covered}
+
+    def _attach_entries(self, altered):
+        """标注每个被改动块覆盖的日志条目（序号、时间戳）"""
+        try:
+            for entry in parse_entries(self.log_file):
+                for block in altered:
+                    if entry.start < block['end'] and entry.end > block['start']:
+                        block['entries'].append({'seq': entry.seq, 'timestamp': entry.timestamp, 'kind': entry.kind})
+        except Exception as e:
+            print(f"⚠️ 定位被改动条目失败：{e}")
+
+    # === 事件 ===
+    def record_incident(self, result):
+        """记录一次篡改事件，并以当前内容为新基准（证据由快照库保留）"""
+        with self.lock:
+            incidents = self.state['incidents'] if self.state else []
+            incidents.append({
+                'detected': datetime.datetime.now().isoformat(),
+                'status': result['status'],
+                'blocks': [block['block'] if isinstance(block, dict) else block
+                           for block in result.get('altered', result.get('blocks', []))],
+                'tip_before': self.state['tip'] if self.state else ''
+            })
+            self.state = self.state or self.empty_state()
+            self.state['incidents'] = incidents[-100:]
+            self._rebuild()
+
+
+def main():
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="项目日志完整性哈希链")
+    parser.add_argument("log_file", help="日志文件路径")
+    parser.add_argument("action", nargs="?", default="verify", choices=["verify", "full", "rebuild"])
+    parser.add_argument("--dir", default="", help="完整性记录目录（默认为日志目录下 backups）")
+    parser.add_argument("--json", action="store_true", help="以JSON输出")
+    args = parser.parse_args()
+
+    state_dir = args.dir or os.path.join(os.path.dirname(os.path.abspath(args.log_file)), "backups")
+    integrity = LogIntegrityChain(args.log_file, state_dir)
+
+    if args.action == "verify":
+        result = integrity.verify(update=True)
+    elif args.action == "full":
+        result = integrity.verify_full()
+    else:
+        result = {'status': "rebuilt", 'size': integrity.rebuild()}
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(f"状态: {result['status']}  大小: {result['size']}")
+        for block in result.get('altered', []):
+            entries = ', '.join(f"#{entry['seq']} {entry['timestamp']}" for entry in block['entries'])
+            print(f"  块 {block['block']} [{block['start']}, {block['end']}) 被改动  {entries}")
+    return 0 if result['status'] in ("ok", "appended", "rebuilt") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志写入服务 - 后台线程统一负责项目日志追加
+
+原实现中注入、笔记、Cascade捕获、工作总结各自在UI线程打开日志文件追加，
+随后同步执行完整性检查和双重备份，大日志下UI会卡顿数百毫秒。
+本服务：
+1. 独占持有日志文件句柄，从有界队列中取条目
+2. 批量合并写入，每批只做一次 fsync（group commit）
+3. 完整性检查与备份通过钩子在后台线程执行
+4. 通过Qt信号把提交结果通知回UI线程
+5. 热日志达到轮转阈值时在批次之间封存为分段（见 log_segments.py）
+6. 恢复、合并等需要替换日志文件的操作经 run_exclusive 在写入线程中执行：
+   暂停追加并关闭文件句柄，替换完成后下一批再重新打开（Windows 上不能替换被打开的文件）；
+   不需要等待结果的后台处理（如外部改动后的备份）用 submit_task 排队
+
+作者: Assistant
+创建时间: 2025-06-14
+项目: injection
+"""
+
+import os
+import time
+import queue
+import threading
+import datetime
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class _ExclusiveTask:
+    """在写入线程中、日志句柄关闭期间执行的操作"""
+
+    def __init__(self, func, waited=True):
+        self.func = func
+        self.waited = waited  # 调用方是否等待结果（否则异常只打印）
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class LogJournalWriter(QObject):
+    """项目日志后台写入器"""
+
+    # 信号定义
+    entries_committed = pyqtSignal(str, list)  # 日志路径, 已提交条目列表
+    commit_failed = pyqtSignal(str, list, str)  # 日志路径, 失败条目列表, 错误信息
+    segment_rotated = pyqtSignal(str, dict)  # 日志路径, 新封存段的清单记录
+
+    _STOP = object()
+
+    def __init__(self, log_file, max_queue=256, batch_size=64,
+                 before_commit=None, after_commit=None, segment_manager=None, after_rotate=None, parent=None):
+        super().__init__(parent)
+        self.log_file = log_file
+        self.batch_size = batch_size
+
+        # 钩子在后台线程执行：before_commit(log_file, batch), after_commit(log_file, batch, start, end)
+        self.before_commit = before_commit
+        self.after_commit = after_commit
+
+        # 日志分段轮转：after_rotate(log_file, segment) 同样在后台线程执行
+        self.segment_manager = segment_manager
+        self.after_rotate = after_rotate
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = None
+        self.handle = None
+        self.is_running = False
+        self.sequence = 0
+        self.sequence_lock = threading.Lock()
+        # 本服务最近一次写入（或替换、轮转）后的日志大小，文件监控据此忽略本应用自己的追加
+        self.committed_size = 0
+
+        # 统计信息
+        self.stats = {
+            'batches': 0,
+            'entries': 0,
+            'bytes': 0,
+            'last_commit_ms': 0.0
+        }
+
+    def start(self):
+        """启动后台写入线程"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, name="LogJournalWriter", daemon=True)
+        self.thread.start()
+        print(f"📝 日志写入服务已启动：{os.path.basename(self.log_file)}")
+
+    def stop(self, timeout=5.0):
+        """停止写入线程，等待队列中的条目全部落盘"""
+        if not self.is_running:
+            return
+        self.queue.put(self._STOP)
+        if self.thread:
+            self.thread.join(timeout)
+        self.is_running = False
+        self.thread = None
+        print(f"📝 日志写入服务已停止：{os.path.basename(self.log_file)}")
+
+    def submit(self, text, kind="injection", meta=None, timeout=2.0):
+        """提交一条日志条目，返回条目ID；队列已满超时返回None"""
+        if not self.is_running:
+            self.start()
+
+        with self.sequence_lock:
+            self.sequence += 1
+            entry_id = f"{int(time.time() * 1000)}-{self.sequence}"
+
+        entry = {
+            'id': entry_id,
+            'kind': kind,
+            'text': text,
+            'meta': meta or {},
+            'submitted': datetime.datetime.now().isoformat()
+        }
+        try:
+            self.queue.put(entry, timeout=timeout)
+            return entry_id
+        except queue.Full:
+            print(f"⚠️ 日志写入队列已满，条目被拒绝：{kind}")
+            return None
+
+    def run_exclusive(self, func, timeout=60.0):
+        """在写入线程中执行 func 并返回其结果，执行期间没有追加且日志文件句柄已关闭
+
+        用于恢复、合并等会替换日志文件的操作；在写入线程内（如 before_commit 钩子）调用时直接执行。
+        """
+        if threading.current_thread() is self.thread:
+            self._close_handle()
+            return func()
+        if not self.is_running:
+            self.start()
+
+        task = _ExclusiveTask(func)
+        try:
+            self.queue.put(task, timeout=timeout)
+        except queue.Full:
+            raise TimeoutError("日志写入队列已满，无法执行日志替换操作")
+        if not task.done.wait(timeout):
+            raise TimeoutError("等待日志写入服务执行日志替换操作超时")
+        if task.error is not None:
+            raise task.error
+        return task.result
+
+    def submit_task(self, func, timeout=2.0):
+        """把 func 排入写入线程执行（与 run_exclusive 相同的条件），不等待结果；队列已满超时返回 False
+
+        func 的结果和异常不返回给调用方，需要通知UI线程时由 func 自己发出信号。
+        """
+        if not self.is_running:
+            self.start()
+        task = _ExclusiveTask(func, waited=False)
+        try:
+            self.queue.put(task, timeout=timeout)
+            return True
+        except queue.Full:
+            print("⚠️ 日志写入队列已满，后台任务被拒绝")
+            return False
+
+    def flush(self, timeout=5.0):
+        """等待当前队列中的条目全部处理完成"""
+        deadline = time.time() + timeout
+        while self.queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+        return self.queue.unfinished_tasks == 0
+
+    # === 后台线程 ===
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            batch = []
+            exclusive = None
+            if item is self._STOP:
+                stopping = True
+            elif isinstance(item, _ExclusiveTask):
+                exclusive = item
+            else:
+                batch.append(item)
+
+            # 合并当前已排队的条目（遇到独占操作时先提交已取出的条目）
+            while exclusive is None and not stopping and len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                if isinstance(item, _ExclusiveTask):
+                    exclusive = item
+                    break
+                batch.append(item)
+
+            if batch:
+                self._commit(batch)
+            if exclusive is not None:
+                self._run_exclusive(exclusive)
+
+            # 标记本轮取出的所有队列项（含停止标记和独占操作）已完成
+            for _ in range(len(batch) + (1 if stopping else 0) + (1 if exclusive is not None else 0)):
+                self.queue.task_done()
+
+        self._close_handle()
+
+    def _run_exclusive(self, task):
+        """关闭句柄后执行独占操作，下一批写入时 _ensure_handle 重新打开（可能已是新文件）"""
+        self._close_handle()
+        try:
+            task.result = task.func()
+        except Exception as e:
+            task.error = e
+            if not task.waited:
+                print(f"⚠️ 日志后台任务失败：{e}")
+        finally:
+            self.committed_size = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+            task.done.set()
+
+    def _commit(self, batch):
+        started = time.perf_counter()
+        try:
+            if self.before_commit:
+                try:
+                    self.before_commit(self.log_file, batch)
+                except Exception as e:
+                    print(f"⚠️ 日志写入前检查失败：{e}")
+
+            handle = self._ensure_handle()
+            start_offset = handle.tell()
+            payload = "".join(entry['text'] for entry in batch).encode('utf-8')
+            handle.write(payload)
+            handle.flush()
+            os.fsync(handle.fileno())
+            end_offset = start_offset + len(payload)
+            self.committed_size = end_offset
+
+            self.stats['batches'] += 1
+            self.stats['entries'] += len(batch)
+            self.stats['bytes'] += len(payload)
+            self.stats['last_commit_ms'] = (time.perf_counter() - started) * 1000
+
+            for entry in batch:
+                entry['committed'] = datetime.datetime.now().isoformat()
+
+            if self.after_commit:
+                try:
+                    self.after_commit(self.log_file, batch, start_offset, end_offset)
+                except Exception as e:
+                    print(f"⚠️ 日志写入后处理失败：{e}")
+
+            self.entries_committed.emit(self.log_file, batch)
+
+        except Exception as e:
+            print(f"❌ 日志批量写入失败：{e}")
+            self._close_handle()
+            self.commit_failed.emit(self.log_file, batch, str(e))
+            return
+
+        self._rotate_if_needed(end_offset)
+
+    def _rotate_if_needed(self, size):
+        """批次之间检查轮转阈值，此时没有未完成的写入"""
+        if not self.segment_manager or not self.segment_manager.should_rotate(size):
+            return
+        try:
+            self._close_handle()
+            segment = self.segment_manager.rotate()
+            if not segment:
+                return
+            self.committed_size = 0
+            if self.after_rotate:
+                try:
+                    self.after_rotate(self.log_file, segment)
+                except Exception as e:
+                    print(f"⚠️ 日志轮转后处理失败：{e}")
+            self.segment_rotated.emit(self.log_file, segment)
+        except Exception as e:
+            print(f"❌ 日志分段轮转失败：{e}")
+
+    def _ensure_handle(self):
+        """确保持有的文件句柄仍指向当前日志文件（恢复/替换后需重新打开）"""
+        if self.handle is not None:
+            try:
+                current = os.stat(self.log_file)
+                opened = os.fstat(self.handle.fileno())
+                if (current.st_ino, current.st_dev) != (opened.st_ino, opened.st_dev):
+                    self._close_handle()
+            except OSError:
+                self._close_handle()
+
+        if self.handle is None:
+            log_dir = os.path.dirname(self.log_file)
+            if log_dir:
+                os.makedirs(log_dir, exist_ok=True)
+            self.handle = open(self.log_file, 'ab')
+        self.handle.seek(0, os.SEEK_END)
+        return self.handle
+
+    def _close_handle(self):
+        if self.handle is not None:
+            try:
+                self.handle.close()
+            except Exception:
+                pass
+            self.handle = None
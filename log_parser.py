@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+项目日志流式解析器 - 所有日志消费方共用的条目解析
+
+日志结构原先分散在多处各自解析（条目索引、MD阅读器、增量备份恢复按 "---\\n\\n" 切分、
+PowerShell 总结脚本逐行读取）。本模块统一提供：
+1. LogScanner：逐行扫描字节流，识别条目标题（代码块中的标题行不算），只消费完整的行
+2. parse_entries：生成器，逐条产出 LogEntry（__slots__ 紧凑记录），内存占用与文件大小无关
+3. 增量备份文件头解析与备份链遍历，条目字节区间换算回原日志偏移
+
+命令行：python log_parser.py <日志或备份文件...> [entries|stats] [--backup] [--since 时间] [--kind 类型] [--json]
+
+作者: Assistant
+创建时间: 2025-06-16
+项目: injection
+"""
+
+import os
+import re
+import sys
+import json
+
+from log_compression import open_compressed
+
+
+# 条目标题: "# 2025-06-14 10:20:30 (Cursor - 项目：injection)"
+HEADING_PATTERN = re.compile(
+    rb'^# (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) \((.*) - ' + '项目：'.encode('utf-8') + rb'(.*)\)\s*$'
+)
+
+# 条目内的输入/输出小节: "## 📥 输入" / "## 📤 输出：" 等
+SECTION_PATTERN = re.compile(r'^##\s*(?:📥\s*)?输入[：:]?\s*$|^##\s*(?:📤\s*)?输出[：:]?\s*$', re.M)
+
+FENCE_MARKER = b'```'
+UTF8_BOM = b'\xef\xbb\xbf'
+
+# 增量备份文件头中的字段
+BACKUP_HEADER_FIELDS = {
+    '备份时间': 'backup_time',
+    '备份类型': 'backup_type',
+    '备份模式': 'mode',
+    '起始位置': 'start',
+    '结束位置': 'end',
+    '位置单位': 'unit',
+    '项目名称': 'project',
+}
+
+
+def classify_entry(source):
+    """根据标题中的来源部分判断条目类型"""
+    if source.startswith("📝"):
+        return "note"
+    if source.startswith("从Cascade获取"):
+        return "cascade"
+    return "injection"
+
+
+def parse_heading(line):
+    """解析条目标题行（bytes），返回 (时间戳, 类型, 来源应用, 项目) 或 None"""
+    if not line.startswith(b'# '):
+        return None
+    match = HEADING_PATTERN.match(line.rstrip(b'\r\n'))
+    if not match:
+        return None
+    timestamp, source, project = (part.decode('utf-8', errors='replace') for part in match.groups())
+    return timestamp, classify_entry(source), source, project
+
+
+def toggles_fence(line):
+    """该行是否打开或关闭代码块（单行 ```code``` 不算）"""
+    stripped = line.strip()
+    return stripped.startswith(FENCE_MARKER) and FENCE_MARKER not in stripped[3:].lstrip(b'`')
+
+
+class LogEntry:
+    """日志条目（紧凑记录）"""
+
+    __slots__ = ('seq', 'timestamp', 'app', 'project', 'kind', 'input_text', 'output_text', 'start', 'end')
+
+    def __init__(self, seq, timestamp, app, project, kind, input_text, output_text, start, end):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.app = app
+        self.project = project
+        self.kind = kind
+        self.input_text = input_text
+        self.output_text = output_text
+        self.start = start
+        self.end = end
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"LogEntry(#{self.seq} {self.timestamp} {self.kind} {self.app} [{self.start}, {self.end}))"
+
+
+class LogScanner:
+    """逐行扫描日志字节流
+
+    position 为已消费的完整行之后的偏移；in_fence 为扫描结束时是否处于代码块中，
+    两者可以保存下来供下次从断点继续扫描。
+    """
+
+    def __init__(self, f, offset=0, in_fence=False, complete_lines_only=True):
+        self.f = f
+        self.position = offset
+        self.in_fence = in_fence
+        self.complete_lines_only = complete_lines_only
+
+    def lines(self):
+        """产出 (行起始偏移, 行, 标题解析结果或None)"""
+        self.f.seek(self.position)
+        for line in self.f:
+            if self.complete_lines_only and not line.endswith(b'\n'):
+                break  # 未写完的行留待下次扫描
+            line_offset = self.position
+            heading = None
+            if self.in_fence:
+                if toggles_fence(line):
+                    self.in_fence = False
+            elif toggles_fence(line):
+                self.in_fence = True
+            elif line.startswith(b'# ') or (line_offset == 0 and line.startswith(UTF8_BOM)):
+                if line_offset == 0 and line.startswith(UTF8_BOM):
+                    heading = parse_heading(line[len(UTF8_BOM):])
+                    line_offset = len(UTF8_BOM)
+                else:
+                    heading = parse_heading(line)
+            self.position += len(line)
+            yield line_offset, line, heading
+
+    def headings(self):
+        """只产出条目标题 (偏移, 时间戳, 类型, 来源应用, 项目)"""
+        for line_offset, _, heading in self.lines():
+            if heading:
+                yield (line_offset,) + heading
+
+
+def split_sections(body):
+    """把条目正文拆分为 (输入, 输出)；没有小节标记时整段作为输入"""
+    sections = list(SECTION_PATTERN.finditer(body))
+    if not sections:
+        return body.strip(), ''
+
+    input_text = ''
+    output_text = ''
+    for i, match in enumerate(sections):
+        content_end = sections[i + 1].start() if i + 1 < len(sections) else len(body)
+        content = body[match.end():content_end].strip()
+        if '输出' in match.group():
+            output_text = content
+        else:
+            input_text = content
+    return input_text, output_text
+
+
+def _open_source(source):
+    if isinstance(source, (str, bytes, os.PathLike)):
+        return open(source, 'rb'), True
+    return source, False
+
+
+def parse_entries(source, offset=0, end=None, first_seq=1, base_offset=0):
+    """流式解析日志，逐条产出 LogEntry
+
+    source: 文件路径或二进制文件对象
+    offset/end: 解析的字节区间（end 为 None 表示到文件末尾）
+    first_seq: 第一个条目的序号
+    base_offset: 产出的字节区间加上的偏移（解析备份文件时换算回原日志偏移）
+    首个条目标题之前的内容不构成条目，被跳过。
+    """
+    f, owned = _open_source(source)
+    try:
+        scanner = LogScanner(f, offset, complete_lines_only=False)
+        seq = first_seq
+        current = None
+        body = []
+
+        def finish(entry_end):
+            input_text, output_text = split_sections(b''.join(body).decode('utf-8', errors='replace'))
+            start, timestamp, kind, app, project = current
+            return LogEntry(seq, timestamp, app, project, kind, input_text, output_text,
+                            start + base_offset, entry_end + base_offset)
+
+        for line_offset, line, heading in scanner.lines():
+            if end is not None and line_offset >= end:
+                break
+            if heading:
+                if current:
+                    yield finish(line_offset)
+                    seq += 1
+                current = (line_offset,) + heading
+                body = []
+            elif current:
+                body.append(line)
+
+        if current:
+            yield finish(min(scanner.position, end) if end is not None else scanner.position)
+    finally:
+        if owned:
+            f.close()
+
+
+# === 增量备份 ===
+def parse_backup_header(f):
+    """解析增量备份文件头，返回字段字典（含正文起始偏移 body_offset）；不是备份文件时返回None
+
+    头部以 "# 增量日志备份" 开始，到第一个 "---" 行及其后的空行结束。
+    旧版备份没有 "位置单位" 字段，位置按字符计。
+    """
+    f.seek(0)
+    first = f.readline()
+    if not first.lstrip(UTF8_BOM).startswith('# 增量日志备份'.encode('utf-8')):
+        return None
+
+    header = {'unit': '字符'}
+    position = len(first)
+    for line in f:
+        position += len(line)
+        text = line.decode('utf-8', errors='replace').strip()
+        if text == '---':
+            # 分隔线后的一个空行也属于头部
+            following = f.readline()
+            if following.strip() == b'':
+                position += len(following)
+            break
+        if text.startswith('- ') and ':' in text:
+            key, value = text[2:].split(':', 1)
+            field = BACKUP_HEADER_FIELDS.get(key.strip())
+            if field:
+                header[field] = value.strip()
+
+    for field in ('start', 'end'):
+        if field in header:
+            try:
+                header[field] = int(header[field])
+            except ValueError:
+                header[field] = None
+    header['body_offset'] = position
+    return header
+
+
+def copy_backup_body(path, out, chunk_size=1024 * 1024):
+    """把备份文件正文（跳过头部）流式写入 out，返回写入字节数"""
+    with open_compressed(path) as f:
+        header = parse_backup_header(f)
+        f.seek(header['body_offset'] if header else 0)
+        copied = 0
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            out.write(chunk)
+            copied += len(chunk)
+        return copied
+
+
+def parse_backup_entries(path, first_seq=1):
+    """解析单个增量备份文件中的条目
+
+    按字节记录位置的备份，条目区间换算为原日志中的字节偏移；
+    旧版按字符记录的备份无法换算，区间为备份正文内的相对偏移。
+    """
+    with open_compressed(path) as f:
+        header = parse_backup_header(f)
+        body_offset = header['body_offset'] if header else 0
+        base_offset = -body_offset
+        if header and header.get('unit') == '字节' and header.get('start') is not None:
+            base_offset = header['start'] - body_offset
+        yield from parse_entries(f, offset=body_offset, first_seq=first_seq, base_offset=base_offset)
+
+
+def iter_backup_chain(paths):
+    """按给定顺序依次解析一组增量备份文件，序号连续"""
+    seq = 1
+    for path in paths:
+        for entry in parse_backup_entries(path, first_seq=seq):
+            seq = entry.seq + 1
+            yield entry
+
+
+def main():
+    """命令行入口（供 PowerShell 总结脚本等外部工具使用）"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="项目日志流式解析")
+    parser.add_argument("files", nargs="+", help="日志文件或增量备份文件（按顺序）")
+    parser.add_argument("--action", default="entries", choices=["entries", "stats"])
+    parser.add_argument("--backup", action="store_true", help="输入为增量备份链")
+    parser.add_argument("--since", default="", help="只输出不早于该时间的条目（可只给前缀）")
+    parser.add_argument("--kind", default="", help="只输出指定类型：injection / note / cascade")
+    parser.add_argument("--json", action="store_true", help="以JSON输出（entries 为每行一条）")
+    args = parser.parse_args()
+
+    if args.backup:
+        entries = iter_backup_chain(args.files)
+    else:
+        entries = (entry for path in args.files for entry in parse_entries(path))
+
+    stats = {'entries': 0, 'by_kind': {}, 'first': None, 'last': None}
+    for entry in entries:
+        if args.since and entry.timestamp < args.since:
+            continue
+        if args.kind and entry.kind != args.kind:
+            continue
+
+        if args.action == "stats":
+            stats['entries'] += 1
+            stats['by_kind'][entry.kind] = stats['by_kind'].get(entry.kind, 0) + 1
+            stats['first'] = stats['first'] or entry.timestamp
+            stats['last'] = entry.timestamp
+        elif args.json:
+            print(json.dumps(entry.to_dict(), ensure_ascii=False))
+        else:
+            summary = ' '.join(entry.input_text.split())[:60]
+            print(f"#{entry.seq:>6}  {entry.timestamp}  [{entry.kind}]  {entry.app}  {summary}")
+
+    if args.action == "stats":
+        if args.json:
+            print(json.dumps(stats, ensure_ascii=False, indent=2))
+        else:
+            for key, value in stats.items():
+                print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
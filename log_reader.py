@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量日志读取器 - MD阅读器的渲染游标
+
+记录上次渲染到的字节偏移和偏移前的尾部校验值：
+- 文件只追加：只返回新增的完整行，阅读器把渲染结果追加到现有文档
+- 文件被截断或尾部被改写：返回全文，阅读器整体重新渲染
+
+LogPager 基于条目索引对日志分页，阅读器只渲染最近的若干页，
+向上滚动时按需加载更早的分页，分页HTML缓存按最近最少使用淘汰，
+内存占用与日志总大小无关。每个条目前插入 entry-{序号} 锚点，
+定位最新交互、按时间或序号跳转都直接滚动到锚点。
+
+作者: Assistant
+创建时间: 2025-06-15
+项目: injection
+"""
+
+import os
+import hashlib
+from collections import OrderedDict
+
+
+class IncrementalLogReader:
+    """基于字节游标的增量日志读取器"""
+
+    MODE_FULL = "full"
+    MODE_APPEND = "append"
+    MODE_UNCHANGED = "unchanged"
+
+    TAIL_CHECK_SIZE = 256
+
+    def __init__(self, log_file):
+        self.log_file = log_file
+        self.offset = 0
+        self.tail_hash = ''
+        self.last_start = 0  # 上次返回内容的起始字节偏移
+
+    def reset(self):
+        """丢弃渲染游标，下次读取返回全文"""
+        self.offset = 0
+        self.tail_hash = ''
+
+    def _hash_before(self, f, offset):
+        start = max(0, offset - self.TAIL_CHECK_SIZE)
+        f.seek(start)
+        return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+    def read_changes(self, read_full=True):
+        """读取自上次渲染以来的变化，返回 (模式, 文本)
+
+        read_full=False 时全量模式不读取全文（返回None），由分页器按需渲染，
+        游标直接移到文件末尾
+        """
+        with open(self.log_file, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+
+            if self.offset and (size < self.offset or self._hash_before(f, self.offset) != self.tail_hash):
+                print("🔁 日志被截断或改写，MD阅读器整体重新渲染")
+                self.reset()
+
+            if self.offset == 0 and not read_full:
+                self.offset = size
+                self.tail_hash = self._hash_before(f, size) if size else ''
+                return self.MODE_FULL, None
+
+            if self.offset == 0:
+                f.seek(0)
+                data = f.read(size)
+                mode = self.MODE_FULL
+            else:
+                if size == self.offset:
+                    return self.MODE_UNCHANGED, ""
+                f.seek(self.offset)
+                data = f.read(size - self.offset)
+                # 只消费完整的行，未写完的行留待下次渲染
+                last_newline = data.rfind(b'\n')
+                if last_newline < 0:
+                    return self.MODE_UNCHANGED, ""
+                data = data[:last_newline + 1]
+                mode = self.MODE_APPEND
+
+            self.last_start = self.offset
+            self.offset += len(data)
+            self.tail_hash = self._hash_before(f, self.offset) if self.offset else ''
+
+        return mode, data.decode('utf-8', errors='replace')
+
+
+class LogPager:
+    """基于条目索引的日志分页器"""
+
+    def __init__(self, log_index, render_func, page_size=50, max_window_pages=3, max_cached_pages=12):
+        self.log_index = log_index
+        self.render_func = render_func  # Markdown片段 -> HTML片段
+        self.page_size = page_size
+        self.max_window_pages = max_window_pages
+        self.max_cached_pages = max_cached_pages
+
+        # 当前文档中渲染的连续分页区间 [first_page, last_page]
+        self.first_page = 0
+        self.last_page = -1
+        self.total_entries = 0
+
+        # 分页HTML缓存（最近最少使用淘汰）
+        self.page_cache = OrderedDict()
+
+    # === 分页信息 ===
+    def page_count(self):
+        return (self.total_entries + self.page_size - 1) // self.page_size
+
+    def latest_page(self):
+        return self.page_count() - 1
+
+    def at_latest(self):
+        return self.last_page >= self.latest_page()
+
+    def has_older(self):
+        return self.first_page > 0
+
+    def has_newer(self):
+        return self.last_page < self.latest_page()
+
+    def page_of(self, seq):
+        return (seq - 1) // self.page_size
+
+    @staticmethod
+    def page_anchor(page):
+        return f"page-{page}"
+
+    @staticmethod
+    def entry_anchor(seq):
+        return f"entry-{seq}"
+
+    def in_window(self, seq):
+        return self.first_page <= self.page_of(seq) <= self.last_page
+
+    # === 渲染 ===
+    def render_page(self, page):
+        """渲染单个分页（最新一页仍在增长，不进入缓存）"""
+        is_latest = page == self.latest_page()
+        if not is_latest and page in self.page_cache:
+            self.page_cache.move_to_end(page)
+            return self.page_cache[page]
+
+        first_seq = page * self.page_size + 1
+        entries = self.log_index.entries_range(first_seq, first_seq + self.page_size - 1)
+        if not entries:
+            return ""
+        # 按所在日志段分组读取（分页可能跨越已封存段和热日志），第一页包含首个条目之前的文件头部内容
+        parts = [f'<a name="{self.page_anchor(page)}"></a>']
+        for index, group in enumerate(self.log_index.group_by_segment(entries)):
+            start = 0 if page == 0 and index == 0 else group[0]['offset']
+            data = self.log_index.read_bytes(group[0]['segment'], start, group[-1]['end'])
+            parts.append(self.render_span(data, start, group))
+        html = "".join(parts)
+
+        if not is_latest:
+            self.page_cache[page] = html
+            while len(self.page_cache) > self.max_cached_pages:
+                self.page_cache.popitem(last=False)
+        return html
+
+    def render_span(self, data, start_offset, entries):
+        """渲染一段日志字节，逐条目渲染并在每个条目起始处插入锚点"""
+        parts = []
+        cursor = 0
+        for entry in entries:
+            position = entry['offset'] - start_offset
+            if position < 0 or position > len(data):
+                continue
+            if position > cursor:
+                parts.append(self.render_func(data[cursor:position].decode('utf-8', errors='replace')))
+            anchor = self.entry_anchor(entry['seq'])
+            parts.append(f'<a name="{anchor}" id="{anchor}"></a>')
+            cursor = position
+        if cursor < len(data):
+            parts.append(self.render_func(data[cursor:].decode('utf-8', errors='replace')))
+        return "".join(parts)
+
+    def render_appended(self, text, start_offset):
+        """渲染新追加的日志内容（带条目锚点）"""
+        data = text.encode('utf-8')
+        return self.render_span(data, start_offset, self.log_index.entries_from_offset(start_offset))
+
+    def window_html(self):
+        """当前窗口内所有分页的HTML"""
+        return "".join(self.render_page(page) for page in range(self.first_page, self.last_page + 1))
+
+    # === 窗口移动 ===
+    def reset_to_latest(self):
+        """定位到最新分页，日志中没有条目时返回False"""
+        self.page_cache.clear()
+        self.total_entries = self.log_index.count()
+        if self.total_entries == 0:
+            self.first_page, self.last_page = 0, -1
+            return False
+
+        self.last_page = self.latest_page()
+        self.first_page = self.last_page
+        # 最新一页条目不足一页时连同上一页一起显示
+        if self.total_entries % self.page_size and self.first_page > 0:
+            self.first_page -= 1
+        return True
+
+    def show_page(self, page):
+        """把窗口移动到包含指定分页的位置"""
+        page = max(0, min(page, self.latest_page()))
+        if self.first_page <= page <= self.last_page:
+            return False
+        self.first_page = page
+        self.last_page = min(page + self.max_window_pages - 1, self.latest_page())
+        return True
+
+    def load_older(self):
+        """窗口向前扩展一页，超出窗口上限时丢弃最新的一页；返回原顶部分页的锚点"""
+        if not self.has_older():
+            return None
+        anchor = self.page_anchor(self.first_page)
+        self.first_page -= 1
+        if self.last_page - self.first_page + 1 > self.max_window_pages:
+            self.last_page -= 1
+        return anchor
+
+    def load_newer(self):
+        """窗口向后扩展一页，超出窗口上限时丢弃最早的一页；返回新分页的锚点"""
+        if not self.has_newer():
+            return None
+        self.last_page += 1
+        if self.last_page - self.first_page + 1 > self.max_window_pages:
+            self.first_page += 1
+        return self.page_anchor(self.last_page)
+
+    def on_appended(self):
+        """日志追加新条目后更新分页信息；窗口超出上限需要重建时返回True"""
+        was_latest = self.at_latest()
+        previous_latest = self.latest_page()
+        self.total_entries = self.log_index.count()
+
+        # 原先的最新一页如果已写满，从此可以进入缓存
+        self.page_cache.pop(previous_latest, None)
+
+        if not was_latest:
+            return False
+        self.last_page = self.latest_page()
+        if self.last_page - self.first_page + 1 > self.max_window_pages:
+            self.first_page = self.last_page - self.max_window_pages + 1
+            return True
+        return False
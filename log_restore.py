@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志精确恢复引擎 - 按备份头部的区间重建项目日志
+
+原 restore_from_incremental_backup 按修改时间排序所有增量备份，整个读入后按第一个 "---\\n\\n" 切分再拼接，
+忽略了起始位置，backup-1 / backup-2 / startup / manual 之间的重叠导致重建结果出现重复或缺失。本引擎：
+1. 解析每个备份文件头部，得到备份模式和区间（按字节；旧版按字符计的备份在重建时换算）
+2. 全量、截断、改写备份以及去重快照开启新的“版本”，只使用最新版本起点之后的备份
+3. 贪心选出覆盖 [0, 末尾) 的最少片段：每一步在覆盖当前位置的片段中选延伸最远的
+4. 逐片段流式写入临时文件，内存占用与日志大小无关
+5. 用完整性哈希链校验重建结果，通过后才替换目标文件
+
+命令行：python log_restore.py <日志文件> [--dirs 备份目录...] [--output 路径] [--swap] [--json]
+
+作者: Assistant
+创建时间: 2025-06-16
+项目: injection
+"""
+
+import os
+import sys
+import json
+import datetime
+
+from log_parser import parse_backup_header
+from log_compression import open_compressed, uncompressed_size, strip_compression_suffix
+from chunk_store import ChunkStore
+from log_integrity import LogIntegrityChain
+
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# utf-8 续字节（0x80-0xBF），删除后剩余字节数即字符数
+UTF8_CONTINUATION = bytes(range(0x80, 0xC0))
+
+# 从0开始写入完整文件的备份模式，出现时开启新版本
+BASE_MODES = ("FULL_BACKUP", "TRUNCATION_DETECTED", "REWRITE_DETECTED", "SNAPSHOT")
+
+
+def count_chars(data):
+    return len(data.translate(None, UTF8_CONTINUATION))
+
+
+class BackupPiece:
+    """一个可用于重建的片段：增量备份文件正文或去重快照"""
+
+    def __init__(self, source, backup_time, mode, unit, start, end, length, backup_type=""):
+        self.source = source
+        self.backup_time = backup_time
+        self.mode = mode
+        self.unit = unit
+        self.start = start
+        self.end = end
+        self.length = length  # 正文字节数
+        self.backup_type = backup_type
+
+    def to_dict(self):
+        return {
+            'source': self.source if isinstance(self.source, str) else self.source[2],
+            'backup_time': self.backup_time,
+            'backup_type': self.backup_type,
+            'mode': self.mode,
+            'unit': self.unit,
+            'start': self.start,
+            'end': self.end,
+            'length': self.length
+        }
+
+    # === 读取 ===
+    def iter_bytes(self, skip=0):
+        """从正文第 skip 字节开始流式产出数据块"""
+        if isinstance(self.source, tuple):
+            store, log_name, snapshot_id = self.source
+            position = 0
+            for chunk_digest, length in store.resolve_chunks(log_name, snapshot_id):
+                if position + length > skip:
+                    data = store.get_object(chunk_digest)
+                    yield data[max(0, skip - position):]
+                position += length
+            return
+
+        with open_compressed(self.source) as f:
+            header = parse_backup_header(f)
+            f.seek((header['body_offset'] if header else 0) + skip)
+            for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+                yield chunk
+
+    def skip_for(self, position_bytes, position_chars):
+        """对齐到当前重建位置需要跳过的正文字节数；片段不覆盖该位置时返回None"""
+        if self.unit == '字节':
+            if self.start <= position_bytes < self.start + self.length:
+                return position_bytes - self.start
+            return None
+
+        # 旧版按字符计的备份：逐块数字符直到对齐
+        if self.start is None or self.end is None or not self.start <= position_chars < self.end:
+            return None
+        remaining = position_chars - self.start
+        skip = 0
+        for chunk in self.iter_bytes():
+            if remaining <= 0:
+                break
+            chars = count_chars(chunk)
+            if chars <= remaining:
+                remaining -= chars
+                skip += len(chunk)
+                continue
+            # 在块内定位第 remaining 个字符的起始字节
+            text = chunk.decode('utf-8', errors='ignore')[:remaining]
+            skip += len(text.encode('utf-8'))
+            remaining = 0
+        return skip
+
+
+class LogRestoreEngine:
+    """日志精确恢复引擎"""
+
+    def __init__(self, log_file, backup_dirs, project_name=None, chunk_store=None, integrity=None):
+        self.log_file = log_file
+        self.backup_dirs = [path for path in backup_dirs if path]
+        self.project_name = project_name or os.path.basename(log_file).replace("-log.md", "")
+        self.chunk_store = chunk_store
+        self.integrity = integrity
+
+    # === 收集片段 ===
+    def collect_pieces(self):
+        """扫描备份目录中的增量备份（含压缩备份），以及快照库中的最新快照"""
+        pieces = []
+        prefix = f"{self.project_name}-log-incremental-"
+        seen = set()
+        for backup_dir in self.backup_dirs:
+            if not os.path.isdir(backup_dir):
+                continue
+            for entry in os.scandir(backup_dir):
+                name = strip_compression_suffix(entry.name)
+                if not (name.startswith(prefix) and name.endswith(".md") and entry.is_file()):
+                    continue
+                path = os.path.abspath(entry.path)
+                if path in seen:
+                    continue
+                seen.add(path)
+                piece = self._piece_from_file(path, entry.stat())
+                if piece:
+                    pieces.append(piece)
+
+        if self.chunk_store is not None:
+            log_name = os.path.basename(self.log_file)
+            snapshots = self.chunk_store.list_snapshots(log_name)
+            if snapshots:
+                manifest = snapshots[-1]
+                pieces.append(BackupPiece((self.chunk_store, log_name, manifest['id']),
+                                          manifest['created'][:19].replace('T', ' '), "SNAPSHOT", '字节',
+                                          0, manifest['size'], manifest['size'], "snapshot"))
+        return pieces
+
+    @staticmethod
+    def _piece_from_file(path, stat):
+        try:
+            with open_compressed(path) as f:
+                header = parse_backup_header(f)
+            if not header or header.get('start') is None:
+                return None
+            length = uncompressed_size(path, stat) - header['body_offset']
+            backup_time = header.get('backup_time') or \
+                datetime.datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+            end = header.get('end')
+            if header['unit'] == '字节':
+                end = header['start'] + length
+            return BackupPiece(path, backup_time, header.get('mode', ''), header['unit'],
+                               header['start'], end, length, header.get('backup_type', ''))
+        except Exception as e:
+            print(f"⚠️ 解析备份文件头失败 ({os.path.basename(path)})：{e}")
+            return None
+
+    def current_lineage(self, pieces):
+        """只保留最新一次从0开始的完整备份（或快照）及其之后的片段"""
+        bases = [piece for piece in pieces if piece.mode in BASE_MODES or piece.start == 0]
+        if not bases:
+            return sorted(pieces, key=lambda piece: piece.backup_time)
+        base_time = max(piece.backup_time for piece in bases)
+        return sorted((piece for piece in pieces if piece.backup_time >= base_time),
+                      key=lambda piece: piece.backup_time)
+
+    # === 覆盖计划 ===
+    def plan(self, pieces=None):
+        """贪心选出覆盖 [0, 末尾) 的最少片段，返回 [(片段, 跳过字节数)] 和缺口信息"""
+        pieces = self.current_lineage(pieces if pieces is not None else self.collect_pieces())
+        # 只有存在按字符计的旧版备份时才需要同步统计字符位置
+        track_chars = any(piece.unit == '字符' for piece in pieces)
+        steps = []
+        position_bytes = 0
+        position_chars = 0
+        while True:
+            best = None
+            for piece in pieces:
+                skip = piece.skip_for(position_bytes, position_chars)
+                if skip is None:
+                    continue
+                reach = position_bytes + piece.length - skip
+                # 延伸最远者优先，相同时取较新的备份
+                if best is None or (reach, piece.backup_time) > (best[2], best[0].backup_time):
+                    best = (piece, skip, reach)
+            if best is None or best[2] <= position_bytes:
+                break
+            piece, skip, reach = best
+            steps.append((piece, skip))
+            if piece.unit == '字符':
+                position_chars = piece.end
+            elif track_chars:
+                position_chars += self._chars_in(piece, skip)
+            position_bytes = reach
+
+        covered_to = position_bytes
+        gap = None
+        remaining = [piece for piece in pieces if piece.unit == '字节' and piece.start + piece.length > covered_to]
+        if remaining:
+            gap = {'from': covered_to, 'to': min(piece.start for piece in remaining)}
+        return {'steps': steps, 'size': covered_to, 'gap': gap, 'candidates': len(pieces)}
+
+    @staticmethod
+    def _chars_in(piece, skip):
+        return sum(count_chars(chunk) for chunk in piece.iter_bytes(skip))
+
+    # === 重建 ===
+    def restore(self, output_path=None, swap=False, min_size=0):
+        """重建日志到 output_path（默认 <日志>.restored.md）；swap 为 True 时校验通过后替换日志文件
+
+        重建结果不大于 min_size 时放弃（例如不用更短的重建结果替换现有日志）。
+        swap 替换正在写入的日志时，需经 LogJournalWriter.run_exclusive 在句柄关闭期间调用。
+        """
+        plan = self.plan()
+        if not plan['steps']:
+            return {'success': False, 'error': 'no_backup_covering_start', 'gap': plan['gap']}
+
+        target = self.log_file if swap else (output_path or os.path.splitext(self.log_file)[0] + ".restored.md")
+        temp_file = target + ".rebuild.tmp"
+        written = 0
+        try:
+            with open(temp_file, 'wb') as out:
+                for piece, skip in plan['steps']:
+                    # 覆盖计划中后一片段从前一片段末尾接续，片段之间没有重叠
+                    for chunk in piece.iter_bytes(skip):
+                        out.write(chunk)
+                        written += len(chunk)
+
+            if written <= min_size:
+                return {'success': False, 'error': 'smaller_than_current', 'size': written}
+
+            verification = self.verify(temp_file)
+            if verification['status'] == LogIntegrityChain.STATUS_TAMPERED:
+                return {'success': False, 'error': 'integrity_mismatch', 'verification': verification,
+                        'plan': [piece.to_dict() for piece, _ in plan['steps']]}
+
+            os.replace(temp_file, target)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+        print(f"♻️ 已用 {len(plan['steps'])} 个片段重建日志：{os.path.basename(target)}（{written} 字节）")
+        return {
+            'success': True,
+            'path': target,
+            'size': written,
+            'gap': plan['gap'],
+            'verification': verification,
+            'plan': [dict(piece.to_dict(), skip=skip) for piece, skip in plan['steps']]
+        }
+
+    def verify(self, path):
+        """用完整性哈希链校验重建结果（没有哈希链记录时跳过）"""
+        if self.integrity is None or self.integrity.state is None:
+            return {'status': 'unchecked'}
+        return self.integrity.verify_file(path)
+
+
+def main():
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="日志精确恢复")
+    parser.add_argument("log_file", help="日志文件路径")
+    parser.add_argument("--dirs", nargs="*", default=None, help="备份目录（默认为日志目录下 backups）")
+    parser.add_argument("--output", default="", help="重建结果路径")
+    parser.add_argument("--swap", action="store_true", help="校验通过后直接替换日志文件")
+    parser.add_argument("--plan", action="store_true", help="只显示覆盖计划")
+    parser.add_argument("--json", action="store_true", help="以JSON输出")
+    args = parser.parse_args()
+
+    backup_dir = os.path.join(os.path.dirname(os.path.abspath(args.log_file)), "backups")
+    engine = LogRestoreEngine(
+        args.log_file, args.dirs or [backup_dir],
+        chunk_store=ChunkStore(os.path.join(backup_dir, "chunk-store")),
+        integrity=LogIntegrityChain(args.log_file, backup_dir)
+    )
+
+    if args.plan:
+        plan = engine.plan()
+        result = {
+            'size': plan['size'],
+            'gap': plan['gap'],
+            'steps': [dict(piece.to_dict(), skip=skip) for piece, skip in plan['steps']]
+        }
+    else:
+        result = engine.restore(args.output or None, swap=args.swap)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        for step in result.get('steps', result.get('plan', [])):
+            print(f"  {step['backup_time']}  [{step['mode']}] {os.path.basename(step['source'])}  "
+                  f"{step['start']}-{step['end']} ({step['unit']})  跳过 {step['skip']}")
+        for key in ('success', 'path', 'size', 'gap', 'error'):
+            if key in result:
+                print(f"{key}: {result[key]}")
+    return 0 if result.get('success', True) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
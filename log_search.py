@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+项目日志全文搜索 - SQLite FTS5 倒排索引
+
+在条目索引（LogIndex）之上为每个日志条目建立全文索引：
+- 中文按字符二元组（bigram）切分，英文数字按单词切分并转小写
+- 随日志追加增量更新，只处理新增条目（最后一条重新索引，防止其内容仍在增长）
+- 条目索引重建（带外修改）后自动重建；热日志封存为分段后序号不变，已封存条目照常可搜
+- 结果按 bm25 排序，摘要中高亮命中的关键词
+- SQLite 不支持 FTS5 时退回 LIKE 查询
+- 索引文件与日志同目录：.{日志文件名}.search.db
+
+命令行：python log_search.py <日志文件> <关键词> [--limit N] [--json]
+
+作者: Assistant
+创建时间: 2025-06-15
+项目: injection
+"""
+
+import os
+import re
+import sys
+import json
+import html
+import sqlite3
+import threading
+
+from log_index import LogIndex
+
+
+# 中日韩统一表意文字按二元组切分，其余按字母数字单词切分
+CJK_RANGES = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+TOKEN_PATTERN = re.compile(f'[{CJK_RANGES}]+|[0-9A-Za-z]+')
+
+HIGHLIGHT_STYLE = 'background-color: #ffeb3b; color: #333;'
+
+
+def is_cjk_run(run):
+    return '\u3400' <= run[0]
+
+
+def tokenize(text):
+    """把文本切分为索引词：中文二元组 + 小写英文单词"""
+    tokens = []
+    for run in TOKEN_PATTERN.findall(text):
+        if is_cjk_run(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+def query_terms(query):
+    """查询中的原始关键词（用于高亮）"""
+    return TOKEN_PATTERN.findall(query)
+
+
+def build_match_query(query):
+    """把用户输入转换为 FTS5 MATCH 表达式，所有关键词需同时命中"""
+    clauses = []
+    for run in query_terms(query):
+        if is_cjk_run(run):
+            if len(run) == 1:
+                clauses.append(f'"{run}"*')
+            else:
+                # 连续二元组作为短语，等价于子串匹配
+                clauses.append('"' + ' '.join(tokenize(run)) + '"')
+        else:
+            clauses.append(f'"{run.lower()}"*')
+    return ' AND '.join(clauses)
+
+
+def highlight_snippet(text, terms, context=40):
+    """截取首个命中位置附近的文本并高亮所有关键词（返回HTML）"""
+    text = ' '.join(text.split())
+    if not terms:
+        return html.escape(text[:context * 2])
+
+    pattern = re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    first = pattern.search(text)
+    center = first.start() if first else 0
+    start = max(0, center - context)
+    end = min(len(text), center + context * 2)
+    window = text[start:end]
+
+    parts = []
+    cursor = 0
+    for match in pattern.finditer(window):
+        parts.append(html.escape(window[cursor:match.start()]))
+        parts.append(f'<span style="{HIGHLIGHT_STYLE}">{html.escape(match.group())}</span>')
+        cursor = match.end()
+    parts.append(html.escape(window[cursor:]))
+
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(text) else ''
+    return prefix + ''.join(parts) + suffix
+
+
+class LogSearchIndex:
+    """项目日志全文搜索索引"""
+
+    SCHEMA_VERSION = "1"
+    BATCH_SIZE = 500
+
+    def __init__(self, log_file, log_index=None, db_path=None):
+        self.log_file = log_file
+        self.log_index = log_index or LogIndex(log_file)
+        self.db_path = db_path or self.default_db_path(log_file)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.use_fts = True
+        self.update_thread = None
+        self._init_schema()
+
+    @staticmethod
+    def default_db_path(log_file):
+        log_dir = os.path.dirname(os.path.abspath(log_file))
+        return os.path.join(log_dir, f".{os.path.basename(log_file)}.search.db")
+
+    def _init_schema(self):
+        with self.lock, self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            try:
+                self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS entry_fts USING fts5(tokens)")
+            except sqlite3.OperationalError:
+                print("⚠️ SQLite 不支持 FTS5，日志搜索退回 LIKE 查询")
+                self.use_fts = False
+                self.conn.execute("CREATE TABLE IF NOT EXISTS entry_tokens (seq INTEGER PRIMARY KEY, tokens TEXT)")
+            if self._get_meta('version') != self.SCHEMA_VERSION:
+                self._reset()
+                self._set_meta('version', self.SCHEMA_VERSION)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # === 元数据 ===
+    def _get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    @property
+    def table(self):
+        return "entry_fts" if self.use_fts else "entry_tokens"
+
+    @property
+    def key_column(self):
+        return "rowid" if self.use_fts else "seq"
+
+    def _reset(self):
+        self.conn.execute(f"DELETE FROM {self.table}")
+        self._set_meta('indexed_seq', 0)
+        self._set_meta('generation', '')
+
+    # === 增量更新 ===
+    def update(self):
+        """同步全文索引到条目索引，返回本次索引的条目数"""
+        with self.lock:
+            self.log_index.update()
+            generation = str(self.log_index.generation())
+            if self._get_meta('generation') != generation:
+                with self.conn:
+                    self._reset()
+                    self._set_meta('generation', generation)
+
+            indexed_seq = int(self._get_meta('indexed_seq', 0))
+            total = self.log_index.count()
+            # 最后一条已索引条目可能仍在增长，重新索引
+            next_seq = max(1, indexed_seq)
+            indexed = 0
+
+            while next_seq <= total:
+                entries = self.log_index.entries_range(next_seq, next_seq + self.BATCH_SIZE - 1)
+                if not entries:
+                    break
+                rows = self._tokenize_entries(entries)
+                with self.conn:
+                    self.conn.executemany(f"DELETE FROM {self.table} WHERE {self.key_column} = ?",
+                                          [(seq,) for seq, _ in rows])
+                    self.conn.executemany(
+                        f"INSERT INTO {self.table} ({self.key_column}, tokens) VALUES (?, ?)", rows)
+                    self._set_meta('indexed_seq', entries[-1]['seq'])
+                indexed += len(rows)
+                next_seq = entries[-1]['seq'] + 1
+
+            return indexed
+
+    def update_async(self):
+        """在后台线程中同步索引（首次为大日志建索引时避免阻塞UI）"""
+        if self.update_thread and self.update_thread.is_alive():
+            return
+        self.update_thread = threading.Thread(target=self._update_quietly, name="LogSearchIndex", daemon=True)
+        self.update_thread.start()
+
+    def _update_quietly(self):
+        try:
+            indexed = self.update()
+            if indexed > 1:
+                print(f"🔍 日志全文索引已更新：{indexed} 条")
+        except Exception as e:
+            print(f"⚠️ 更新日志全文索引失败：{e}")
+
+    def rebuild(self):
+        with self.lock:
+            with self.conn:
+                self._reset()
+        return self.update()
+
+    def _tokenize_entries(self, entries):
+        """按日志段一次读取连续条目的原文并切分索引词（已封存段同样适用）"""
+        rows = []
+        for group in self.log_index.group_by_segment(entries):
+            start = group[0]['offset']
+            data = self.log_index.read_bytes(group[0]['segment'], start, group[-1]['end'])
+            for entry in group:
+                text = data[entry['offset'] - start:entry['end'] - start].decode('utf-8', errors='replace')
+                rows.append((entry['seq'], ' '.join(tokenize(text))))
+        return rows
+
+    # === 查询 ===
+    def search(self, query, limit=50, update=True):
+        """搜索日志条目，返回按相关度排序的条目（含高亮摘要 snippet）"""
+        terms = query_terms(query)
+        if not terms:
+            return []
+
+        with self.lock:
+            if update:
+                self.update()
+            if self.use_fts:
+                rows = self.conn.execute(
+                    "SELECT rowid, bm25(entry_fts) FROM entry_fts WHERE entry_fts MATCH ? "
+                    "ORDER BY bm25(entry_fts), rowid DESC LIMIT ?",
+                    (build_match_query(query), limit)).fetchall()
+            else:
+                conditions = []
+                params = []
+                for term in terms:
+                    conditions.append("tokens LIKE ?")
+                    params.append(f"%{' '.join(tokenize(term))}%")
+                rows = self.conn.execute(
+                    f"SELECT seq, 0 FROM entry_tokens WHERE {' AND '.join(conditions)} ORDER BY seq DESC LIMIT ?",
+                    params + [limit]).fetchall()
+
+        scores = dict(rows)
+        results = self.log_index.entries_by_seq([seq for seq, _ in rows])
+        for entry in results:
+            entry['score'] = scores[entry['seq']]
+            entry['snippet'] = highlight_snippet(self.log_index.read_entry(entry), terms)
+        return results
+
+
+def main():
+    """命令行入口（供 PowerShell 脚本等外部工具查询）"""
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="项目日志全文搜索")
+    parser.add_argument("log_file", help="日志文件路径")
+    parser.add_argument("query", help="搜索关键词")
+    parser.add_argument("--limit", type=int, default=20, help="最多返回条数")
+    parser.add_argument("--json", action="store_true", help="以JSON输出")
+    args = parser.parse_args()
+
+    search_index = LogSearchIndex(args.log_file)
+    try:
+        search_index.update()
+        started = time.perf_counter()
+        results = search_index.search(args.query, args.limit, update=False)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if args.json:
+            print(json.dumps(results, ensure_ascii=False, indent=2))
+        else:
+            for entry in results:
+                snippet = re.sub(r'<[^>]+>', '', entry['snippet'])
+                print(f"#{entry['seq']:>6}  {entry['ts']}  [{entry['kind']}]  {html.unescape(snippet)}")
+            print(f"共 {len(results)} 条结果，耗时 {elapsed_ms:.1f}ms")
+    finally:
+        search_index.close()
+        search_index.log_index.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
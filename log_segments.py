@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+项目日志分段轮转 - 热日志超过大小或时间阈值后封存为压缩段
+
+原先只有 LogManager.ps1 描述了超过 MaxSizeMB 后归档 injection-log.md，
+应用本身一直向同一个文件追加，文件越大每次追加后的检查、备份、索引越慢。
+本模块：
+1. 热日志达到大小阈值（默认4MB）或时间阈值（默认30天）时，由日志写入线程在批次之间封存
+2. 封存段移入 log-archive/ 并以 gzip 压缩（安装了 zstandard 时可选 zstd，提供 LogCodec 时使用训练字典）
+3. 段列表记录在清单 {日志文件名}.manifest.json 中
+4. 条目索引把已封存条目标记到对应段，阅读器分页和全文搜索跨段透明访问
+
+作者: Assistant
+创建时间: 2025-06-16
+项目: injection
+"""
+
+import io
+import os
+import re
+import gzip
+import json
+import shutil
+import hashlib
+import datetime
+
+from log_parser import parse_entries
+from log_compression import ZSTD_AVAILABLE, zstandard, open_compressed, compression_of
+
+
+def open_segment(path):
+    """以二进制只读方式打开日志段（按扩展名自动解压，字典压缩的段自动加载字典）"""
+    return open_compressed(path)
+
+
+def read_segment(path):
+    """读取整个日志段的原始字节"""
+    with open_segment(path) as f:
+        return f.read()
+
+
+class LogSegmentManager:
+    """项目日志分段管理"""
+
+    DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+    DEFAULT_MAX_AGE_DAYS = 30
+
+    def __init__(self, log_file, archive_dir=None, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS, compression="gzip", index_provider=None, after_swap=None,
+                 codec=None):
+        self.log_file = log_file
+        self.archive_dir = archive_dir or os.path.join(os.path.dirname(os.path.abspath(log_file)), "log-archive")
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        # 提供 LogCodec 时压缩方式由其决定（字典 zstd，或未安装 zstandard 时的 gzip）
+        self.codec = codec
+        if codec is not None:
+            compression = codec.archive_method()
+        self.compression = compression if compression != "zstd" or ZSTD_AVAILABLE else "gzip"
+        # 返回当前日志的 LogIndex（或None），封存时在索引锁内完成文件切换
+        self.index_provider = index_provider
+        # 热日志切换为空文件后立即调用（压缩之前），供文件监控等重新建立基准
+        self.after_swap = after_swap
+
+        self.log_name = os.path.basename(log_file)
+        self.stem = os.path.splitext(self.log_name)[0]
+        self.manifest_path = os.path.join(self.archive_dir, f"{self.log_name}.manifest.json")
+        self.manifest = self.load_manifest()
+
+    # === 清单 ===
+    def load_manifest(self):
+        manifest = {'log_file': self.log_name, 'hot_started': None, 'segments': []}
+        try:
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    manifest.update(json.load(f))
+        except Exception as e:
+            print(f"⚠️ 读取日志分段清单失败：{e}")
+        return manifest
+
+    def save_manifest(self):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        temp_file = self.manifest_path + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.manifest_path)
+
+    def segments(self):
+        return list(self.manifest['segments'])
+
+    def segment_path(self, segment):
+        return os.path.join(self.archive_dir, segment['file'])
+
+    def segment_paths(self):
+        return [self.segment_path(segment) for segment in self.manifest['segments']]
+
+    # === 轮转 ===
+    def hot_started(self):
+        """热日志开始时间（首次使用时按文件创建时间估计）"""
+        started = self.manifest.get('hot_started')
+        if started:
+            return datetime.datetime.fromisoformat(started)
+        if os.path.exists(self.log_file):
+            return datetime.datetime.fromtimestamp(os.path.getctime(self.log_file))
+        return datetime.datetime.now()
+
+    def should_rotate(self, size=None):
+        """热日志是否达到封存阈值"""
+        if size is None:
+            size = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+        if size <= 0:
+            return False
+        if self.max_bytes and size >= self.max_bytes:
+            return True
+        if self.max_age_days:
+            age = datetime.datetime.now() - self.hot_started()
+            return age.days >= self.max_age_days
+        return False
+
+    def rotate(self):
+        """封存当前热日志，返回新段的清单记录；调用方需保证没有其他线程在写入"""
+        if not os.path.exists(self.log_file) or os.path.getsize(self.log_file) == 0:
+            return None
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        number = len(self.manifest['segments']) + 1
+        name = f"{self.stem}.{number:05d}"
+        raw_path = os.path.join(self.archive_dir, f"{name}.md")
+
+        log_index = self.index_provider() if self.index_provider else None
+        if log_index is not None:
+            with log_index.lock:
+                log_index.update()
+                self._swap_hot_file(raw_path)
+                compressed_path = self._compress(raw_path)
+                info = log_index.seal_hot_segment(name, compressed_path, os.path.getsize(raw_path))
+        else:
+            self._swap_hot_file(raw_path)
+            with open(raw_path, 'rb') as f:
+                info = self._scan_bytes(f.read())
+            compressed_path = self._compress(raw_path)
+
+        segment = {
+            'name': name,
+            'file': os.path.basename(compressed_path),
+            'compression': self._compression_of(compressed_path),
+            'raw_bytes': info['raw_bytes'],
+            'stored_bytes': os.path.getsize(compressed_path),
+            'sha256': self._sha256(compressed_path),
+            'entries': info['entries'],
+            'first_ts': info['first_ts'],
+            'last_ts': info['last_ts'],
+            'sealed_at': datetime.datetime.now().isoformat()
+        }
+        if compressed_path != raw_path and os.path.exists(raw_path):
+            os.remove(raw_path)
+
+        self.manifest['segments'].append(segment)
+        self.manifest['hot_started'] = datetime.datetime.now().isoformat()
+        self.save_manifest()
+
+        ratio = segment['stored_bytes'] / segment['raw_bytes'] if segment['raw_bytes'] else 0
+        print(f"🗄️ 日志已封存为分段 {segment['file']}：{segment['entries']} 条，"
+              f"{segment['raw_bytes']} → {segment['stored_bytes']} 字节 ({ratio:.0%})")
+        return segment
+
+    def _swap_hot_file(self, raw_path):
+        """把热日志移入归档目录，并立即创建新的空热日志"""
+        os.replace(self.log_file, raw_path)
+        open(self.log_file, 'ab').close()
+        if self.after_swap:
+            try:
+                self.after_swap(self.log_file)
+            except Exception as e:
+                print(f"⚠️ 热日志切换回调失败：{e}")
+
+    def _compress(self, raw_path):
+        """压缩封存段，失败时保留未压缩文件"""
+        try:
+            if self.codec is not None:
+                return self.codec.compress_file(raw_path)
+            if self.compression == "zstd":
+                compressed_path = raw_path + ".zst"
+                with open(raw_path, 'rb') as src, open(compressed_path, 'wb') as dst:
+                    zstandard.ZstdCompressor(level=10).copy_stream(src, dst)
+            elif self.compression == "gzip":
+                compressed_path = raw_path + ".gz"
+                with open(raw_path, 'rb') as src, gzip.open(compressed_path, 'wb', compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+            else:
+                return raw_path
+            return compressed_path
+        except Exception as e:
+            print(f"⚠️ 压缩日志分段失败，保留未压缩文件：{e}")
+            return raw_path
+
+    @staticmethod
+    def _compression_of(path):
+        return compression_of(path)
+
+    @staticmethod
+    def _sha256(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _scan_bytes(data):
+        """没有条目索引时通过解析器统计段信息"""
+        entries = 0
+        first_ts = last_ts = None
+        for entry in parse_entries(io.BytesIO(data)):
+            entries += 1
+            first_ts = first_ts or entry.timestamp
+            last_ts = entry.timestamp
+        return {'raw_bytes': len(data), 'entries': entries, 'first_ts': first_ts, 'last_ts': last_ts}
+
+    def adopt_orphans(self):
+        """把封存过程中断后遗留在归档目录、但未写入清单的段补记到清单"""
+        if not os.path.isdir(self.archive_dir):
+            return 0
+        known = {segment['name'] for segment in self.manifest['segments']}
+        pattern = re.compile(re.escape(self.stem) + r'\.(\d{5})\.md(\.gz|\.zst)?$')
+        adopted = 0
+        for file_name in sorted(os.listdir(self.archive_dir)):
+            match = pattern.match(file_name)
+            name = f"{self.stem}.{match.group(1)}" if match else None
+            if not match or name in known:
+                continue
+            path = os.path.join(self.archive_dir, file_name)
+            info = self._scan_bytes(read_segment(path))
+            self.manifest['segments'].append({
+                'name': name,
+                'file': file_name,
+                'compression': self._compression_of(path),
+                'raw_bytes': info['raw_bytes'],
+                'stored_bytes': os.path.getsize(path),
+                'sha256': self._sha256(path),
+                'entries': info['entries'],
+                'first_ts': info['first_ts'],
+                'last_ts': info['last_ts'],
+                'sealed_at': datetime.datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+            })
+            known.add(name)
+            adopted += 1
+        if adopted:
+            self.manifest['segments'].sort(key=lambda segment: segment['name'])
+            self.save_manifest()
+            print(f"🗄️ 补记 {adopted} 个未登记的日志分段")
+        return adopted
+
+    # === 跨段读取 ===
+    def iter_entries(self):
+        """按时间顺序解析所有已封存段和热日志中的条目，序号连续"""
+        seq = 1
+        for path in self.segment_paths():
+            with open_segment(path) as f:
+                for entry in parse_entries(f, first_seq=seq):
+                    seq = entry.seq + 1
+                    yield entry
+        if os.path.exists(self.log_file):
+            yield from parse_entries(self.log_file, first_seq=seq)
+
+    def stats(self):
+        segments = self.manifest['segments']
+        return {
+            'segments': len(segments),
+            'archived_entries': sum(segment['entries'] or 0 for segment in segments),
+            'raw_bytes': sum(segment['raw_bytes'] or 0 for segment in segments),
+            'stored_bytes': sum(segment['stored_bytes'] or 0 for segment in segments),
+            'hot_bytes': os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+        }
@@ -11,10 +11,14 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QH
                              QTextEdit, QComboBox, QMenu, QShortcut, QMessageBox, 
                              QFileDialog, QDialog, QLineEdit, QCheckBox, QInputDialog, QFrame, QListWidget,
                              QListWidgetItem, QScrollArea, QTextBrowser, QSplitter, QSizePolicy)
-from PyQt5.QtCore import Qt, QTimer, QEvent, QBuffer, QByteArray, QUrl
-from PyQt5.QtGui import QIcon, QKeySequence, QPixmap, QImage, QClipboard
+from PyQt5.QtCore import Qt, QTimer, QEvent, QBuffer, QByteArray, QUrl, pyqtSignal
+from PyQt5.QtGui import QIcon, QKeySequence, QPixmap, QImage, QClipboard, QTextCursor
 import datetime
 import json
+import re
+import tempfile
+import statistics
+import threading
 from template_dialog import TemplateDialog
 from template_manager import TemplateManager
 from ai_service import AIService
@@ -34,6 +38,31 @@ from fullscreen_manager import integrate_fullscreen_manager
 # 导入新的窗口管理器（模块化解耦方案）
 from window_manager import integrate_window_manager
 
+# 导入增量日志备份引擎和后台写入服务
+from log_backup_engine import LogBackupEngine
+from log_compression import LogCodec, DICTIONARY_DIR_NAME, COMPRESSED_SUFFIXES, strip_compression_suffix
+from chunk_store import ChunkStore, SnapshotWorker
+from log_integrity import LogIntegrityChain
+from log_restore import LogRestoreEngine
+from log_diff import DiffSide, diff_logs, merge_into_log, render_markdown
+from backup_replication import BackupReplicator, load_target_config, STATUS_FILE_NAME
+from backup_verifier import BackupVerifier
+from log_journal_writer import LogJournalWriter
+
+# 导入日志条目索引和增量读取器
+from log_index import LogIndex
+from log_segments import LogSegmentManager
+from log_file_watcher import LogFileWatcher
+from log_search import LogSearchIndex
+from log_reader import IncrementalLogReader, LogPager
+from markdown_renderer import get_markdown_renderer
+from input_driver import InjectionSequence, create_input_driver, format_timings
+from injection_queue import InjectionQueue, DEFAULT_PACING
+from injection_queue_dialog import InjectionQueueDialog
+from target_set import TargetSet, fan_out_inject, format_results
+from image_store import ImageStore, EDITOR_IMAGE_WIDTH, READER_IMAGE_WIDTH
+from window_registry import WindowRegistry, create_window_source
+
 # 导入新的项目集成服务
 try:
     from src.services.project_integration_service import ProjectIntegrationService
@@ -82,6 +111,13 @@ CONFIG_PATH = os.path.join(APP_DIR, f'config_instance_{INSTANCE_ID}.json')
 os.makedirs(LOGS_DIR, exist_ok=True)
 
 class MainWindow(QMainWindow):
+    # 窗口登记表的变化通知（由登记表线程发出，在UI线程处理）
+    window_registry_changed = pyqtSignal(str, dict)
+    # 日志合并的差异报告（恢复在写入线程执行，报告在UI线程显示）
+    log_diff_ready = pyqtSignal(dict)
+    # 外部改动处理完成（备份和恢复在写入线程执行）：日志路径, 是否已恢复
+    log_change_handled = pyqtSignal(str, bool)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle('提示词注入工具')
@@ -105,6 +141,9 @@ class MainWindow(QMainWindow):
         # MD阅读器面板相关变量
         self.md_reader_panel = None
         self.md_reader_visible = False
+        self.md_log_reader = None  # 增量渲染游标
+        self.md_log_pager = None   # 分页窗口
+        self.md_page_loading = False
         
         # 新架构：布局管理器
         self.layout_manager = None
@@ -114,7 +153,35 @@ class MainWindow(QMainWindow):
         
         # 文件保护功能相关变量
         self.backup_dir = None
+        self.backup_engine = None
+        self.log_codec = None
+        self.log_compression = "auto"
+        self.chunk_store = None
+        self.snapshot_worker = None
+        self.log_integrity = None
+        self.backup_replicator = None
+        self.backup_verifier = None
+        self.backup_verify_version = -1
+        self.backup_verify_reported = None
+        self.last_log_diff = None
+        self.log_diff_ready.connect(self.show_log_diff)
+        self.log_change_handled.connect(self.on_log_change_handled)
+        self.image_store = None
+        self.input_driver = None
+        self.injection_durations = []  # 最近的注入总耗时（毫秒），用于报告中位数
+        self.injection_queue = None
+        self.injection_queue_dialog = None
+        self.injection_pacing = DEFAULT_PACING
+        self.target_set = TargetSet()  # 多目标注入的目标组（主目标之外的已校准窗口）
+        self.calibrating_target_set = False
+        self.window_registry = None  # 候选窗口缓存，注入路径上按字典查询
+        self.log_index = None
+        self.log_search = None
+        self.log_file_watcher = None
         self.last_log_size = 0
+        
+        # 日志后台写入服务（按日志路径区分）
+        self.journal_writers = {}
         self.template_manager = TemplateManager()
         self.ai_service = AIService()
         
@@ -185,6 +252,15 @@ class MainWindow(QMainWindow):
                 self.default_scene = config.get('default_scene')
                 self.default_version = config.get('default_version')
                 
+                # 备份与归档压缩方式：auto / zstd / gzip / none
+                self.log_compression = config.get('log_compression', "auto")
+                
+                # 批量注入每条之间的间隔（秒）
+                self.injection_pacing = config.get('injection_pacing', DEFAULT_PACING)
+                
+                # 多目标注入的目标组
+                self.target_set = TargetSet.from_config(config)
+                
                 # 根据项目文件夹设置日志文件路径
                 if self.project_folder and self.project_name:
                     self.log_file = os.path.join(self.project_folder, f"{self.project_name}-log.md")
@@ -215,7 +291,10 @@ class MainWindow(QMainWindow):
             'project_folder': self.project_folder,
             'project_name': self.project_name,
             'default_scene': self.default_scene,
-            'default_version': self.default_version
+            'default_version': self.default_version,
+            'log_compression': self.log_compression,
+            'injection_pacing': self.injection_queue.pacing if self.injection_queue else self.injection_pacing,
+            'target_set': self.target_set.to_config()
         }
         try:
             # 确保配置目录存在
@@ -562,6 +641,20 @@ class MainWindow(QMainWindow):
         self.calibrate_button.clicked.connect(self.start_calibration)
         calibration_layout.addWidget(self.calibrate_button)
         
+        # 目标组：再校准其他窗口，用于一次注入到全部目标
+        target_set_layout = QHBoxLayout()
+        self.add_target_button = QPushButton("添加到目标组")
+        self.add_target_button.setStyleSheet(self.calibrate_button.styleSheet())
+        self.add_target_button.clicked.connect(self.start_target_set_calibration)
+        target_set_layout.addWidget(self.add_target_button)
+        self.clear_targets_button = QPushButton("清空目标组")
+        self.clear_targets_button.setStyleSheet(self.calibrate_button.styleSheet())
+        self.clear_targets_button.clicked.connect(self.clear_target_set)
+        target_set_layout.addWidget(self.clear_targets_button)
+        calibration_layout.addLayout(target_set_layout)
+        self.target_set_label = QLabel(f"目标组：{len(self.target_set)} 个窗口")
+        calibration_layout.addWidget(self.target_set_label)
+        
         left_layout.addLayout(calibration_layout)
         
         # 添加弹性空间
@@ -666,6 +759,16 @@ class MainWindow(QMainWindow):
         self.inject_button.clicked.connect(self.inject_command)
         button_layout.addWidget(self.inject_button)
         
+        # 创建多目标注入按钮
+        self.inject_all_button = QPushButton("注入到全部目标")
+        self.inject_all_button.clicked.connect(self.inject_to_all_targets)
+        button_layout.addWidget(self.inject_all_button)
+        
+        # 创建批量注入按钮
+        self.batch_inject_button = QPushButton("批量注入")
+        self.batch_inject_button.clicked.connect(self.show_injection_queue_dialog)
+        button_layout.addWidget(self.batch_inject_button)
+        
         # 创建清除按钮
         self.clear_button = QPushButton("清除")
         self.clear_button.clicked.connect(self.clear_command)
@@ -782,6 +885,20 @@ class MainWindow(QMainWindow):
         """)
         self.status_bar.addWidget(self.resize_status_label)
         
+        # 备份后台校验状态（定时读取校验服务的摘要，校验线程不直接操作界面）
+        self.backup_verify_label = QLabel("")
+        self.backup_verify_label.setStyleSheet("""
+            QLabel {
+                color: #888;
+                font-size: 11px;
+                padding: 2px 5px;
+            }
+        """)
+        self.status_bar.addPermanentWidget(self.backup_verify_label)
+        self.backup_verify_timer = QTimer(self)
+        self.backup_verify_timer.timeout.connect(self.update_backup_verification_status)
+        self.backup_verify_timer.start(5000)
+        
         # 窗口控制按钮已移除 - 使用系统默认标题栏控制
         pass
         
@@ -899,6 +1016,15 @@ class MainWindow(QMainWindow):
                         
                         # 转换为窗口坐标
                         client_point = win32gui.ScreenToClient(hwnd, point)
+                        
+                        # 目标组校准：不改变主目标，加入目标组
+                        if self.calibrating_target_set:
+                            self.reset_calibration()
+                            self.show()
+                            self.activateWindow()
+                            self.add_calibrated_target(hwnd, client_point, title, app_name)
+                            return
+                        
                         self.target_position = client_point
                         self.target_window = hwnd
                         self.target_window_title = app_name  # 保存识别后的应用名称
@@ -1047,9 +1173,128 @@ class MainWindow(QMainWindow):
             print(f"获取应用名称出错: {str(e)}")
             return window_title
             
+    def start_target_set_calibration(self):
+        """校准一个目标组窗口（不影响主目标）"""
+        self.calibrating_target_set = True
+        self.start_calibration()
+    
+    def add_calibrated_target(self, hwnd, position, title, app_name):
+        """把刚校准的窗口加入目标组，并选择它对应的项目目录（注入日志写入该项目）"""
+        default_folder = os.path.dirname(self.project_folder) if self.project_folder else os.getcwd()
+        project_folder = QFileDialog.getExistingDirectory(self, f"选择「{title}」对应的项目目录", default_folder)
+        if not project_folder:
+            # 没有项目目录就无法确定注入日志写到哪里，不能退回当前项目日志
+            self.status_label.setText(f"未选择项目目录，「{title}」没有加入目标组")
+            return
+        target = self.target_set.add(hwnd, position, title, app_name, project_folder)
+        self.save_config()
+        self.target_set_label.setText(f"目标组：{len(self.target_set)} 个窗口")
+        self.show_mini_notification(f"已加入目标组：{target['project_name'] or app_name}")
+    
+    def clear_target_set(self):
+        if not len(self.target_set):
+            return
+        self.target_set.clear()
+        self.save_config()
+        self.target_set_label.setText("目标组：0 个窗口")
+    
+    def fan_out_targets(self):
+        """多目标注入的目标：主目标（当前项目）加目标组，同一窗口只注入一次"""
+        targets = []
+        if self.target_window and self.target_position:
+            targets.append({
+                'hwnd': self.target_window,
+                'position': tuple(self.target_position),
+                'title': self.target_window_title or "",
+                'app_name': self.target_window_title or "未知应用",
+                'project_name': "",
+                'log_file': self.log_file,
+                'primary': True
+            })
+        seen = {target['hwnd'] for target in targets}
+        for target in self.target_set:
+            if target['hwnd'] not in seen:
+                seen.add(target['hwnd'])
+                targets.append(dict(target))
+        return targets
+    
+    def inject_to_all_targets(self):
+        """把输入框中的命令注入到主目标和目标组中的所有窗口，返回 {目标: 结果}"""
+        self.notify_backup_activity()
+        if self.injection_queue is not None and self.injection_queue.is_busy():
+            QMessageBox.warning(self, "提示", "批量注入正在进行，请等待完成或暂停并取消剩余命令")
+            return None
+        
+        targets = self.fan_out_targets()
+        if len(targets) < 2:
+            QMessageBox.warning(self, "错误", "请先校准目标窗口，并用「添加到目标组」加入至少一个其他窗口")
+            return None
+        
+        command = self.command_input.toPlainText().strip()
+        if not command:
+            QMessageBox.warning(self, "错误", "请输入命令")
+            return None
+        if not self.project_folder or not self.project_name or not self.log_file:
+            self.auto_detect_current_project()
+            targets[0]['log_file'] = self.log_file
+        
+        use_ai = self.realtime_check.isChecked()
+        
+        def prepare(target):
+            # 主目标沿用当前项目识别，目标组按各自校准时确定的项目名称标识
+            if target.get('primary'):
+                text, target['project_name'] = self.build_injection_text(command, use_ai, notify=False)
+                return text
+            text, _ = self.build_injection_text(command, use_ai, notify=False,
+                                                project_name=target['project_name'] or target['app_name'])
+            return text
+        
+        def relocate(target):
+            # 只在主目标项目的窗口中重新查找，避开已在本次目标中的窗口（否则同一窗口收到两次）
+            if not target.get('primary'):
+                return None
+            taken = {other['hwnd'] for other in targets}
+            project = target['project_name'] or self.project_name
+            for hwnd in self.get_window_registry().windows_for_project(project):
+                if hwnd not in taken:
+                    return hwnd
+            return None
+        
+        results = fan_out_inject(self.get_input_driver(), targets, prepare, relocate)
+        print(f"📡 多目标注入: {format_results(results)}")
+        
+        # 每个成功的目标各写一条日志到对应项目；无法确定项目日志的目标不写，不能写进当前项目日志
+        unlogged = []
+        for key, result in results.items():
+            target = result['target']
+            if target.get('primary') and result['hwnd'] != self.target_window:
+                self.target_window = result['hwnd']
+                self.save_config()
+            if not result['success']:
+                continue
+            if target['log_file']:
+                self.log_injection_entry(command, target['project_name'], target['log_file'], target['app_name'])
+            else:
+                print(f"⚠️ {key} 没有对应的项目日志，本次注入未记录（请重新加入目标组并选择项目目录）")
+                unlogged.append(key)
+        if unlogged:
+            self.status_label.setText(f"未记录日志（目标没有项目目录）：{', '.join(unlogged)}")
+        
+        succeeded = sum(1 for result in results.values() if result['success'])
+        if succeeded:
+            self.clear_command()
+        if succeeded == len(results):
+            self.show_mini_notification(f"已注入到全部 {succeeded} 个目标")
+        else:
+            failed = [f"{key}: {result['error']}" for key, result in results.items() if not result['success']]
+            QMessageBox.warning(self, "部分目标注入失败",
+                                f"成功 {succeeded}/{len(results)} 个目标\n\n" + "\n".join(failed))
+        return {key: result['success'] for key, result in results.items()}
+    
     def reset_calibration(self):
         """重置校准状态"""
         self.mouse_hook = False
+        self.calibrating_target_set = False
         if self.calibration_timer:
             self.calibration_timer.stop()
         self.calibrate_button.setEnabled(True)
@@ -1163,25 +1408,49 @@ class MainWindow(QMainWindow):
         if api_key:
             self.ai_service.set_api_key(api_key)
             
+    def get_window_registry(self):
+        """获取窗口登记表（首次调用时建立索引并开始监视窗口变化）"""
+        if self.window_registry is None:
+            self.window_registry = WindowRegistry(create_window_source())
+            self.window_registry_changed.connect(self.on_window_registry_changed)
+            self.window_registry.add_listener(self.window_registry_changed.emit)
+            self.window_registry.start()
+        return self.window_registry
+
+    def on_window_registry_changed(self, event, record):
+        """[UI线程] 已校准的目标窗口关闭时，换成同一项目仍打开的Cursor窗口"""
+        if event != "removed":
+            return
+        hwnd = record['hwnd']
+        replacements = [candidate for candidate in self.get_window_registry().windows_for_project(record['project'])
+                        if candidate != hwnd] if record['project'] else []
+        new_hwnd = replacements[0] if replacements else None
+
+        if hwnd == self.target_window:
+            if new_hwnd:
+                message = f"目标窗口已关闭，已切换到同项目的Cursor窗口（{record['project']}）"
+                print(f"🔄 {message}: {new_hwnd} (原句柄: {hwnd})")
+                self.target_window = new_hwnd
+                self.save_config()
+            else:
+                message = f"目标窗口已关闭：{record['title']}，请重新校准"
+                print(f"⚠️ {message} (句柄: {hwnd})")
+            self.status_label.setText(message)
+        if new_hwnd and any(target['hwnd'] == hwnd for target in self.target_set):
+            self.target_set.update_hwnd(hwnd, new_hwnd)
+            self.save_config()
+            self.target_set_label.setText(f"目标组：{len(self.target_set)} 个窗口")
+            self.status_label.setText(f"目标组中的窗口已关闭，已切换到同项目的Cursor窗口（{record['project']}）")
+
     def find_current_cursor_window(self):
         """动态查找当前的Cursor窗口句柄"""
         try:
-            def enum_windows_callback(hwnd, results):
-                if win32gui.IsWindowVisible(hwnd):
-                    window_title = win32gui.GetWindowText(hwnd)
-                    if window_title and "Cursor" in window_title:
-                        results.append((hwnd, window_title))
-                return True
-            
-            windows = []
-            win32gui.EnumWindows(enum_windows_callback, windows)
-            
-            # 优先选择最活跃的Cursor窗口（通常是最后一个）
-            if windows:
-                # 按窗口句柄排序，选择最新的
-                windows.sort(key=lambda x: x[0], reverse=True)
-                latest_hwnd, latest_title = windows[0]
-                print(f"🔍 找到Cursor窗口: {latest_title} (句柄: {latest_hwnd})")
+            registry = self.get_window_registry()
+            # 按窗口句柄选择最新的Cursor窗口（登记表中已缓存）
+            latest_hwnd = registry.latest_cursor_window()
+            record = registry.get(latest_hwnd) if latest_hwnd else None
+            if record:
+                print(f"🔍 找到Cursor窗口: {record['title']} (句柄: {latest_hwnd})")
                 return latest_hwnd
             
             return None
@@ -1190,54 +1459,36 @@ class MainWindow(QMainWindow):
             print(f"查找Cursor窗口失败: {e}")
             return None
 
+    def relocate_target_window(self):
+        """激活失败后重新查找Cursor窗口，句柄变化时更新配置"""
+        new_cursor_window = self.find_current_cursor_window()
+        if new_cursor_window and new_cursor_window != self.target_window:
+            self.target_window = new_cursor_window
+            self.save_config()
+        return new_cursor_window
+    
+    def get_input_driver(self):
+        """获取注入使用的输入驱动（Windows 上为 win32 驱动）"""
+        if self.input_driver is None:
+            self.input_driver = create_input_driver()
+        return self.input_driver
+
     def get_cursor_project_name(self):
         """识别当前Cursor所在的项目名称"""
         try:
-            # 尝试查找Cursor窗口
-            cursor_window = None
-            cursor_title = ""
-            
-            def enum_windows_callback(hwnd, results):
-                if win32gui.IsWindowVisible(hwnd):
-                    window_title = win32gui.GetWindowText(hwnd)
-                    if window_title and ("Cursor" in window_title or "cursor" in window_title):
-                        results.append((hwnd, window_title))
-                return True
-            
-            windows = []
-            win32gui.EnumWindows(enum_windows_callback, windows)
-            
-            # 优先选择最相关的Cursor窗口
-            for hwnd, title in windows:
-                if "Cursor" in title:
-                    cursor_window = hwnd
-                    cursor_title = title
-                    break
+            # 优先选择最近处于前台的Cursor窗口
+            registry = self.get_window_registry()
+            cursor_window = registry.current_cursor_window()
+            record = registry.get(cursor_window) if cursor_window else None
             
-            if cursor_window and cursor_title:
-                # 从窗口标题中提取项目名称
+            if record:
+                # 项目名称在登记窗口时已从标题中解析
                 # Cursor窗口标题通常格式为: "filename - project_name - Cursor"
-                parts = cursor_title.split(" - ")
-                if len(parts) >= 2:
-                    # 倒数第二个部分通常是项目名称
-                    project_name = parts[-2].strip()
-                    if project_name != "Cursor":
-                        return project_name
-                
-                # 如果从标题提取失败，尝试从路径提取
-                # 获取窗口的进程信息
-                try:
-                    thread_id, process_id = win32process.GetWindowThreadProcessId(cursor_window)
-                    process_handle = win32api.OpenProcess(win32con.PROCESS_QUERY_INFORMATION | win32con.PROCESS_VM_READ, False, process_id)
-                    if process_handle:
-                        # 这里可以进一步获取进程的工作目录
-                        # 由于复杂性，我们使用标题中的信息
-                        pass
-                except:
-                    pass
+                if record['project']:
+                    return record['project']
                     
                 # 最后的备选方案：使用整个标题
-                return cursor_title.replace(" - Cursor", "").strip()
+                return record['title'].replace(" - Cursor", "").strip()
             
             return "Cursor项目"
             
@@ -1245,13 +1496,74 @@ class MainWindow(QMainWindow):
             print(f"获取Cursor项目名称失败: {str(e)}")
             return "未知项目"
             
+    def build_injection_text(self, command, use_ai=False, notify=True, project_name=None):
+        """给命令加上项目标识，并套用默认模板或AI修饰词，返回 (注入文本, 项目名称)
+
+        批量注入、多目标注入在后台线程调用（notify=False），不操作界面。
+        project_name 为空时识别当前Cursor窗口的项目。
+        """
+        project_name = project_name or self.get_cursor_project_name()
+        
+        # 处理空命令的情况
+        if command:
+            command_with_project = f"【项目：{project_name}】\n{command}"
+        else:
+            # 空命令时只添加项目标识
+            command_with_project = f"【项目：{project_name}】"
+        
+        # 应用模板或AI修饰
+        if use_ai and self.ai_service.api_key:
+            decorators = self.ai_service.generate_decorators(command_with_project, self.default_scene)
+            if decorators:
+                return f"{decorators['prefix']}\n\n{command_with_project}\n\n{decorators['suffix']}", project_name
+            return command_with_project, project_name
+        
+        if use_ai:
+            print("⚠️ 实时生成已启用但未设置API密钥，回退到默认模板模式")
+            # 提示用户API密钥缺失但不阻止注入
+            if notify:
+                self.show_mini_notification("API密钥未设置，已使用默认模板")
+        
+        # 使用默认模板
+        if self.default_scene and self.default_version:
+            template = self.template_manager.get_template(self.default_scene, self.default_version)
+            if template:
+                return f"{template['prefix']}\n\n{command_with_project}\n\n{template['suffix']}", project_name
+        return command_with_project, project_name
+    
+    def log_injection_entry(self, original_command, project_name, log_file=None, app_name=None):
+        """把一次注入写入项目日志（默认为当前项目日志）"""
+        try:
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            app_name = app_name or self.target_window_title or "未知应用"
+            
+            # 修改日志：2025-12-21 by Assistant - 最终修复日志记录混乱问题
+            # 变更：注入工具只记录简单操作事实，避免与AI工作总结混淆
+            # 目的：区分技术操作记录和AI分析内容，解决"中间结果"问题
+            output_content = f"✅ 命令注入完成 - {app_name} - {timestamp}"
+
+            log_content = f"\n# {timestamp} ({app_name} - 项目：{project_name})\n\n## 📥 输入\n\n{original_command}\n\n## 📤 输出\n\n{output_content}\n"
+            
+            # 提交到后台写入服务，完整性检查和双重增量备份在写入线程完成
+            self.append_log_entry(log_content, "injection", {'preview': original_command[:100]}, log_file=log_file)
+            
+        except Exception as e:
+            QMessageBox.warning(self, "警告", f"记录日志失败：{str(e)}")
+    
     def inject_command(self):
         """统一的命令注入实现 - 删除冗余逻辑，专注核心功能"""
         
+        # 注入期间让出磁盘，后台备份校验暂停
+        self.notify_backup_activity()
+        
         # === 基础校验 ===
         if not self.target_window or not self.target_position:
             QMessageBox.warning(self, "错误", "请先校准目标窗口")
             return
+        
+        if self.injection_queue is not None and self.injection_queue.is_busy():
+            QMessageBox.warning(self, "提示", "批量注入正在进行，请等待完成或暂停并取消剩余命令")
+            return
             
         command = self.command_input.toPlainText().strip()
         
@@ -1277,161 +1589,20 @@ class MainWindow(QMainWindow):
             self.auto_detect_current_project()
             
         # === 准备注入内容 ===
-        project_name = self.get_cursor_project_name()
         original_command = command
-        
-        # 处理空命令的情况
-        if command:
-            command_with_project = f"【项目：{project_name}】\n{command}"
-        else:
-            # 空命令时只添加项目标识
-            command_with_project = f"【项目：{project_name}】"
-        
-        # 应用模板或AI修饰
-        if self.realtime_check.isChecked():
-            if not self.ai_service.api_key:
-                print("⚠️ 实时生成已启用但未设置API密钥，回退到默认模板模式")
-                # 回退到默认模板而不是直接返回
-                if self.default_scene and self.default_version:
-                    template = self.template_manager.get_template(self.default_scene, self.default_version)
-                    if template:
-                        final_command = f"{template['prefix']}\n\n{command_with_project}\n\n{template['suffix']}"
-                    else:
-                        final_command = command_with_project
-                else:
-                    final_command = command_with_project
-                # 提示用户API密钥缺失但不阻止注入
-                self.show_mini_notification("API密钥未设置，已使用默认模板")
-            else:
-                decorators = self.ai_service.generate_decorators(command_with_project, self.default_scene)
-                if decorators:
-                    final_command = f"{decorators['prefix']}\n\n{command_with_project}\n\n{decorators['suffix']}"
-                else:
-                    final_command = command_with_project
-        else:
-            # 使用默认模板
-            if self.default_scene and self.default_version:
-                template = self.template_manager.get_template(self.default_scene, self.default_version)
-                if template:
-                    final_command = f"{template['prefix']}\n\n{command_with_project}\n\n{template['suffix']}"
-                else:
-                    final_command = command_with_project
-            else:
-                final_command = command_with_project
+        final_command, project_name = self.build_injection_text(command, self.realtime_check.isChecked())
         
         try:
-            # === 1. 窗口激活（带动态句柄检测和重试机制） ===
-            success = False
-            target_window = self.target_window  # 使用当前配置的句柄
-            
-            for attempt in range(3):  # 增加到3次尝试
-                try:
-                    # 第一次尝试失败后，尝试重新查找Cursor窗口
-                    if attempt == 1:
-                        print(f"⚠️ 第一次激活失败，尝试重新查找Cursor窗口...")
-                        new_cursor_window = self.find_current_cursor_window()
-                        if new_cursor_window and new_cursor_window != self.target_window:
-                            print(f"🔄 发现新的Cursor窗口句柄: {new_cursor_window} (原句柄: {self.target_window})")
-                            target_window = new_cursor_window
-                            # 更新配置中的窗口句柄
-                            self.target_window = new_cursor_window
-                            self.save_config()
-                    
-                    # 第二次失败后强制恢复窗口状态
-                    if attempt == 2:
-                        win32gui.ShowWindow(target_window, win32con.SW_RESTORE)
-                        time.sleep(0.3)
-                    
-                    win32gui.SetForegroundWindow(target_window)
-                    time.sleep(0.2)
-                    
-                    # 验证激活成功
-                    current_foreground = win32gui.GetForegroundWindow()
-                    if current_foreground == target_window:
-                        print(f"✅ 窗口激活成功 (尝试 #{attempt + 1}, 句柄: {target_window})")
-                        success = True
-                        break
-                    else:
-                        print(f"❌ 窗口激活失败 (尝试 #{attempt + 1}): 目标={target_window}, 当前前台={current_foreground}")
-                        
-                except Exception as e:
-                    print(f"❌ 窗口激活异常 (尝试 #{attempt + 1}): {str(e)}")
-                    if attempt == 2:  # 最后一次尝试失败
-                        raise Exception(f"窗口激活失败: {str(e)}")
-                    
-            if not success:
-                raise Exception(f"无法激活目标窗口 (最终句柄: {target_window})")
-            
-            # === 2. 鼠标定位和点击 ===
-            point = win32gui.ClientToScreen(target_window, self.target_position)
-            win32api.SetCursorPos(point)
-            time.sleep(0.1)
-            
-            # 执行点击
-            win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, 0, 0, 0, 0)
-            win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, 0, 0, 0, 0)
-            time.sleep(0.1)
-            
-            # === 3. 剪贴板操作（带验证） ===
-            pyperclip.copy(final_command)
-            time.sleep(0.1)
-            
-            # 验证剪贴板内容
-            clipboard_content = pyperclip.paste()
-            if clipboard_content != final_command:
-                raise Exception("剪贴板复制失败")
-            
-            # === 4. 粘贴操作 ===
-            win32api.keybd_event(win32con.VK_CONTROL, 0, 0, 0)
-            win32api.keybd_event(ord('V'), 0, 0, 0)
-            time.sleep(0.1)
-            win32api.keybd_event(ord('V'), 0, win32con.KEYEVENTF_KEYUP, 0)
-            win32api.keybd_event(win32con.VK_CONTROL, 0, win32con.KEYEVENTF_KEYUP, 0)
-            time.sleep(0.1)
-            
-            # === 5. 发送回车 ===
-            win32api.keybd_event(win32con.VK_RETURN, 0, 0, 0)
-            win32api.keybd_event(win32con.VK_RETURN, 0, win32con.KEYEVENTF_KEYUP, 0)
-            time.sleep(0.2)
+            # === 1~5. 激活、点击、剪贴板、粘贴、提交（由输入驱动执行，条件满足即进入下一步，见 input_driver.WAIT_TIMEOUTS） ===
+            sequence = InjectionSequence(self.get_input_driver())
+            result = sequence.run(self.target_window, self.target_position, final_command,
+                                  relocate=self.relocate_target_window)
+            self.injection_durations = self.injection_durations[-49:] + [result['total_ms']]
+            print(f"⏱️ 注入阶段耗时: {format_timings(result)} | 最近 {len(self.injection_durations)} 次中位 "
+                  f"{statistics.median(self.injection_durations):.0f}ms")
             
             # === 6. 记录日志 ===
-            try:
-                self.auto_recover_log_file()
-                
-                log_dir = os.path.dirname(self.log_file)
-                if not os.path.exists(log_dir):
-                    os.makedirs(log_dir, exist_ok=True)
-                    
-                timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                app_name = self.target_window_title if self.target_window_title else "未知应用"
-                
-                # 修改日志：2025-12-21 by Assistant - 最终修复日志记录混乱问题
-                # 变更：注入工具只记录简单操作事实，避免与AI工作总结混淆
-                # 目的：区分技术操作记录和AI分析内容，解决"中间结果"问题
-                output_content = f"✅ 命令注入完成 - {app_name} - {timestamp}"
-
-                log_content = f"\n# {timestamp} ({app_name} - 项目：{project_name})\n\n## 📥 输入\n\n{original_command}\n\n## 📤 输出\n\n{output_content}\n"
-                
-                with open(self.log_file, 'a', encoding='utf-8') as f:
-                    f.write(log_content)
-                
-                # 【修复】增量备份机制 - 每次注入后自动创建备份
-                try:
-                    backup1 = self.create_log_backup("backup-1")
-                    backup2 = self.create_log_backup("backup-2")
-                    if backup1 and backup2:
-                        print("✅ 自动双重增量备份创建完成")
-                    elif backup1 or backup2:
-                        print("⚠️ 部分增量备份创建成功")
-                    else:
-                        print("⚠️ 增量备份创建失败")
-                except Exception as backup_error:
-                    print(f"⚠️ 备份创建异常：{backup_error}")
-                
-                # 移除独立时间戳备份，减少冗余文件
-                
-            except Exception as e:
-                QMessageBox.warning(self, "警告", f"记录日志失败：{str(e)}")
+            self.log_injection_entry(original_command, project_name)
             
             # === 7. 完成操作 ===
             self.clear_command()
@@ -1450,6 +1621,64 @@ class MainWindow(QMainWindow):
     
     def clear_command(self):
         self.command_input.clear()
+    
+    def get_injection_queue(self):
+        """获取批量注入队列（与单条注入共用输入驱动）"""
+        if self.injection_queue is None:
+            self.injection_queue = InjectionQueue(
+                self.get_input_driver(),
+                prepare=lambda command, options: self.build_injection_text(command, options.get('use_ai', False), notify=False),
+                target=lambda: (self.target_window, self.target_position),
+                relocate=self.find_current_cursor_window,
+                pacing=self.injection_pacing
+            )
+            self.injection_queue.item_changed.connect(self.on_injection_item_changed)
+            self.injection_queue.batch_finished.connect(self.on_injection_batch_finished)
+            self.injection_queue.target_changed.connect(self.on_injection_target_changed)
+        return self.injection_queue
+    
+    def show_injection_queue_dialog(self):
+        """打开批量注入窗口（非模态，关闭窗口不影响队列运行）"""
+        if not self.target_window or not self.target_position:
+            QMessageBox.warning(self, "错误", "请先校准目标窗口")
+            return
+        if not self.project_folder or not self.project_name or not self.log_file:
+            self.auto_detect_current_project()
+        
+        if self.injection_queue_dialog is None or not self.injection_queue_dialog.isVisible():
+            self.injection_queue_dialog = InjectionQueueDialog(
+                self.get_injection_queue(),
+                options_provider=lambda: {'use_ai': self.realtime_check.isChecked()},
+                parent=self
+            )
+        self.injection_queue_dialog.show()
+        self.injection_queue_dialog.raise_()
+        self.injection_queue_dialog.activateWindow()
+    
+    def on_injection_item_changed(self, item):
+        """[UI线程] 批量注入条目状态变化：成功的条目写入项目日志"""
+        self.notify_backup_activity()
+        if item['status'] == 'done':
+            self.log_injection_entry(item['command'], item['project_name'])
+            self.status_label.setText(f"批量注入 #{item['id']} 已完成")
+        elif item['status'] == 'failed':
+            self.status_label.setText(f"批量注入 #{item['id']} 失败，队列已暂停")
+            self.log_injection_failure_check("BATCH_INJECTION_FAILED", f"queue-{item['id']}", {
+                'error': item['error'],
+                'command_preview': item['command'][:50]
+            })
+    
+    def on_injection_batch_finished(self, summary):
+        """[UI线程] 一批命令全部结束"""
+        self.save_config()
+        self.show_mini_notification(f"批量注入完成：成功 {summary['done']} 条，失败 {summary['failed']} 条")
+    
+    def on_injection_target_changed(self, hwnd):
+        """[UI线程] 批量注入时重新查找到了新的目标窗口句柄"""
+        if hwnd and hwnd != self.target_window:
+            print(f"🔄 批量注入更新目标窗口句柄: {hwnd} (原句柄: {self.target_window})")
+            self.target_window = hwnd
+            self.save_config()
         
     def auto_detect_current_project(self):
         """自动检测当前项目"""
@@ -1782,8 +2011,33 @@ class MainWindow(QMainWindow):
             self.layout_manager.save_layout_state()
         
         # 停止日志文件监控
-        if hasattr(self, 'log_monitor_timer'):
-            self.log_monitor_timer.stop()
+        if self.log_file_watcher is not None:
+            self.log_file_watcher.stop()
+        
+        # 等待日志写入服务把队列中的条目落盘
+        for writer in self.journal_writers.values():
+            writer.stop()
+        
+        # 停止后台快照（未完成的快照由下次备份补上）
+        if self.snapshot_worker is not None:
+            self.snapshot_worker.stop()
+        
+        # 停止备份复制（未完成的副本下次启动时补齐）
+        if self.backup_replicator is not None:
+            self.backup_replicator.stop()
+        
+        # 停止备份校验（下次启动时从头开始本轮校验）
+        if self.backup_verifier is not None:
+            self.backup_verifier.stop()
+        
+        # 停止批量注入（正在注入的一条完成后退出，其余丢弃）
+        if self.injection_queue is not None:
+            self.injection_queue.cancel_pending()
+            self.injection_queue.stop()
+        
+        # 停止窗口监视
+        if self.window_registry is not None:
+            self.window_registry.stop()
         
         # 释放项目锁
         if self.project_name:
@@ -1880,6 +2134,8 @@ class MainWindow(QMainWindow):
         
         # 如果剪贴板包含图片
         if mime_data.hasImage():
+            if not self.log_file:
+                self.auto_detect_current_project()
             image = clipboard.image()
             if not image.isNull():
                 # 将图片插入到文本编辑器
@@ -1890,26 +2146,32 @@ class MainWindow(QMainWindow):
         # 没有图片则让QTextEdit自行处理粘贴
         return False
     
+    def get_image_store(self):
+        """获取当前项目日志目录下的笔记图片库（未确定项目时使用临时目录，记笔记时再导入项目）"""
+        if self.log_file:
+            image_dir = os.path.join(os.path.dirname(os.path.abspath(self.log_file)), "images")
+        else:
+            image_dir = os.path.join(tempfile.gettempdir(), "injection-images")
+        if self.image_store is None or self.image_store.image_dir != os.path.abspath(image_dir):
+            self.image_store = ImageStore(image_dir)
+        return self.image_store
+    
     def insert_image_to_editor(self, image):
-        """将图片插入到文本编辑器"""
+        """将图片存入图片库，并以哈希文件（过宽时用缩略图）插入到文本编辑器"""
         try:
-            # 调整图片大小，如果太大
-            if image.width() > 600:
-                image = image.scaledToWidth(600, Qt.SmoothTransformation)
-                
-            # 创建一个QTextCursor来操作文本编辑器内容
-            cursor = self.command_input.textCursor()
+            store = self.get_image_store()
+            digest = store.put_qimage(image)
+            display_path = store.thumbnail(store.path_for(digest), EDITOR_IMAGE_WIDTH)
+            image_url = QUrl.fromLocalFile(display_path)
             
-            # 将QImage转换为QPixmap，然后插入到文档中
-            pixmap = QPixmap.fromImage(image)
-            self.command_input.document().addResource(
-                1,  # QTextDocument.ImageResource
-                QUrl("clipboard_image"),
-                pixmap
-            )
+            # 同一张图片对应同一个资源地址，文档中只保留一份像素数据
+            document = self.command_input.document()
+            if document.resource(1, image_url) is None:  # 1 = QTextDocument.ImageResource
+                document.addResource(1, image_url, QPixmap(display_path))
             
             # 使用HTML插入图片
-            cursor.insertHtml(f'<img src="clipboard_image" /><br>')
+            cursor = self.command_input.textCursor()
+            cursor.insertHtml(f'<img src="{image_url.toString()}" /><br>')
             
             # 显示成功消息
             self.status_label.setText("已粘贴图片")
@@ -1960,16 +2222,7 @@ class MainWindow(QMainWindow):
             return
             
         try:
-            # 检查并自动恢复日志文件（如果需要）
-            self.auto_recover_log_file()
-            
-            # 监控日志写入尝试
-            write_attempt_id = self.monitor_log_write_attempt("take_note", plain_text)
-            
-            # 确保日志文件目录存在
             log_dir = os.path.dirname(self.log_file)
-            if not os.path.exists(log_dir):
-                os.makedirs(log_dir, exist_ok=True)
             
             # 获取时间戳和应用名称
             timestamp_text = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -1979,78 +2232,46 @@ class MainWindow(QMainWindow):
             # 修改日志：2025-12-21 by Assistant - 为笔记创建专属格式标识
             # 笔记专属格式: "# 时间戳 (📝 笔记 - 项目：项目名称)"
             title_text = f"\n# {timestamp_text} (📝 笔记 - 项目：{project_name})\n\n"
+            note_content = title_text
+            image_md = None
             
-            # 如果内容中包含图片，保存图片文件并生成Markdown链接
+            # 如果内容中包含图片，按编辑框中的图片生成指向哈希文件的Markdown链接
             if "<img" in note_html:
-                # 创建图片保存目录
-                image_dir = os.path.join(log_dir, "images")
-                if not os.path.exists(image_dir):
-                    os.makedirs(image_dir, exist_ok=True)
-                
-                # 获取文档中的图片
-                timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-                
-                # 从HTML中提取图片
-                # 创建一个临时文件来保存剪贴板中的图片
-                temp_image_path = os.path.join(image_dir, f"{timestamp}.png")
-                
-                # 获取当前剪贴板中的图片（如果有）
-                clipboard = QApplication.clipboard()
-                if clipboard.mimeData().hasImage():
-                    image = clipboard.image()
-                    if not image.isNull():
-                        # 保存图片
-                        image.save(temp_image_path)
-                        
-                        # 创建图片的Markdown链接
-                        rel_path = os.path.relpath(temp_image_path, os.path.dirname(self.log_file))
-                        rel_path = rel_path.replace("\\", "/")  # 确保使用正斜杠
-                        image_md = f"\n![图片]({rel_path})\n"
-                        
-                        # 写入日志文件
-                        with open(self.log_file, 'a', encoding='utf-8') as f:
-                            f.write(title_text)
-                            
-                            # 如果有文本，先写入文本
-                            if plain_text.strip():
-                                f.write(f"{plain_text}\n\n")
-                                
-                            # 再写入图片引用（笔记不需要输出块）
-                            f.write(f"{image_md}\n")
-                    else:
-                        # 没有图片，只写入文本
-                        with open(self.log_file, 'a', encoding='utf-8') as f:
-                            f.write(title_text)
-                            f.write(f"{plain_text}\n")
-                else:
-                    # 没有图片，只写入文本
-                    with open(self.log_file, 'a', encoding='utf-8') as f:
-                        f.write(title_text)
-                        f.write(f"{plain_text}\n")
+                store = self.get_image_store()
+                links = []
+                seen = set()
+                for src in re.findall(r'<img[^>]*\ssrc="([^"]+)"', note_html):
+                    image_path = QUrl(src).toLocalFile()
+                    if not image_path or not os.path.exists(ImageStore.source_of(image_path)[0]):
+                        continue
+                    # 粘贴时尚未确定项目的图片在这里导入项目图片库（已在库中则直接取哈希）
+                    digest = store.import_file(image_path)
+                    if digest not in seen:
+                        seen.add(digest)
+                        links.append(store.markdown_link(digest, log_dir))
+                if links:
+                    image_md = "\n" + "\n\n".join(links) + "\n"
+            
+            if image_md:
+                # 如果有文本，先写入文本
+                if plain_text.strip():
+                    note_content += f"{plain_text}\n\n"
+                    
+                # 再写入图片引用（笔记不需要输出块）
+                note_content += f"{image_md}\n"
             else:
-                # 纯文本笔记
-                with open(self.log_file, 'a', encoding='utf-8') as f:
-                    f.write(title_text)
-                    f.write(f"{plain_text}\n")
-                
-            # 验证写入是否成功并进行双重备份
-            if write_attempt_id:
-                if self.verify_log_write_success(write_attempt_id, expected_append=True):
-                    # 创建双重备份（两个独立的备份文件）
-                    backup1 = self.create_log_backup("backup-1")
-                    backup2 = self.create_log_backup("backup-2")
-                    if backup1 and backup2:
-                        print("✅ 笔记日志双重备份创建完成")
-                    else:
-                        print("⚠️ 备份创建部分失败")
+                # 没有图片，只写入文本
+                note_content += f"{plain_text}\n"
+            
+            # 提交到后台写入服务，写入验证和双重备份在写入线程完成
+            if not self.append_log_entry(note_content, "note", {'preview': plain_text[:100]}):
+                return
             
             # 清除输入框
             self.clear_command()
             
-            # 显示成功消息
-            self.status_label.setText("笔记已保存")
-            # 显示小提示，1秒后自动消失
-            self.show_mini_notification("笔记已保存")
+            # 显示提交消息（落盘完成后由 on_log_entries_committed 提示"笔记已保存"）
+            self.status_label.setText("笔记保存中...")
             
         except Exception as e:
             QMessageBox.warning(self, "错误", f"保存笔记失败：{str(e)}")
@@ -2072,24 +2293,17 @@ class MainWindow(QMainWindow):
             cascade_window = None
             
             # 尝试所有可能的标题
+            registry = self.get_window_registry()
             for title in possible_titles:
-                hwnd = win32gui.FindWindow(None, title)
+                hwnd = registry.find_by_title(title)
                 if hwnd:
                     cascade_window = hwnd
                     self.status_label.setText(f"找到窗口: {title}")
                     break
             
             if not cascade_window:
-                # 如果找不到预设标题，尝试枚举所有窗口
-                def enum_windows_callback(hwnd, results):
-                    if win32gui.IsWindowVisible(hwnd):
-                        window_title = win32gui.GetWindowText(hwnd)
-                        if window_title and len(window_title) > 0:
-                            results.append((hwnd, window_title))
-                    return True
-                
-                windows = []
-                win32gui.EnumWindows(enum_windows_callback, windows)
+                # 如果找不到预设标题，列出登记表中的所有窗口
+                windows = registry.visible_windows()
                 
                 # 显示窗口选择对话框
                 if windows:
@@ -2159,34 +2373,17 @@ class MainWindow(QMainWindow):
                     self.auto_detect_current_project()
                     
                 try:
-                    # 确保日志文件目录存在
-                    log_dir = os.path.dirname(self.log_file)
-                    if not os.path.exists(log_dir):
-                        os.makedirs(log_dir, exist_ok=True)
-                        
-                    # 执行完整的日志保护流程
-                    self.auto_recover_log_file()
-                    write_attempt_id = self.monitor_log_write_attempt("capture_cascade_text", text[:100] + "..." if len(text) > 100 else text)
+                    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    project_name = self.get_cursor_project_name()
+                    # 统一使用交互块格式
+                    cascade_content = f"\n# {timestamp} (从Cascade获取 - 项目：{project_name})\n\n## 📥 输入\n\n从Cascade窗口捕获文本\n\n## 📤 输出\n\n{text}\n"
                     
-                    with open(self.log_file, 'a', encoding='utf-8') as f:
-                        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        project_name = self.get_cursor_project_name()
-                        # 统一使用交互块格式
-                        f.write(f"\n# {timestamp} (从Cascade获取 - 项目：{project_name})\n\n## 📥 输入\n\n从Cascade窗口捕获文本\n\n## 📤 输出\n\n{text}\n")
-                    
-                    # 验证写入成功并进行双重备份
-                    if self.verify_log_write_success(write_attempt_id):
-                        # 创建双重备份（两个独立的备份文件）
-                        backup1 = self.create_log_backup("backup-1")
-                        backup2 = self.create_log_backup("backup-2")
-                        if backup1 and backup2:
-                            print("✅ Cascade日志双重备份创建完成")
-                        else:
-                            print("⚠️ 备份创建部分失败")
-                        
-                    # 显示成功消息
-                    self.status_label.setText("已从Cascade获取文本并保存到日志")
-                    self.show_mini_notification("已获取Cascade文本")
+                    # 提交到后台写入服务，完整的日志保护流程在写入线程执行
+                    preview = text[:100] + "..." if len(text) > 100 else text
+                    if self.append_log_entry(cascade_content, "cascade", {'preview': preview}):
+                        # 显示成功消息
+                        self.status_label.setText("已从Cascade获取文本，正在保存到日志")
+                        self.show_mini_notification("已获取Cascade文本")
                     
                 except Exception as e:
                     QMessageBox.warning(self, "错误", f"保存日志失败：{str(e)}")
@@ -2446,7 +2643,8 @@ class MainWindow(QMainWindow):
                 'report_time': current_state['timestamp'],
                 'system_info': self.debug_log['system_info'],
                 'current_state': current_state,
-                'injection_failure_diagnosis': self.debug_log['injection_failure_diagnosis']
+                'injection_failure_diagnosis': self.debug_log['injection_failure_diagnosis'],
+                'backup_verification': self.backup_verifier.result if self.backup_verifier is not None else None
             }
             
             # 生成文件名
@@ -2522,6 +2720,20 @@ class MainWindow(QMainWindow):
                                     f.write(f"  - {key}: {value}\n")
                                 f.write("\n")
                         
+                        # 备份校验
+                        f.write("## 🛡️ 备份后台校验\n\n")
+                        verification = diagnosis_data['backup_verification']
+                        if verification:
+                            f.write(f"- **最近完成**: {verification.get('finished')}\n")
+                            f.write(f"- **校验文件数**: {verification['checked_files']}\n")
+                            for category, stats in sorted(verification['categories'].items()):
+                                f.write(f"- **{category}**: {stats['files']} 个文件，{stats['problems']} 个问题\n")
+                            for problem in verification['problems']:
+                                f.write(f"  - ❌ [{problem['category']}] {problem['path']}: {problem['error']}\n")
+                        else:
+                            f.write("- 尚未完成过备份校验\n")
+                        f.write("\n")
+                        
                         # 诊断建议
                         f.write("## 💡 诊断建议\n\n")
                         if failed_count > 0:
@@ -2581,8 +2793,15 @@ class MainWindow(QMainWindow):
             # 初始化文件状态
             if os.path.exists(self.log_file):
                 self.last_log_size = os.path.getsize(self.log_file)
-                # 创建启动时的增量备份
-                self.create_log_backup("startup")
+                # 应用未运行期间的改动只能靠完整校验发现
+                self.verify_log_history_full()
+                # 创建启动时的增量备份（没有快照时首次快照要切分整个日志，在后台线程执行）
+                self.get_backup_engine()
+                self.get_chunk_store()
+                threading.Thread(target=self.create_log_backup, args=("startup",),
+                                 name="StartupLogBackup", daemon=True).start()
+                # 空闲时后台校验备份和副本
+                self.get_backup_verifier().start()
                 print(f"🔐 增量备份保护已启用，文件大小：{self.last_log_size} 字节")
                 print("📝 增量备份机制：只备份新增内容，防止AI篡改历史日志")
             else:
@@ -2601,171 +2820,509 @@ class MainWindow(QMainWindow):
             self.log_error("LOG_PROTECTION_INIT_ERROR", str(e))
     
     def start_log_file_monitoring(self):
-        """启动日志文件监控，自动检测文件变化并创建双备份"""
+        """启动日志文件监控，文件发生变化时才处理备份"""
         if not self.log_file:
             return
-            
-        # 启动定时器，每2秒检查一次文件变化
-        self.log_monitor_timer = QTimer()
-        self.log_monitor_timer.timeout.connect(self.check_log_file_changes)
-        self.log_monitor_timer.start(2000)  # 2秒间隔
-        print("🔍 日志文件监控已启动")
+        
+        # 切换项目时替换原有监控
+        if self.log_file_watcher is not None:
+            if self.log_file_watcher.log_file == os.path.abspath(self.log_file) and self.log_file_watcher.is_watching:
+                return
+            self.log_file_watcher.stop()
+        
+        self.log_file_watcher = LogFileWatcher(self.log_file, parent=self)
+        self.log_file_watcher.log_changed.connect(self.on_log_file_changed)
+        self.log_file_watcher.start()
     
-    def check_log_file_changes(self):
-        """检查日志文件是否有变化，如有变化则创建双备份"""
+    def on_log_file_changed(self, log_file, change, old_size, new_size):
+        """[UI线程] 日志文件发生变化（防抖合并后的一次通知）
+
+        备份、完整性检查和恢复要读取整个日志，排入写入线程与追加串行执行，不阻塞界面；
+        完成后经 log_change_handled 信号回到UI线程刷新。
+        """
         try:
-            if not os.path.exists(self.log_file):
+            if not self.log_file or os.path.abspath(self.log_file) != log_file:
                 return
-                
-            current_size = os.path.getsize(self.log_file)
             
-            # 如果文件大小发生变化，说明有新内容写入
-            if current_size > self.last_log_size:
-                print(f"📝 检测到日志文件变化：{self.last_log_size} → {current_size} 字节")
-                
-                # 更新记录的文件大小
-                self.last_log_size = current_size
-                
-                # 创建双重备份
-                backup1 = self.create_log_backup("backup-1")
-                backup2 = self.create_log_backup("backup-2")
+            # 本应用写入服务追加的内容：索引、备份和快照已在写入线程完成，阅读器由提交信号刷新
+            writer = self.journal_writers.get(self.log_file)
+            if (change in (LogFileWatcher.CHANGE_APPEND, LogFileWatcher.CHANGE_CREATED) and writer is not None
+                    and new_size <= writer.committed_size):
+                self.last_log_size = new_size
+                return
+            
+            print(f"📝 检测到日志文件变化（{change}）：{old_size} → {new_size} 字节")
+            self.get_journal_writer().submit_task(
+                lambda: self.handle_log_file_change(log_file, change, old_size, new_size))
                 
-                if backup1 and backup2:
-                    print("✅ 自动双重备份创建完成")
-                else:
-                    print("⚠️ 自动备份创建部分失败")
-                    
         except Exception as e:
             # 静默处理监控错误，避免干扰正常功能
-            pass
+            print(f"⚠️ 处理日志文件变化失败：{e}")
     
-    def create_log_backup(self, backup_type="auto"):
-        """创建增量日志文件备份"""
-        try:
-            if not os.path.exists(self.log_file):
-                return None
-                
-            # 使用项目名称作为备份文件前缀
-            project_prefix = self.project_name if self.project_name else "unknown"
-            
-            # 生成备份文件名
-            if backup_type.startswith("backup-"):
-                backup_filename = f"{project_prefix}-log-incremental-{backup_type.split('-')[1]}.md"
-            elif backup_type == "startup":
-                backup_filename = f"{project_prefix}-log-incremental-startup.md"
-            else:
-                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                backup_filename = f"{project_prefix}-log-incremental-{backup_type}-{timestamp}.md"
-                
-            # 三级备份策略：当前目录、项目backups、AI项目目录
-            if backup_type == "backup-2":
-                # backup-2 移动到 d:\ai-projects 目录
-                ai_projects_dir = r"d:\ai-projects"
-                os.makedirs(ai_projects_dir, exist_ok=True)
-                backup_path = os.path.join(ai_projects_dir, backup_filename)
-            else:
-                backup_path = os.path.join(self.backup_dir, backup_filename)
-            
-            # 增量备份逻辑
-            increment_content = self.create_incremental_backup_content(backup_type)
-            
-            if increment_content:
-                with open(backup_path, 'w', encoding='utf-8') as f:
-                    f.write(increment_content)
-                location = "AI项目目录" if backup_type == "backup-2" else "项目目录"
-                print(f"✅ 增量日志备份创建 ({location})：{backup_filename} ({len(increment_content)} 字符)")
-                
-                # 记录备份创建事件
-                self.log_injection_failure_check("LOG_INCREMENTAL_BACKUP_CREATED", backup_type, {
-                    'backup_file': backup_filename,
-                    'increment_size': len(increment_content),
-                    'backup_type': 'incremental',
-                    'backup_location': location
-                })
-                
-                return backup_path
-            else:
-                print(f"⚠️ 没有新内容需要备份：{backup_type}")
-                return None
-            
-        except Exception as e:
-            print(f"❌ 创建增量日志备份失败：{e}")
-            self.log_error("LOG_BACKUP_ERROR", str(e))
-            return None
-
-    def create_incremental_backup_content(self, backup_type):
-        """创建增量备份内容"""
-        try:
-            # 读取当前日志文件
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                current_content = f.read()
-            
-            # 获取上次备份位置标记
-            last_backup_position = self.get_last_backup_position(backup_type)
-            
-            # 如果是首次备份，备份全部内容
-            if last_backup_position == 0:
-                increment_content = self.create_backup_header(backup_type, "FULL_BACKUP") + current_content
-                self.update_backup_position(backup_type, len(current_content))
-                return increment_content
-            
-            # 提取增量内容
-            if len(current_content) > last_backup_position:
-                new_content = current_content[last_backup_position:]
-                increment_content = self.create_backup_header(backup_type, "INCREMENTAL_BACKUP", last_backup_position) + new_content
-                self.update_backup_position(backup_type, len(current_content))
-                return increment_content
-            
-            # 检测到文件被截断或清空
-            if len(current_content) < last_backup_position:
-                increment_content = self.create_backup_header(backup_type, "TRUNCATION_DETECTED") + current_content
-                self.update_backup_position(backup_type, len(current_content))
-                return increment_content
-            
-            return None  # 没有新内容
+    def handle_log_file_change(self, log_file, change, old_size, new_size):
+        """[写入线程] 外部改动后的备份、完整性检查和恢复"""
+        if not self.log_file or os.path.abspath(self.log_file) != log_file:
+            return
+        
+        recovered = False
+        if change in (LogFileWatcher.CHANGE_APPEND, LogFileWatcher.CHANGE_CREATED):
+            self.last_log_size = new_size
             
-        except Exception as e:
-            print(f"❌ 创建增量备份内容失败：{e}")
-            return None
+            # 备份引擎按字节偏移判断，已由写入服务备份过的内容不会重复写入
+            backup1, backup2 = self.create_dual_log_backup()
+            if backup1 and backup2:
+                print("✅ 自动双重备份创建完成")
+        
+        elif change in (LogFileWatcher.CHANGE_TRUNCATE, LogFileWatcher.CHANGE_DELETED):
+            # 外部截断或删除：交给完整性检查决定是否从备份恢复
+            self.log_injection_failure_check("LOG_FILE_EXTERNAL_CHANGE", change, {
+                'previous_size': old_size,
+                'current_size': new_size
+            })
+            recovered = bool(self.auto_recover_log_file())
+        
+        elif change == LogFileWatcher.CHANGE_REWRITE:
+            # 尾部被原地改写：记录事件并由哈希链定位改动的块，备份引擎会检测到改写并做一次全量备份
+            self.log_injection_failure_check("LOG_FILE_EXTERNAL_CHANGE", change, {
+                'previous_size': old_size,
+                'current_size': new_size
+            })
+            self.check_log_file_integrity()
+            self.last_log_size = new_size
+            self.create_dual_log_backup()
+        
+        self.log_change_handled.emit(log_file, recovered)
+    
+    def on_log_change_handled(self, log_file, recovered):
+        """[UI线程] 外部改动处理完成：恢复后重设文件监控基线，阅读器打开时同步显示"""
+        if not self.log_file or os.path.abspath(self.log_file) != log_file:
+            return
+        if recovered and self.log_file_watcher:
+            self.log_file_watcher.rebaseline()
+        if self.md_reader_visible and self.md_reader_panel:
+            self.load_log_content()
+    
+    def get_backup_engine(self):
+        """获取当前日志文件对应的增量备份引擎"""
+        if self.backup_engine is None or self.backup_engine.log_file != self.log_file:
+            self.backup_engine = LogBackupEngine(self.log_file, self.backup_dir, self.project_name,
+                                                 codec=self.get_log_codec())
+        return self.backup_engine
 
-    def create_backup_header(self, backup_type, backup_mode, start_position=0):
-        """创建备份文件头部信息"""
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        header = f"""# 增量日志备份
-## 备份信息
-- 备份时间: {timestamp}
-- 备份类型: {backup_type}
-- 备份模式: {backup_mode}
-- 起始位置: {start_position}
-- 项目名称: {self.project_name if self.project_name else "unknown"}
+    def get_log_codec(self):
+        """获取当前备份目录的压缩编码（字典保存在 backups/dictionaries/）"""
+        dict_dir = os.path.join(self.backup_dir, DICTIONARY_DIR_NAME)
+        if self.log_codec is None or self.log_codec.dict_dir != dict_dir:
+            self.log_codec = LogCodec(dict_dir, self.log_compression)
+        return self.log_codec
 
----
+    def get_chunk_store(self):
+        """获取当前备份目录下的内容寻址快照库"""
+        store_dir = os.path.join(self.backup_dir, "chunk-store")
+        if self.chunk_store is None or self.chunk_store.store_dir != store_dir:
+            self.chunk_store = ChunkStore(store_dir)
+        return self.chunk_store
 
-"""
-        return header
+    def get_snapshot_worker(self):
+        """获取当前快照库的后台快照线程（分块哈希较慢，不在写入线程和UI线程执行）"""
+        store = self.get_chunk_store()
+        if self.snapshot_worker is None or self.snapshot_worker.store is not store:
+            if self.snapshot_worker is not None:
+                self.snapshot_worker.stop()
+            self.snapshot_worker = SnapshotWorker(store, on_snapshot=self.on_log_snapshot_created)
+        return self.snapshot_worker
 
-    def get_last_backup_position(self, backup_type):
-        """获取上次备份的位置"""
+    def on_log_snapshot_created(self, log_file, manifest):
+        """[快照线程] 后台快照完成：把清单和新增块对象交给复制服务"""
+        print(f"🧩 日志快照 {manifest['id']}：{manifest['size']} 字节，"
+              f"新增 {manifest['new_chunks']} 块 / {manifest['stored_bytes']} 字节")
         try:
-            backup_meta_file = os.path.join(self.backup_dir, f"backup_meta_{backup_type}.txt")
-            if os.path.exists(backup_meta_file):
-                with open(backup_meta_file, 'r', encoding='utf-8') as f:
-                    return int(f.read().strip())
-            return 0
-        except:
-            return 0
+            store = self.snapshot_worker.store
+            paths = [store.manifest_path(os.path.basename(log_file), manifest['id'])]
+            paths.extend(store.object_path(digest) for digest in manifest['new_objects'])
+            self.get_backup_replicator().submit(paths)
+        except Exception as e:
+            print(f"⚠️ 提交快照复制失败：{e}")
 
-    def update_backup_position(self, backup_type, position):
-        """更新备份位置记录"""
+    def get_backup_replicator(self):
+        """获取当前备份目录的异步复制服务（首次创建时后台补齐副本）"""
+        if self.backup_replicator is not None and self.backup_replicator.source_roots.get('') == self.backup_dir:
+            return self.backup_replicator
+        if self.backup_replicator is not None:
+            self.backup_replicator.stop()
+        
+        archive_dir = os.path.join(os.path.dirname(os.path.abspath(self.log_file)), "log-archive")
+        self.backup_replicator = BackupReplicator(
+            {'': self.backup_dir, 'log-archive': archive_dir},
+            load_target_config(self.backup_dir, self.project_name or "unknown"),
+            status_path=os.path.join(self.backup_dir, STATUS_FILE_NAME)
+        )
+        self.backup_replicator.start()
+        self.backup_replicator.catch_up_async()
+        return self.backup_replicator
+
+    def replicate_backup_files(self, paths):
+        """把新写入的备份文件交给复制服务（只入队，不等待副本写入）"""
         try:
-            backup_meta_file = os.path.join(self.backup_dir, f"backup_meta_{backup_type}.txt")
-            with open(backup_meta_file, 'w', encoding='utf-8') as f:
-                f.write(str(position))
+            paths = list(paths)
+            integrity = self.get_log_integrity()
+            paths.append(integrity.state_path)
+            self.get_backup_replicator().submit(paths)
         except Exception as e:
-            print(f"❌ 更新备份位置失败：{e}")
+            print(f"⚠️ 提交备份复制失败：{e}")
 
-    def check_log_file_integrity(self):
-        """检查日志文件完整性"""
+    def get_log_integrity(self):
+        """获取当前日志文件对应的完整性哈希链（记录在备份目录中）"""
+        if self.log_integrity is None or self.log_integrity.log_file != self.log_file:
+            self.log_integrity = LogIntegrityChain(self.log_file, self.backup_dir)
+        return self.log_integrity
+
+    def snapshot_log_history(self, reason):
+        """为日志当前内容建立去重快照（保留每次备份时的完整历史状态）"""
+        try:
+            manifest = self.get_chunk_store().snapshot(self.log_file, reason)
+            if manifest:
+                print(f"🧩 日志快照 {manifest['id']}：{manifest['size']} 字节，"
+                      f"新增 {manifest['new_chunks']} 块 / {manifest['stored_bytes']} 字节")
+            return manifest
+        except Exception as e:
+            print(f"⚠️ 创建日志快照失败：{e}")
+            self.log_error("LOG_SNAPSHOT_ERROR", str(e))
+            return None
+
+    def restore_log_from_snapshot(self):
+        """[写入线程，日志句柄已关闭] 从内容比当前日志更多的最新快照恢复日志，返回快照清单或None
+
+        当前日志还有内容时按条目合并（补回丢失条目、保留新增条目），而不是整体覆盖。
+        """
+        store = self.get_chunk_store()
+        log_name = os.path.basename(self.log_file)
+        current_size = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+        self.last_log_diff = None
+        for manifest in reversed(store.list_snapshots(log_name)):
+            if manifest['size'] > current_size:
+                if current_size > 0:
+                    self.merge_log_with(DiffSide.from_snapshot(store, log_name, manifest['id']))
+                else:
+                    store.restore(log_name, manifest['id'], self.log_file)
+                return manifest
+        return None
+
+    def merge_log_with(self, base):
+        """[写入线程，日志句柄已关闭] 把备份/快照与当前日志按条目合并并原地替换日志
+
+        差异报告通过 log_diff_ready 信号交给UI线程显示在日志阅读器中。
+        """
+        result = merge_into_log(base, self.log_file, prefer="base")
+        counts = result['counts']
+        print(f"🔀 日志已与 {result['base']} 合并：补回 {counts.get('removed', 0)} 条，"
+              f"保留新增 {counts.get('added', 0)} 条，改动 {counts.get('modified', 0)} 条恢复为备份内容")
+        self.last_log_diff = result
+        self.log_diff_ready.emit(result)
+        return result
+
+    def diff_log_with_latest_snapshot(self):
+        """比较当前日志与最新快照，在日志阅读器中显示条目级差异"""
+        try:
+            store = self.get_chunk_store()
+            log_name = os.path.basename(self.log_file)
+            manifest, _ = store.latest_snapshot(log_name)
+            if manifest is None:
+                self.show_mini_notification("还没有日志快照，无法比较")
+                return None
+            _, result = diff_logs(DiffSide.from_snapshot(store, log_name, manifest['id']),
+                                  DiffSide.from_file(self.log_file, "当前日志"))
+            self.show_log_diff(result, force_show=True)
+            return result
+        except Exception as e:
+            print(f"❌ 比较日志差异失败：{e}")
+            QMessageBox.warning(self, "错误", f"比较日志差异失败：{str(e)}")
+            return None
+
+    def show_log_diff(self, result, force_show=False):
+        """[UI线程] 在日志阅读器中显示差异报告（阅读器未打开时只保存结果，除非 force_show）"""
+        self.last_log_diff = result
+        if force_show and not self.md_reader_visible:
+            self.toggle_md_reader_panel()
+        if self.md_reader_visible and self.md_reader_panel:
+            html_fragment = self.convert_markdown_to_html_fragment(render_markdown(result))
+            self.md_content_browser.setHtml(self.wrap_html_document(html_fragment))
+
+    def get_log_index(self):
+        """获取当前日志文件对应的条目索引"""
+        if self.log_index is None or self.log_index.log_file != self.log_file:
+            if self.log_index is not None:
+                self.log_index.close()
+            self.log_index = LogIndex(self.log_file)
+        return self.log_index
+
+    def get_log_search(self):
+        """获取当前日志文件对应的全文搜索索引"""
+        log_index = self.get_log_index()
+        if self.log_search is None or self.log_search.log_index is not log_index:
+            if self.log_search is not None:
+                self.log_search.close()
+            self.log_search = LogSearchIndex(self.log_file, log_index)
+        return self.log_search
+
+    def get_backup_path(self, backup_type):
+        """根据备份类型生成备份文件路径"""
+        # 使用项目名称作为备份文件前缀
+        project_prefix = self.project_name if self.project_name else "unknown"
+        
+        # 生成备份文件名
+        if backup_type.startswith("backup-"):
+            backup_filename = f"{project_prefix}-log-incremental-{backup_type.split('-')[1]}.md"
+        elif backup_type == "startup":
+            backup_filename = f"{project_prefix}-log-incremental-startup.md"
+        else:
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            backup_filename = f"{project_prefix}-log-incremental-{backup_type}-{timestamp}.md"
+            
+        # 所有备份先写入项目backups，其他位置由复制服务异步同步（见 backups/replication.json）
+        return os.path.join(self.backup_dir, backup_filename)
+
+    def get_backup_verifier(self):
+        """获取当前项目的备份后台校验服务"""
+        if self.backup_verifier is not None and self.backup_verifier.backup_dir == self.backup_dir:
+            return self.backup_verifier
+        if self.backup_verifier is not None:
+            self.backup_verifier.stop()
+        self.backup_verifier = BackupVerifier(self.project_folder, self.project_name or "unknown",
+                                              archive_dir=os.path.join(os.path.dirname(os.path.abspath(self.log_file)), "log-archive"))
+        self.backup_verify_version = -1
+        return self.backup_verifier
+
+    def notify_backup_activity(self):
+        """通知后台校验应用正忙（可在任意线程调用）"""
+        if self.backup_verifier is not None:
+            self.backup_verifier.notify_activity()
+
+    def update_backup_verification_status(self):
+        """[定时器] 刷新状态栏中的备份校验摘要，新发现问题时记录诊断事件"""
+        verifier = self.backup_verifier
+        if verifier is None or verifier.version == self.backup_verify_version:
+            return
+        self.backup_verify_version = verifier.version
+        self.backup_verify_label.setText(verifier.summary())
+        
+        result = verifier.result
+        if result and result['problems'] and result.get('finished') != self.backup_verify_reported:
+            self.backup_verify_reported = result['finished']
+            self.backup_verify_label.setStyleSheet("QLabel { color: #d32f2f; font-size: 11px; padding: 2px 5px; }")
+            self.log_injection_failure_check("BACKUP_VERIFICATION_FAILED", result['finished'], {
+                'problems': len(result['problems']),
+                'first_problems': result['problems'][:5]
+            })
+
+    def create_log_backup(self, backup_type="auto"):
+        """创建增量日志文件备份"""
+        backup_paths = self.create_log_backups([backup_type])
+        return backup_paths.get(backup_type)
+
+    def create_dual_log_backup(self):
+        """创建双重增量备份（backup-1 和 backup-2 共享一次尾部读取）"""
+        backup_paths = self.create_log_backups(["backup-1", "backup-2"])
+        return backup_paths.get("backup-1"), backup_paths.get("backup-2")
+
+    def create_log_backups(self, backup_types):
+        """对多个备份类型执行增量备份，返回 {备份类型: 备份路径}"""
+        try:
+            if not os.path.exists(self.log_file):
+                return {}
+            
+            destinations = [(backup_type, self.get_backup_path(backup_type)) for backup_type in backup_types]
+            results = self.get_backup_engine().backup(destinations)
+            # 日志增长一倍后在后台重新训练压缩字典
+            self.get_log_codec().ensure_dictionary_async(self.log_file)
+            
+            backup_paths = {}
+            for result in results:
+                backup_type = result['backup_type']
+                backup_filename = os.path.basename(result['backup_path'])
+                location = "项目目录"
+                print(f"✅ 增量日志备份创建 ({location})：{backup_filename} ({result['bytes']} 字节, {result['mode']})")
+                
+                # 记录备份创建事件
+                self.log_injection_failure_check("LOG_INCREMENTAL_BACKUP_CREATED", backup_type, {
+                    'backup_file': backup_filename,
+                    'increment_size': result['bytes'],
+                    'start_offset': result['start'],
+                    'end_offset': result['end'],
+                    'backup_mode': result['mode'],
+                    'backup_type': 'incremental',
+                    'backup_location': location
+                })
+                backup_paths[backup_type] = result['backup_path']
+            
+            for backup_type in backup_types:
+                if backup_type not in backup_paths:
+                    print(f"⚠️ 没有新内容需要备份：{backup_type}")
+            
+            # 增量备份文件会被下次覆盖，同时记录一次去重快照保留历史（在快照线程执行，复制在快照完成后提交）
+            if results:
+                self.replicate_backup_files([result['backup_path'] for result in results])
+                self.get_snapshot_worker().request(self.log_file, ",".join(sorted({result['mode'] for result in results})))
+            
+            return backup_paths
+            
+        except Exception as e:
+            print(f"❌ 创建增量日志备份失败：{e}")
+            self.log_error("LOG_BACKUP_ERROR", str(e))
+            return {}
+
+    # === 日志后台写入服务 ===
+    def get_journal_writer(self, log_file=None):
+        """获取指定日志文件的后台写入服务（默认为当前项目日志）
+
+        其他项目的日志（多目标注入）只追加：分段轮转、条目索引、增量备份、快照和完整性哈希链
+        由打开那个项目的实例负责，本实例轮转它的热日志会被那边当作截断而恢复。
+        """
+        log_file = log_file or self.log_file
+        is_current = log_file == self.log_file
+        writer = self.journal_writers.get(log_file)
+        if writer is not None and is_current and writer.segment_manager is None:
+            # 作为其他项目日志创建的写入服务，切换到该项目后重建以启用分段轮转
+            writer.stop()
+            writer = None
+        if writer is None:
+            segment_manager = None
+            if is_current:
+                segment_manager = LogSegmentManager(
+                    log_file,
+                    index_provider=lambda: self.get_log_index() if log_file == self.log_file else None,
+                    after_swap=self.on_log_hot_file_swapped,
+                    codec=self.get_log_codec() if self.backup_dir else None
+                )
+                segment_manager.adopt_orphans()
+            writer = LogJournalWriter(
+                log_file,
+                before_commit=self.on_journal_before_commit,
+                after_commit=self.on_journal_after_commit,
+                segment_manager=segment_manager,
+                after_rotate=self.on_journal_after_rotate,
+                parent=self
+            )
+            writer.entries_committed.connect(self.on_log_entries_committed)
+            writer.commit_failed.connect(self.on_log_commit_failed)
+            writer.segment_rotated.connect(self.on_log_segment_rotated)
+            writer.start()
+            self.journal_writers[log_file] = writer
+            if not is_current:
+                print(f"📝 {os.path.basename(log_file)} 不是当前项目日志：只追加，不轮转分段，也不建立索引、备份和完整性记录")
+        return writer
+
+    def append_log_entry(self, content, kind, meta=None, log_file=None):
+        """把日志条目提交到后台写入服务，返回条目ID"""
+        if not (log_file or self.log_file):
+            QMessageBox.warning(self, "错误", "未绑定项目日志文件")
+            return None
+        
+        entry_id = self.get_journal_writer(log_file).submit(content, kind, meta)
+        if entry_id is None:
+            QMessageBox.warning(self, "警告", "日志写入队列已满，请稍后重试")
+        return entry_id
+
+    def on_journal_before_commit(self, log_file, batch):
+        """[写入线程] 批量写入前：完整性检查、自动恢复和写入监控"""
+        if log_file != self.log_file:
+            return
+        self.notify_backup_activity()
+        self.auto_recover_log_file()
+        
+        preview = batch[0]['meta'].get('preview', '')
+        self._journal_write_attempt_id = self.monitor_log_write_attempt(batch[0]['kind'], preview)
+
+    def on_journal_after_commit(self, log_file, batch, start_offset, end_offset):
+        """[写入线程] 批量写入后：验证写入并创建双重增量备份"""
+        if log_file != self.log_file:
+            return
+        
+        write_attempt_id = getattr(self, '_journal_write_attempt_id', None)
+        if write_attempt_id and not self.verify_log_write_success(write_attempt_id, expected_append=True):
+            return
+        
+        # 增量更新条目索引和全文索引（只处理新追加的字节和条目）
+        try:
+            self.get_log_index().update()
+            self.get_log_search().update()
+        except Exception as e:
+            print(f"⚠️ 更新日志条目索引失败：{e}")
+        
+        backup1, backup2 = self.create_dual_log_backup()
+        if backup1 and backup2:
+            print(f"✅ 双重增量备份创建完成（{len(batch)} 条日志）")
+        elif backup1 or backup2:
+            print("⚠️ 部分增量备份创建成功")
+        else:
+            print("⚠️ 增量备份创建失败")
+
+    def on_log_hot_file_swapped(self, log_file):
+        """[写入线程] 热日志刚被换成空文件"""
+        if log_file != self.log_file:
+            return
+        
+        # 文件大小归零是正常轮转，不能被完整性检查和文件监控当作被清空而触发恢复
+        self.last_log_size = 0
+        self.get_log_integrity().rebuild()
+        if self.log_file_watcher is not None:
+            self.log_file_watcher.rebaseline()
+    
+    def on_journal_after_rotate(self, log_file, segment):
+        """[写入线程] 热日志已封存为分段：新的热日志从空文件开始"""
+        if log_file != self.log_file:
+            return
+        
+        # 备份位置相对于旧热日志，下次对新热日志做全量备份
+        engine = self.get_backup_engine()
+        with engine.lock:
+            for backup_type in ("backup-1", "backup-2"):
+                engine.reset_state(backup_type)
+        
+        archive_dir = os.path.join(os.path.dirname(os.path.abspath(log_file)), "log-archive")
+        self.get_backup_replicator().submit([
+            os.path.join(archive_dir, segment['file']),
+            os.path.join(archive_dir, f"{os.path.basename(log_file)}.manifest.json")
+        ])
+        
+        self.log_injection_failure_check("LOG_SEGMENT_ROTATED", segment['name'], {
+            'segment_file': segment['file'],
+            'entries': segment['entries'],
+            'raw_bytes': segment['raw_bytes'],
+            'stored_bytes': segment['stored_bytes']
+        })
+
+    def on_log_segment_rotated(self, log_file, segment):
+        """[UI线程] 热日志已封存为分段"""
+        if log_file == self.log_file:
+            self.show_mini_notification(f"日志已归档：{segment['file']}")
+
+    def on_log_entries_committed(self, log_file, entries):
+        """[UI线程] 日志条目已落盘"""
+        kinds = {entry['kind'] for entry in entries}
+        if "note" in kinds:
+            self.status_label.setText("笔记已保存")
+            # 显示小提示，1秒后自动消失
+            self.show_mini_notification("笔记已保存")
+        if "cascade" in kinds:
+            self.status_label.setText("已从Cascade获取文本并保存到日志")
+        
+        # 如果MD阅读器已打开，自动刷新内容
+        if log_file == self.log_file and self.md_reader_visible and self.md_reader_panel:
+            self.load_log_content()
+
+    def on_log_commit_failed(self, log_file, entries, error):
+        """[UI线程] 日志条目写入失败"""
+        for entry in entries:
+            self.log_injection_failure_check("LOG_WRITE_FAILED", entry['kind'], {
+                'error': error,
+                'log_file': log_file,
+                'content_preview': entry['meta'].get('preview', '')[:50]
+            })
+        QMessageBox.warning(self, "警告", f"记录日志失败：{error}")
+
+    def check_log_file_integrity(self):
+        """检查日志文件完整性"""
         try:
             if not os.path.exists(self.log_file):
                 self.log_injection_failure_check("LOG_FILE_MISSING", "integrity_check", {
@@ -2794,6 +3351,32 @@ class MainWindow(QMainWindow):
                 })
                 return "truncated"
             
+            # 哈希链校验：只哈希新增字节和原尾部，历史内容被原地修改时判定为篡改
+            result = self.get_log_integrity().verify(update=True)
+            if result['status'] == LogIntegrityChain.STATUS_TRUNCATED:
+                # 比哈希链记录的短：尾部丢失，交给自动恢复补回（恢复成功后才重建哈希链）
+                self.log_injection_failure_check("LOG_FILE_TRUNCATED", "integrity_check", {
+                    'fast_check': result,
+                    'previous_size': self.last_log_size,
+                    'current_size': current_size
+                })
+                return "truncated"
+            
+            if result['status'] == LogIntegrityChain.STATUS_TAMPERED:
+                report = self.get_log_integrity().verify_full()
+                self.log_injection_failure_check("LOG_FILE_TAMPERED", "integrity_check", {
+                    'fast_check': result,
+                    'altered_blocks': report['altered'],
+                    'current_size': report['size'],
+                    'covered_size': report.get('covered', 0)
+                })
+                print(f"🚨 检测到历史日志被改动：{len(report['altered'])} 个块"
+                      f"（{', '.join(str(block['block']) for block in report['altered'])}）")
+                # 记录事件后以当前内容为新基准，改动前的内容保留在快照库中
+                self.get_log_integrity().record_incident(report)
+                self.last_log_size = current_size
+                return "tampered"
+            
             # 更新记录的文件大小
             self.last_log_size = current_size
             return "ok"
@@ -2809,50 +3392,132 @@ class MainWindow(QMainWindow):
         if integrity_status in ["cleared", "missing", "truncated"]:
             print(f"🚨 检测到日志文件问题：{integrity_status}")
             
-            # 记录恢复尝试
-            recovery_id = datetime.datetime.now().isoformat()
-            self.log_injection_failure_check("LOG_RECOVERY_ATTEMPT", recovery_id, {
-                'problem_type': integrity_status,
-                'recovery_method': 'auto_restore_from_backup'
+            # 替换日志文件交给写入服务执行：暂停追加并关闭它的文件句柄，替换完成后下一批写入再重新打开
+            try:
+                recovered = self.get_journal_writer().run_exclusive(lambda: self.recover_log_file_held(integrity_status))
+            except Exception as e:
+                print(f"❌ 自动恢复失败：{e}")
+                self.log_error("LOG_RECOVERY_ERROR", str(e))
+                recovered = False
+            if not recovered and integrity_status == "truncated" and os.path.exists(self.log_file):
+                # 无法恢复时以当前内容为新基准，避免此后每次写入都重复尝试恢复
+                self.last_log_size = os.path.getsize(self.log_file)
+                self.get_log_integrity().rebuild()
+            return recovered
+        
+        return True
+    
+    def recover_log_file_held(self, integrity_status):
+        """[写入线程] 恢复期间不开始后台快照：快照线程打开着日志时无法替换它"""
+        with self.get_snapshot_worker().hold():
+            return self.recover_log_file(integrity_status)
+    
+    def recover_log_file(self, integrity_status):
+        """[写入线程，日志句柄已关闭] 依次从快照、增量备份重建、最新备份文件恢复日志"""
+        # 记录恢复尝试
+        recovery_id = datetime.datetime.now().isoformat()
+        self.log_injection_failure_check("LOG_RECOVERY_ATTEMPT", recovery_id, {
+            'problem_type': integrity_status,
+            'recovery_method': 'auto_restore_from_backup'
+        })
+        
+        # 优先从去重快照恢复完整日志（逐块校验）
+        try:
+            if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > 0:
+                self.snapshot_log_history("before-recovery")
+            manifest = self.restore_log_from_snapshot()
+            if manifest:
+                self.last_log_size = os.path.getsize(self.log_file)
+                self.get_log_integrity().rebuild()
+                self.log_injection_failure_check("LOG_RECOVERY_SUCCESS", recovery_id, {
+                    'snapshot_used': manifest['id'],
+                    'snapshot_time': manifest['created'],
+                    'restored_size': self.last_log_size,
+                    'merged_changes': self.last_log_diff['counts'] if self.last_log_diff else {}
+                })
+                return True
+        except Exception as e:
+            print(f"⚠️ 从快照恢复失败，改用备份文件：{e}")
+        
+        # 其次按增量备份头部的区间精确重建
+        if self.restore_from_incremental_backup(swap=True):
+            self.last_log_size = os.path.getsize(self.log_file)
+            self.get_log_integrity().rebuild()
+            self.log_injection_failure_check("LOG_RECOVERY_SUCCESS", recovery_id, {
+                'backup_used': 'incremental_rebuild',
+                'restored_size': self.last_log_size
             })
-            
-            # 尝试从最新备份恢复
-            latest_backup = self.get_latest_log_backup()
-            if latest_backup:
-                try:
-                    # 如果当前文件存在且有内容，先备份
-                    if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > 0:
-                        self.create_log_backup("before-recovery")
-                    
-                    # 恢复文件
-                    shutil.copy2(latest_backup, self.log_file)
-                    self.last_log_size = os.path.getsize(self.log_file)
-                    
-                    print(f"✅ 日志文件已自动恢复，使用备份：{os.path.basename(latest_backup)}")
-                    
-                    # 记录恢复成功
-                    self.log_injection_failure_check("LOG_RECOVERY_SUCCESS", recovery_id, {
-                        'backup_used': os.path.basename(latest_backup),
-                        'restored_size': self.last_log_size
-                    })
-                    
-                    return True
-                    
-                except Exception as e:
-                    print(f"❌ 自动恢复失败：{e}")
-                    self.log_injection_failure_check("LOG_RECOVERY_FAILED", recovery_id, {
-                        'error': str(e)
-                    })
-                    return False
-            else:
-                print("❌ 没有可用的备份文件")
+            return True
+        
+        # 尝试从最新备份恢复
+        latest_backup = self.get_latest_log_backup()
+        if latest_backup:
+            try:
+                # 如果当前文件存在且有内容，先备份
+                if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > 0:
+                    self.create_log_backup("before-recovery")
+                
+                # 当前日志还有内容时按条目合并，否则写入备份正文（按扩展名解压，不含备份文件头）
+                if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > 0:
+                    with open(self.log_file, 'rb') as f:
+                        live_data = f.read()
+                    self.merge_log_with(DiffSide.from_backup(latest_backup, live_data))
+                else:
+                    temp_file = self.log_file + ".tmp"
+                    with open(temp_file, 'wb') as f:
+                        f.write(DiffSide.from_backup(latest_backup).data)
+                    os.replace(temp_file, self.log_file)
+                self.last_log_size = os.path.getsize(self.log_file)
+                self.get_log_integrity().rebuild()
+                
+                print(f"✅ 日志文件已自动恢复，使用备份：{os.path.basename(latest_backup)}")
+                
+                # 记录恢复成功
+                self.log_injection_failure_check("LOG_RECOVERY_SUCCESS", recovery_id, {
+                    'backup_used': os.path.basename(latest_backup),
+                    'restored_size': self.last_log_size
+                })
+                
+                return True
+                
+            except Exception as e:
+                print(f"❌ 自动恢复失败：{e}")
                 self.log_injection_failure_check("LOG_RECOVERY_FAILED", recovery_id, {
-                    'error': 'no_backup_available'
+                    'error': str(e)
                 })
                 return False
-        
-        return True
+        else:
+            print("❌ 没有可用的备份文件")
+            self.log_injection_failure_check("LOG_RECOVERY_FAILED", recovery_id, {
+                'error': 'no_backup_available'
+            })
+            return False
     
+    def verify_log_history_full(self):
+        """完整校验日志哈希链，逐块定位被改动的历史内容"""
+        try:
+            integrity = self.get_log_integrity()
+            if integrity.state is None:
+                integrity.rebuild()
+                return "ok"
+            report = integrity.verify_full()
+            if report['status'] == LogIntegrityChain.STATUS_TAMPERED:
+                self.log_injection_failure_check("LOG_FILE_TAMPERED", "full_verify", {
+                    'altered_blocks': report['altered'],
+                    'current_size': report['size'],
+                    'covered_size': report['covered']
+                })
+                for block in report['altered']:
+                    entries = ', '.join(entry['timestamp'] for entry in block['entries'])
+                    print(f"🚨 日志块 {block['block']} [{block['start']}, {block['end']}) 被改动：{entries}")
+                integrity.record_incident(report)
+            else:
+                integrity.verify(update=True)
+            return report['status']
+        except Exception as e:
+            self.log_error("LOG_INTEGRITY_VERIFY_ERROR", str(e))
+            return "error"
+
     def get_latest_log_backup(self):
         """获取最新的日志备份文件（优先增量备份）"""
         try:
@@ -2862,12 +3527,14 @@ class MainWindow(QMainWindow):
             for file in os.listdir(self.backup_dir):
                 file_path = os.path.join(self.backup_dir, file)
                 mtime = os.path.getmtime(file_path)
+                # 启用压缩后备份为 .md.zst / .md.gz，按去掉压缩扩展名后的名称匹配
+                name = strip_compression_suffix(file)
                 
                 # 优先获取增量备份文件
-                if file.startswith(f"{project_prefix}-log-incremental-") and file.endswith(".md"):
+                if name.startswith(f"{project_prefix}-log-incremental-") and name.endswith(".md"):
                     backup_files.append((file_path, mtime, "incremental"))
                 # 兼容旧的整体备份文件
-                elif (file.startswith(f"{project_prefix}-log-bak-") or file.startswith("my-log-backup-")) and file.endswith(".md"):
+                elif (name.startswith(f"{project_prefix}-log-bak-") or name.startswith("my-log-backup-")) and name.endswith(".md"):
                     backup_files.append((file_path, mtime, "full"))
             
             if backup_files:
@@ -2881,44 +3548,41 @@ class MainWindow(QMainWindow):
             print(f"❌ 获取备份文件失败：{e}")
             return None
 
-    def restore_from_incremental_backup(self):
-        """从增量备份恢复完整日志"""
+    def get_log_restore_engine(self):
+        """创建按备份区间精确重建日志的恢复引擎（目录型复制目标也作为备份来源）"""
+        targets = load_target_config(self.backup_dir, self.project_name or "unknown")
+        backup_dirs = [self.backup_dir] + [target['path'] for target in targets if target.get('type', 'directory') == 'directory']
+        return LogRestoreEngine(self.log_file, backup_dirs, self.project_name,
+                                chunk_store=self.get_chunk_store(), integrity=self.get_log_integrity())
+
+    def restore_from_incremental_backup(self, swap=False):
+        """从增量备份精确重建完整日志（按起始位置选取覆盖片段，流式写入并用哈希链校验）
+
+        swap 为 True 时替换日志文件，只能在写入服务的独占操作中调用（见 recover_log_file）。
+        """
         try:
             project_prefix = self.project_name if self.project_name else "unknown"
-            incremental_files = []
-            
-            # 收集所有增量备份文件
-            for file in os.listdir(self.backup_dir):
-                if file.startswith(f"{project_prefix}-log-incremental-") and file.endswith(".md"):
-                    file_path = os.path.join(self.backup_dir, file)
-                    mtime = os.path.getmtime(file_path)
-                    incremental_files.append((file_path, mtime))
-            
-            if not incremental_files:
-                return None
-            
-            # 按时间排序
-            incremental_files.sort(key=lambda x: x[1])
-            
-            # 合并所有增量备份内容
-            restored_content = ""
-            for backup_file, _ in incremental_files:
-                with open(backup_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    # 跳过备份头部信息，只取实际日志内容
-                    if "---\n\n" in content:
-                        actual_content = content.split("---\n\n", 1)[1]
-                        restored_content += actual_content
-            
-            # 创建恢复文件
             recovery_timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
             recovery_file = os.path.join(self.backup_dir, f"{project_prefix}-log-recovered-{recovery_timestamp}.md")
             
-            with open(recovery_file, 'w', encoding='utf-8') as f:
-                f.write(restored_content)
+            current_size = os.path.getsize(self.log_file) if swap and os.path.exists(self.log_file) else 0
+            result = self.get_log_restore_engine().restore(recovery_file, swap=swap, min_size=current_size)
+            if not result['success']:
+                print(f"❌ 从增量备份重建日志失败：{result['error']}")
+                self.log_injection_failure_check("LOG_REBUILD_FAILED", recovery_timestamp, result)
+                return None
             
-            print(f"✅ 从增量备份恢复完整日志：{recovery_file}")
-            return recovery_file
+            if result['gap']:
+                print(f"⚠️ 备份中缺少 {result['gap']['from']}-{result['gap']['to']} 字节，重建结果只到缺口之前")
+            print(f"✅ 从增量备份恢复完整日志：{result['path']}")
+            self.log_injection_failure_check("LOG_REBUILD_SUCCESS", recovery_timestamp, {
+                'path': result['path'],
+                'size': result['size'],
+                'pieces': len(result['plan']),
+                'gap': result['gap'],
+                'verification': result['verification']['status']
+            })
+            return result['path']
             
         except Exception as e:
             print(f"❌ 从增量备份恢复失败：{e}")
@@ -2941,7 +3605,8 @@ class MainWindow(QMainWindow):
             incremental_files = []
             
             for file in os.listdir(self.backup_dir):
-                if file.startswith(f"{project_prefix}-log-incremental-") and file.endswith(".md"):
+                if file.startswith(f"{project_prefix}-log-incremental-") and \
+                        (file.endswith(".md") or os.path.splitext(file)[1] in COMPRESSED_SUFFIXES):
                     file_path = os.path.join(self.backup_dir, file)
                     mtime = os.path.getmtime(file_path)
                     file_size = os.path.getsize(file_path)
@@ -3259,6 +3924,14 @@ class MainWindow(QMainWindow):
         refresh_button.setToolTip("刷新日志内容")
         title_layout.addWidget(refresh_button)
         
+        # 差异按钮：与最新快照比较
+        diff_button = QPushButton("🔍")
+        diff_button.setFixedSize(30, 30)
+        diff_button.setStyleSheet(refresh_button.styleSheet())
+        diff_button.clicked.connect(self.diff_log_with_latest_snapshot)
+        diff_button.setToolTip("与最新快照比较，显示丢失、新增和改动的条目")
+        title_layout.addWidget(diff_button)
+        
         # 关闭按钮
         close_button = QPushButton("×")
         close_button.setFixedSize(30, 30)
@@ -3298,6 +3971,76 @@ class MainWindow(QMainWindow):
         
         panel_layout.addLayout(file_info_layout)
         
+        # 创建定位区域（#序号 或 时间，留空定位到最新交互）
+        jump_layout = QHBoxLayout()
+        
+        self.md_jump_input = QLineEdit()
+        self.md_jump_input.setPlaceholderText("定位：2025-06-14 10:20 或 #128")
+        self.md_jump_input.setStyleSheet("""
+            QLineEdit {
+                font-size: 12px;
+                padding: 3px;
+                border: 1px solid #ddd;
+                border-radius: 3px;
+            }
+        """)
+        self.md_jump_input.returnPressed.connect(self.on_md_jump_requested)
+        jump_layout.addWidget(self.md_jump_input)
+        
+        jump_button = QPushButton("定位")
+        jump_button.setFixedHeight(26)
+        jump_button.setStyleSheet("""
+            QPushButton {
+                background-color: #f0f0f0;
+                border: 1px solid #ccc;
+                border-radius: 3px;
+                font-size: 12px;
+                padding: 0 8px;
+            }
+            QPushButton:hover {
+                background-color: #e0e0e0;
+            }
+        """)
+        jump_button.clicked.connect(self.on_md_jump_requested)
+        jump_layout.addWidget(jump_button)
+        
+        panel_layout.addLayout(jump_layout)
+        
+        # 创建搜索区域（回车搜索，点击结果跳转到条目）
+        self.md_search_input = QLineEdit()
+        self.md_search_input.setPlaceholderText("🔍 搜索日志（回车搜索）")
+        self.md_search_input.setClearButtonEnabled(True)
+        self.md_search_input.setStyleSheet("""
+            QLineEdit {
+                font-size: 12px;
+                padding: 3px;
+                border: 1px solid #ddd;
+                border-radius: 3px;
+            }
+        """)
+        self.md_search_input.returnPressed.connect(self.on_md_search_requested)
+        self.md_search_input.textChanged.connect(self.on_md_search_text_changed)
+        panel_layout.addWidget(self.md_search_input)
+        
+        self.md_search_results = QListWidget()
+        self.md_search_results.setMaximumHeight(220)
+        self.md_search_results.setStyleSheet("""
+            QListWidget {
+                border: 1px solid #ddd;
+                border-radius: 3px;
+                font-size: 12px;
+            }
+            QListWidget::item {
+                border-bottom: 1px solid #f0f0f0;
+            }
+            QListWidget::item:selected {
+                background-color: #e3f2fd;
+            }
+        """)
+        self.md_search_results.itemClicked.connect(self.on_md_search_result_clicked)
+        self.md_search_results.hide()
+        panel_layout.addWidget(self.md_search_results)
+        
         # 创建MD内容显示区域
         self.md_content_browser = QTextBrowser()
         self.md_content_browser.setStyleSheet("""
@@ -3315,6 +4058,12 @@ class MainWindow(QMainWindow):
         # 设置支持Markdown渲染
         self.md_content_browser.setOpenExternalLinks(True)
         
+        # 新建的文档需要从头渲染
+        self.md_log_reader = None
+        
+        # 滚动到顶部/底部时按需加载更早/更新的分页
+        self.md_content_browser.verticalScrollBar().valueChanged.connect(self.on_md_reader_scrolled)
+        
         panel_layout.addWidget(self.md_content_browser)
         
         # 创建底部状态栏
@@ -3419,10 +4168,12 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "错误", f"切换MD阅读器面板失败：{str(e)}")
     
     def load_log_content(self):
-        """加载日志文件内容"""
+        """加载日志文件内容（只渲染上次渲染之后追加的部分）"""
         try:
             if not self.log_file or not os.path.exists(self.log_file):
                 # 没有绑定项目或日志文件不存在
+                self.md_log_reader = None
+                self.md_log_pager = None
                 self.md_content_browser.setHtml("""
                 <div style="text-align: center; color: #666; margin-top: 50px;">
                     <h3>📂 未找到日志文件</h3>
@@ -3443,38 +4194,68 @@ class MainWindow(QMainWindow):
             
             self.log_file_label.setText(f"当前日志：{file_name} ({size_mb:.1f}MB)")
             
-            # 读取文件内容
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 如果文件为空
-            if not content.strip():
-                self.md_content_browser.setHtml("""
-                <div style="text-align: center; color: #666; margin-top: 50px;">
-                    <h3>📝 日志文件为空</h3>
-                    <p>开始使用工具后，工作记录将自动保存到此文件。</p>
-                </div>
-                """)
-                self.log_status_label.setText("日志文件为空")
-                return
-            
-            # 简单的Markdown转HTML处理
-            html_content = self.convert_markdown_to_html(content)
-            
-            # 设置内容
-            self.md_content_browser.setHtml(html_content)
-            
-            # 滚动到底部显示最新内容
-            self.md_content_browser.verticalScrollBar().setValue(
-                self.md_content_browser.verticalScrollBar().maximum()
-            )
+            # 切换项目后重新建立渲染游标和分页窗口
+            if self.md_log_reader is None or self.md_log_reader.log_file != self.log_file:
+                self.md_log_reader = IncrementalLogReader(self.log_file)
+                self.md_log_pager = LogPager(self.get_log_index(), self.convert_markdown_to_html_fragment)
+                # 在后台补建全文索引，首次搜索时无需等待
+                self.get_log_search().update_async()
+            
+            # 读取自上次渲染以来的变化（全量时不读全文，由分页窗口渲染）
+            mode, content = self.md_log_reader.read_changes(read_full=False)
+            
+            if mode == IncrementalLogReader.MODE_APPEND:
+                if not self.md_log_pager.at_latest():
+                    # 当前在浏览历史分页，只更新分页信息，向下滚动时再加载
+                    self.md_log_pager.on_appended()
+                elif self.md_log_pager.on_appended():
+                    # 窗口超出分页上限，丢弃最早的分页后重建
+                    self.render_md_reader_window(scroll_to_bottom=True)
+                else:
+                    # 只转换新增内容并追加到现有文档（带条目锚点）
+                    self.append_html_to_md_reader(
+                        self.md_log_pager.render_appended(content, self.md_log_reader.last_start))
+            elif mode == IncrementalLogReader.MODE_FULL:
+                # 只渲染最近的分页；日志中没有条目标题时回退到全文渲染
+                if self.md_log_pager.reset_to_latest():
+                    self.render_md_reader_window(scroll_to_bottom=True)
+                    entry_count = self.md_log_pager.total_entries
+                    self.log_status_label.setText(f"共 {entry_count} 条记录，已显示最近 {self.md_window_entry_count()} 条")
+                    return
+                
+                with open(self.log_file, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                
+                # 如果文件为空
+                if not content.strip():
+                    self.md_log_reader.reset()
+                    self.md_content_browser.setHtml("""
+                    <div style="text-align: center; color: #666; margin-top: 50px;">
+                        <h3>📝 日志文件为空</h3>
+                        <p>开始使用工具后，工作记录将自动保存到此文件。</p>
+                    </div>
+                    """)
+                    self.log_status_label.setText("日志文件为空")
+                    return
+                
+                # 简单的Markdown转HTML处理
+                html_content = self.convert_markdown_to_html(content)
+                
+                # 设置内容
+                self.md_content_browser.setHtml(html_content)
+                
+                # 滚动到底部显示最新内容
+                self.md_content_browser.verticalScrollBar().setValue(
+                    self.md_content_browser.verticalScrollBar().maximum()
+                )
             
-            # 更新状态
-            lines = len(content.split('\n'))
-            self.log_status_label.setText(f"已加载 {lines} 行内容")
+            # 更新状态（条目数来自索引，无需再次切分全文）
+            entry_count = self.get_log_index().count()
+            self.log_status_label.setText(f"已加载 {entry_count} 条记录")
             
         except Exception as e:
             print(f"加载日志内容失败: {e}")
+            self.md_log_reader = None
             self.md_content_browser.setHtml(f"""
             <div style="text-align: center; color: #ff4444; margin-top: 50px;">
                 <h3>⚠️ 加载失败</h3>
@@ -3483,70 +4264,74 @@ class MainWindow(QMainWindow):
             """)
             self.log_status_label.setText(f"加载失败：{str(e)}")
     
+    def render_md_reader_window(self, anchor=None, scroll_to_bottom=False):
+        """按分页窗口重建阅读器文档"""
+        self.md_page_loading = True
+        try:
+            self.md_content_browser.setHtml(self.wrap_html_document(self.md_log_pager.window_html()))
+            
+            scrollbar = self.md_content_browser.verticalScrollBar()
+            if anchor:
+                self.scroll_md_reader_to_anchor(anchor)
+            elif scroll_to_bottom:
+                scrollbar.setValue(scrollbar.maximum())
+        finally:
+            self.md_page_loading = False
+    
+    def md_window_entry_count(self):
+        """当前窗口中显示的条目数"""
+        pager = self.md_log_pager
+        first_seq = pager.first_page * pager.page_size + 1
+        last_seq = min((pager.last_page + 1) * pager.page_size, pager.total_entries)
+        return max(0, last_seq - first_seq + 1)
+    
+    def on_md_reader_scrolled(self, value):
+        """滚动到顶部加载更早的分页，滚动到底部加载更新的分页"""
+        pager = self.md_log_pager
+        if pager is None or self.md_page_loading or pager.last_page < 0:
+            return
+        
+        scrollbar = self.md_content_browser.verticalScrollBar()
+        anchor = None
+        if value <= scrollbar.minimum() and pager.has_older():
+            anchor = pager.load_older()
+        elif value >= scrollbar.maximum() and pager.has_newer():
+            anchor = pager.load_newer()
+        
+        if anchor:
+            # 延迟到滚动事件处理完成后再重建文档
+            self.md_page_loading = True
+            QTimer.singleShot(0, lambda: self.render_md_reader_window(anchor=anchor))
+            self.log_status_label.setText(
+                f"共 {pager.total_entries} 条记录，显示第 {pager.first_page + 1}-{pager.last_page + 1} 页"
+            )
+    
+    def append_html_to_md_reader(self, html_fragment):
+        """把HTML片段追加到阅读器文档末尾，不重置视图"""
+        scrollbar = self.md_content_browser.verticalScrollBar()
+        was_at_bottom = scrollbar.value() >= scrollbar.maximum() - 4
+        previous_value = scrollbar.value()
+        
+        cursor = QTextCursor(self.md_content_browser.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertHtml(html_fragment)
+        
+        # 原本停留在底部则跟随新内容，否则保持阅读位置
+        scrollbar.setValue(scrollbar.maximum() if was_at_bottom else previous_value)
+    
     def convert_markdown_to_html(self, markdown_content):
         """简单的Markdown到HTML转换"""
         try:
-            html_lines = []
-            lines = markdown_content.split('\n')
-            
-            for line in lines:
-                line = line.rstrip()
-                
-                # 处理标题
-                if line.startswith('# '):
-                    html_lines.append(f'<h1 style="color: #333; border-bottom: 2px solid #e0e0e0; padding-bottom: 5px;">{line[2:]}</h1>')
-                elif line.startswith('## '):
-                    html_lines.append(f'<h2 style="color: #444; margin-top: 20px;">{line[3:]}</h2>')
-                elif line.startswith('### '):
-                    html_lines.append(f'<h3 style="color: #555;">{line[4:]}</h3>')
-                elif line.startswith('#### '):
-                    html_lines.append(f'<h4 style="color: #666;">{line[5:]}</h4>')
-                
-                # 处理列表
-                elif line.startswith('- '):
-                    html_lines.append(f'<li style="margin: 5px 0;">{line[2:]}</li>')
-                elif line.startswith('* '):
-                    html_lines.append(f'<li style="margin: 5px 0;">{line[2:]}</li>')
-                
-                # 处理代码块
-                elif line.startswith('```'):
-                    if '```' in line[3:]:  # 单行代码块
-                        code = line[3:].replace('```', '')
-                        html_lines.append(f'<code style="background-color: #f5f5f5; padding: 2px 4px; border-radius: 3px;">{code}</code>')
-                    else:
-                        html_lines.append('<pre style="background-color: #f8f9fa; padding: 10px; border-radius: 5px; border-left: 3px solid #007acc;">')
-                
-                # 处理引用
-                elif line.startswith('> '):
-                    html_lines.append(f'<blockquote style="border-left: 3px solid #ccc; margin: 10px 0; padding-left: 10px; color: #666;">{line[2:]}</blockquote>')
-                
-                # 处理分隔线
-                elif line.strip() == '---':
-                    html_lines.append('<hr style="border: none; border-top: 1px solid #e0e0e0; margin: 20px 0;">')
-                
-                # 处理空行
-                elif not line.strip():
-                    html_lines.append('<br>')
-                
-                # 普通文本
-                else:
-                    # 处理粗体和斜体
-                    processed_line = line
-                    
-                    # 粗体 **text**
-                    import re
-                    processed_line = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', processed_line)
-                    
-                    # 斜体 *text*
-                    processed_line = re.sub(r'\*(.*?)\*', r'<em>\1</em>', processed_line)
-                    
-                    # 内联代码 `code`
-                    processed_line = re.sub(r'`(.*?)`', r'<code style="background-color: #f5f5f5; padding: 2px 4px; border-radius: 3px;">\1</code>', processed_line)
-                    
-                    html_lines.append(f'<p style="margin: 8px 0; line-height: 1.6;">{processed_line}</p>')
+            return self.wrap_html_document(self.convert_markdown_to_html_fragment(markdown_content))
             
-            # 组装完整HTML
-            html_content = f"""
+        except Exception as e:
+            print(f"Markdown转HTML失败: {e}")
+            return f"<p>内容加载失败：{str(e)}</p>"
+    
+    def wrap_html_document(self, body_html):
+        """为HTML正文片段套上阅读器的文档样式"""
+        # 组装完整HTML
+        html_content = f"""
             <html>
             <head>
                 <meta charset="utf-8">
@@ -3571,17 +4356,33 @@ class MainWindow(QMainWindow):
                 </style>
             </head>
             <body>
-                {''.join(html_lines)}
+                {body_html}
             </body>
             </html>
             """
-            
-            return html_content
+        
+        return html_content
+    
+    def convert_markdown_to_html_fragment(self, markdown_content):
+        """把Markdown片段转换为HTML正文片段（用于增量追加），按条目缓存渲染结果"""
+        try:
+            renderer = get_markdown_renderer()
+            renderer.set_image_resolver(self.resolve_note_image, self.log_file)
+            return renderer.render(markdown_content)
             
         except Exception as e:
             print(f"Markdown转HTML失败: {e}")
             return f"<p>内容加载失败：{str(e)}</p>"
     
+    def resolve_note_image(self, src):
+        """阅读器中的笔记图片：相对日志目录的本地图片换成缩略图地址（首次显示时生成）"""
+        if not self.log_file or '://' in src:
+            return src
+        image_path = os.path.join(os.path.dirname(os.path.abspath(self.log_file)), src)
+        if not os.path.exists(image_path):
+            return src
+        return QUrl.fromLocalFile(self.get_image_store().thumbnail(image_path, READER_IMAGE_WIDTH)).toString()
+    
     def refresh_log_content(self):
         """刷新日志内容并滚动到最后一个交互块"""
         try:
@@ -3597,54 +4398,140 @@ class MainWindow(QMainWindow):
     
     def scroll_to_latest_interaction(self):
         """滚动到最后一个交互块的位置"""
-        try:
-            if not hasattr(self, 'md_content_browser') or not self.md_content_browser:
-                return
-                
-            # 获取当前HTML内容
-            html_content = self.md_content_browser.toHtml()
-            
-            # 查找最后一个"📥 输入"或"📤 输出"标记的位置
-            last_input_pos = html_content.rfind("📥 输入")
-            last_output_pos = html_content.rfind("📤 输出")
-            
-            # 确定最后一个交互块的位置
-            last_interaction_pos = max(last_input_pos, last_output_pos)
-            
-            if last_interaction_pos > 0:
-                # 滚动到页面底部，确保显示最新内容
-                scrollbar = self.md_content_browser.verticalScrollBar()
-                scrollbar.setValue(scrollbar.maximum())
-                
-                # 使用JavaScript精确定位到最后交互块
-                self.md_content_browser.page().runJavaScript(f"""
-                    var elements = document.querySelectorAll('*');
-                    var lastInteraction = null;
-                    for(var i = elements.length - 1; i >= 0; i--) {{
-                        var text = elements[i].textContent || elements[i].innerText || '';
-                        if(text.includes('📥 输入') || text.includes('📤 输出')) {{
-                            lastInteraction = elements[i];
-                            break;
-                        }}
-                    }}
-                    if(lastInteraction) {{
-                        lastInteraction.scrollIntoView({{behavior: 'smooth', block: 'start'}});
-                    }}
-                """)
-            else:
-                # 如果没找到交互块标记，直接滚动到底部
-                scrollbar = self.md_content_browser.verticalScrollBar()
-                scrollbar.setValue(scrollbar.maximum())
-                
-        except Exception as e:
-            print(f"滚动到最新交互位置失败: {e}")
-            # 降级处理：直接滚动到底部
+        if not self.jump_to_latest():
+            # 没有条目锚点时直接滚动到底部
             try:
                 scrollbar = self.md_content_browser.verticalScrollBar()
                 scrollbar.setValue(scrollbar.maximum())
             except:
                 pass
     
+    def scroll_md_reader_to_anchor(self, anchor):
+        """滚动阅读器到指定锚点（兼容QTextBrowser和WebEngine）"""
+        if hasattr(self.md_content_browser, 'page'):
+            # WebEngine：锚点同时带有id属性
+            self.md_content_browser.page().runJavaScript(
+                f"var target = document.getElementById('{anchor}');"
+                f"if (target) {{ target.scrollIntoView({{block: 'start'}}); }}"
+            )
+        else:
+            self.md_content_browser.scrollToAnchor(anchor)
+    
+    def jump_to_entry(self, seq):
+        """跳转到指定序号的日志条目，条目不在当前分页窗口时先切换窗口"""
+        try:
+            if not getattr(self, 'md_content_browser', None) or not self.md_log_pager:
+                return False
+            
+            pager = self.md_log_pager
+            if seq < 1 or seq > pager.total_entries:
+                return False
+            
+            anchor = pager.entry_anchor(seq)
+            if pager.in_window(seq):
+                self.scroll_md_reader_to_anchor(anchor)
+            else:
+                pager.show_page(pager.page_of(seq))
+                self.render_md_reader_window(anchor=anchor)
+            return True
+            
+        except Exception as e:
+            print(f"跳转到日志条目失败: {e}")
+            return False
+    
+    def jump_to_latest(self):
+        """跳转到最新的交互条目"""
+        try:
+            if not self.log_file or not self.md_log_pager:
+                return False
+            latest_entries = self.get_log_index().last_entries(1)
+            if not latest_entries:
+                return False
+            
+            pager = self.md_log_pager
+            if not pager.at_latest() or not pager.in_window(latest_entries[0]['seq']):
+                pager.reset_to_latest()
+                self.render_md_reader_window()
+            return self.jump_to_entry(latest_entries[0]['seq'])
+            
+        except Exception as e:
+            print(f"跳转到最新交互失败: {e}")
+            return False
+    
+    def jump_to_time(self, timestamp):
+        """跳转到不晚于指定时间的最后一条条目（时间格式 YYYY-MM-DD HH:MM:SS，可只给前缀）"""
+        try:
+            if not self.log_file:
+                return False
+            entry = self.get_log_index().entry_at_time(timestamp)
+            if not entry:
+                return False
+            return self.jump_to_entry(entry['seq'])
+            
+        except Exception as e:
+            print(f"按时间跳转失败: {e}")
+            return False
+    
+    def on_md_search_requested(self):
+        """执行日志全文搜索并列出高亮结果"""
+        query = self.md_search_input.text().strip()
+        self.md_search_results.clear()
+        if not query or not self.log_file or not os.path.exists(self.log_file):
+            self.md_search_results.hide()
+            return
+        
+        try:
+            start_time = time.perf_counter()
+            results = self.get_log_search().search(query, limit=50)
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            
+            for entry in results:
+                item = QListWidgetItem()
+                item.setData(Qt.UserRole, entry['seq'])
+                label = QLabel(
+                    f'<span style="color: #888;">#{entry["seq"]} {entry["ts"]} · {entry["app"]}</span><br>'
+                    f'{entry["snippet"]}'
+                )
+                label.setWordWrap(True)
+                label.setStyleSheet("QLabel { padding: 4px; border: none; }")
+                item.setSizeHint(label.sizeHint())
+                self.md_search_results.addItem(item)
+                self.md_search_results.setItemWidget(item, label)
+            
+            self.md_search_results.setVisible(bool(results))
+            self.log_status_label.setText(f"搜索“{query}”：{len(results)} 条结果（{elapsed_ms:.0f}ms）")
+            
+        except Exception as e:
+            print(f"日志搜索失败: {e}")
+            self.log_status_label.setText(f"搜索失败：{str(e)}")
+    
+    def on_md_search_text_changed(self, text):
+        """清空搜索框时收起结果列表"""
+        if not text.strip():
+            self.md_search_results.clear()
+            self.md_search_results.hide()
+    
+    def on_md_search_result_clicked(self, item):
+        """点击搜索结果跳转到对应条目"""
+        self.jump_to_entry(item.data(Qt.UserRole))
+    
+    def on_md_jump_requested(self):
+        """处理阅读器定位输入框：#序号 或 时间"""
+        text = self.md_jump_input.text().strip()
+        if not text:
+            self.scroll_to_latest_interaction()
+            return
+        
+        if text.startswith('#') and text[1:].isdigit():
+            found = self.jump_to_entry(int(text[1:]))
+        else:
+            found = self.jump_to_time(text)
+        
+        if found:
+            self.log_status_label.setText(f"已定位：{text}")
+        else:
+            self.log_status_label.setText(f"未找到条目：{text}")
+    
     def generate_work_summary(self, user_input, ai_output):
         """生成工作总结并保存到项目日志文件"""
         try:
@@ -3748,15 +4635,9 @@ class MainWindow(QMainWindow):
                 # 如果没有绑定项目，使用默认路径
                 log_file_path = os.path.join(APP_DIR, "injection-log.md")
             
-            # 追加到日志文件
-            with open(log_file_path, 'a', encoding='utf-8') as f:
-                f.write(summary_content)
-            
-            print(f"✅ 工作总结已保存到: {log_file_path}")
-            
-            # 如果MD阅读器已打开，自动刷新内容
-            if self.md_reader_visible and self.md_reader_panel:
-                self.load_log_content()
+            # 提交到后台写入服务（MD阅读器在落盘后自动刷新）
+            if self.append_log_entry(summary_content, "summary", log_file=log_file_path):
+                print(f"✅ 工作总结已提交到: {log_file_path}")
             
         except Exception as e:
             print(f"生成工作总结失败: {e}")
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Markdown渲染器 - MD阅读器使用的单遍行状态机
+
+原 convert_markdown_to_html 对每一行普通文本都重新 import re 并编译三个正则，
+没有代码块状态：``` 打开的 <pre> 从不关闭，代码块内的行还会被加粗/斜体替换。
+本渲染器：
+1. 所有正则在模块加载时预编译，行内格式一次替换完成
+2. 逐行状态机处理代码块、列表、引用的开闭，代码块内容原样转义输出
+3. 文本统一做HTML转义
+4. 按日志条目切分，渲染结果以条目内容哈希缓存（最近最少使用淘汰）
+5. 图片链接 ![说明](路径) 渲染为 <img>，可由调用方把路径换成缩略图地址
+
+作者: Assistant
+创建时间: 2025-06-15
+项目: injection
+"""
+
+import re
+import html
+import hashlib
+from collections import OrderedDict
+
+
+# === 预编译模式 ===
+HEADING_RE = re.compile(r'^(#{1,4}) (.*)$')
+UNORDERED_ITEM_RE = re.compile(r'^\s*[-*+] (.*)$')
+ORDERED_ITEM_RE = re.compile(r'^\s*\d+[.)] (.*)$')
+QUOTE_RE = re.compile(r'^> ?(.*)$')
+FENCE_RE = re.compile(r'^\s*(`{3,})\s*([\w+-]*)')
+FENCE_CLOSE_RE = re.compile(r'^\s*(`{3,})\s*$')
+HR_RE = re.compile(r'^(?:-{3,}|\*{3,}|_{3,})\s*$')
+IMAGE_RE = re.compile(r'!\[([^\]]*)\]\(([^)\s]+)\)')
+
+# 可能开始列表项的首字符
+LIST_FIRST_CHARS = frozenset('-*+0123456789 \t')
+
+# 行内格式：代码优先，代码内部不再做粗体/斜体替换
+INLINE_RE = re.compile(r'`([^`]+)`|\*\*(.+?)\*\*|(?<![\w*])\*(?![\s*])(.+?)(?<![\s*])\*(?![\w*])')
+
+# 日志条目标题: "# 2025-06-14 10:20:30 (Cursor - 项目：injection)"
+ENTRY_HEADING_RE = re.compile(r'^# \d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} \(', re.M)
+FENCE_LINE_RE = re.compile(r'^[ \t]*(`{3,})(.*)$', re.M)
+
+# === 样式（与原转换器保持一致） ===
+STYLE_H = {
+    1: 'color: #333; border-bottom: 2px solid #e0e0e0; padding-bottom: 5px;',
+    2: 'color: #444; margin-top: 20px;',
+    3: 'color: #555;',
+    4: 'color: #666;',
+}
+STYLE_CODE = 'background-color: #f5f5f5; padding: 2px 4px; border-radius: 3px;'
+STYLE_PRE = 'background-color: #f8f9fa; padding: 10px; border-radius: 5px; border-left: 3px solid #007acc;'
+STYLE_LIST = 'margin: 5px 0; padding-left: 20px;'
+STYLE_LI = 'margin: 5px 0;'
+STYLE_QUOTE = 'border-left: 3px solid #ccc; margin: 10px 0; padding-left: 10px; color: #666;'
+STYLE_HR = 'border: none; border-top: 1px solid #e0e0e0; margin: 20px 0;'
+STYLE_P = 'margin: 8px 0; line-height: 1.6;'
+
+
+def _inline_replace(match):
+    code, bold, italic = match.groups()
+    if code is not None:
+        return f'<code style="{STYLE_CODE}">{code}</code>'
+    if bold is not None:
+        return f'<strong>{bold}</strong>'
+    return f'<em>{italic}</em>'
+
+
+def escape_text(text):
+    """HTML转义（没有特殊字符时直接返回原文）"""
+    if '&' in text or '<' in text or '>' in text:
+        return html.escape(text, quote=False)
+    return text
+
+
+def render_image(alt, src, image_resolver=None):
+    if image_resolver is not None:
+        src = image_resolver(src)
+    return f'<img src="{html.escape(src)}" alt="{html.escape(alt)}" />'
+
+
+def render_inline(text, image_resolver=None):
+    """转义并处理行内格式（粗体、斜体、内联代码、图片）"""
+    if '![' in text:
+        parts = IMAGE_RE.split(text)
+        if len(parts) > 1:
+            rendered = [render_inline(parts[0])]
+            for index in range(1, len(parts), 3):
+                rendered.append(render_image(parts[index], parts[index + 1], image_resolver))
+                rendered.append(render_inline(parts[index + 2]))
+            return ''.join(rendered)
+    text = escape_text(text)
+    if '`' in text or '*' in text:
+        return INLINE_RE.sub(_inline_replace, text)
+    return text
+
+
+def is_fence_close(line, fence_marker):
+    close = FENCE_CLOSE_RE.match(line)
+    return bool(close) and len(close.group(1)) >= len(fence_marker)
+
+
+def render_markdown(markdown_content, image_resolver=None):
+    """单遍渲染一段Markdown，返回HTML正文片段（不经过缓存）
+
+    image_resolver(路径) 返回图片实际使用的地址（例如缩略图）。
+    """
+    out = []
+    append = out.append
+
+    def inline(text):
+        return render_inline(text, image_resolver)
+
+    in_fence = False
+    fence_marker = ''
+    list_tag = None      # 当前打开的列表 'ul' / 'ol'
+    quote_lines = None   # 当前引用块中的行
+
+    def close_blocks():
+        nonlocal list_tag, quote_lines
+        if list_tag:
+            append(f'</{list_tag}>')
+            list_tag = None
+        if quote_lines is not None:
+            append(f'<blockquote style="{STYLE_QUOTE}">{"<br>".join(quote_lines)}</blockquote>')
+            quote_lines = None
+
+    lines = markdown_content.split('\n')
+    if lines and not lines[-1]:
+        # 结尾换行只是上一行的结束，不是空行
+        lines.pop()
+
+    for line in lines:
+        line = line.rstrip()
+
+        # 代码块内部：原样转义输出，直到遇到不短于开始标记的结束标记
+        if in_fence:
+            if '```' in line and is_fence_close(line, fence_marker):
+                append('</pre>')
+                in_fence = False
+            else:
+                append(escape_text(line))
+                append('\n')
+            continue
+
+        if not line:
+            close_blocks()
+            append('<br>')
+            continue
+
+        # 按首字符分派，普通文本行不做任何块级正则匹配
+        first = line[0]
+
+        if first == '`' or (first in ' \t' and '```' in line):
+            fence = FENCE_RE.match(line)
+            if fence:
+                close_blocks()
+                marker = fence.group(1)
+                rest = line.strip()[len(marker):]
+                if marker in rest:
+                    # 单行代码块 ```code```
+                    code = rest[:rest.index(marker)]
+                    append(f'<code style="{STYLE_CODE}">{escape_text(code)}</code>')
+                else:
+                    language = fence.group(2)
+                    class_attr = f' class="language-{language}"' if language else ''
+                    append(f'<pre style="{STYLE_PRE}"{class_attr}>')
+                    in_fence = True
+                    fence_marker = marker
+                continue
+
+        # 引用：连续的引用行合并为一个 blockquote
+        if first == '>':
+            if list_tag:
+                append(f'</{list_tag}>')
+                list_tag = None
+            if quote_lines is None:
+                quote_lines = []
+            quote_lines.append(inline(QUOTE_RE.match(line).group(1)))
+            continue
+
+        # 列表：连续的列表项合并为一个 ul / ol
+        if first in LIST_FIRST_CHARS and not HR_RE.match(line):
+            item = UNORDERED_ITEM_RE.match(line)
+            tag = 'ul'
+            if not item:
+                item = ORDERED_ITEM_RE.match(line)
+                tag = 'ol'
+            if item:
+                if quote_lines is not None or list_tag != tag:
+                    close_blocks()
+                    append(f'<{tag} style="{STYLE_LIST}">')
+                    list_tag = tag
+                append(f'<li style="{STYLE_LI}">{inline(item.group(1))}</li>')
+                continue
+
+        close_blocks()
+
+        heading = HEADING_RE.match(line) if first == '#' else None
+        if heading:
+            level = len(heading.group(1))
+            append(f'<h{level} style="{STYLE_H[level]}">{inline(heading.group(2))}</h{level}>')
+        elif first in '-*_' and HR_RE.match(line):
+            append(f'<hr style="{STYLE_HR}">')
+        elif line.isspace():
+            append('<br>')
+        else:
+            append(f'<p style="{STYLE_P}">{inline(line)}</p>')
+
+    # 片段结束时关闭所有未闭合的块，保证追加到文档中的HTML完整
+    if in_fence:
+        append('</pre>')
+    close_blocks()
+
+    return ''.join(out)
+
+
+def _fence_toggles(segment):
+    """统计片段中打开/关闭代码块的行数（单行代码块不计）"""
+    if '```' not in segment:
+        return 0
+    return sum(1 for marker, rest in FENCE_LINE_RE.findall(segment) if marker not in rest)
+
+
+def split_entries(markdown_content):
+    """按日志条目标题切分文本（代码块中的标题行不作为切分点）"""
+    chunks = []
+    chunk_start = 0
+    scanned = 0
+    in_fence = False
+
+    for match in ENTRY_HEADING_RE.finditer(markdown_content):
+        position = match.start()
+        if _fence_toggles(markdown_content[scanned:position]) % 2:
+            in_fence = not in_fence
+        scanned = position
+        if in_fence or position == chunk_start:
+            continue
+        chunks.append(markdown_content[chunk_start:position])
+        chunk_start = position
+
+    if chunk_start < len(markdown_content):
+        chunks.append(markdown_content[chunk_start:])
+    return chunks
+
+
+class MarkdownRenderer:
+    """带条目级缓存的Markdown渲染器"""
+
+    def __init__(self, max_cached_entries=2048):
+        self.max_cached_entries = max_cached_entries
+        self.image_resolver = None
+        self.image_context = None
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, markdown_content):
+        """渲染日志片段：按条目切分，未变化的条目直接复用缓存"""
+        return ''.join(self.render_entry(chunk) for chunk in split_entries(markdown_content))
+
+    def render_entry(self, entry_text):
+        """渲染单个条目，以内容哈希为缓存键"""
+        key = hashlib.sha1(entry_text.encode('utf-8')).hexdigest()
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        rendered = render_markdown(entry_text, self.image_resolver)
+        self.cache[key] = rendered
+        while len(self.cache) > self.max_cached_entries:
+            self.cache.popitem(last=False)
+        return rendered
+
+    def set_image_resolver(self, image_resolver, context=None):
+        """设置图片地址解析函数；context（如日志目录）变化时缓存中的图片地址失效"""
+        if context != self.image_context:
+            self.clear_cache()
+        self.image_resolver = image_resolver
+        self.image_context = context
+
+    def clear_cache(self):
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def cache_info(self):
+        """缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self.cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+# 全局渲染器实例
+_markdown_renderer = None
+
+
+def get_markdown_renderer():
+    """获取全局Markdown渲染器实例"""
+    global _markdown_renderer
+    if _markdown_renderer is None:
+        _markdown_renderer = MarkdownRenderer()
+    return _markdown_renderer
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目标组 - 一个实例校准多个目标窗口，一次操作把同一条指令注入到所有目标
+
+原校准模型在 config_instance_{id}.json 中只保存一个 target_window / target_position，
+多个 Cursor 窗口（每个项目一个）需要同一条指令时只能逐个重新校准、逐个注入。本模块：
+1. TargetSet 保存多个已校准目标（窗口句柄、输入框坐标、标题、项目名称和项目日志路径），
+   以 target_set 键存入实例配置
+2. fan_out_inject 把注入按阶段流水线化：
+   - 各目标的注入文本（项目标识、模板或AI修饰词）在线程池中并行准备，
+     第一个目标的文本就绪即开始注入，不等其余目标
+   - 激活、点击、粘贴、回车独占前台和键盘，按目标依次执行；
+     上一个目标回车后的等待期间就写入下一个目标的剪贴板，等待时间不再叠加
+   - 单个目标失败不影响其余目标，返回每个目标的结果
+
+作者: Assistant
+创建时间: 2025-06-16
+项目: injection
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from input_driver import InjectionSequence
+from window_registry import project_from_title
+
+
+MAX_PREPARE_WORKERS = 4
+
+
+def project_log_file(project_folder):
+    """项目日志路径，与自动绑定项目时的约定一致：<项目目录>/<目录名>-log.md"""
+    project_folder = os.path.abspath(project_folder)
+    return os.path.join(project_folder, f"{os.path.basename(project_folder)}-log.md")
+
+
+def target_key(target):
+    """目标在结果字典中的键：项目名称优先，其次窗口标题，最后句柄"""
+    return target.get('project_name') or target.get('title') or str(target['hwnd'])
+
+
+class TargetSet:
+    """一个实例的多个已校准目标"""
+
+    def __init__(self, targets=None):
+        self.targets = [dict(target) for target in (targets or [])]
+
+    @classmethod
+    def from_config(cls, config):
+        targets = []
+        for target in config.get('target_set') or []:
+            if target.get('hwnd') and target.get('position'):
+                target['position'] = tuple(target['position'])
+                targets.append(target)
+        return cls(targets)
+
+    def to_config(self):
+        return [dict(target, position=list(target['position'])) for target in self.targets]
+
+    def add(self, hwnd, position, title="", app_name="", project_folder=None):
+        """加入或更新一个目标（同一窗口只保留一个），返回目标记录"""
+        target = {
+            'hwnd': hwnd,
+            'position': tuple(position),
+            'title': title,
+            'app_name': app_name or title,
+            'project_name': os.path.basename(os.path.abspath(project_folder)) if project_folder else project_from_title(title),
+            'log_file': project_log_file(project_folder) if project_folder else None
+        }
+        self.targets = [existing for existing in self.targets if existing['hwnd'] != hwnd]
+        self.targets.append(target)
+        return target
+
+    def remove(self, hwnd):
+        before = len(self.targets)
+        self.targets = [target for target in self.targets if target['hwnd'] != hwnd]
+        return len(self.targets) != before
+
+    def clear(self):
+        self.targets = []
+
+    def update_hwnd(self, old_hwnd, new_hwnd):
+        """目标窗口句柄变化；新句柄已在目标组中时只去掉旧目标（同一窗口只保留一个目标）"""
+        if any(target['hwnd'] == new_hwnd for target in self.targets):
+            self.remove(old_hwnd)
+            return
+        for target in self.targets:
+            if target['hwnd'] == old_hwnd:
+                target['hwnd'] = new_hwnd
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __iter__(self):
+        return iter(self.targets)
+
+
+def fan_out_inject(driver, targets, prepare, relocate=None):
+    """把同一条命令注入到多个目标
+
+    prepare(target) -> 注入文本，在线程池中并行调用
+    relocate(target) -> 新句柄或 None，目标第一次激活失败时调用
+    返回 {目标键: {'success', 'error', 'hwnd', 'total_ms', 'target'}}，顺序与 targets 一致
+    """
+    results = {}
+    if not targets:
+        return results
+
+    sequence = InjectionSequence(driver, verbose=False)
+    with ThreadPoolExecutor(max_workers=min(MAX_PREPARE_WORKERS, len(targets))) as executor:
+        texts = [executor.submit(prepare, target) for target in targets]
+
+        copied_text = None
+        for index, target in enumerate(targets):
+            key = target_key(target)
+            if key in results:
+                key = f"{key}#{target['hwnd']}"
+            result = {'success': False, 'error': "", 'hwnd': target['hwnd'], 'total_ms': None, 'target': target}
+            results[key] = result
+            is_last = index == len(targets) - 1
+            submitted_at = None
+            try:
+                text = texts[index].result()
+                run = sequence.run(
+                    target['hwnd'], target['position'], text,
+                    relocate=(lambda target=target: relocate(target)) if relocate else None,
+                    copied=copied_text == text,
+                    settle=is_last
+                )
+                submitted_at = driver.now()
+                result['hwnd'] = run['hwnd']
+                result['total_ms'] = run['total_ms']
+                result['success'] = True
+            except Exception as e:
+                result['error'] = str(e)
+            copied_text = None
+
+            if is_last:
+                break
+
+            # 流水线：上一个目标回车后的等待期间写好下一个目标的剪贴板
+            if submitted_at is not None:
+                try:
+                    next_text = texts[index + 1].result()
+                    sequence.copy_ahead(next_text)
+                    copied_text = next_text
+                except Exception as e:
+                    print(f"⚠️ 预写剪贴板失败，下一个目标将重新复制: {e}")
+                sequence.settle_after(submitted_at)
+
+    return results
+
+
+def format_results(results):
+    """结果摘要，例如 'injection ✅ 310ms | webapp ❌ 无法激活目标窗口'"""
+    parts = []
+    for key, result in results.items():
+        if result['success']:
+            parts.append(f"{key} ✅ {result['total_ms']:.0f}ms")
+        else:
+            parts.append(f"{key} ❌ {result['error']}")
+    return " | ".join(parts)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+备份校验测试 - 损坏的清单作为问题记录，不中断整轮校验；本地状态文件不参与副本比对
+
+用法: python -m pytest tests/test_backup_verifier.py  或  python tests/test_backup_verifier.py
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backup_verifier import BackupVerifier, STATUS_FILE_NAME
+
+
+class BackupVerifierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.project_dir = tempfile.mkdtemp()
+        self.backup_dir = os.path.join(self.project_dir, "backups")
+        self.archive_dir = os.path.join(self.project_dir, "log-archive")
+        self.target_dir = os.path.join(self.project_dir, "replica")
+        os.makedirs(self.backup_dir)
+        os.makedirs(self.archive_dir)
+        os.makedirs(self.target_dir)
+        self.write_json(os.path.join(self.backup_dir, "replication.json"),
+                        {'targets': [{'name': "replica", 'type': "directory", 'path': self.target_dir}]})
+
+    def tearDown(self):
+        shutil.rmtree(self.project_dir, ignore_errors=True)
+
+    def write_json(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    def write_text(self, path, text):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def run_pass(self):
+        return BackupVerifier(self.project_dir, "injection").run_pass(respect_idle=False)
+
+    def test_corrupt_manifests_are_reported_and_later_checks_still_run(self):
+        self.write_text(os.path.join(self.archive_dir, "injection-log.md.manifest.json"), "{bad")
+        snapshot_dir = os.path.join(self.backup_dir, "chunk-store", "snapshots", "injection-log.md")
+        self.write_text(os.path.join(snapshot_dir, "20250616-100000-000000.json"), "{bad")
+        # 排在损坏清单之后的副本比对仍然执行
+        self.write_text(os.path.join(self.backup_dir, "notes.md"), "本地内容较长")
+        self.write_text(os.path.join(self.target_dir, "notes.md"), "短")
+
+        result = self.run_pass()
+
+        problems = {(problem['category'], os.path.basename(problem['path'])) for problem in result['problems']}
+        self.assertEqual(problems, {
+            ("snapshot", "20250616-100000-000000.json"),
+            ("segment", "injection-log.md.manifest.json"),
+            ("target:replica", "notes.md"),
+        })
+        self.assertIsNotNone(result['finished'])
+
+    def test_verification_status_file_is_not_compared_with_replica(self):
+        self.write_json(os.path.join(self.target_dir, STATUS_FILE_NAME), {})
+        self.run_pass()  # 第一轮写出较长的本地状态文件
+
+        result = self.run_pass()
+
+        self.assertEqual(result['problems'], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+快照库测试 - 追加后的增量快照与完整快照一致；后台快照线程合并排队中的请求
+
+用法: python -m pytest tests/test_chunk_store.py  或  python tests/test_chunk_store.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunk_store import ChunkStore, SnapshotWorker, iter_chunks
+
+
+def make_log(count, start=0):
+    return b''.join(f"\n# 2025-06-16 10:00:{index % 60:02d} (注入 - 项目：injection)\n\n"
+                    f"## 📥 输入\n\n命令 {index}\n\n## 📤 输出\n\n{'输出内容 ' * (index % 17 + 3)}\n".encode('utf-8')
+                    for index in range(start, start + count))
+
+
+class ChunkStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.temp_dir, "injection-log.md")
+        self.store_dir = os.path.join(self.temp_dir, "backups", "chunk-store")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def append(self, data):
+        with open(self.log_file, 'ab') as f:
+            f.write(data)
+
+    def test_appended_snapshot_matches_full_chunking(self):
+        store = ChunkStore(self.store_dir)
+        self.append(make_log(500))
+        store.snapshot(self.log_file)
+        self.append(make_log(20, 500))
+
+        manifest = store.snapshot(self.log_file)
+
+        with open(self.log_file, 'rb') as f:
+            data = f.read()
+        expected = [end - start for start, end in iter_chunks(data)]
+        self.assertEqual([length for _, length in store.resolve_chunks("injection-log.md", manifest['id'])], expected)
+        restored = os.path.join(self.temp_dir, "restored.md")
+        store.restore("injection-log.md", manifest['id'], restored)
+        with open(restored, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+    def test_worker_coalesces_queued_requests(self):
+        store = ChunkStore(self.store_dir)
+        created = []
+        worker = SnapshotWorker(store, on_snapshot=lambda log_file, manifest: created.append(manifest))
+        self.append(make_log(200))
+
+        with worker.hold():  # 快照线程开始前排入多次请求
+            for reason in ("backup-1", "backup-2", "startup"):
+                worker.request(self.log_file, reason)
+        self.assertTrue(worker.flush())
+        worker.stop()
+
+        self.assertEqual(len(created), 1)
+        self.assertEqual(created[0]['reason'], "backup-1,backup-2,startup")
+        self.assertEqual(created[0]['size'], os.path.getsize(self.log_file))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+注入队列测试 - 失败后暂停、取消剩余条目、整批完成统计（FakeInputDriver，不需要 Windows）
+
+用法: python -m pytest tests/test_injection_queue.py  或  python tests/test_injection_queue.py
+需要 PyQt5（队列通过Qt信号通知），未安装时跳过。
+"""
+
+import os
+import sys
+import time
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from input_driver import FakeInputDriver
+
+try:
+    from PyQt5.QtCore import Qt
+    from injection_queue import InjectionQueue
+except ImportError:
+    InjectionQueue = None
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+@unittest.skipIf(InjectionQueue is None, "需要 PyQt5")
+class InjectionQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.driver = FakeInputDriver()
+        self.driver.add_window(1, "main.py - injection - Cursor")
+        self.summaries = []
+        self.finished = threading.Event()
+        self.progress = []
+
+    def tearDown(self):
+        self.injection_queue.stop()
+
+    def make_queue(self, max_pending=100):
+        def prepare(command, options):
+            if command.startswith("坏命令"):
+                raise ValueError("模板不存在")
+            return command, "injection"
+
+        self.injection_queue = InjectionQueue(self.driver, prepare, lambda: (1, (10, 20)),
+                                              pacing=0, max_pending=max_pending)
+        # 信号在队列线程发出，直接连接以便不需要事件循环
+        self.injection_queue.batch_finished.connect(self.on_batch_finished, Qt.DirectConnection)
+        self.injection_queue.progress_changed.connect(
+            lambda finished, total: self.progress.append((finished, total)), Qt.DirectConnection)
+        return self.injection_queue
+
+    def on_batch_finished(self, summary):
+        self.summaries.append(summary)
+        self.finished.set()
+
+    def statuses(self):
+        return [item['status'] for item in self.injection_queue.batch_items()]
+
+    def test_batch_runs_in_order_and_reports_summary(self):
+        injection_queue = self.make_queue()
+
+        injection_queue.enqueue(["第一条", "第二条", "第三条"])
+
+        self.assertTrue(self.finished.wait(5))
+        self.assertEqual(self.driver.submitted, {1: ["第一条", "第二条", "第三条"]})
+        self.assertEqual(self.summaries[0]['done'], 3)
+        self.assertEqual((self.summaries[0]['failed'], self.summaries[0]['cancelled']), (0, 0))
+        self.assertEqual(self.progress[-1], (3, 3))
+        self.assertFalse(injection_queue.is_busy())
+
+    def test_failure_pauses_and_cancel_finishes_batch(self):
+        injection_queue = self.make_queue()
+
+        injection_queue.enqueue(["第一条", "坏命令", "第三条"])
+
+        self.assertTrue(wait_for(lambda: injection_queue.is_paused() and self.statuses()[1] == 'failed'))
+        self.assertEqual(self.statuses(), ['done', 'failed', 'pending'])
+        self.assertFalse(self.finished.is_set())
+
+        self.assertEqual(injection_queue.cancel_pending(), 1)
+
+        self.assertTrue(self.finished.wait(5))
+        self.assertEqual({key: self.summaries[0][key] for key in ('done', 'failed', 'cancelled')},
+                         {'done': 1, 'failed': 1, 'cancelled': 1})
+        self.assertEqual(self.driver.submitted, {1: ["第一条"]})
+        self.assertEqual(injection_queue.batch_items(), [])
+
+    def test_resume_after_failure_continues_with_remaining_items(self):
+        injection_queue = self.make_queue()
+        injection_queue.enqueue(["坏命令", "第二条"])
+        self.assertTrue(wait_for(lambda: injection_queue.is_paused() and self.statuses()[0] == 'failed'))
+
+        injection_queue.resume()
+
+        self.assertTrue(self.finished.wait(5))
+        self.assertEqual((self.summaries[0]['done'], self.summaries[0]['failed']), (1, 1))
+        self.assertEqual(self.driver.submitted, {1: ["第二条"]})
+
+    def test_batch_that_does_not_fit_is_rejected_whole(self):
+        injection_queue = self.make_queue(max_pending=2)
+        injection_queue.pause()
+
+        self.assertEqual(len(injection_queue.enqueue(["第一条", "第二条"])), 2)
+        self.assertIsNone(injection_queue.enqueue(["第三条"]))
+        self.assertEqual(len(injection_queue.batch_items()), 2)
+        injection_queue.cancel_pending()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输入驱动测试 - 用 FakeInputDriver（虚拟时钟）驱动 InjectionSequence，不需要 Windows
+
+用法: python -m pytest tests/test_input_driver.py  或  python tests/test_input_driver.py
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from input_driver import FakeInputDriver, InjectionSequence, InjectionError, DEFAULT_DELAYS, WAIT_TIMEOUTS
+
+
+def make_driver(**options):
+    driver = FakeInputDriver(**options)
+    driver.add_window(1, "main.py - injection - Cursor", origin=(100, 100))
+    driver.add_window(2, "main.py - injection - Cursor", origin=(0, 0))
+    return driver
+
+
+class MismatchedClipboardDriver(FakeInputDriver):
+    """剪贴板被其他程序改写：回读内容与写入的不同"""
+
+    def get_clipboard(self):
+        super().get_clipboard()
+        return "其他程序的内容"
+
+
+class InjectionSequenceTest(unittest.TestCase):
+
+    def activation_events(self, driver):
+        return [event for event in driver.events if event[0] in ("activate", "restore")]
+
+    def test_text_is_submitted_to_target_window(self):
+        driver = make_driver()
+
+        result = InjectionSequence(driver, verbose=False).run(1, (10, 20), "修复登录页")
+
+        self.assertEqual(result['hwnd'], 1)
+        self.assertEqual(driver.submitted, {1: ["修复登录页"]})
+        self.assertIn(('move_cursor', (110, 120)), driver.events)
+
+    def test_failed_activation_relocates_then_restores(self):
+        driver = make_driver(activation_failures=2)
+        relocated = []
+
+        def relocate():
+            relocated.append(True)
+            return 2
+
+        result = InjectionSequence(driver, verbose=False).run(1, (10, 20), "hello", relocate=relocate)
+
+        self.assertEqual(relocated, [True])
+        self.assertEqual(self.activation_events(driver),
+                         [('activate', 1), ('activate', 2), ('restore', 2), ('activate', 2)])
+        self.assertEqual(result['hwnd'], 2)
+        self.assertEqual(driver.submitted, {2: ["hello"]})
+
+    def test_activation_gives_up_after_three_attempts(self):
+        driver = make_driver(activation_failures=3)
+
+        with self.assertRaises(InjectionError) as raised:
+            InjectionSequence(driver, verbose=False).run(1, (10, 20), "hello", relocate=lambda: None)
+
+        self.assertEqual(raised.exception.stage, "activate")
+        self.assertEqual(self.activation_events(driver),
+                         [('activate', 1), ('activate', 1), ('restore', 1), ('activate', 1)])
+        self.assertEqual(driver.submitted, {})
+
+    def test_clipboard_mismatch_raises_before_paste(self):
+        driver = MismatchedClipboardDriver()
+        driver.add_window(1, "main.py - injection - Cursor")
+
+        with self.assertRaises(InjectionError) as raised:
+            InjectionSequence(driver, verbose=False).run(1, (10, 20), "hello")
+
+        self.assertEqual(raised.exception.stage, "clipboard")
+        self.assertNotIn(('key_combo_down',), driver.events)
+        self.assertEqual(driver.submitted, {})
+
+
+class ConditionModeTest(unittest.TestCase):
+    """条件等待：状态一可见就进入下一步；状态迟迟不可见时在 WAIT_TIMEOUTS 截止后按原逻辑判定"""
+
+    # 轮询间隔按指数退避增长，条件成立后最多再多等一个最大间隔
+    POLL_SLACK_MS = 20
+
+    def test_waits_end_once_state_is_ready(self):
+        ready_delays = {'activate': 0.02, 'focus': 0.01, 'clipboard': 0.005}
+        condition_driver = make_driver(ready_delays=ready_delays)
+        fixed_driver = make_driver(ready_delays=ready_delays)
+
+        condition = InjectionSequence(condition_driver, verbose=False).run(1, (10, 20), "hello")
+        fixed = InjectionSequence(fixed_driver, verbose=False, mode="fixed").run(1, (10, 20), "hello")
+
+        stages = condition['stages']
+        self.assertGreaterEqual(stages['activate']['sleep_ms'], 20)
+        self.assertLess(stages['activate']['sleep_ms'], 20 + self.POLL_SLACK_MS)
+        self.assertLess(stages['activate']['sleep_ms'], DEFAULT_DELAYS['activate_settle'] * 1000)
+        self.assertLess(stages['clipboard']['sleep_ms'], DEFAULT_DELAYS['clipboard_settle'] * 1000)
+        # 没有可轮询条件的等待保持原来的时长
+        self.assertAlmostEqual(stages['paste']['sleep_ms'], fixed['stages']['paste']['sleep_ms'], delta=1)
+        self.assertLess(condition['total_ms'], fixed['total_ms'])
+        self.assertEqual(condition_driver.submitted, {1: ["hello"]})
+        self.assertEqual(fixed_driver.submitted, {1: ["hello"]})
+
+    def test_focus_wait_stops_at_timeout(self):
+        driver = make_driver(ready_delays={'focus': WAIT_TIMEOUTS['focus'] * 5})
+
+        result = InjectionSequence(driver, verbose=False).run(1, (10, 20), "hello")
+
+        expected_ms = (DEFAULT_DELAYS['move_settle'] + WAIT_TIMEOUTS['focus'] + DEFAULT_DELAYS['click_settle']) * 1000
+        self.assertAlmostEqual(result['stages']['click']['sleep_ms'], expected_ms, delta=self.POLL_SLACK_MS)
+
+    def test_activation_not_visible_before_timeout_fails_as_before(self):
+        driver = make_driver(ready_delays={'activate': WAIT_TIMEOUTS['activate'] + 0.2})
+
+        with self.assertRaises(InjectionError) as raised:
+            InjectionSequence(driver, verbose=False).run(1, (10, 20), "hello")
+
+        self.assertEqual(raised.exception.stage, "activate")
+        self.assertEqual([event for event in driver.events if event[0] in ("activate", "restore")],
+                         [('activate', 1), ('activate', 1), ('restore', 1), ('activate', 1)])
+
+    def test_clipboard_not_visible_before_timeout_fails_as_before(self):
+        driver = make_driver(ready_delays={'clipboard': WAIT_TIMEOUTS['clipboard'] + 0.3})
+
+        with self.assertRaises(InjectionError) as raised:
+            InjectionSequence(driver, verbose=False).run(1, (10, 20), "hello")
+
+        self.assertEqual(raised.exception.stage, "clipboard")
+        self.assertEqual(driver.submitted, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
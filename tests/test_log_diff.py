@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志差异合并测试 - 备份之后又追加了条目时，合并结果必须与预期逐字节一致
+
+用法: python -m pytest tests/test_log_diff.py  或  python tests/test_log_diff.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_diff import DiffSide, diff_logs, merge_into_log
+
+
+def make_entry(index, output=None):
+    """与注入日志相同格式的一个交互块"""
+    output = output or f"输出内容 {index} " * 8
+    return (f"\n# 2025-06-16 10:{index // 60 % 60:02d}:{index % 60:02d} (注入 - 项目：injection)\n\n"
+            f"## 📥 输入\n\n命令 {index}\n\n## 📤 输出\n\n{output}\n").encode('utf-8')
+
+
+class MergeAppendedEntriesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.temp_dir, "injection-log.md")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def write_log(self, data):
+        with open(self.log_file, 'wb') as f:
+            f.write(data)
+
+    def read_log(self):
+        with open(self.log_file, 'rb') as f:
+            return f.read()
+
+    def test_appended_entries_are_not_reported_as_modified(self):
+        base = b''.join(make_entry(index) for index in range(3000))
+        live = base + b''.join(make_entry(3000 + index) for index in range(5))
+
+        _, result = diff_logs(DiffSide("备份", base), DiffSide("当前日志", live))
+
+        self.assertEqual(result['counts'], {'added': 5})
+
+    def test_merge_keeps_appended_entries_byte_exact(self):
+        base = b''.join(make_entry(index) for index in range(3000))
+        live = base + b''.join(make_entry(3000 + index) for index in range(5))
+        self.write_log(live)
+
+        result = merge_into_log(DiffSide("备份", base), self.log_file, prefer="base")
+
+        self.assertEqual(self.read_log(), live)
+        self.assertEqual(result['merged_size'], len(live))
+
+    def test_merge_reverts_edit_and_keeps_appended_entries(self):
+        base = b''.join(make_entry(index) for index in range(3000))
+        appended = b''.join(make_entry(3000 + index) for index in range(5))
+        live = b''.join(make_entry(index, "被改动的内容" if index == 1500 else None) for index in range(3000)) + appended
+        self.write_log(live)
+
+        result = merge_into_log(DiffSide("备份", base), self.log_file, prefer="base")
+
+        self.assertEqual(result['counts'], {'modified': 1, 'added': 5})
+        self.assertEqual(self.read_log(), base + appended)
+
+    def test_merge_restores_edited_last_entry_before_appended_entries(self):
+        base = b''.join(make_entry(index) for index in range(200))
+        appended = b''.join(make_entry(200 + index) for index in range(3))
+        live = base[:-len(make_entry(199))] + make_entry(199, "被改动的末尾条目") + appended
+        self.write_log(live)
+
+        result = merge_into_log(DiffSide("备份", base), self.log_file, prefer="base")
+
+        self.assertEqual(result['counts'], {'modified': 1, 'added': 3})
+        self.assertEqual(self.read_log(), base + appended)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多目标注入测试 - 预写剪贴板的流水线顺序、每个目标的结果、目标组的去重（FakeInputDriver，不需要 Windows）
+
+用法: python -m pytest tests/test_target_set.py  或  python tests/test_target_set.py
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from input_driver import FakeInputDriver
+from target_set import TargetSet, fan_out_inject, project_log_file
+
+
+def make_target(hwnd, project):
+    return {'hwnd': hwnd, 'position': (10, 20), 'title': f"main.py - {project} - Cursor",
+            'app_name': "Cursor", 'project_name': project, 'log_file': None}
+
+
+def prepare(target):
+    return f"[{target['project_name']}] 修复登录页"
+
+
+class FanOutInjectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.driver = FakeInputDriver()
+        for hwnd, project in ((1, "injection"), (2, "webapp"), (3, "docs")):
+            self.driver.add_window(hwnd, f"main.py - {project} - Cursor")
+
+    def test_each_target_gets_its_own_text_and_result(self):
+        targets = [make_target(1, "injection"), make_target(2, "webapp"), make_target(3, "docs")]
+
+        results = fan_out_inject(self.driver, targets, prepare)
+
+        self.assertEqual(list(results), ["injection", "webapp", "docs"])
+        self.assertTrue(all(result['success'] for result in results.values()))
+        self.assertEqual(self.driver.submitted, {
+            1: ["[injection] 修复登录页"],
+            2: ["[webapp] 修复登录页"],
+            3: ["[docs] 修复登录页"],
+        })
+
+    def test_next_clipboard_is_written_before_switching_targets(self):
+        targets = [make_target(1, "injection"), make_target(2, "webapp"), make_target(3, "docs")]
+
+        fan_out_inject(self.driver, targets, prepare)
+
+        # 每个目标只写一次剪贴板；第 2、3 个目标的剪贴板在上一个目标回车之后、激活下一个窗口之前写好
+        order = [event[:2] if event[0] == "activate" else event[:1] for event in self.driver.events
+                 if event[0] in ("activate", "set_clipboard", "press_enter")]
+        self.assertEqual(order, [
+            ("activate", 1), ("set_clipboard",), ("press_enter",),
+            ("set_clipboard",), ("activate", 2), ("press_enter",),
+            ("set_clipboard",), ("activate", 3), ("press_enter",),
+        ])
+
+    def test_failed_target_does_not_stop_the_others(self):
+        targets = [make_target(1, "injection"), make_target(99, "closed"), make_target(3, "docs")]
+
+        results = fan_out_inject(self.driver, targets, prepare)
+
+        self.assertEqual([result['success'] for result in results.values()], [True, False, True])
+        self.assertIn("窗口激活失败", results["closed"]['error'])
+        self.assertEqual(self.driver.submitted, {1: ["[injection] 修复登录页"], 3: ["[docs] 修复登录页"]})
+
+    def test_relocate_replaces_target_window(self):
+        self.driver.activation_failures = 1
+        targets = [make_target(9, "injection"), make_target(2, "webapp")]
+        self.driver.add_window(9, "main.py - injection - Cursor")
+
+        results = fan_out_inject(self.driver, targets, prepare,
+                                 relocate=lambda target: 1 if target['hwnd'] == 9 else None)
+
+        self.assertEqual(results["injection"]['hwnd'], 1)
+        self.assertEqual(self.driver.submitted, {1: ["[injection] 修复登录页"], 2: ["[webapp] 修复登录页"]})
+
+    def test_targets_of_the_same_project_keep_separate_results(self):
+        targets = [make_target(1, "injection"), make_target(2, "injection")]
+
+        results = fan_out_inject(self.driver, targets, prepare)
+
+        self.assertEqual(list(results), ["injection", "injection#2"])
+
+
+class TargetSetTest(unittest.TestCase):
+
+    def test_project_folder_sets_project_log(self):
+        target_set = TargetSet()
+        folder = os.path.join(os.sep, "work", "webapp")
+
+        target = target_set.add(5, (1, 2), "main.py - webapp - Cursor", "Cursor", folder)
+
+        self.assertEqual(target['project_name'], "webapp")
+        self.assertEqual(target['log_file'], project_log_file(folder))
+        self.assertEqual(TargetSet.from_config({'target_set': target_set.to_config()}).targets, target_set.targets)
+
+    def test_update_hwnd_to_window_already_in_set_keeps_one_target(self):
+        target_set = TargetSet([make_target(1, "injection"), make_target(2, "injection")])
+
+        target_set.update_hwnd(1, 2)
+
+        self.assertEqual([target['hwnd'] for target in target_set], [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
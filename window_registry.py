@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+窗口登记表 - 缓存候选窗口（句柄、标题、进程名、标题中的项目名），增量更新并通知变化
+
+原 find_current_cursor_window 和 get_cursor_project_name 在每次注入、每次重试时都枚举全部顶层窗口，
+capture_cascade_text 也是 FindWindow 逐个尝试后再 EnumWindows。本模块：
+1. 以字典维护可见顶层窗口的记录，并按标题、项目建立索引，注入路径上的查询都是字典命中
+2. Windows 上用 SetWinEventHook 监听窗口创建/销毁/显示/隐藏/改名/前台切换，只刷新变化的那个窗口；
+   另有低频全量比对兜底（钩子漏掉的事件在下一轮比对时补上）
+3. 没有钩子的后端（FakeWindowSource）按较短间隔做廉价比对：只比较 句柄→标题，
+   只有新出现或改名的窗口才查询进程名（进程名按进程ID缓存）
+4. 记录新增、移除、变化时回调监听者（在登记表线程中调用，UI需自行转回主线程）
+
+作者: Assistant
+创建时间: 2025-06-16
+项目: injection
+"""
+
+import os
+import time
+import ctypes
+import threading
+
+try:
+    import win32gui
+    import win32con
+    import win32api
+    import win32process
+    WIN32_AVAILABLE = True
+except ImportError:
+    WIN32_AVAILABLE = False
+
+
+POLL_INTERVAL = 1.0          # 无钩子时的比对间隔（秒）
+RESYNC_INTERVAL = 30.0       # 有钩子时的全量比对间隔（秒）
+
+# WinEvent 常量
+EVENT_SYSTEM_FOREGROUND = 0x0003
+EVENT_OBJECT_CREATE = 0x8000
+EVENT_OBJECT_DESTROY = 0x8001
+EVENT_OBJECT_SHOW = 0x8002
+EVENT_OBJECT_HIDE = 0x8003
+EVENT_OBJECT_NAMECHANGE = 0x800C
+WINEVENT_OUTOFCONTEXT = 0x0000
+WINEVENT_SKIPOWNPROCESS = 0x0002
+OBJID_WINDOW = 0
+CHILDID_SELF = 0
+GA_ROOT = 2
+WM_QUIT = 0x0012
+
+
+def project_from_title(title):
+    """从 Cursor 窗口标题 "文件 - 项目 - Cursor" 中取项目名称，取不到时返回空字符串"""
+    parts = [part.strip() for part in (title or "").split(" - ")]
+    if len(parts) >= 2 and parts[-2] and parts[-2] != "Cursor":
+        return parts[-2]
+    return ""
+
+
+def is_cursor_title(title):
+    return "Cursor" in title
+
+
+class Win32WindowSource:
+    """Windows 窗口来源：EnumWindows 快照 + WinEvent 钩子"""
+
+    supports_hooks = True
+
+    def __init__(self):
+        if not WIN32_AVAILABLE:
+            raise RuntimeError("pywin32 不可用，无法监视窗口")
+        self.hook_thread_id = None
+        self.process_names = {}  # 进程ID -> 进程名
+
+    def snapshot(self):
+        """可见且有标题的顶层窗口 {句柄: 标题}"""
+        windows = {}
+
+        def enum_windows_callback(hwnd, results):
+            if win32gui.IsWindowVisible(hwnd):
+                title = win32gui.GetWindowText(hwnd)
+                if title:
+                    results[hwnd] = title
+            return True
+
+        win32gui.EnumWindows(enum_windows_callback, windows)
+        return windows
+
+    def title_of(self, hwnd):
+        """可见顶层窗口的标题；窗口不存在、不可见或不是顶层窗口时返回 None"""
+        try:
+            if not win32gui.IsWindow(hwnd) or not win32gui.IsWindowVisible(hwnd):
+                return None
+            if ctypes.windll.user32.GetAncestor(hwnd, GA_ROOT) != hwnd:
+                return None
+            return win32gui.GetWindowText(hwnd) or None
+        except Exception:
+            return None
+
+    def process_name(self, hwnd):
+        try:
+            _, process_id = win32process.GetWindowThreadProcessId(hwnd)
+        except Exception:
+            return ""
+        name = self.process_names.get(process_id)
+        if name is None:
+            name = ""
+            try:
+                handle = win32api.OpenProcess(win32con.PROCESS_QUERY_INFORMATION | win32con.PROCESS_VM_READ,
+                                              False, process_id)
+                try:
+                    name = os.path.splitext(os.path.basename(win32process.GetModuleFileNameEx(handle, 0)))[0]
+                finally:
+                    win32api.CloseHandle(handle)
+            except Exception:
+                pass
+            self.process_names[process_id] = name
+        return name
+
+    def foreground(self):
+        return win32gui.GetForegroundWindow()
+
+    def run_hooks(self, on_event):
+        """安装 WinEvent 钩子并在当前线程处理消息，直到 stop_hooks()"""
+        from ctypes import wintypes
+        user32 = ctypes.windll.user32
+        WinEventProc = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                          wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+        user32.SetWinEventHook.restype = wintypes.HANDLE
+        user32.SetWinEventHook.argtypes = [wintypes.UINT, wintypes.UINT, wintypes.HMODULE, WinEventProc,
+                                           wintypes.DWORD, wintypes.DWORD, wintypes.UINT]
+
+        def callback(hook, event, hwnd, id_object, id_child, thread_id, event_time):
+            if hwnd and id_object == OBJID_WINDOW and id_child == CHILDID_SELF:
+                on_event(event, hwnd)
+
+        # 回调对象必须在钩子存在期间保持引用
+        self._hook_proc = WinEventProc(callback)
+        hooks = [user32.SetWinEventHook(low, high, None, self._hook_proc, 0, 0,
+                                        WINEVENT_OUTOFCONTEXT | WINEVENT_SKIPOWNPROCESS)
+                 for low, high in ((EVENT_SYSTEM_FOREGROUND, EVENT_SYSTEM_FOREGROUND),
+                                   (EVENT_OBJECT_CREATE, EVENT_OBJECT_HIDE),
+                                   (EVENT_OBJECT_NAMECHANGE, EVENT_OBJECT_NAMECHANGE))]
+        self.hook_thread_id = ctypes.windll.kernel32.GetCurrentThreadId()
+        try:
+            message = wintypes.MSG()
+            while user32.GetMessageW(ctypes.byref(message), None, 0, 0) > 0:
+                user32.TranslateMessage(ctypes.byref(message))
+                user32.DispatchMessageW(ctypes.byref(message))
+        finally:
+            for hook in hooks:
+                if hook:
+                    user32.UnhookWinEvent(hook)
+            self.hook_thread_id = None
+
+    def stop_hooks(self):
+        if self.hook_thread_id:
+            ctypes.windll.user32.PostThreadMessageW(self.hook_thread_id, WM_QUIT, 0, 0)
+
+
+class FakeWindowSource:
+    """进程内模拟的窗口来源（没有钩子，登记表按间隔比对）"""
+
+    supports_hooks = False
+
+    def __init__(self):
+        self.windows = {}  # 句柄 -> {'title', 'process', 'visible'}
+        self.foreground_window = None
+        self.process_lookups = 0
+
+    def open_window(self, hwnd, title, process="Cursor", visible=True):
+        self.windows[hwnd] = {'title': title, 'process': process, 'visible': visible}
+
+    def close_window(self, hwnd):
+        self.windows.pop(hwnd, None)
+
+    def rename_window(self, hwnd, title):
+        self.windows[hwnd]['title'] = title
+
+    def snapshot(self):
+        return {hwnd: window['title'] for hwnd, window in self.windows.items()
+                if window['visible'] and window['title']}
+
+    def title_of(self, hwnd):
+        window = self.windows.get(hwnd)
+        if window and window['visible'] and window['title']:
+            return window['title']
+        return None
+
+    def process_name(self, hwnd):
+        self.process_lookups += 1
+        window = self.windows.get(hwnd)
+        return window['process'] if window else ""
+
+    def foreground(self):
+        return self.foreground_window
+
+
+def create_window_source(name="auto"):
+    """auto / win32：监视真实窗口，pywin32 不可用时抛出 RuntimeError；fake：模拟来源（只在明确指定时使用）"""
+    if name in ("auto", "win32"):
+        return Win32WindowSource()
+    if name == "fake":
+        return FakeWindowSource()
+    raise ValueError(f"未知的窗口来源: {name}")
+
+
+class WindowRegistry:
+    """可见顶层窗口的索引缓存"""
+
+    def __init__(self, source, poll_interval=POLL_INTERVAL, resync_interval=RESYNC_INTERVAL):
+        self.source = source
+        self.poll_interval = poll_interval
+        self.resync_interval = resync_interval
+        self.lock = threading.RLock()
+
+        self.records = {}        # 句柄 -> 记录
+        self.by_title = {}       # 标题 -> 句柄集合
+        self.by_project = {}     # 项目名称 -> Cursor窗口句柄集合
+        self.cursor_hwnds = set()
+        self.latest_cursor = None    # 句柄最大的Cursor窗口（与原 find_current_cursor_window 的选择一致）
+        self.active_cursor = None    # 最近一次处于前台的Cursor窗口
+
+        self.listeners = []
+        self.version = 0
+        self.stats = {'full_refreshes': 0, 'window_refreshes': 0, 'events': 0, 'lookups': 0}
+
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    # === 服务控制 ===
+
+    def start(self):
+        """先同步建立一次完整索引，再启动增量更新线程"""
+        with self.lock:
+            if self.threads:
+                return
+            self.stop_event.clear()
+        self.refresh()
+        interval = self.resync_interval if self.source.supports_hooks else self.poll_interval
+        with self.lock:
+            self.threads.append(threading.Thread(target=self._poll_loop, args=(interval,),
+                                                 name="WindowRegistryPoll", daemon=True))
+            if self.source.supports_hooks:
+                self.threads.append(threading.Thread(target=self._hook_loop, name="WindowRegistryHooks", daemon=True))
+            for thread in self.threads:
+                thread.start()
+        print(f"🪟 窗口登记表已启动：{len(self.records)} 个窗口，{len(self.cursor_hwnds)} 个Cursor窗口"
+              f"（{'事件钩子' if self.source.supports_hooks else '定时比对'}）")
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        if self.source.supports_hooks:
+            self.source.stop_hooks()
+        with self.lock:
+            threads = self.threads
+            self.threads = []
+        for thread in threads:
+            thread.join(timeout)
+
+    def add_listener(self, callback):
+        """callback(事件, 记录)，事件为 added / removed / changed / activated，在登记表线程中调用"""
+        self.listeners.append(callback)
+
+    def _poll_loop(self, interval):
+        while not self.stop_event.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️ 窗口登记表比对失败: {e}")
+
+    def _hook_loop(self):
+        try:
+            self.source.run_hooks(self._on_event)
+        except Exception as e:
+            print(f"⚠️ 窗口事件钩子不可用，改为每 {self.poll_interval} 秒比对: {e}")
+            # 与 stop() 互斥：已经停止时不再启动比对线程
+            with self.lock:
+                if self.stop_event.is_set():
+                    return
+                thread = threading.Thread(target=self._poll_loop, args=(self.poll_interval,),
+                                          name="WindowRegistryPollFallback", daemon=True)
+                self.threads.append(thread)
+                thread.start()
+
+    def _on_event(self, event, hwnd):
+        with self.lock:
+            self.stats['events'] += 1
+        try:
+            if event == EVENT_SYSTEM_FOREGROUND:
+                self.mark_active(hwnd)
+            elif event == EVENT_OBJECT_DESTROY:
+                self.remove_window(hwnd)
+            else:
+                self.refresh_window(hwnd)
+        except Exception as e:
+            print(f"⚠️ 处理窗口事件失败: {e}")
+
+    # === 增量更新 ===
+
+    def refresh(self):
+        """全量比对：只对新出现或标题变化的窗口查询进程名，返回 (新增, 变化, 移除) 数量"""
+        snapshot = self.source.snapshot()
+        changes = []
+        with self.lock:
+            self.stats['full_refreshes'] += 1
+            for hwnd in [hwnd for hwnd in self.records if hwnd not in snapshot]:
+                changes.append(("removed", self._remove(hwnd)))
+            for hwnd, title in snapshot.items():
+                record = self.records.get(hwnd)
+                if record is None or record['title'] != title:
+                    changes.append(self._put(hwnd, title))
+            if changes:
+                self._update_latest()
+                self.version += 1
+        self._notify(changes)
+        counts = {"added": 0, "changed": 0, "removed": 0}
+        for event, _ in changes:
+            counts[event] += 1
+        return counts["added"], counts["changed"], counts["removed"]
+
+    def refresh_window(self, hwnd):
+        """重新读取单个窗口（钩子事件：创建、显示、隐藏、改名）"""
+        title = self.source.title_of(hwnd)
+        changes = []
+        with self.lock:
+            self.stats['window_refreshes'] += 1
+            record = self.records.get(hwnd)
+            if title is None:
+                if record is not None:
+                    changes.append(("removed", self._remove(hwnd)))
+            elif record is None or record['title'] != title:
+                changes.append(self._put(hwnd, title))
+            if changes:
+                self._update_latest()
+                self.version += 1
+        self._notify(changes)
+
+    def remove_window(self, hwnd):
+        changes = []
+        with self.lock:
+            if hwnd in self.records:
+                changes.append(("removed", self._remove(hwnd)))
+                self._update_latest()
+                self.version += 1
+        self._notify(changes)
+
+    def mark_active(self, hwnd):
+        """前台窗口变化：记录最近活动的Cursor窗口"""
+        changes = []
+        with self.lock:
+            if hwnd not in self.records:
+                title = self.source.title_of(hwnd)
+                if title is None:
+                    return
+                changes.append(self._put(hwnd, title))
+                self._update_latest()
+                self.version += 1
+            record = self.records[hwnd]
+            record['activated_at'] = time.time()
+            if record['is_cursor'] and self.active_cursor != hwnd:
+                self.active_cursor = hwnd
+                changes.append(("activated", dict(record)))
+        self._notify(changes)
+
+    def _put(self, hwnd, title):
+        """调用方持有 self.lock；返回 (事件, 记录快照)"""
+        previous = self.records.get(hwnd)
+        if previous is not None:
+            self._unindex(previous)
+        record = {
+            'hwnd': hwnd,
+            'title': title,
+            'process': self.source.process_name(hwnd),
+            'project': project_from_title(title),
+            'is_cursor': is_cursor_title(title),
+            'activated_at': previous['activated_at'] if previous else None
+        }
+        self.records[hwnd] = record
+        self.by_title.setdefault(title, set()).add(hwnd)
+        if record['is_cursor']:
+            self.cursor_hwnds.add(hwnd)
+            if record['project']:
+                self.by_project.setdefault(record['project'], set()).add(hwnd)
+        return ("changed" if previous is not None else "added", dict(record, previous_title=previous['title'] if previous else None))
+
+    def _remove(self, hwnd):
+        record = self.records.pop(hwnd)
+        self._unindex(record)
+        if self.active_cursor == hwnd:
+            self.active_cursor = None
+        return dict(record)
+
+    def _unindex(self, record):
+        hwnd = record['hwnd']
+        titles = self.by_title.get(record['title'])
+        if titles is not None:
+            titles.discard(hwnd)
+            if not titles:
+                del self.by_title[record['title']]
+        self.cursor_hwnds.discard(hwnd)
+        projects = self.by_project.get(record['project'])
+        if projects is not None:
+            projects.discard(hwnd)
+            if not projects:
+                del self.by_project[record['project']]
+
+    def _update_latest(self):
+        self.latest_cursor = max(self.cursor_hwnds) if self.cursor_hwnds else None
+
+    def _notify(self, changes):
+        for event, record in changes:
+            for callback in list(self.listeners):
+                try:
+                    callback(event, record)
+                except Exception as e:
+                    print(f"⚠️ 窗口变化通知处理失败: {e}")
+
+    # === 查询（注入路径上使用，均为字典命中；索引由钩子和比对线程修改，查询同样持锁） ===
+
+    def get(self, hwnd):
+        with self.lock:
+            self.stats['lookups'] += 1
+            record = self.records.get(hwnd)
+            return dict(record) if record else None
+
+    def find_by_title(self, title):
+        """标题完全相同的窗口句柄（多个时取任意一个），没有时返回 None"""
+        with self.lock:
+            self.stats['lookups'] += 1
+            hwnds = self.by_title.get(title)
+            return next(iter(hwnds)) if hwnds else None
+
+    def latest_cursor_window(self):
+        with self.lock:
+            self.stats['lookups'] += 1
+            return self.latest_cursor
+
+    def current_cursor_window(self):
+        """最近处于前台的Cursor窗口，没有记录时取句柄最大的一个"""
+        with self.lock:
+            self.stats['lookups'] += 1
+            return self.active_cursor if self.active_cursor in self.records else self.latest_cursor
+
+    def windows_for_project(self, project):
+        with self.lock:
+            self.stats['lookups'] += 1
+            return sorted(self.by_project.get(project, ()), reverse=True)
+
+    def visible_windows(self):
+        """全部已登记窗口 [(句柄, 标题)]（窗口选择列表使用）"""
+        with self.lock:
+            return [(hwnd, record['title']) for hwnd, record in self.records.items()]
+
+    def summary(self):
+        with self.lock:
+            return {
+                'windows': len(self.records),
+                'cursor_windows': len(self.cursor_hwnds),
+                'projects': sorted(self.by_project),
+                'version': self.version,
+                **self.stats
+            }